@@ -0,0 +1 @@
+"""Simulator-free performance benchmarks of the Flow kernel."""
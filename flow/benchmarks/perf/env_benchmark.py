@@ -0,0 +1,394 @@
+"""End-to-end throughput benchmarks of the Flow benchmark environments.
+
+Every environment of flow.benchmarks (e.g. grid0, bottleneck1, merge2) is
+created through make_create_env in a separate process, reset, and stepped a
+fixed number of times with a zero or random policy. The following are
+measured:
+
+* "startup": time taken to create the environment, i.e. to generate the
+  network and start sumo
+* "reset": median time taken by a reset
+* "steps_per_sec" and "step_latency": throughput and latency of env.step
+* "phases": time spent in every phase of a step, in seconds per step. The
+  phases are "simulation" (advancing sumo), "kernel_update" (processing the
+  results of the simulation), "rl_actions", "observation" (get_state),
+  "reward" (compute_reward), and "other" (controllers of the human-driven
+  vehicles, rendering, etc.)
+* "peak_rss_mb" and "sumo_peak_rss_mb": peak resident memory of the process
+  running the environment, and of sumo
+
+Results are written to JSON with metadata on the machine and the versions of
+Flow and sumo, and may be compared with previous results, in which case the
+regressions beyond a threshold are reported. Environments using sumo are
+skipped if sumo is not installed.
+
+Usage
+    $ python flow/benchmarks/perf/env_benchmark.py --output results.json
+    $ python flow/benchmarks/perf/env_benchmark.py --benchmarks grid0 merge0 \
+        --compare results.json --threshold 0.1
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from flow.utils.registry import make_create_env
+from flow.version import __version__
+
+# names of the benchmarks in flow.benchmarks
+BENCHMARKS = ["grid0", "grid1", "bottleneck0", "bottleneck1", "bottleneck2",
+              "figureeight0", "figureeight1", "figureeight2", "merge0",
+              "merge1", "merge2"]
+
+# phases of a step, see the module documentation
+PHASES = ["simulation", "kernel_update", "rl_actions", "observation",
+          "reward", "other"]
+
+# measures compared with previous results, and whether higher is better
+MEASURES = [("startup", False), ("reset", False), ("steps_per_sec", True),
+            ("peak_rss_mb", False)]
+
+
+class _PhaseTimer(object):
+    """Accumulate the time spent in methods of an environment."""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.)
+
+    def wrap(self, obj, name, phase):
+        """Time the calls to a method of an object as part of a phase."""
+        method = getattr(obj, name)
+
+        def _timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.totals[phase] += time.perf_counter() - t0
+
+        # shadow the method with the timed one on this object only
+        setattr(obj, name, _timed)
+
+
+def benchmark_env(flow_params, num_steps=200, num_resets=2, policy="zero",
+                  seed=0):
+    """Measure the throughput of an environment.
+
+    Parameters
+    ----------
+    flow_params : dict
+        parameters of the environment, see make_create_env
+    num_steps : int
+        number of timed steps
+    num_resets : int
+        number of timed resets, performed before the steps
+    policy : str
+        "zero" to apply null actions, or "random" to sample actions from the
+        action space
+    seed : int
+        seed of the random policy
+
+    Returns
+    -------
+    dict
+        measures of the environment, see the module documentation
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    create_env, _ = make_create_env(flow_params)
+
+    t0 = time.perf_counter()
+    env = create_env().unwrapped
+    startup = time.perf_counter() - t0
+
+    try:
+        resets = []
+        for _ in range(max(num_resets, 1)):
+            t0 = time.perf_counter()
+            env.reset()
+            resets.append(time.perf_counter() - t0)
+
+        action_space = env.action_space
+        if hasattr(action_space, "seed"):
+            action_space.seed(seed)
+
+        timer = _PhaseTimer()
+        timer.wrap(env.k.simulation, "simulation_step", "simulation")
+        timer.wrap(env.k, "update", "kernel_update")
+        timer.wrap(env, "apply_rl_actions", "rl_actions")
+        timer.wrap(env, "get_state", "observation")
+        timer.wrap(env, "compute_reward", "reward")
+
+        latencies = []
+        for _ in range(num_steps):
+            if policy == "random":
+                action = action_space.sample()
+            else:
+                action = np.zeros(action_space.shape)
+            t0 = time.perf_counter()
+            _, _, done, _ = env.step(action)
+            latencies.append(time.perf_counter() - t0)
+            if done is True:
+                # resets are not part of the phases of the steps
+                totals = dict(timer.totals)
+                env.reset()
+                timer.totals = totals
+        total = sum(latencies)
+        timer.totals["other"] += total - sum(timer.totals.values())
+        num_vehicles = len(env.k.vehicle.get_ids())
+
+        sumo_rss = None
+        sumo_proc = getattr(env.k.simulation, "sumo_proc", None)
+        if sumo_proc is not None:
+            sumo_rss = _peak_rss_mb(sumo_proc.pid)
+    finally:
+        env.terminate()
+
+    return {
+        "status": "ok",
+        "startup": startup,
+        "reset": float(np.median(resets)),
+        "steps_per_sec": num_steps / total if total > 0 else None,
+        "step_latency": {
+            "median": float(np.median(latencies)),
+            "p90": float(np.percentile(latencies, 90)),
+        },
+        "phases": {phase: timer.totals[phase] / num_steps
+                   for phase in PHASES},
+        "peak_rss_mb": _peak_rss_mb(),
+        "sumo_peak_rss_mb": sumo_rss,
+        "num_vehicles": num_vehicles,
+    }
+
+
+def _peak_rss_mb(pid=None):
+    """Return the peak resident memory of a process, in MB.
+
+    The peak memory of the current process is returned if pid is None, and
+    None if it cannot be measured (the memory of other processes is read
+    from /proc, on Linux).
+    """
+    if pid is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / 1024 ** (2 if sys.platform == "darwin" else 1)
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def sumo_version():
+    """Return the version of sumo, or None if sumo is not installed."""
+    if shutil.which("sumo") is None:
+        return None
+    try:
+        output = subprocess.check_output(["sumo", "--version"],
+                                         stderr=subprocess.STDOUT)
+    except (subprocess.CalledProcessError, OSError):
+        return None
+    return output.decode(errors="replace").splitlines()[0].strip()
+
+
+def _run_benchmark(name, num_steps, num_resets, policy, seed):
+    """Run a benchmark of flow.benchmarks, in a worker process."""
+    module = importlib.import_module("flow.benchmarks." + name)
+    try:
+        return benchmark_env(module.flow_params, num_steps, num_resets,
+                             policy, seed)
+    except Exception as e:
+        return {"status": "error",
+                "error": "{}: {}".format(type(e).__name__, e)}
+
+
+def run(benchmarks=BENCHMARKS, num_steps=200, num_resets=2, policy="zero",
+        seed=0):
+    """Run benchmarks of flow.benchmarks.
+
+    Every benchmark runs in a new process, so that the peak memory of each
+    benchmark is measured separately, and environments registered with gym
+    by a benchmark do not leak into the next ones.
+
+    Parameters
+    ----------
+    benchmarks : list of str
+        names of the benchmarks
+    num_steps, num_resets, policy, seed
+        see benchmark_env
+
+    Returns
+    -------
+    dict
+        "metadata" of the run, and "results" by benchmark. The "status" of
+        every result is "ok", "error" (along with the "error"), or "skipped"
+        (along with the "reason") if sumo is not installed
+    """
+    version = sumo_version()
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in benchmarks:
+        if version is None:
+            results[name] = {"status": "skipped",
+                             "reason": "sumo is not installed"}
+            continue
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(
+                _run_benchmark, (name, num_steps, num_resets, policy, seed))
+
+    return {
+        "metadata": {
+            "flow": __version__,
+            "sumo": version,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "num_steps": num_steps,
+            "num_resets": num_resets,
+            "policy": policy,
+            "seed": seed,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(results, previous, threshold=0.1):
+    """Compare the results of benchmarks with previous results.
+
+    Only the benchmarks that ran successfully in both are compared.
+
+    Parameters
+    ----------
+    results : dict
+        results of the benchmarks, see run
+    previous : dict
+        previous results, in the same format
+    threshold : float
+        relative degradation of a measure considered as a regression
+
+    Returns
+    -------
+    list of dict
+        the comparison of every measure of every benchmark: "benchmark",
+        "measure", "previous" and "value" of the measure, their "ratio", and
+        "regression"
+    """
+    comparisons = []
+    for name, result in sorted(results["results"].items()):
+        reference = previous["results"].get(name, {})
+        if result.get("status") != "ok" or reference.get("status") != "ok":
+            continue
+        for measure, higher_is_better in MEASURES:
+            value, old = result.get(measure), reference.get(measure)
+            if value is None or old is None or old <= 0:
+                continue
+            ratio = value / old
+            if higher_is_better:
+                regression = ratio < 1 - threshold
+            else:
+                regression = ratio > 1 + threshold
+            comparisons.append({
+                "benchmark": name,
+                "measure": measure,
+                "previous": old,
+                "value": value,
+                "ratio": ratio,
+                "regression": regression,
+            })
+    return comparisons
+
+
+def create_parser():
+    """Create the parser of the benchmarks."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="Measures the throughput of the environments of "
+                    "flow.benchmarks.")
+    parser.add_argument("--benchmarks", type=str, nargs="+",
+                        default=BENCHMARKS, choices=BENCHMARKS,
+                        help="benchmarks to run")
+    parser.add_argument("--num_steps", type=int, default=200,
+                        help="number of timed steps per benchmark")
+    parser.add_argument("--num_resets", type=int, default=2,
+                        help="number of timed resets per benchmark")
+    parser.add_argument("--policy", type=str, default="zero",
+                        choices=["zero", "random"],
+                        help="policy computing the actions")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random policy")
+    parser.add_argument("--output", type=str, default=None,
+                        help="path of the JSON file to write the results to")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="path of previous results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative degradation considered as a "
+                             "regression")
+    return parser
+
+
+def main(args):
+    """Run the benchmarks and print the results.
+
+    Returns
+    -------
+    int
+        1 if a regression was found with respect to the previous results, 0
+        otherwise
+    """
+    flags = create_parser().parse_args(args)
+    results = run(flags.benchmarks, flags.num_steps, flags.num_resets,
+                  flags.policy, flags.seed)
+
+    if flags.output is not None:
+        with open(flags.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    print("{:<13} {:>9} {:>9} {:>10} {:>9}  {}".format(
+        "benchmark", "startup", "reset", "steps/sec", "rss (MB)",
+        "phases (ms/step)"))
+    for name in flags.benchmarks:
+        result = results["results"][name]
+        if result["status"] != "ok":
+            print("{:<13} {}: {}".format(name, result["status"],
+                                         result.get("reason",
+                                                    result.get("error"))))
+            continue
+        print("{:<13} {:>8.2f}s {:>8.3f}s {:>10.1f} {:>9.0f}  {}".format(
+            name, result["startup"], result["reset"],
+            result["steps_per_sec"], result["peak_rss_mb"],
+            ", ".join("{} {:.2f}".format(phase, 1000 * seconds)
+                      for phase, seconds in result["phases"].items())))
+
+    regressions = []
+    if flags.compare is not None:
+        with open(flags.compare) as f:
+            previous = json.load(f)
+        regressions = [c for c in compare(results, previous, flags.threshold)
+                       if c["regression"]]
+        for c in regressions:
+            print("REGRESSION {benchmark} {measure}: {previous:.3f} -> "
+                  "{value:.3f} ({ratio:.2f}x)".format(**c))
+        if not regressions:
+            print("no regression beyond {:.0%}".format(flags.threshold))
+
+    return int(len(regressions) > 0)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,226 @@
+"""Fake TraCI connection replaying recorded subscription results.
+
+The TraCI kernel of Flow (see flow/core/kernel/*/traci.py) reads the state
+of the simulation from the subscription results of the vehicle and
+simulation domains of a TraCI connection. ``FakeKernelAPI`` implements the
+subset of the TraCI connection used by the kernel, and returns recorded
+subscription results instead of querying sumo, so that the overhead of the
+kernel can be measured without sumo, and separately from it.
+
+Traces are recorded from the NumPy ring simulator (see
+flow/core/kernel/simulation/ring.py) by ``record_trace``, which converts the
+state of its vehicles after every step into the results sumo would have sent
+for the subscriptions of the kernel.
+"""
+
+import traci.constants as tc
+
+
+class FakeKernelAPI(object):
+    """Fake TraCI connection replaying a trace of subscription results.
+
+    Every call to ``simulationStep`` moves to the next step of the trace.
+    Once the trace is exhausted, it is replayed from its second step, so that
+    vehicles only depart once. Commands sent to the simulator (e.g.
+    ``vehicle.slowDown``) are counted, but have no effect.
+
+    Usage
+        >>> trace = record_trace(env, num_steps=20)
+        >>> kernel.pass_api(FakeKernelAPI(trace))
+        >>> kernel.update(reset=True)
+    """
+
+    def __init__(self, trace):
+        """Instantiate the connection.
+
+        Parameters
+        ----------
+        trace : dict
+            recorded trace, see record_trace
+        """
+        self.trace = trace
+        self.step = 0
+        # number of calls to each command, by name
+        self.calls = {}
+        self.vehicle = _VehicleDomain(self, "vehicle")
+        self.simulation = _SimulationDomain(self, "simulation")
+        self.trafficlight = _TrafficLightDomain(self, "trafficlight")
+
+    def simulationStep(self, step=0.):
+        """Move to the next step of the trace."""
+        self.step += 1
+        if self.step >= len(self.trace["steps"]):
+            self.step = min(1, len(self.trace["steps"]) - 1)
+
+    def setOrder(self, order):
+        """See traci.connection.Connection.setOrder."""
+        pass
+
+    def close(self):
+        """See traci.connection.Connection.close."""
+        pass
+
+    def count(self, command):
+        """Count a call to a command."""
+        self.calls[command] = self.calls.get(command, 0) + 1
+
+    @property
+    def vehicle_obs(self):
+        """Return the vehicle subscription results of the current step."""
+        return self.trace["steps"][self.step][0]
+
+    @property
+    def sim_obs(self):
+        """Return the simulation subscription results of the current step."""
+        return self.trace["steps"][self.step][1]
+
+
+class _Domain(object):
+    """Base class of the domains of the fake connection.
+
+    Commands that are not implemented by a domain are counted and ignored.
+    """
+
+    def __init__(self, api, name):
+        self._api = api
+        self._name = name
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        command = "{}.{}".format(self._name, name)
+
+        def _command(*args, **kwargs):
+            self._api.count(command)
+        return _command
+
+
+class _VehicleDomain(_Domain):
+    """Vehicle domain of the fake connection."""
+
+    def getSubscriptionResults(self):
+        # like traci, a new dictionary is returned at every call
+        return dict(self._api.vehicle_obs)
+
+    def getIDList(self):
+        return list(self._api.vehicle_obs)
+
+    def getTypeID(self, veh_id):
+        return self._api.trace["types"][veh_id]
+
+    def getLength(self, veh_id):
+        return self._api.trace["lengths"][veh_id]
+
+    def getRoadID(self, veh_id):
+        return self._api.vehicle_obs[veh_id][tc.VAR_ROAD_ID]
+
+    def getLanePosition(self, veh_id):
+        return self._api.vehicle_obs[veh_id][tc.VAR_LANEPOSITION]
+
+    def getLaneIndex(self, veh_id):
+        return self._api.vehicle_obs[veh_id][tc.VAR_LANE_INDEX]
+
+    def getSpeed(self, veh_id):
+        return self._api.vehicle_obs[veh_id][tc.VAR_SPEED]
+
+    def getMaxSpeed(self, veh_id):
+        return self._api.trace["max_speed"]
+
+
+class _SimulationDomain(_Domain):
+    """Simulation domain of the fake connection."""
+
+    def getSubscriptionResults(self):
+        return dict(self._api.sim_obs)
+
+    def getTime(self):
+        return self._api.sim_obs[tc.VAR_TIME_STEP] / 1000
+
+    def getStartingTeleportNumber(self):
+        return len(self._api.sim_obs[tc.VAR_TELEPORT_STARTING_VEHICLES_IDS])
+
+
+class _TrafficLightDomain(_Domain):
+    """Traffic light domain of the fake connection."""
+
+    def getIDList(self):
+        return []
+
+    def getSubscriptionResults(self):
+        return {}
+
+
+def record_trace(env, num_steps, rl_actions=None):
+    """Record the subscription results of a ring simulator environment.
+
+    The environment is reset, and stepped ``num_steps`` times. The first step
+    of the trace is the state after the reset, in which all vehicles depart.
+
+    Parameters
+    ----------
+    env : flow.envs.Env
+        environment using the "ring" simulator
+    num_steps : int
+        number of steps to record after the reset
+    rl_actions : array_like, optional
+        actions applied at every step
+
+    Returns
+    -------
+    dict
+        * "steps": list of (vehicle, simulation) subscription results, one per
+          step
+        * "types": type of every vehicle
+        * "lengths": length of every vehicle
+        * "max_speed": maximum speed of the vehicles
+    """
+    env.reset()
+    k = env.k
+    trace = {
+        "steps": [],
+        "types": {veh_id: k.vehicle.get_type(veh_id)
+                  for veh_id in k.vehicle.get_ids()},
+        "lengths": {veh_id: k.vehicle.get_length(veh_id)
+                    for veh_id in k.vehicle.get_ids()},
+        "max_speed": k.scenario.max_speed(),
+    }
+
+    for step in range(num_steps + 1):
+        if step > 0:
+            env.step(rl_actions)
+        vehicle_obs = {}
+        for veh_id in k.vehicle.get_ids():
+            x, y, angle = k.vehicle.get_orientation(veh_id)
+            speed = k.vehicle.get_speed(veh_id)
+            leader = k.vehicle.get_leader(veh_id)
+            obs = {
+                tc.VAR_LANE_INDEX: k.vehicle.get_lane(veh_id),
+                tc.VAR_LANEPOSITION: k.vehicle.get_position(veh_id),
+                tc.VAR_ROAD_ID: k.vehicle.get_edge(veh_id),
+                tc.VAR_SPEED: speed,
+                tc.VAR_EDGES: tuple(k.vehicle.get_route(veh_id)),
+                tc.VAR_POSITION: (x, y),
+                tc.VAR_ANGLE: angle,
+                tc.VAR_SPEED_WITHOUT_TRACI: speed,
+                # the kernel adds the minimum gap to the gap sent by sumo
+                tc.VAR_LEADER: None if leader in ("", None) else (
+                    leader, k.vehicle.get_headway(veh_id) -
+                    k.vehicle.minGap[trace["types"][veh_id]]),
+            }
+            vehicle_obs[veh_id] = obs
+        sim_obs = {
+            tc.VAR_DEPARTED_VEHICLES_IDS:
+                tuple(vehicle_obs) if step == 0 else (),
+            tc.VAR_ARRIVED_VEHICLES_IDS: (),
+            tc.VAR_TELEPORT_STARTING_VEHICLES_IDS: (),
+            tc.VAR_TIME_STEP: int(round(1000 * step * env.sim_step)),
+            tc.VAR_DELTA_T: int(round(1000 * env.sim_step)),
+            tc.VAR_COLLIDING_VEHICLES_IDS:
+                tuple(k.simulation.get_collision_ids()),
+            tc.VAR_LOADED_VEHICLES_NUMBER:
+                len(vehicle_obs) if step == 0 else 0,
+            tc.VAR_MIN_EXPECTED_VEHICLES: len(vehicle_obs),
+        }
+        trace["steps"].append((vehicle_obs, sim_obs))
+
+    return trace
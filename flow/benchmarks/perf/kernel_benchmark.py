@@ -0,0 +1,415 @@
+"""Simulator-free benchmarks of the TraCI kernel.
+
+Traces of subscription results are recorded from the NumPy ring simulator
+for rings of 10 to 10,000 vehicles, and replayed through the TraCI kernel
+with a fake TraCI connection (see flow/benchmarks/perf/fake_api.py), so that
+the time spent by Flow at every step is measured without sumo. The following
+operations are timed at every step:
+
+* "vehicle.update": TraCIVehicle.update, which processes the subscription
+  results, including _multi_lane_headways
+* "multi_lane_headways": TraCIVehicle._multi_lane_headways alone
+* "kernel.aggregates": the remaining updates of the kernel (histories of the
+  vehicles, traffic lights, and network-level metrics)
+* "getters": state getters commonly called by environments and controllers
+* "controllers": the acceleration and routing controllers of all vehicles,
+  and the application of their actions
+* "get_state" and "compute_reward": of the AccelEnv environment
+
+The median latency of every operation is compared with a stored baseline,
+and its scaling with the number of vehicles is estimated as the slope of the
+latency in log-log space (1 for linear scaling).
+
+Usage
+    $ python flow/benchmarks/perf/kernel_benchmark.py
+    $ python flow/benchmarks/perf/kernel_benchmark.py --sizes 10 100 \
+        --save_baseline my_baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from flow.benchmarks.perf.fake_api import FakeKernelAPI, record_trace
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.kernel import Kernel
+from flow.core.kernel.scenario import RingScenario
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.envs.loop.loop_accel import AccelEnv, ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+from flow.version import __version__
+
+# numbers of vehicles of the benchmarked scenarios
+SIZES = [10, 100, 1000, 10000]
+
+# timed operations, in the order they are performed at every step
+OPERATIONS = ["vehicle.update", "multi_lane_headways", "kernel.aggregates",
+              "getters", "controllers", "get_state", "compute_reward"]
+
+# baseline stored with the benchmarks
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "baseline.json")
+
+
+def make_env(num_vehicles, rl_fraction=0.1):
+    """Create a ring road environment simulated by the ring simulator.
+
+    Parameters
+    ----------
+    num_vehicles : int
+        number of vehicles in the ring, whose length is 10 m per vehicle
+    rl_fraction : float
+        fraction of the vehicles that are rl vehicles (at least one)
+
+    Returns
+    -------
+    flow.envs.loop.loop_accel.AccelEnv
+        the environment
+    """
+    num_rl = max(1, int(num_vehicles * rl_fraction))
+    vehicles = VehicleParams()
+    vehicles.add("human",
+                 acceleration_controller=(IDMController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=num_vehicles - num_rl)
+    vehicles.add("rl",
+                 acceleration_controller=(RLController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=num_rl)
+
+    net_params = NetParams(additional_params=dict(
+        ADDITIONAL_NET_PARAMS, length=max(230, 10 * num_vehicles)))
+    scenario = LoopScenario("perf_loop_{}".format(num_vehicles), vehicles,
+                            net_params, InitialConfig(shuffle=True))
+
+    return AccelEnv(EnvParams(additional_params=ADDITIONAL_ENV_PARAMS),
+                    SumoParams(sim_step=0.1), scenario, simulator="ring")
+
+
+def replay_kernel(env, trace):
+    """Replace the kernel of an environment by a TraCI kernel replaying traces.
+
+    The scenario kernel of the ring simulator is kept, since creating the
+    TraCI scenario kernel requires sumo.
+
+    Parameters
+    ----------
+    env : flow.envs.Env
+        environment using the "ring" simulator
+    trace : dict
+        trace recorded from the environment, see
+        flow.benchmarks.perf.fake_api.record_trace
+
+    Returns
+    -------
+    flow.core.kernel.Kernel
+        the new kernel of the environment, updated with the first step of
+        the trace
+    """
+    k = Kernel(simulator="traci", sim_params=env.sim_params)
+    k.scenario = RingScenario(k)
+    k.scenario.generate_network(env.scenario)
+    k.vehicle.initialize(env.scenario.vehicles)
+    k.simulation.sim_step = env.sim_step
+    k.pass_api(FakeKernelAPI(trace))
+    k.update(reset=True)
+
+    env.k.close()
+    env.k = k
+    return k
+
+
+def query_getters(k):
+    """Call the getters commonly used by environments and controllers."""
+    ids = k.vehicle.get_ids()
+    k.vehicle.get_speed(ids)
+    k.vehicle.get_position(ids)
+    k.vehicle.get_edge(ids)
+    k.vehicle.get_lane(ids)
+    k.vehicle.get_headway(ids)
+    k.vehicle.get_leader(ids)
+    k.vehicle.get_follower(ids)
+    k.vehicle.get_orientation(ids[0])
+    for veh_id in ids:
+        k.vehicle.get_x_by_id(veh_id)
+    rl_ids = k.vehicle.get_rl_ids()
+    k.vehicle.get_lane_headways(rl_ids)
+    k.vehicle.get_lane_leaders(rl_ids)
+    k.vehicle.get_lane_followers(rl_ids)
+
+
+def apply_controllers(env, rl_actions):
+    """Compute and apply the actions of the controllers of all vehicles.
+
+    This matches the work done in Env._simulation_step before the simulation
+    is advanced.
+    """
+    k = env.k
+    controlled_ids = k.vehicle.get_controlled_ids()
+    accel = [k.vehicle.get_acc_controller(veh_id).get_action(env)
+             for veh_id in controlled_ids]
+    k.vehicle.apply_acceleration(controlled_ids, accel)
+
+    routing_ids = []
+    routing_actions = []
+    for veh_id in k.vehicle.get_ids():
+        router = k.vehicle.get_routing_controller(veh_id)
+        if router is not None:
+            routing_ids.append(veh_id)
+            routing_actions.append(router.choose_route(env))
+    k.vehicle.choose_routes(routing_ids, routing_actions)
+
+    env.apply_rl_actions(rl_actions)
+
+
+def benchmark_size(num_vehicles, num_steps=20, num_warmup=2):
+    """Time the operations of the kernel for a number of vehicles.
+
+    Parameters
+    ----------
+    num_vehicles : int
+        number of vehicles in the ring
+    num_steps : int
+        number of timed steps. The trace is replayed cyclically, and is as
+        long as the timed and warmup steps.
+    num_warmup : int
+        number of steps performed before the timed steps, e.g. to create the
+        controllers of the vehicles
+
+    Returns
+    -------
+    dict
+        latencies of every operation, in milliseconds, with one element per
+        timed step
+    """
+    env = make_env(num_vehicles)
+    rl_actions = np.zeros(env.action_space.shape)
+    trace = record_trace(env, num_steps + num_warmup, rl_actions)
+    k = replay_kernel(env, trace)
+
+    operations = [
+        ("vehicle.update", lambda: k.vehicle.update(reset=False)),
+        ("multi_lane_headways", k.vehicle._multi_lane_headways),
+        ("kernel.aggregates", lambda: _update_aggregates(k)),
+        ("getters", lambda: query_getters(k)),
+        ("controllers", lambda: apply_controllers(env, rl_actions)),
+        ("get_state", env.get_state),
+        ("compute_reward",
+         lambda: env.compute_reward(rl_actions, fail=False)),
+    ]
+
+    latencies = {name: [] for name in OPERATIONS}
+    for step in range(num_warmup + num_steps):
+        k.simulation.simulation_step()
+        for name, operation in operations:
+            t0 = time.perf_counter()
+            operation()
+            if step >= num_warmup:
+                latencies[name].append(1000 * (time.perf_counter() - t0))
+
+    env.terminate()
+    return latencies
+
+
+def _update_aggregates(k):
+    """Perform the updates of the kernel following the vehicle update."""
+    k.vehicle.update_aggregates(False)
+    k.traffic_light.update(False)
+    k.metrics.update(False)
+
+
+def benchmark(sizes=SIZES, num_steps=20):
+    """Benchmark the kernel for several numbers of vehicles.
+
+    Parameters
+    ----------
+    sizes : list of int
+        numbers of vehicles
+    num_steps : int
+        number of timed steps for every number of vehicles
+
+    Returns
+    -------
+    dict
+        * "metadata": versions of python, numpy and flow, and the platform
+          the benchmarks were run on
+        * "results": median and 90th percentile latencies of every operation
+          (in milliseconds), by operation and by number of vehicles
+        * "scaling": estimated exponent of the latency of every operation as
+          a function of the number of vehicles, see scaling
+    """
+    results = {name: {} for name in OPERATIONS}
+    for num_vehicles in sizes:
+        latencies = benchmark_size(num_vehicles, num_steps)
+        for name in OPERATIONS:
+            results[name][str(num_vehicles)] = {
+                "median": float(np.median(latencies[name])),
+                "p90": float(np.percentile(latencies[name], 90)),
+            }
+
+    return {
+        "metadata": {
+            "flow": __version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "num_steps": num_steps,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+        "scaling": scaling(results),
+    }
+
+
+def scaling(results):
+    """Estimate how the latency of every operation scales with the vehicles.
+
+    Parameters
+    ----------
+    results : dict
+        median latencies by operation and by number of vehicles, see
+        benchmark
+
+    Returns
+    -------
+    dict
+        slope of the median latency of every operation in log-log space, e.g.
+        1 for a latency linear in the number of vehicles, or None if fewer
+        than two numbers of vehicles were benchmarked
+    """
+    exponents = {}
+    for name, by_size in results.items():
+        sizes = sorted(by_size, key=int)
+        if len(sizes) < 2:
+            exponents[name] = None
+            continue
+        x = np.log([int(size) for size in sizes])
+        y = np.log([max(by_size[size]["median"], 1e-6) for size in sizes])
+        exponents[name] = float(np.polyfit(x, y, 1)[0])
+    return exponents
+
+
+def compare(results, baseline, threshold=0.25, noise=0.01):
+    """Compare the latencies of a benchmark with a baseline.
+
+    Only the operations and numbers of vehicles present in both are compared.
+
+    Parameters
+    ----------
+    results : dict
+        results of the benchmark, see benchmark
+    baseline : dict
+        results of the baseline, in the same format
+    threshold : float
+        relative increase of the median latency considered as a regression
+    noise : float
+        increase of the median latency (in milliseconds) below which
+        differences are considered as noise, for very fast operations
+
+    Returns
+    -------
+    list of dict
+        the comparison of every operation and number of vehicles: "operation",
+        "num_vehicles", "baseline" and "latency" (median latencies, in
+        milliseconds), "ratio" between them, and "regression"
+    """
+    comparisons = []
+    for name, by_size in results["results"].items():
+        for size, latency in sorted(by_size.items(), key=lambda x: int(x[0])):
+            try:
+                reference = baseline["results"][name][size]["median"]
+            except KeyError:
+                continue
+            current = latency["median"]
+            comparisons.append({
+                "operation": name,
+                "num_vehicles": int(size),
+                "baseline": reference,
+                "latency": current,
+                "ratio": current / reference if reference > 0 else np.inf,
+                "regression": current - reference > max(
+                    threshold * reference, noise),
+            })
+    return comparisons
+
+
+def create_parser():
+    """Create the parser of the benchmarks."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="Benchmarks the TraCI kernel on recorded subscription "
+                    "results, without sumo.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="numbers of vehicles of the scenarios")
+    parser.add_argument("--num_steps", type=int, default=20,
+                        help="number of timed steps per scenario")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH,
+                        help="results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative increase of the latency considered as "
+                             "a regression")
+    parser.add_argument("--output", type=str, default=None,
+                        help="path of the JSON file to write the results to")
+    parser.add_argument("--save_baseline", type=str, default=None,
+                        help="path of the JSON file to write the results to "
+                             "as a baseline")
+    return parser
+
+
+def main(args):
+    """Run the benchmarks and print the results.
+
+    Returns
+    -------
+    int
+        1 if a regression was found with respect to the baseline, 0 otherwise
+    """
+    flags = create_parser().parse_args(args)
+    results = benchmark(flags.sizes, flags.num_steps)
+
+    for path in (flags.output, flags.save_baseline):
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+    baseline = {"results": {}}
+    if flags.baseline and os.path.exists(flags.baseline):
+        with open(flags.baseline) as f:
+            baseline = json.load(f)
+    comparisons = {(c["operation"], c["num_vehicles"]): c
+                   for c in compare(results, baseline, flags.threshold)}
+
+    print("{:<20} {:>8} {:>11} {:>11} {:>11} {:>7}".format(
+        "operation", "vehicles", "median (ms)", "p90 (ms)", "baseline",
+        "ratio"))
+    for name in OPERATIONS:
+        for size in flags.sizes:
+            latency = results["results"][name][str(size)]
+            comparison = comparisons.get((name, size))
+            print("{:<20} {:>8} {:>11.3f} {:>11.3f} {:>11} {:>7}{}".format(
+                name, size, latency["median"], latency["p90"],
+                "-" if comparison is None else
+                "{:.3f}".format(comparison["baseline"]),
+                "-" if comparison is None else
+                "{:.2f}".format(comparison["ratio"]),
+                "  REGRESSION" if comparison is not None and
+                comparison["regression"] else ""))
+
+    print("\nscaling exponents:")
+    for name in OPERATIONS:
+        exponent = results["scaling"][name]
+        print("{:<20} {}".format(
+            name, "-" if exponent is None else "{:.2f}".format(exponent)))
+
+    return int(any(c["regression"] for c in comparisons.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
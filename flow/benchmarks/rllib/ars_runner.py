@@ -26,6 +26,8 @@ Here the arguments are:
 benchmark_name - name of the benchmark to run
 num_rollouts - number of rollouts to train across
 num_cpus - number of cpus to use for training
+profile_path - directory the profiles of the sampled episodes are written to
+profile_every_n_episodes - one in every N episodes is profiled
 """
 
 parser = argparse.ArgumentParser(
@@ -55,6 +57,21 @@ parser.add_argument(
     default=6,
     help="The number of rollouts to average over.")
 
+# optional input parameters
+parser.add_argument(
+    '--profile_path',
+    type=str,
+    default=None,
+    help="Directory the profiles of the sampled episodes are written to. "
+         "Episodes are not profiled if not specified.")
+
+# optional input parameters
+parser.add_argument(
+    '--profile_every_n_episodes',
+    type=int,
+    default=100,
+    help="One in every profile_every_n_episodes episodes is profiled.")
+
 if __name__ == "__main__":
     benchmark_name = 'grid0'
     args = parser.parse_args()
@@ -72,6 +89,12 @@ if __name__ == "__main__":
         "flow.benchmarks.%s" % benchmark_name, fromlist=["flow_params"])
     flow_params = benchmark.flow_params
 
+    # profile one in every N episodes of every worker, see
+    # flow/core/profiler.py
+    flow_params["env"].profile_path = args.profile_path
+    flow_params["env"].profile_every_n_episodes = \
+        args.profile_every_n_episodes
+
     # get the env name and a creator for the environment
     create_env, env_name = make_create_env(params=flow_params, version=0)
 
@@ -15,6 +15,7 @@ except ImportError:
 from ray.tune import run_experiments
 from ray.tune.registry import register_env
 
+from flow.envs.async_env import FlowAsyncEnv
 from flow.utils.registry import make_create_env
 from flow.utils.rllib import FlowParamsEncoder
 
@@ -25,6 +26,9 @@ Here the arguments are:
 benchmark_name - name of the benchmark to run
 num_rollouts - number of rollouts to train across
 num_cpus - number of cpus to use for training
+profile_path - directory the profiles of the sampled episodes are written to
+profile_every_n_episodes - one in every N episodes is profiled
+num_envs_per_worker - number of simulations interleaved on each worker
 """
 
 parser = argparse.ArgumentParser(
@@ -54,6 +58,30 @@ parser.add_argument(
     default=6,
     help="The number of cpus to use.")
 
+# optional input parameters
+parser.add_argument(
+    '--num_envs_per_worker',
+    type=int,
+    default=1,
+    help="The number of simulations interleaved on each worker. If greater "
+         "than one, the simulations are stepped asynchronously, overlapping "
+         "the simulator and python-side computations.")
+
+# optional input parameters
+parser.add_argument(
+    '--profile_path',
+    type=str,
+    default=None,
+    help="Directory the profiles of the sampled episodes are written to. "
+         "Episodes are not profiled if not specified.")
+
+# optional input parameters
+parser.add_argument(
+    '--profile_every_n_episodes',
+    type=int,
+    default=100,
+    help="One in every profile_every_n_episodes episodes is profiled.")
+
 if __name__ == "__main__":
     benchmark_name = 'grid0'
     args = parser.parse_args()
@@ -65,12 +93,20 @@ if __name__ == "__main__":
     num_cpus = args.num_cpus
 
     upload_dir = args.upload_dir
+    # number of simulations run by every worker
+    num_envs_per_worker = args.num_envs_per_worker
 
     # Import the benchmark and fetch its flow_params
     benchmark = __import__(
         "flow.benchmarks.%s" % benchmark_name, fromlist=["flow_params"])
     flow_params = benchmark.flow_params
 
+    # profile one in every N episodes of every worker, see
+    # flow/core/profiler.py
+    flow_params["env"].profile_path = args.profile_path
+    flow_params["env"].profile_every_n_episodes = \
+        args.profile_every_n_episodes
+
     # get the env name and a creator for the environment
     create_env, env_name = make_create_env(params=flow_params, version=0)
 
@@ -107,7 +143,11 @@ if __name__ == "__main__":
     config['env_config']['run'] = alg_run
 
     # Register as rllib env
-    register_env(env_name, create_env)
+    if num_envs_per_worker > 1:
+        register_env(env_name, lambda env_config: FlowAsyncEnv(
+            [create_env(env_config) for _ in range(num_envs_per_worker)]))
+    else:
+        register_env(env_name, create_env)
 
     exp_tag = {
         "run": alg_run,
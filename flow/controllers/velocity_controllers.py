@@ -127,9 +127,6 @@ class PISaturation(BaseController):
         # maximum achievable acceleration by the vehicle
         self.max_accel = car_following_params.controller_params['accel']
 
-        # history used to determine AV desired velocity
-        self.v_history = []
-
         # other parameters
         self.gamma = 2
         self.g_l = 7
@@ -153,14 +150,10 @@ class PISaturation(BaseController):
         dv = lead_vel - this_vel
         dx_s = max(2 * dv, 4)
 
-        # update the AV's velocity history
-        self.v_history.append(this_vel)
-
-        if len(self.v_history) == int(38 / env.sim_step):
-            del self.v_history[0]
-
-        # update desired velocity values
-        v_des = np.mean(self.v_history)
+        # desired velocity, averaged over the AV's velocity history (the
+        # last 38 seconds, minus one step)
+        window = max(int(38 / env.sim_step) - 1, 1)
+        v_des = env.k.vehicle.get_history(self.veh_id, window).mean
         v_target = v_des + self.v_catch \
             * min(max((dx - self.g_l) / (self.g_u - self.g_l), 0), 1)
 
@@ -0,0 +1,264 @@
+"""Streaming accumulators for running-window statistics.
+
+Controllers and environments often keep a history of recent values (e.g. the
+speed of a vehicle over the last few seconds) in a python list, dropping the
+oldest element once the list is full and recomputing statistics over the whole
+list every step. The classes in this file instead maintain these statistics
+incrementally, at a constant cost per step regardless of the window size.
+
+Usage
+    >>> history = RingBuffer(capacity=100)
+    >>> history.push(speed)
+    >>> mean, std = history.mean, history.std
+"""
+
+import collections
+
+import numpy as np
+
+
+class RingBuffer(object):
+    """Fixed-size window over the most recent values, with running moments.
+
+    Once the buffer is full, every new value overwrites the oldest one. The
+    sum and the sum of squares of the values in the window are updated with
+    every push, and recomputed from scratch after each full pass over the
+    buffer in order to avoid the accumulation of rounding errors.
+
+    Attributes
+    ----------
+    capacity : int
+        maximum number of values in the window
+    """
+
+    def __init__(self, capacity, fill=None):
+        """Instantiate the buffer.
+
+        Parameters
+        ----------
+        capacity : int
+            maximum number of values in the window
+        fill : float, optional
+            if specified, the buffer starts full, with all values set to fill.
+            Otherwise, the buffer starts empty.
+
+        Raises
+        ------
+        ValueError
+            if the capacity is not positive
+        """
+        if capacity < 1:
+            raise ValueError('The capacity of a RingBuffer must be positive, '
+                             'got {}.'.format(capacity))
+        self.capacity = capacity
+        self._data = np.zeros(capacity)
+        self.clear(fill)
+
+    def clear(self, fill=None):
+        """Remove all values from the buffer (or set all of them to fill)."""
+        self._index = 0
+        if fill is None:
+            self._size = 0
+            self._sum = 0.
+            self._sum_sq = 0.
+        else:
+            self._data.fill(fill)
+            self._size = self.capacity
+            self._recompute()
+
+    def _recompute(self):
+        """Recompute the running sums from the values in the buffer."""
+        values = self._data[:self._size]
+        self._sum = float(values.sum())
+        self._sum_sq = float(np.dot(values, values))
+
+    def push(self, value):
+        """Append a value, dropping the oldest one if the buffer is full."""
+        value = float(value)
+        if self._size == self.capacity:
+            old = self._data[self._index]
+            self._sum -= old
+            self._sum_sq -= old * old
+        else:
+            self._size += 1
+        self._data[self._index] = value
+        self._sum += value
+        self._sum_sq += value * value
+
+        self._index += 1
+        if self._index == self.capacity:
+            self._index = 0
+            self._recompute()
+
+    def __len__(self):
+        """Return the number of values in the buffer."""
+        return self._size
+
+    @property
+    def full(self):
+        """Return whether the buffer contains capacity values."""
+        return self._size == self.capacity
+
+    def values(self):
+        """Return a copy of the values in the buffer, from oldest to newest."""
+        if self._size < self.capacity:
+            return self._data[:self._size].copy()
+        return np.roll(self._data, -self._index)
+
+    @property
+    def last(self):
+        """Return the most recent value, or None if the buffer is empty."""
+        if self._size == 0:
+            return None
+        return self._data[self._index - 1]
+
+    @property
+    def sum(self):
+        """Return the sum of the values in the buffer."""
+        return self._sum
+
+    @property
+    def mean(self):
+        """Return the mean of the values in the buffer (nan if empty)."""
+        if self._size == 0:
+            return float("nan")
+        return self._sum / self._size
+
+    @property
+    def var(self):
+        """Return the (population) variance of the values in the buffer."""
+        if self._size == 0:
+            return float("nan")
+        mean = self._sum / self._size
+        return max(self._sum_sq / self._size - mean * mean, 0.)
+
+    @property
+    def std(self):
+        """Return the (population) standard deviation of the values."""
+        return np.sqrt(self.var)
+
+
+class ExponentialMovingAverage(object):
+    """Exponential moving average of a stream of values.
+
+    The first value initializes the average, and every subsequent value x
+    updates it as ``value = (1 - alpha) * value + alpha * x``.
+
+    Attributes
+    ----------
+    alpha : float
+        weight of every new value
+    value : float or None
+        current average, or None if no value has been pushed yet
+    """
+
+    def __init__(self, alpha):
+        """Instantiate the average.
+
+        Parameters
+        ----------
+        alpha : float
+            weight of every new value, in (0, 1]
+
+        Raises
+        ------
+        ValueError
+            if alpha is not in (0, 1]
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError('The weight of an ExponentialMovingAverage must '
+                             'be in (0, 1], got {}.'.format(alpha))
+        self.alpha = alpha
+        self.value = None
+
+    @classmethod
+    def from_span(cls, span):
+        """Return an average whose weights decay like a window of span values.
+
+        This matches the convention of pandas, i.e. ``alpha = 2 / (span + 1)``.
+        """
+        return cls(2. / (span + 1))
+
+    def clear(self):
+        """Reset the average."""
+        self.value = None
+
+    def push(self, value):
+        """Update the average with a new value, and return the average."""
+        if self.value is None:
+            self.value = float(value)
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class WindowedMinMax(object):
+    """Minimum and maximum of the most recent values.
+
+    Uses monotonic queues, so that every push costs O(1) amortized time and
+    the extrema are available in O(1) time.
+
+    Attributes
+    ----------
+    capacity : int
+        maximum number of values in the window
+    """
+
+    def __init__(self, capacity):
+        """Instantiate the window.
+
+        Parameters
+        ----------
+        capacity : int
+            maximum number of values in the window
+
+        Raises
+        ------
+        ValueError
+            if the capacity is not positive
+        """
+        if capacity < 1:
+            raise ValueError('The capacity of a WindowedMinMax must be '
+                             'positive, got {}.'.format(capacity))
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        """Remove all values from the window."""
+        self._count = 0
+        # (index, value) pairs with increasing (resp. decreasing) values
+        self._min = collections.deque()
+        self._max = collections.deque()
+
+    def push(self, value):
+        """Append a value, dropping the oldest one if the window is full."""
+        index = self._count
+        self._count += 1
+
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((index, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((index, value))
+
+        # drop values that left the window
+        oldest = index - self.capacity + 1
+        if self._min[0][0] < oldest:
+            self._min.popleft()
+        if self._max[0][0] < oldest:
+            self._max.popleft()
+
+    def __len__(self):
+        """Return the number of values in the window."""
+        return min(self._count, self.capacity)
+
+    @property
+    def min(self):
+        """Return the minimum of the window, or None if it is empty."""
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self):
+        """Return the maximum of the window, or None if it is empty."""
+        return self._max[0][1] if self._max else None
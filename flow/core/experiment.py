@@ -2,12 +2,167 @@
 
 import logging
 import datetime
+import multiprocessing
+import random
 import numpy as np
 import time
 import os
+from copy import deepcopy
 
+from flow.core.params import InitialConfig
+from flow.core.params import TrafficLightParams
 from flow.core.util import emission_to_csv
 
+# parameters of the rollouts of a worker process, set by _init_worker
+_worker_args = None
+
+
+def _create_env(flow_params, seed=None):
+    """Create the environment of a single rollout.
+
+    The environment is instantiated directly rather than through gym's
+    registry, in which environments with the same name cannot be re-registered
+    with different parameters.
+
+    Parameters
+    ----------
+    flow_params : dict
+        flow-related parameters (see flow.utils.registry.make_create_env). The
+        "env_name" element may also be an environment class.
+    seed : int, optional
+        seed for the simulator and the python/numpy random number generators
+
+    Returns
+    -------
+    flow.envs.Env
+        the environment
+    """
+    # seed the random number generators used by flow and the simulator
+    sim_params = deepcopy(flow_params["sim"])
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+        sim_params.seed = seed
+
+    module = __import__("flow.scenarios", fromlist=[flow_params["scenario"]])
+    scenario_class = getattr(module, flow_params["scenario"])
+    scenario = scenario_class(
+        name=flow_params["exp_tag"],
+        vehicles=flow_params["veh"],
+        net_params=flow_params["net"],
+        initial_config=flow_params.get("initial", InitialConfig()),
+        traffic_lights=flow_params.get("tls", TrafficLightParams()))
+
+    env_class = flow_params["env_name"]
+    if not isinstance(env_class, type):
+        module = __import__("flow.envs", fromlist=[env_class])
+        env_class = getattr(module, env_class)
+
+    return env_class(
+        env_params=flow_params["env"],
+        sim_params=sim_params,
+        scenario=scenario,
+        simulator=flow_params.get("simulator", "traci"))
+
+
+def _rollout(env, num_steps, rl_actions):
+    """Perform a single rollout in an environment.
+
+    Returns
+    -------
+    list of float
+        reward of every step
+    numpy ndarray
+        average speed of the vehicles in the network at every step
+    """
+    vel = np.zeros(num_steps)
+    ret_list = []
+    state = env.reset()
+    for j in range(num_steps):
+        state, reward, done, _ = env.step(rl_actions(state))
+        vel[j] = env.k.metrics.mean_speed
+        ret_list.append(reward)
+        if done:
+            break
+    return ret_list, vel
+
+
+def _run_rollout(flow_params, num_steps, rl_actions, convert_to_csv, run,
+                 seed):
+    """Perform a rollout in a new environment.
+
+    The scenario of the run is renamed after the index of the run, so that
+    the files generated by simultaneous runs (e.g. the network and emission
+    files of sumo) do not collide.
+
+    Parameters
+    ----------
+    flow_params : dict
+        flow-related parameters (see flow.utils.registry.make_create_env)
+    num_steps : int
+        maximum number of steps of the rollout
+    rl_actions : method
+        maps states to actions to be performed by the RL agents
+    convert_to_csv : bool
+        specifies whether to convert the emission file created by sumo into a
+        csv file
+    run : int
+        index of the run
+    seed : int or None
+        seed of the run
+
+    Returns
+    -------
+    int
+        index of the run
+    list of float
+        reward of every step
+    numpy ndarray
+        average speed of the vehicles in the network at every step
+    """
+    params = dict(flow_params)
+    params["exp_tag"] = "{}_{}".format(flow_params["exp_tag"], run)
+    env = _create_env(params, seed)
+    try:
+        ret_list, vel = _rollout(env, num_steps, rl_actions)
+    finally:
+        env.terminate()
+
+    if convert_to_csv:
+        _convert_emission(env)
+
+    return run, ret_list, vel
+
+
+def _init_worker(flow_params, num_steps, rl_actions, convert_to_csv):
+    """Store the parameters of the rollouts of a worker process.
+
+    These are passed once when the process is started (rather than with
+    every run), which also allows lambdas to be used as rl_actions with the
+    "fork" start method.
+    """
+    global _worker_args
+    _worker_args = (flow_params, num_steps, rl_actions, convert_to_csv)
+
+
+def _run_worker_rollout(run_seed):
+    """Perform a rollout within a worker process of the pool."""
+    return _run_rollout(*(_worker_args + run_seed))
+
+
+def _convert_emission(env):
+    """Convert the emission file created by sumo during a run into a csv."""
+    # wait a short period of time to ensure the xml file is readable
+    time.sleep(0.1)
+
+    # collect the location of the emission file
+    dir_path = env.sim_params.emission_path
+    emission_filename = "{0}-emission.xml".format(env.scenario.name)
+    emission_path = os.path.join(dir_path, emission_filename)
+
+    # convert the emission file into a csv
+    emission_to_csv(emission_path)
+
 
 class Experiment:
     """
@@ -28,6 +183,15 @@ class Experiment:
         >>> rl_actions = lambda state: 0  # replace with something appropriate
         >>> exp.run(num_runs=1, num_steps=1000, rl_actions=rl_actions)
 
+    Runs may also be performed in parallel, in which case every run creates
+    its own environment from a set of flow parameters (see
+    flow.utils.registry.make_create_env) and is seeded explicitly. The i-th
+    run is seeded with ``seed + i``, so that the results do not depend on the
+    number of workers nor on the order in which the runs complete:
+
+        >>> exp = Experiment(flow_params=flow_params)
+        >>> exp.run(num_runs=10, num_steps=1000, num_workers=4, seed=0)
+
     Finally, if you would like to like to plot and visualize your results, this
     class can generate csv files from emission files produced by sumo. These
     files will contain the speeds, positions, edges, etc... of every vehicle
@@ -47,25 +211,53 @@ class Experiment:
     After the experiment is complete, look at the "./data" directory. There
     will be two files, one with the suffix .xml and another with the suffix
     .csv. The latter should be easily interpretable from any csv reader (e.g.
-    Excel), and can be parsed using tools such as numpy and pandas.
+    Excel), and can be parsed using tools such as numpy and pandas. When runs
+    are created from flow parameters, the files of the i-th run are named
+    after the scenario name followed by "_i".
     """
 
-    def __init__(self, env):
+    def __init__(self, env=None, flow_params=None):
         """Instantiate Experiment.
 
         Attributes
         ----------
-        env: flow.envs.Env
+        env: flow.envs.Env, optional
             the environment object the simulator will run
+        flow_params: dict, optional
+            flow-related parameters (see flow.utils.registry.make_create_env)
+            from which a new environment is created for every run. The
+            "env_name" element may also be an environment class. Exactly one
+            of env and flow_params must be specified.
+
+        Raises
+        ------
+        ValueError
+            if both or neither of env and flow_params are specified
         """
+        if (env is None) == (flow_params is None):
+            raise ValueError("Exactly one of env and flow_params must be "
+                             "specified.")
+
         self.env = env
+        self.flow_params = flow_params
 
+        name = env.scenario.name if env is not None \
+            else flow_params["exp_tag"]
         logging.info(" Starting experiment {} at {}".format(
-            env.scenario.name, str(datetime.datetime.utcnow())))
+            name, str(datetime.datetime.utcnow())))
 
         logging.info("Initializing environment.")
 
-    def run(self, num_runs, num_steps, rl_actions=None, convert_to_csv=False):
+    def run(self,
+            num_runs,
+            num_steps,
+            rl_actions=None,
+            convert_to_csv=False,
+            num_workers=1,
+            seed=None,
+            backend="multiprocessing",
+            start_method=None,
+            callback=None):
         """Run the given scenario for a set number of runs and steps per run.
 
         Parameters
@@ -76,72 +268,153 @@ class Experiment:
                 number of steps to be performs in each run of the experiment
             rl_actions: method, optional
                 maps states to actions to be performed by the RL agents (if
-                there are any)
+                there are any). With the "spawn" and "forkserver" start
+                methods, or the "ray" backend, this must be picklable.
             convert_to_csv: bool
                 Specifies whether to convert the emission file created by sumo
                 into a csv file
+            num_workers: int, optional
+                number of runs performed simultaneously, each in its own
+                process. Defaults to 1, in which case the runs are performed
+                in the current process. If None, one process is used per cpu.
+                Runs are only performed in parallel if the experiment was
+                created from flow_params.
+            seed: int, optional
+                base seed of the runs; the i-th run is seeded with
+                ``seed + i``. Only used if the experiment was created from
+                flow_params. If not specified, the runs are not explicitly
+                seeded.
+            backend: str, optional
+                either "multiprocessing" (default), or "ray", in which case
+                the runs are submitted as ray tasks. ray must then have been
+                initialized with ``ray.init``, and num_workers is ignored.
+            start_method: str, optional
+                multiprocessing start method ("fork", "spawn", or
+                "forkserver"), defaults to the platform default
+            callback: method, optional
+                called with the index of every run and its info dict (with
+                the same elements as the returned dict, for this run only) as
+                soon as the run completes
 
         Returns
         -------
             info_dict: dict
-                contains returns, average speed per step
+                contains returns, average speed per step, and the seed of
+                every run, ordered by run index
+
+        Raises
+        ------
+            ValueError
+                if runs are requested to be performed in parallel in an
+                experiment created from an environment, or if the backend is
+                not supported
         """
-        info_dict = {}
         if rl_actions is None:
+            rl_actions = _no_actions
 
-            def rl_actions(*_):
-                return None
+        if self.flow_params is None:
+            if num_workers != 1:
+                raise ValueError("Runs can only be performed in parallel in "
+                                 "experiments created from flow_params.")
+            results = self._run_env(num_runs, num_steps, rl_actions)
+            seeds = [None] * num_runs
+        else:
+            seeds = [None if seed is None else seed + i
+                     for i in range(num_runs)]
+            results = self._run_flow_params(
+                num_steps, rl_actions, convert_to_csv, seeds, num_workers,
+                backend, start_method)
 
-        rets = []
-        mean_rets = []
-        ret_lists = []
-        vels = []
-        mean_vels = []
-        std_vels = []
-        for i in range(num_runs):
-            vel = np.zeros(num_steps)
-            logging.info("Iter #" + str(i))
-            ret = 0
-            ret_list = []
-            state = self.env.reset()
-            for j in range(num_steps):
-                state, reward, done, _ = self.env.step(rl_actions(state))
-                vel[j] = np.mean(
-                    self.env.k.vehicle.get_speed(self.env.k.vehicle.get_ids()))
-                ret += reward
-                ret_list.append(reward)
-                if done:
-                    break
-            rets.append(ret)
-            vels.append(vel)
-            mean_rets.append(np.mean(ret_list))
-            ret_lists.append(ret_list)
-            mean_vels.append(np.mean(vel))
-            std_vels.append(np.std(vel))
-            print("Round {0}, return: {1}".format(i, ret))
-
-        info_dict["returns"] = rets
-        info_dict["velocities"] = vels
-        info_dict["mean_returns"] = mean_rets
-        info_dict["per_step_returns"] = ret_lists
+        # aggregate the runs in the order of their indices, regardless of the
+        # order in which they completed
+        ret_lists = [None] * num_runs
+        vels = [None] * num_runs
+        for i, ret_list, vel in results:
+            ret_lists[i] = ret_list
+            vels[i] = vel
+            print("Round {0}, return: {1}".format(i, sum(ret_list)))
+            if callback is not None:
+                callback(i, _info_dict([ret_list], [vel], [seeds[i]]))
+
+        info_dict = _info_dict(ret_lists, vels, seeds)
 
         print("Average, std return: {}, {}".format(
-            np.mean(rets), np.std(rets)))
+            np.mean(info_dict["returns"]), np.std(info_dict["returns"])))
         print("Average, std speed: {}, {}".format(
-            np.mean(mean_vels), np.std(std_vels)))
-        self.env.terminate()
-
-        if convert_to_csv:
-            # wait a short period of time to ensure the xml file is readable
-            time.sleep(0.1)
+            np.mean([np.mean(vel) for vel in vels]),
+            np.std([np.std(vel) for vel in vels])))
 
-            # collect the location of the emission file
-            dir_path = self.env.sim_params.emission_path
-            emission_filename = \
-                "{0}-emission.xml".format(self.env.scenario.name)
-            emission_path = os.path.join(dir_path, emission_filename)
+        if self.env is not None:
+            self.env.terminate()
 
-            # convert the emission file into a csv
-            emission_to_csv(emission_path)
+            if convert_to_csv:
+                _convert_emission(self.env)
 
         return info_dict
+
+    def _run_env(self, num_runs, num_steps, rl_actions):
+        """Perform the runs sequentially in the environment of the experiment.
+
+        Yields
+        ------
+        tuple
+            index, per-step rewards, and per-step average speeds of every run
+        """
+        for i in range(num_runs):
+            logging.info("Iter #" + str(i))
+            ret_list, vel = _rollout(self.env, num_steps, rl_actions)
+            yield i, ret_list, vel
+
+    def _run_flow_params(self, num_steps, rl_actions, convert_to_csv, seeds,
+                         num_workers, backend, start_method):
+        """Perform every run in a new environment, possibly in parallel.
+
+        Yields
+        ------
+        tuple
+            index, per-step rewards, and per-step average speeds of every run,
+            in the order in which the runs complete
+        """
+        runs = list(enumerate(seeds))
+        args = (self.flow_params, num_steps, rl_actions, convert_to_csv)
+
+        if backend == "ray":
+            import ray
+            remote_rollout = ray.remote(_run_rollout)
+            pending = [remote_rollout.remote(*(args + run)) for run in runs]
+            while pending:
+                done, pending = ray.wait(pending)
+                yield ray.get(done[0])
+        elif backend != "multiprocessing":
+            raise ValueError('Backend "{}" is not supported; must be one of '
+                             '"multiprocessing" or "ray".'.format(backend))
+        elif num_workers == 1:
+            for run in runs:
+                logging.info("Iter #" + str(run[0]))
+                yield _run_rollout(*(args + run))
+        else:
+            ctx = multiprocessing.get_context(start_method)
+            pool = ctx.Pool(num_workers, initializer=_init_worker,
+                            initargs=args)
+            try:
+                for result in pool.imap_unordered(_run_worker_rollout, runs):
+                    yield result
+            finally:
+                pool.terminate()
+                pool.join()
+
+
+def _no_actions(*_):
+    """Return no actions, for experiments without RL agents."""
+    return None
+
+
+def _info_dict(ret_lists, vels, seeds):
+    """Return the info dict of a set of runs."""
+    return {
+        "returns": [sum(ret_list) for ret_list in ret_lists],
+        "velocities": vels,
+        "mean_returns": [np.mean(ret_list) for ret_list in ret_lists],
+        "per_step_returns": ret_lists,
+        "seeds": seeds,
+    }
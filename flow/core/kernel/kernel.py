@@ -1,9 +1,15 @@
 """Script containing the Flow kernel object for interacting with simulators."""
 
-from flow.core.kernel.simulation import TraCISimulation
-from flow.core.kernel.scenario import TraCIScenario
-from flow.core.kernel.vehicle import TraCIVehicle
-from flow.core.kernel.traffic_light import TraCITrafficLight
+from flow.core.kernel.simulation import TraCISimulation, RingSimulation, \
+    CTMSimulation
+from flow.core.kernel.scenario import TraCIScenario, RingScenario, \
+    CTMScenario
+from flow.core.kernel.vehicle import TraCIVehicle, RingVehicle, CTMVehicle
+from flow.core.kernel.traffic_light import TraCITrafficLight, \
+    RingTrafficLight, CTMTrafficLight
+from flow.core.kernel.metrics import StepMetrics
+from flow.core.kernel.recorder import TrajectoryRecorder
+from flow.core.kernel.traci_stats import TraCIStats
 
 
 class Kernel(object):
@@ -22,6 +28,16 @@ class Kernel(object):
     * traffic_light: stores and regularly updates traffic light-specific
       information (see flow/core/kernel/traffic_light/base.py).
 
+    In addition, the ``metrics`` attribute holds a snapshot of network-level
+    metrics (e.g. the speeds of all vehicles) that is computed at most once
+    per step and shared by reward functions (see
+    flow/core/kernel/metrics.py), and, if ``SimParams.record_path`` is set, the
+    ``recorder`` attribute records the trajectories of all vehicles after
+    every step (see flow/core/kernel/recorder.py). If
+    ``SumoParams.traci_stats`` is set, the ``traci_stats`` attribute counts
+    the TraCI calls, round trips and bytes of every step (see
+    flow/core/kernel/traci_stats.py).
+
     The above kernel subclasses are designed specifically to support
     simulator-agnostic state information calling. For example, if you would
     like to collect the vehicle speed of a specific vehicle, then simply type:
@@ -48,7 +64,12 @@ class Kernel(object):
         Parameters
         ----------
         simulator : str
-            simulator type, must be one of {"traci"}
+            simulator type, must be one of {"traci", "ring", "ctm"}. "ring"
+            is a pure NumPy simulator for networks made of closed single-lane
+            rings (see flow/core/kernel/simulation/ring.py), and "ctm" is a
+            macroscopic cell transmission model of the network, which does not
+            model individual vehicles (see
+            flow/core/kernel/simulation/ctm.py)
         sim_params : flow.core.params.SimParams
             simulation-specific parameters
 
@@ -64,13 +85,37 @@ class Kernel(object):
             self.scenario = TraCIScenario(self)
             self.vehicle = TraCIVehicle(self, sim_params)
             self.traffic_light = TraCITrafficLight(self)
+        elif simulator == "ring":
+            self.simulation = RingSimulation(self)
+            self.scenario = RingScenario(self)
+            self.vehicle = RingVehicle(self, sim_params)
+            self.traffic_light = RingTrafficLight(self)
+        elif simulator == "ctm":
+            self.simulation = CTMSimulation(self)
+            self.scenario = CTMScenario(self)
+            self.vehicle = CTMVehicle(self, sim_params)
+            self.traffic_light = CTMTrafficLight(self)
         else:
             raise ValueError('Simulator type "{}" is not valid.'.
                              format(simulator))
 
+        # network-level metrics shared by reward functions, memoized within
+        # every step
+        self.metrics = StepMetrics(self)
+
+        # recorder of the trajectories of all vehicles, if requested
+        self.recorder = None
+        if getattr(sim_params, "record_path", None) is not None:
+            self.recorder = TrajectoryRecorder(self, sim_params)
+
+        # statistics of the calls to the TraCI connection, if requested
+        self.traci_stats = None
+
     def pass_api(self, kernel_api):
         """Pass the kernel API to all kernel subclasses."""
         self.kernel_api = kernel_api
+        if isinstance(kernel_api, TraCIStats):
+            self.traci_stats = kernel_api
         self.simulation.pass_api(kernel_api)
         self.scenario.pass_api(kernel_api)
         self.vehicle.pass_api(kernel_api)
@@ -93,9 +138,15 @@ class Kernel(object):
         self.scenario.update(reset)
         self.simulation.update(reset)
         self.vehicle.update(reset)
+        self.vehicle.update_aggregates(reset)
         self.traffic_light.update(reset)
+        self.metrics.update(reset)
+        if self.recorder is not None:
+            self.recorder.update(reset)
 
     def close(self):
         """Terminate all components within the simulation and scenario."""
         self.scenario.close()
         self.simulation.close()
+        if self.recorder is not None:
+            self.recorder.close()
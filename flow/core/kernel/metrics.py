@@ -0,0 +1,191 @@
+"""Script containing the per-step metrics snapshot of the Flow kernel."""
+
+import numpy as np
+
+
+class StepMetrics(object):
+    """Snapshot of network-level metrics shared by reward functions.
+
+    Reward functions (see flow/core/rewards.py) and environments frequently
+    need the same data within a step, e.g. the speeds of all vehicles, and
+    environments often combine several reward functions. Instead of having
+    each of them query the vehicle kernel, the metrics are computed the first
+    time they are requested within a step, and memoized until the next update
+    of the kernel, or until the state of the vehicle kernel is modified
+    directly (e.g. vehicles are added or removed, see ``invalidate``). Static
+    properties of the network (e.g. the maximum speed limit) are memoized
+    until the simulation is reset.
+
+    Usage
+        >>> metrics = env.k.metrics
+        >>> mean_speed = metrics.mean_speed
+        >>> bottom_speeds = metrics.get_speeds(["bottom"])
+
+    Speeds are returned along with the number of vehicles at each of them
+    (see ``weights``), which is always one for simulators with individual
+    vehicles, so that reward functions also apply to macroscopic simulators.
+    The arrays returned by this class are shared, and should not be modified.
+    """
+
+    def __init__(self, master_kernel):
+        """Instantiate the metrics snapshot.
+
+        Parameters
+        ----------
+        master_kernel : flow.core.kernel.Kernel
+            the kernel the metrics are computed from
+        """
+        self.master_kernel = master_kernel
+
+        # metrics computed since the last update, and static metrics computed
+        # since the last reset
+        self._step_cache = {}
+        self._static_cache = {}
+
+    def update(self, reset):
+        """Invalidate the memoized metrics after a simulation step.
+
+        Parameters
+        ----------
+        reset : bool
+            specifies whether the simulator was reset in the last simulation
+            step
+        """
+        self._step_cache.clear()
+        if reset:
+            self._static_cache.clear()
+
+    def invalidate(self):
+        """Discard the memoized metrics of the current step.
+
+        This is called by the vehicle kernels whenever their state is modified
+        between two updates, e.g. when vehicles are added or removed.
+        """
+        self._step_cache.clear()
+
+    def _memoize(self, cache, key, compute):
+        """Return a memoized value, computing it if necessary."""
+        try:
+            return cache[key]
+        except KeyError:
+            value = cache[key] = compute()
+            return value
+
+    @property
+    def ids(self):
+        """Return the ids of all vehicles in the network."""
+        return self._memoize(
+            self._step_cache, "ids",
+            lambda: list(self.master_kernel.vehicle.get_ids()))
+
+    @property
+    def _distribution(self):
+        """Return the speeds, weights, and edges in the network."""
+        return self._memoize(
+            self._step_cache, "distribution",
+            self.master_kernel.vehicle.get_speed_distribution)
+
+    @property
+    def speeds(self):
+        """Return the speeds in the network.
+
+        For simulators with individual vehicles, these are the speeds of all
+        vehicles, in the order of ``ids``. See
+        flow.core.kernel.vehicle.KernelVehicle.get_speed_distribution.
+        """
+        return self._distribution[0]
+
+    @property
+    def weights(self):
+        """Return the number of vehicles at each of the speeds."""
+        return self._distribution[1]
+
+    @property
+    def mean_speed(self):
+        """Return the mean speed of all vehicles (nan if there are none)."""
+        def compute():
+            total = self.weights.sum()
+            if total == 0:
+                return float("nan")
+            return float(np.dot(self.speeds, self.weights) / total)
+        return self._memoize(self._step_cache, "mean_speed", compute)
+
+    @property
+    def rl_speeds(self):
+        """Return the speeds of the rl vehicles.
+
+        These are ordered as in the vehicle kernel's ``get_rl_ids``.
+        """
+        return self._memoize(
+            self._step_cache, "rl_speeds",
+            lambda: np.asarray(self.master_kernel.vehicle.get_speed(
+                self.master_kernel.vehicle.get_rl_ids()),
+                dtype=float).reshape(-1))
+
+    @property
+    def edges(self):
+        """Return the edge of each of the speeds."""
+        return self._distribution[2]
+
+    @property
+    def num_arrived(self):
+        """Return the number of vehicles that exited in the last step."""
+        return self._memoize(self._step_cache, "num_arrived",
+                             self.master_kernel.vehicle.get_num_arrived)
+
+    def get_speeds(self, edges=None):
+        """Return the speeds of the vehicles located on some edges.
+
+        Parameters
+        ----------
+        edges : str or list of str, optional
+            edges the vehicles are located on. If not specified, the speeds of
+            all vehicles are returned.
+
+        Returns
+        -------
+        numpy ndarray (float)
+            speeds of the vehicles
+        """
+        if edges is None:
+            return self.speeds
+        return self.speeds[self._edge_mask(edges)]
+
+    def get_weights(self, edges=None):
+        """Return the number of vehicles at each of the speeds of get_speeds.
+
+        Parameters
+        ----------
+        edges : str or list of str, optional
+            edges the vehicles are located on. If not specified, the weights
+            of all speeds are returned.
+
+        Returns
+        -------
+        numpy ndarray (float)
+            number of vehicles at each speed
+        """
+        if edges is None:
+            return self.weights
+        return self.weights[self._edge_mask(edges)]
+
+    def _edge_mask(self, edges):
+        """Return a mask of the speeds located on some edges."""
+        if isinstance(edges, str):
+            edges = [edges]
+        key = ("mask", tuple(edges))
+
+        def compute():
+            if len(self.edges) == 0:
+                return np.zeros(0, dtype=bool)
+            return np.isin(self.edges, list(edges))
+        return self._memoize(self._step_cache, key, compute)
+
+    @property
+    def max_speed_limit(self):
+        """Return the maximum speed limit over all edges of the network."""
+        def compute():
+            scenario = self.master_kernel.scenario
+            return max(scenario.speed_limit(edge)
+                       for edge in scenario.get_edge_list())
+        return self._memoize(self._static_cache, "max_speed_limit", compute)
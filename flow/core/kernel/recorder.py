@@ -0,0 +1,405 @@
+"""Script containing the trajectory recorder of the Flow kernel.
+
+The recorder stores the state of every vehicle after each (recorded)
+simulation step directly from the vehicle kernel, as an alternative to the
+emission files generated by sumo (see SimParams.emission_path), which are
+costly to write and need to be converted before being analyzed.
+
+Rows are appended to preallocated columnar buffers. Once a buffer is full, it
+is handed to a background thread which writes it to disk as a compressed .npz
+chunk, while the simulation keeps recording into another buffer. Vehicle ids
+and edges are stored as integer indices; the chunk in which an id or edge
+first appears stores its name, so that chunks are only ever appended to.
+"""
+
+import os
+import threading
+import queue
+from glob import glob
+
+import numpy as np
+
+from flow.core.util import ensure_dir
+
+# columns of the recorded trajectories, along with their types. "id" and
+# "edge" are indices in the lists of vehicle ids and edges of the recording,
+# and "accel" is the acceleration applied by the vehicle's controller (or the
+# rl agent) before the step, which is nan for vehicles left to the simulator
+TRAJECTORY_COLUMNS = [
+    ('time', np.float64), ('episode', np.int32), ('id', np.int32),
+    ('edge', np.int32), ('lane', np.int32), ('position', np.float64),
+    ('speed', np.float64), ('x', np.float64), ('y', np.float64),
+    ('accel', np.float64)
+]
+
+# number of buffers used by a recorder, i.e. one being filled while the others
+# are written to disk
+NUM_BUFFERS = 2
+
+
+class TrajectoryRecorder(object):
+    """Recorder of the trajectories of all vehicles in the network.
+
+    The recorder is created by the kernel if ``SimParams.record_path`` is set,
+    and writes the chunks of a scenario to the directory
+    "<record_path>/<scenario name>-trajectories" (see the ``path``
+    attribute), where, as for sumo's emission files, the scenario name
+    includes the time at which the scenario was created. Recordings can be
+    read with TrajectoryReader.
+
+    Usage
+        >>> sim_params = SumoParams(record_path="./data",
+        >>>                         record_every_n_steps=10)
+        >>> ...  # run an environment with these parameters
+        >>> path = env.k.recorder.path
+        >>> env.terminate()  # flushes the remaining rows
+        >>> reader = TrajectoryReader(path)
+        >>> speeds = reader.get_vehicle("human_0")["speed"]
+    """
+
+    def __init__(self, master_kernel, sim_params):
+        """Instantiate the recorder.
+
+        Parameters
+        ----------
+        master_kernel : flow.core.kernel.Kernel
+            the kernel the vehicle states are recorded from
+        sim_params : flow.core.params.SimParams
+            simulation-specific parameters, from which the sim_step,
+            record_path, record_every_n_steps and record_chunk_size are used
+        """
+        self.master_kernel = master_kernel
+        self.sim_step = sim_params.sim_step
+        self.record_path = sim_params.record_path
+        self.every_n_steps = sim_params.record_every_n_steps
+        self.chunk_size = sim_params.record_chunk_size
+
+        # episode (i.e. number of resets) and step within the episode
+        self.episode = -1
+        self.step = 0
+
+        # accelerations applied to the vehicles since the last update
+        self._accel = {}
+
+        # indices of the vehicle ids and edges, and the names of those that
+        # have not yet been written to a chunk
+        self._id_index = {}
+        self._edge_index = {}
+        self._new_ids = []
+        self._new_edges = []
+
+        self.path = None
+        self.num_chunks = 0
+        self._buffer = None
+        self._num_rows = 0
+        self._writer = None
+
+    def set_accelerations(self, veh_ids, acc):
+        """Store the accelerations applied to vehicles within the step.
+
+        This is called by the vehicle kernels when accelerations are applied.
+        """
+        for veh_id, a in zip(veh_ids, acc):
+            if a is not None:
+                self._accel[veh_id] = a
+
+    def update(self, reset):
+        """Record the state of the vehicles after a simulation step.
+
+        Parameters
+        ----------
+        reset : bool
+            specifies whether the simulator was reset in the last simulation
+            step, in which case a new episode starts
+        """
+        if reset:
+            self.episode += 1
+            self.step = 0
+        else:
+            self.step += 1
+
+        accel = self._accel
+        self._accel = {}
+        if self.step % self.every_n_steps != 0:
+            return
+
+        vehicle = self.master_kernel.vehicle
+        veh_ids = vehicle.get_ids()
+        if len(veh_ids) == 0:
+            return
+
+        if self._writer is None:
+            self._start()
+
+        nan = float('nan')
+        orientations = []
+        for veh_id in veh_ids:
+            try:
+                orientations.append(vehicle.get_orientation(veh_id)[:2])
+            except (KeyError, TypeError):
+                orientations.append((nan, nan))
+        x, y = zip(*orientations)
+
+        rows = {
+            'time': self.step * self.sim_step,
+            'episode': self.episode,
+            'id': [self._index(self._id_index, self._new_ids, veh_id)
+                   for veh_id in veh_ids],
+            'edge': [self._index(self._edge_index, self._new_edges, edge)
+                     for edge in vehicle.get_edge(veh_ids)],
+            'lane': vehicle.get_lane(veh_ids),
+            'position': vehicle.get_position(veh_ids),
+            'speed': vehicle.get_speed(veh_ids),
+            'x': x,
+            'y': y,
+            'accel': [accel.get(veh_id, nan) for veh_id in veh_ids],
+        }
+
+        # the rows of a step may be split across several chunks
+        start = 0
+        num_rows = len(veh_ids)
+        while start < num_rows:
+            n = min(num_rows - start, self.chunk_size - self._num_rows)
+            for name, _ in TRAJECTORY_COLUMNS:
+                values = rows[name]
+                if not np.isscalar(values):
+                    values = values[start:start + n]
+                self._buffer[name][self._num_rows:self._num_rows + n] = values
+            self._num_rows += n
+            start += n
+            if self._num_rows == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """Hand the rows recorded so far to the background writer.
+
+        This blocks if all buffers are waiting to be written.
+
+        Raises
+        ------
+        Exception
+            any error raised by the writer while writing a previous chunk
+        """
+        if self._writer is None:
+            return
+        self._writer.check()
+        if self._num_rows == 0:
+            return
+
+        chunk_path = os.path.join(
+            self.path, 'chunk_{:05d}.npz'.format(self.num_chunks))
+        self._writer.tasks.put(
+            (chunk_path, self._buffer, self._num_rows, self._new_ids,
+             self._new_edges, len(self._id_index) - len(self._new_ids),
+             len(self._edge_index) - len(self._new_edges)))
+        self.num_chunks += 1
+        self._new_ids = []
+        self._new_edges = []
+        self._num_rows = 0
+        self._buffer = self._writer.buffers.get()
+
+    def close(self):
+        """Write the remaining rows and wait for the writer to complete.
+
+        Recording resumes (in the same directory) if the kernel is updated
+        again, e.g. after the simulation was restarted.
+
+        Raises
+        ------
+        Exception
+            any error raised by the writer
+        """
+        if self._writer is None:
+            return
+        self.flush()
+        writer = self._writer
+        self._writer = None
+        self._buffer = None
+        writer.tasks.put(None)
+        writer.join()
+        writer.check()
+
+    def _start(self):
+        """Start the background writer."""
+        if self.path is None:
+            name = self.master_kernel.scenario.network.name
+            self.path = ensure_dir(os.path.join(
+                self.record_path, '{}-trajectories'.format(name)))
+
+        self._writer = _ChunkWriter(self.chunk_size)
+        self._writer.start()
+        self._buffer = self._writer.buffers.get()
+
+    @staticmethod
+    def _index(index, new_names, name):
+        """Return the index of a vehicle id or edge, adding it if necessary."""
+        try:
+            return index[name]
+        except KeyError:
+            new_names.append(name)
+            i = index[name] = len(index)
+            return i
+
+
+class _ChunkWriter(threading.Thread):
+    """Thread writing the buffers of a recorder to disk.
+
+    Buffers are passed to the thread through the ``tasks`` queue, and returned
+    to the ``buffers`` queue once they were written, so that memory usage is
+    bounded by NUM_BUFFERS buffers. Errors are stored and re-raised by the
+    recorder through ``check``.
+    """
+
+    def __init__(self, chunk_size):
+        """Instantiate the writer and its buffers."""
+        threading.Thread.__init__(self, daemon=True)
+        self.tasks = queue.Queue()
+        self.buffers = queue.Queue()
+        for _ in range(NUM_BUFFERS):
+            self.buffers.put({name: np.empty(chunk_size, dtype=dtype)
+                              for name, dtype in TRAJECTORY_COLUMNS})
+        self.error = None
+
+    def run(self):
+        """Write the chunks passed by the recorder."""
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            path, buffer, num_rows, ids, edges, id_offset, edge_offset = task
+            try:
+                if self.error is None:
+                    columns = {name: buffer[name][:num_rows]
+                               for name, _ in TRAJECTORY_COLUMNS}
+                    np.savez_compressed(
+                        path,
+                        ids=np.array(ids, dtype=str),
+                        edges=np.array(edges, dtype=str),
+                        id_offset=id_offset,
+                        edge_offset=edge_offset,
+                        **columns)
+            except Exception as e:
+                self.error = e
+            self.buffers.put(buffer)
+
+    def check(self):
+        """Re-raise the error raised while writing a chunk, if any."""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+
+class TrajectoryReader(object):
+    """Reader of the trajectories recorded by TrajectoryRecorder.
+
+    Usage
+        >>> reader = TrajectoryReader("./data/<scenario name>-trajectories")
+        >>> rows = reader.get_vehicle("human_0")
+        >>> rows["time"], rows["speed"]  # numpy arrays, ordered by time
+        >>> rows = reader.get_time_slice(100, 200, episode=0)
+
+    Attributes
+    ----------
+    ids : list of str
+        vehicle ids, indexed by the "id" column
+    edges : list of str
+        edges, indexed by the "edge" column
+    """
+
+    def __init__(self, path):
+        """Instantiate the reader.
+
+        Parameters
+        ----------
+        path : str
+            directory of the recording
+        """
+        self.chunk_paths = sorted(glob(os.path.join(path, 'chunk_*.npz')))
+        self.ids = []
+        self.edges = []
+        for chunk_path in self.chunk_paths:
+            with np.load(chunk_path) as chunk:
+                self.ids.extend(chunk['ids'].tolist())
+                self.edges.extend(chunk['edges'].tolist())
+        self._id_index = {veh_id: i for i, veh_id in enumerate(self.ids)}
+
+    def iter_chunks(self, columns=None):
+        """Iterate over the chunks of the recording.
+
+        Parameters
+        ----------
+        columns : list of str, optional
+            columns to be read, defaults to all columns of TRAJECTORY_COLUMNS
+
+        Yields
+        ------
+        dict of numpy.ndarray
+            values of every column in a chunk of rows
+        """
+        if columns is None:
+            columns = [name for name, _ in TRAJECTORY_COLUMNS]
+        for chunk_path in self.chunk_paths:
+            with np.load(chunk_path) as chunk:
+                yield {name: chunk[name] for name in columns}
+
+    def get_vehicle(self, veh_id, columns=None):
+        """Return the rows of a vehicle.
+
+        Parameters
+        ----------
+        veh_id : str
+            vehicle id
+        columns : list of str, optional
+            columns to be read, defaults to all columns
+
+        Returns
+        -------
+        dict of numpy.ndarray
+            values of every column, ordered by episode and time
+        """
+        index = self._id_index.get(veh_id, -1)
+        return self._select(columns, lambda chunk: chunk['id'] == index)
+
+    def get_time_slice(self, start, end, episode=None, columns=None):
+        """Return the rows recorded within a time interval.
+
+        Parameters
+        ----------
+        start : float
+            start of the interval, in seconds since the start of the episode
+        end : float
+            end of the interval (excluded)
+        episode : int, optional
+            episode of the rows, defaults to all episodes
+        columns : list of str, optional
+            columns to be read, defaults to all columns
+
+        Returns
+        -------
+        dict of numpy.ndarray
+            values of every column, ordered by episode and time
+        """
+        def select(chunk):
+            mask = (start <= chunk['time']) & (chunk['time'] < end)
+            if episode is not None:
+                mask &= chunk['episode'] == episode
+            return mask
+
+        return self._select(columns, select)
+
+    def _select(self, columns, select):
+        """Return the rows of all chunks selected by a mask function."""
+        if columns is None:
+            columns = [name for name, _ in TRAJECTORY_COLUMNS]
+        read = sorted(set(columns) | {'time', 'episode', 'id'})
+
+        selected = {name: [] for name in columns}
+        for chunk in self.iter_chunks(read):
+            mask = select(chunk)
+            for name in columns:
+                selected[name].append(chunk[name][mask])
+
+        dtypes = dict(TRAJECTORY_COLUMNS)
+        return {name: np.concatenate(values) if len(values) > 0
+                else np.zeros(0, dtype=dtypes[name])
+                for name, values in selected.items()}
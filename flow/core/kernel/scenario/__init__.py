@@ -1,4 +1,6 @@
 from flow.core.kernel.scenario.base import KernelScenario
 from flow.core.kernel.scenario.traci import TraCIScenario
+from flow.core.kernel.scenario.ring import RingScenario
+from flow.core.kernel.scenario.ctm import CTMScenario
 
-__all__ = ["KernelScenario", "TraCIScenario"]
+__all__ = ["KernelScenario", "TraCIScenario", "RingScenario", "CTMScenario"]
@@ -0,0 +1,230 @@
+"""Script containing the scenario kernel class of the cell transmission model.
+"""
+
+import collections
+
+import numpy as np
+
+from flow.core.kernel.scenario import KernelScenario
+
+
+class CTMScenario(KernelScenario):
+    """Scenario kernel for the macroscopic cell transmission model.
+
+    Edges are connected through their from and to nodes. The fraction of
+    vehicles moving from an edge to each of its successors (or exiting the
+    network at its end) is computed from the routes of the scenario, with
+    every route weighted equally. Edges that are not part of any route send
+    their vehicles to their successors in proportion to the number of lanes of
+    the latter, or out of the network if they have no successor.
+
+    Extends flow.core.kernel.scenario.KernelScenario
+    """
+
+    def __init__(self, master_kernel):
+        """See parent class."""
+        super(CTMScenario, self).__init__(master_kernel)
+
+        self._edges = None
+        self._edge_list = None
+        self._next_edges = None
+        self._prev_edges = None
+        self.__max_speed = None
+        self.__length = None
+        self.rts = None
+
+        # turning fractions, in the form (from edge, to edge, fraction), with
+        # a to edge of None for vehicles exiting the network
+        self.movements = None
+
+    def generate_network(self, network):
+        """See parent class.
+
+        Raises
+        ------
+        ValueError
+            if the network is imported from a net.xml or osm file
+        """
+        self.network = network
+        self.orig_name = network.orig_name
+        self.name = network.name
+
+        net_params = network.net_params
+        if net_params.netfile is not None or net_params.osm_path is not None:
+            raise ValueError('The cell transmission model does not support '
+                             'networks imported from net.xml or osm files.')
+
+        # collect the properties of all edges, with attributes not specified
+        # by an edge taken from its type
+        types = {typ["id"]: typ for typ in network.types or []}
+        nodes = {node["id"]: node for node in network.nodes}
+        self._edges = collections.OrderedDict()
+        for edge in network.edges:
+            props = dict(types.get(edge.get("type"), {}))
+            props.update(edge)
+            if "length" in props:
+                length = props["length"]
+            else:
+                start, end = nodes[props["from"]], nodes[props["to"]]
+                length = np.hypot(end["x"] - start["x"], end["y"] - start["y"])
+            self._edges[edge["id"]] = {
+                "length": float(length),
+                "lanes": int(props.get("numLanes", 1)),
+                "speed": float(props["speed"]),
+                "from": props["from"],
+                "to": props["to"],
+            }
+        self._edge_list = list(self._edges.keys())
+
+        self.rts = network.routes
+        self._generate_movements()
+
+        self.__max_speed = max(
+            self.speed_limit(edge) for edge in self.get_edge_list())
+        self.__length = sum(
+            self.edge_length(edge) for edge in self.get_edge_list())
+
+        # absolute positions of the edges, used by the "get_x" method
+        self.edgestarts = network.edge_starts
+        if self.edgestarts is None:
+            length = 0
+            self.edgestarts = []
+            for edge_id in sorted(self._edge_list):
+                self.edgestarts.append((edge_id, length))
+                length += self._edges[edge_id]['length']
+
+        # there are no internal links in the cell transmission model
+        self.internal_edgestarts = []
+        self.intersection_edgestarts = []
+        self.internal_edgestarts_dict = {}
+        self.total_edgestarts = sorted(self.edgestarts, key=lambda tup: tup[1])
+        self.total_edgestarts_dict = dict(self.total_edgestarts)
+
+    def _generate_movements(self):
+        """Compute the turning fractions between edges from the routes."""
+        # successors and predecessors of every edge, excluding u-turns
+        self._next_edges = {edge: [] for edge in self._edge_list}
+        self._prev_edges = {edge: [] for edge in self._edge_list}
+        for edge, props in self._edges.items():
+            for other, other_props in self._edges.items():
+                if other_props["from"] == props["to"] \
+                        and other_props["to"] != props["from"]:
+                    self._next_edges[edge].append(other)
+                    self._prev_edges[other].append(edge)
+
+        # number of routes following every pair of consecutive edges, or
+        # ending on an edge
+        weights = collections.defaultdict(float)
+        for route in (self.rts or {}).values():
+            for i, edge in enumerate(route):
+                next_edge = route[i + 1] if i + 1 < len(route) else None
+                weights[edge, next_edge] += 1
+
+        self.movements = []
+        for edge in self._edge_list:
+            options = self._next_edges[edge] + [None]
+            total = sum(weights[edge, option] for option in options)
+            if total > 0:
+                fractions = [weights[edge, option] / total
+                             for option in options]
+            elif len(self._next_edges[edge]) > 0:
+                lanes = [self.num_lanes(option)
+                         for option in self._next_edges[edge]]
+                fractions = [num_lanes / sum(lanes) for num_lanes in lanes]
+                fractions.append(0)
+            else:
+                fractions = [0] * len(self._next_edges[edge]) + [1]
+
+            for option, fraction in zip(options, fractions):
+                if fraction > 0:
+                    self.movements.append((edge, option, fraction))
+
+    def update(self, reset):
+        """Perform no action of value (scenarios are static)."""
+        pass
+
+    def close(self):
+        """See parent class.
+
+        No files are generated for the cell transmission model.
+        """
+        pass
+
+    ###########################################################################
+    #                        State acquisition methods                        #
+    ###########################################################################
+
+    def get_edge(self, x):
+        """See parent class."""
+        for (edge, start_pos) in reversed(self.total_edgestarts):
+            if x >= start_pos:
+                return edge, x - start_pos
+
+    def get_x(self, edge, position):
+        """See parent class."""
+        if len(edge) == 0:
+            return -1001
+        return self.total_edgestarts_dict[edge] + position
+
+    def edge_length(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['length']
+        except KeyError:
+            print('Error in edge length with key', edge_id)
+            return -1001
+
+    def length(self):
+        """See parent class."""
+        return self.__length
+
+    def speed_limit(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['speed']
+        except KeyError:
+            print('Error in speed limit with key', edge_id)
+            return -1001
+
+    def num_lanes(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['lanes']
+        except KeyError:
+            print('Error in num lanes with key', edge_id)
+            return -1001
+
+    def max_speed(self):
+        """See parent class."""
+        return self.__max_speed
+
+    def get_edge_list(self):
+        """See parent class."""
+        return self._edge_list
+
+    def get_junction_list(self):
+        """See parent class."""
+        return []
+
+    def outgoing_edges(self, node_id):
+        """Return the names of the edges leaving a node."""
+        return [edge for edge in self._edge_list
+                if self._edges[edge]["from"] == node_id]
+
+    def next_edge(self, edge, lane):
+        """See parent class.
+
+        Lanes are not modeled individually, so every lane of an edge is
+        connected to the closest lane of each successor.
+        """
+        return [(next_edge, min(lane, self.num_lanes(next_edge) - 1))
+                for next_edge in self._next_edges.get(edge, [])]
+
+    def prev_edge(self, edge, lane):
+        """See parent class.
+
+        Lanes are not modeled individually, so every lane of an edge is
+        connected to the closest lane of each predecessor.
+        """
+        return [(prev_edge, min(lane, self.num_lanes(prev_edge) - 1))
+                for prev_edge in self._prev_edges.get(edge, [])]
@@ -0,0 +1,281 @@
+"""Script containing the scenario kernel class of the NumPy ring simulator."""
+
+from bisect import bisect_right
+
+import numpy as np
+
+from flow.core.kernel.scenario import KernelScenario
+
+
+class RingScenario(KernelScenario):
+    """Scenario kernel for the NumPy ring road simulator.
+
+    The nodes and edges of the scenario are required to form one or several
+    closed, single-lane rings, i.e. every node has exactly one outgoing edge.
+    Within each ring, positions are measured from the start of the first edge
+    of the ring (in the order the edges are specified by the scenario).
+
+    Extends flow.core.kernel.scenario.KernelScenario
+    """
+
+    def __init__(self, master_kernel):
+        """See parent class."""
+        super(RingScenario, self).__init__(master_kernel)
+
+        self._edges = None
+        self._edge_list = None
+        self._next_edge = None
+        self._prev_edge = None
+        self.__max_speed = None
+        self.__length = None
+        self.rts = None
+
+        # length of each ring
+        self.ring_lengths = None
+        # ring each edge is located in, and the position of its start
+        self._edge_ring = None
+        # start positions and names of the edges of each ring, ordered
+        self._ring_edge_starts = None
+        self._ring_edges = None
+
+    def generate_network(self, network):
+        """See parent class.
+
+        Raises
+        ------
+        ValueError
+            if the network is not made up of closed single-lane rings, or
+            contains inflows
+        """
+        self.network = network
+        self.orig_name = network.orig_name
+        self.name = network.name
+
+        net_params = network.net_params
+        if net_params.netfile is not None or net_params.osm_path is not None:
+            raise ValueError('The ring simulator does not support networks '
+                             'imported from net.xml or osm files.')
+        if len(net_params.inflows.get()) > 0:
+            raise ValueError('The ring simulator does not support inflows.')
+
+        # collect the properties of all edges, with attributes not specified
+        # by an edge taken from its type
+        types = {typ["id"]: typ for typ in network.types or []}
+        nodes = {node["id"]: node for node in network.nodes}
+        self._edges = {}
+        for edge in network.edges:
+            props = dict(types.get(edge.get("type"), {}))
+            props.update(edge)
+            if "length" in props:
+                length = props["length"]
+            else:
+                start, end = nodes[props["from"]], nodes[props["to"]]
+                length = np.hypot(end["x"] - start["x"], end["y"] - start["y"])
+            self._edges[edge["id"]] = {
+                "length": float(length),
+                "lanes": int(props.get("numLanes", 1)),
+                "speed": float(props["speed"]),
+                "from": props["from"],
+                "to": props["to"],
+            }
+
+        self._edge_list = [edge["id"] for edge in network.edges]
+        if any(self._edges[edge]["lanes"] != 1 for edge in self._edge_list):
+            raise ValueError('The ring simulator only supports single-lane '
+                             'networks.')
+
+        self._generate_rings()
+
+        self.__max_speed = max(
+            self.speed_limit(edge) for edge in self.get_edge_list())
+        self.__length = sum(
+            self.edge_length(edge) for edge in self.get_edge_list())
+
+        # absolute positions of the edges, used by the "get_x" method
+        self.edgestarts = network.edge_starts
+        if self.edgestarts is None:
+            length = 0
+            self.edgestarts = []
+            for edge_id in sorted(self._edge_list):
+                self.edgestarts.append((edge_id, length))
+                length += self._edges[edge_id]['length']
+
+        # there are no internal links in the ring simulator
+        self.internal_edgestarts = []
+        self.intersection_edgestarts = []
+        self.internal_edgestarts_dict = {}
+        self.total_edgestarts = sorted(self.edgestarts, key=lambda tup: tup[1])
+        self.total_edgestarts_dict = dict(self.total_edgestarts)
+
+        self.rts = network.routes
+
+    def _generate_rings(self):
+        """Group the edges into rings by following the edges' end nodes."""
+        outgoing = {}
+        for edge in self._edge_list:
+            node = self._edges[edge]["from"]
+            if node in outgoing:
+                raise ValueError('The ring simulator only supports networks '
+                                 'made of closed rings, but node {} has more '
+                                 'than one outgoing edge.'.format(node))
+            outgoing[node] = edge
+
+        self._next_edge = {}
+        self._prev_edge = {}
+        self._edge_ring = {}
+        self._ring_edge_starts = []
+        self._ring_edges = []
+        ring_lengths = []
+        for first_edge in self._edge_list:
+            if first_edge in self._edge_ring:
+                continue
+
+            ring = len(ring_lengths)
+            edges, starts = [], []
+            length = 0
+            edge = first_edge
+            while True:
+                self._edge_ring[edge] = (ring, length)
+                edges.append(edge)
+                starts.append(length)
+                length += self._edges[edge]["length"]
+
+                next_edge = outgoing.get(self._edges[edge]["to"])
+                if next_edge is None or (next_edge in self._edge_ring and
+                                         next_edge != first_edge):
+                    raise ValueError('The ring simulator only supports '
+                                     'networks made of closed rings, but edge '
+                                     '{} is not part of one.'.format(edge))
+                self._next_edge[edge] = next_edge
+                self._prev_edge[next_edge] = edge
+                if next_edge == first_edge:
+                    break
+                edge = next_edge
+
+            ring_lengths.append(length)
+            self._ring_edges.append(edges)
+            self._ring_edge_starts.append(starts)
+
+        self.ring_lengths = np.array(ring_lengths)
+
+    def update(self, reset):
+        """Perform no action of value (scenarios are static)."""
+        pass
+
+    def close(self):
+        """See parent class.
+
+        No files are generated for the ring simulator.
+        """
+        pass
+
+    ###########################################################################
+    #                        State acquisition methods                        #
+    ###########################################################################
+
+    def ring_position(self, edge, position):
+        """Return the ring and position along the ring of an edge position.
+
+        Parameters
+        ----------
+        edge : str
+            name of the edge
+        position : float
+            relative position on the edge
+
+        Returns
+        -------
+        int
+            index of the ring
+        float
+            position with respect to the start of the ring
+        """
+        ring, start = self._edge_ring[edge]
+        return ring, start + position
+
+    def edge_position(self, ring, position):
+        """Return the edge and relative position of a position along a ring.
+
+        Parameters
+        ----------
+        ring : int
+            index of the ring
+        position : float
+            position with respect to the start of the ring
+
+        Returns
+        -------
+        str
+            name of the edge
+        float
+            relative position on the edge
+        """
+        starts = self._ring_edge_starts[ring]
+        i = bisect_right(starts, position) - 1
+        return self._ring_edges[ring][i], position - starts[i]
+
+    def get_edge(self, x):
+        """See parent class."""
+        for (edge, start_pos) in reversed(self.total_edgestarts):
+            if x >= start_pos:
+                return edge, x - start_pos
+
+    def get_x(self, edge, position):
+        """See parent class."""
+        if len(edge) == 0:
+            return -1001
+        return self.total_edgestarts_dict[edge] + position
+
+    def edge_length(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['length']
+        except KeyError:
+            print('Error in edge length with key', edge_id)
+            return -1001
+
+    def length(self):
+        """See parent class."""
+        return self.__length
+
+    def speed_limit(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['speed']
+        except KeyError:
+            print('Error in speed limit with key', edge_id)
+            return -1001
+
+    def num_lanes(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['lanes']
+        except KeyError:
+            print('Error in num lanes with key', edge_id)
+            return -1001
+
+    def max_speed(self):
+        """See parent class."""
+        return self.__max_speed
+
+    def get_edge_list(self):
+        """See parent class."""
+        return self._edge_list
+
+    def get_junction_list(self):
+        """See parent class."""
+        return []
+
+    def next_edge(self, edge, lane):
+        """See parent class."""
+        try:
+            return [(self._next_edge[edge], 0)]
+        except KeyError:
+            return []
+
+    def prev_edge(self, edge, lane):
+        """See parent class."""
+        try:
+            return [(self._prev_edge[edge], 0)]
+        except KeyError:
+            return []
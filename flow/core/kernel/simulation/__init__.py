@@ -1,4 +1,7 @@
 from flow.core.kernel.simulation.base import KernelSimulation
 from flow.core.kernel.simulation.traci import TraCISimulation
+from flow.core.kernel.simulation.ring import RingSimulation
+from flow.core.kernel.simulation.ctm import CTMSimulation
 
-__all__ = ['KernelSimulation', 'TraCISimulation']
+__all__ = ['KernelSimulation', 'TraCISimulation', 'RingSimulation',
+           'CTMSimulation']
@@ -49,10 +49,17 @@ class KernelSimulation(object):
         """
         raise NotImplementedError
 
-    def simulation_step(self):
+    def simulation_step(self, num_steps=1):
         """Advance the simulation by one step.
 
         This is done in most cases by calling a relevant simulator API method.
+
+        Parameters
+        ----------
+        num_steps : int, optional
+            number of simulation steps to advance by. If greater than one, the
+            intermediate steps are performed by the simulator alone, and the
+            other kernels are not updated in between them.
         """
         raise NotImplementedError
 
@@ -80,6 +87,29 @@ class KernelSimulation(object):
         """
         raise NotImplementedError
 
+    def get_collision_ids(self):
+        """Return the ids of the vehicles that collided in the last time step.
+
+        Returns
+        -------
+        list of str
+            ids of the colliding vehicles
+        """
+        raise NotImplementedError
+
+    def get_insertion_backlog(self):
+        """Return the number of vehicles waiting to enter the network.
+
+        These are the vehicles that are due to depart (e.g. from inflows) but
+        could not be inserted yet, e.g. because the network is congested.
+
+        Returns
+        -------
+        float
+            number of vehicles waiting to be inserted
+        """
+        raise NotImplementedError
+
     def close(self):
         """Closes the current simulation instance."""
         raise NotImplementedError
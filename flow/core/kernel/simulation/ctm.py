@@ -0,0 +1,497 @@
+"""Script containing the macroscopic cell transmission model and its kernel.
+
+The cell transmission model (CTM) represents traffic as a compressible fluid:
+every edge is split into cells, the state of which is the number of vehicles
+they contain, and vehicles are moved between neighboring cells according to a
+triangular fundamental diagram (Daganzo, 1994). This is orders of magnitude
+cheaper than simulating individual vehicles, and is well suited to networks
+in which only segment-level quantities (densities, speeds, flows) matter, e.g.
+bottlenecks and highway merges.
+"""
+
+import numpy as np
+
+from flow.core.kernel.simulation import KernelSimulation
+from flow.core.kernel.scenario.base import VEHICLE_LENGTH
+
+# default time headway and minimum gap of vehicles, used to compute the
+# fundamental diagram if no vehicle types are specified
+DEFAULT_TAU = 1.0
+DEFAULT_MIN_GAP = 2.5
+
+
+class CTMSimulator(object):
+    """Vectorized cell transmission model.
+
+    Each cell has a triangular fundamental diagram with free flow speed equal
+    to the speed limit of its edge, and capacity and jam density computed from
+    the time headway and minimum gap of vehicles. At every step, the flow
+    between consecutive cells is the minimum of the sending flow of the
+    upstream cell and the receiving flow of the downstream cell. At nodes,
+    the sending flow of every incoming edge is split among the outgoing edges
+    by turning fractions; the demand on each outgoing edge is served in
+    proportion to the demands of the incoming edges, and incoming edges obey a
+    first-in-first-out rule (Daganzo, 1995). A fraction of every edge's flow
+    may exit the network, as specified by the routes of vehicles.
+
+    Attributes
+    ----------
+    sim_step : float
+        simulation step size, in seconds
+    time : float
+        current simulation time, in seconds
+    edge_cells : dict < str, (int, int) >
+        index of the first cell of every edge and the number of its cells
+    cell_edge : numpy ndarray (str)
+        edge of every cell
+    num : numpy ndarray (float)
+        number of vehicles in every cell
+    length : numpy ndarray (float)
+        length of every cell, in meters
+    lanes : numpy ndarray (int)
+        number of lanes of every cell
+    speed : numpy ndarray (float)
+        equilibrium speed of vehicles in every cell, in m/s
+    speed_limit : numpy ndarray (float)
+        speed limit of every cell, in m/s
+    queue : numpy ndarray (float)
+        number of vehicles waiting to enter the network from every inflow
+    num_departed : float
+        number of vehicles that entered the network in the last step
+    num_arrived : float
+        number of vehicles that exited the network in the last step
+    """
+
+    def __init__(self, edges, movements, sim_step, tau=DEFAULT_TAU,
+                 min_gap=DEFAULT_MIN_GAP):
+        """Instantiate the simulator.
+
+        Parameters
+        ----------
+        edges : list of (str, float, int, float)
+            name, length, number of lanes, and speed limit of every edge
+        movements : list of (str, str or None, float)
+            turning fractions, in the form (from edge, to edge, fraction). A
+            to edge of None denotes the fraction of vehicles exiting the
+            network at the end of the from edge.
+        sim_step : float
+            simulation step size, in seconds
+        tau : float, optional
+            time headway of vehicles, in seconds
+        min_gap : float, optional
+            minimum bumper-to-bumper gap between vehicles, in meters
+        """
+        self.sim_step = sim_step
+        self.time = 0.
+
+        # congestion waves travel backwards at a speed of spacing / tau
+        spacing = VEHICLE_LENGTH + min_gap
+        self.wave_speed = spacing / tau
+
+        # split every edge into cells that neither vehicles nor congestion
+        # waves can traverse in less than a time step (CFL condition)
+        self.edge_cells = {}
+        length, lanes, speed_limit, cell_edge = [], [], [], []
+        for edge, edge_length, edge_lanes, edge_speed in edges:
+            max_speed = max(edge_speed, self.wave_speed)
+            num_cells = max(1, int(edge_length // (max_speed * sim_step)))
+            self.edge_cells[edge] = (len(length), num_cells)
+            cell_edge.extend([edge] * num_cells)
+            length.extend([edge_length / num_cells] * num_cells)
+            lanes.extend([edge_lanes] * num_cells)
+            speed_limit.extend([edge_speed] * num_cells)
+
+        self.num_cells = len(length)
+        self.cell_edge = np.array(cell_edge, dtype=object)
+        self.length = np.array(length, dtype=float)
+        self.lanes = np.array(lanes, dtype=int)
+        self.free_speed = np.array(speed_limit, dtype=float)
+        self.speed_limit = self.free_speed.copy()
+        self.num = np.zeros(self.num_cells)
+        self.speed = self.speed_limit.copy()
+
+        # triangular fundamental diagram of every cell, per lane
+        self.jam_density = 1 / spacing
+        self.capacity = self.free_speed / (self.free_speed * tau + spacing)
+
+        # multiplier of the receiving flow of every cell, used to represent
+        # traffic lights at the start of edges
+        self.supply_factor = np.ones(self.num_cells)
+
+        # links between consecutive cells of the same edge
+        upstream = [start + i for start, num_cells in self.edge_cells.values()
+                    for i in range(num_cells - 1)]
+        self._up = np.array(upstream, dtype=int)
+        self._down = self._up + 1
+
+        # movements between the last and first cells of consecutive edges,
+        # and exits from the network
+        mv_from, mv_to, mv_fraction = [], [], []
+        exit_from, exit_fraction = [], []
+        for from_edge, to_edge, fraction in movements:
+            start, num_cells = self.edge_cells[from_edge]
+            if to_edge is None:
+                exit_from.append(start + num_cells - 1)
+                exit_fraction.append(fraction)
+            else:
+                mv_from.append(start + num_cells - 1)
+                mv_to.append(self.edge_cells[to_edge][0])
+                mv_fraction.append(fraction)
+        self._mv_from = np.array(mv_from, dtype=int)
+        self._mv_to = np.array(mv_to, dtype=int)
+        self._mv_fraction = np.array(mv_fraction, dtype=float)
+        self._exit_from = np.array(exit_from, dtype=int)
+        self._exit_fraction = np.array(exit_fraction, dtype=float)
+
+        # inflows, as (first cell, rate in veh/s, begin, end)
+        self._src_cell = np.zeros(0, dtype=int)
+        self._src_rate = np.zeros(0)
+        self._src_begin = np.zeros(0)
+        self._src_end = np.zeros(0)
+        self.queue = np.zeros(0)
+
+        # batches of vehicles added to the inflow queues at a given time, as
+        # (index of the queue, number of vehicles, time)
+        self._batch_src = np.zeros(0, dtype=int)
+        self._batch_num = np.zeros(0)
+        self._batch_time = np.zeros(0)
+
+        self.num_departed = 0.
+        self.num_arrived = 0.
+
+    def add_inflow(self, edge, rate, begin=0., end=float("inf")):
+        """Add a constant inflow of vehicles at the start of an edge.
+
+        Vehicles that cannot enter the network because the first cell of the
+        edge is congested wait in a queue.
+
+        Parameters
+        ----------
+        edge : str
+            name of the edge
+        rate : float
+            inflow rate, in veh/s
+        begin : float, optional
+            time the inflow starts, in seconds
+        end : float, optional
+            time the inflow ends, in seconds
+        """
+        self._src_cell = np.append(self._src_cell, self.edge_cells[edge][0])
+        self._src_rate = np.append(self._src_rate, rate)
+        self._src_begin = np.append(self._src_begin, begin)
+        self._src_end = np.append(self._src_end, end)
+        self.queue = np.append(self.queue, 0.)
+
+    def add_batch(self, edge, num, time=0.):
+        """Add a batch of vehicles waiting to enter the network at an edge.
+
+        The vehicles join an inflow queue of the edge once the time is
+        reached, and enter the network as soon as the first cell of the edge
+        has room for them.
+
+        Parameters
+        ----------
+        edge : str
+            name of the edge
+        num : float
+            number of vehicles
+        time : float, optional
+            time the vehicles join the queue, in seconds
+        """
+        self.add_inflow(edge, 0., begin=time, end=time)
+        self._batch_src = np.append(self._batch_src, len(self.queue) - 1)
+        self._batch_num = np.append(self._batch_num, num)
+        self._batch_time = np.append(self._batch_time, time)
+
+    def add(self, edge, pos, num=1.):
+        """Add vehicles to the cell containing a position on an edge.
+
+        Parameters
+        ----------
+        edge : str
+            name of the edge
+        pos : float
+            position on the edge, in meters
+        num : float, optional
+            number of vehicles
+        """
+        self.num[self.get_cell(edge, pos)] += num
+
+    def clear(self):
+        """Remove all vehicles from the network and the inflow queues."""
+        self.num.fill(0)
+        self.queue.fill(0)
+        self.speed[:] = self.speed_limit
+
+    def get_cell(self, edge, pos):
+        """Return the index of the cell containing a position on an edge."""
+        start, num_cells = self.edge_cells[edge]
+        length = self.length[start]
+        return start + min(max(int(pos // length), 0), num_cells - 1)
+
+    def set_supply_factor(self, edge, factor):
+        """Scale the receiving flow at the start of an edge.
+
+        This is used to represent traffic lights, with a factor of 0 for a
+        red light and 1 for a green light.
+        """
+        self.supply_factor[self.edge_cells[edge][0]] = factor
+
+    def get_segments(self, edge, num_segments=1):
+        """Return the cells of an edge, and the segment each cell belongs to.
+
+        The edge is split into ``num_segments`` segments of equal length, and
+        every cell is attributed to the segment containing its center.
+
+        Returns
+        -------
+        slice
+            cells of the edge
+        numpy ndarray (int)
+            segment of every cell of the edge
+        """
+        start, num_cells = self.edge_cells[edge]
+        segment = ((np.arange(num_cells) + 0.5) * num_segments //
+                   num_cells).astype(int)
+        return slice(start, start + num_cells), segment
+
+    def get_speed_limit(self, edge, num_segments=1):
+        """Return the speed limit of every segment of an edge.
+
+        See get_segments. Segments without cells have a speed limit of zero.
+        """
+        cells, segment = self.get_segments(edge, num_segments)
+        total = np.bincount(segment, weights=self.speed_limit[cells],
+                            minlength=num_segments)
+        count = np.bincount(segment, minlength=num_segments)
+        return np.divide(total, count, out=np.zeros(num_segments),
+                         where=count > 0)
+
+    def set_speed_limit(self, edge, speed):
+        """Set the speed limit of the cells of an edge.
+
+        The speed limit is bounded by the free flow speed of the edge, as the
+        size of cells is chosen based on the latter.
+
+        Parameters
+        ----------
+        edge : str
+            name of the edge
+        speed : float or array_like
+            speed limit of the whole edge, or of each of a number of segments
+            of equal length the edge is split into (see get_segments)
+        """
+        speed = np.asarray(speed, dtype=float)
+        cells, segment = self.get_segments(edge, max(speed.size, 1))
+        if speed.ndim > 0:
+            speed = speed[segment]
+        self.speed_limit[cells] = np.minimum(speed, self.free_speed[cells])
+
+    def step(self, num_steps=1):
+        """Advance the simulation by a number of steps."""
+        num_departed = 0.
+        num_arrived = 0.
+        for _ in range(num_steps):
+            departed, arrived = self._step()
+            num_departed += departed
+            num_arrived += arrived
+        self.num_departed = num_departed
+        self.num_arrived = num_arrived
+
+    def _step(self):
+        """Advance the simulation by a single step.
+
+        Returns
+        -------
+        float
+            number of vehicles that entered the network
+        float
+            number of vehicles that exited the network
+        """
+        dt = self.sim_step
+        num = self.num
+        lane_length = self.length * self.lanes
+
+        # sending and receiving flows of every cell, in vehicles per step
+        sending = np.minimum(
+            np.minimum(self.speed_limit * num / self.length,
+                       self.capacity * self.lanes) * dt, num)
+        receiving = np.maximum(np.minimum(
+            self.capacity * self.lanes,
+            self.wave_speed * (self.jam_density * lane_length - num) /
+            self.length) * dt, 0) * self.supply_factor
+
+        # flows between cells of the same edge
+        flow_int = np.minimum(sending[self._up], receiving[self._down])
+
+        # flows between edges: the demand on every cell is scaled down if it
+        # exceeds the receiving flow, and every incoming edge is restricted by
+        # its most congested movement. Exiting vehicles are subject to the
+        # same first-in-first-out restriction
+        demand = sending[self._mv_from] * self._mv_fraction
+        total_demand = np.bincount(self._mv_to, weights=demand,
+                                   minlength=self.num_cells)
+        ratio = np.ones(self.num_cells)
+        np.divide(receiving, total_demand, out=ratio, where=total_demand > 0)
+        np.minimum(ratio, 1, out=ratio)
+        fifo = np.ones(self.num_cells)
+        np.minimum.at(fifo, self._mv_from, ratio[self._mv_to])
+        flow_mv = fifo[self._mv_from] * demand
+        flow_exit = fifo[self._exit_from] * sending[self._exit_from] * \
+            self._exit_fraction
+
+        # inflows enter the first cell of their edge with the receiving flow
+        # left after the flows from upstream edges
+        flow_src = np.zeros(0)
+        if len(self.queue) > 0:
+            due = self._batch_time <= self.time
+            if due.any():
+                self.queue[self._batch_src[due]] += self._batch_num[due]
+                self._batch_src = self._batch_src[~due]
+                self._batch_num = self._batch_num[~due]
+                self._batch_time = self._batch_time[~due]
+
+            active = (self._src_begin <= self.time) & \
+                (self.time < self._src_end)
+            self.queue += np.where(active, self._src_rate * dt, 0)
+            supply = receiving - np.bincount(self._mv_to, weights=flow_mv,
+                                             minlength=self.num_cells)
+            src_demand = np.bincount(self._src_cell, weights=self.queue,
+                                     minlength=self.num_cells)
+            src_ratio = np.ones(self.num_cells)
+            np.divide(np.maximum(supply, 0), src_demand, out=src_ratio,
+                      where=src_demand > 0)
+            flow_src = self.queue * np.minimum(src_ratio, 1)[self._src_cell]
+            self.queue -= flow_src
+
+        # update the number of vehicles in every cell
+        num[self._up] -= flow_int
+        num[self._down] += flow_int
+        num -= np.bincount(self._mv_from, weights=flow_mv,
+                           minlength=self.num_cells)
+        num += np.bincount(self._mv_to, weights=flow_mv,
+                           minlength=self.num_cells)
+        num -= np.bincount(self._exit_from, weights=flow_exit,
+                           minlength=self.num_cells)
+        num += np.bincount(self._src_cell, weights=flow_src,
+                           minlength=self.num_cells)
+        np.maximum(num, 0, out=num)
+
+        # equilibrium speed of every cell, given its density
+        density = num / lane_length
+        congested_speed = np.divide(
+            self.wave_speed * (self.jam_density - density), density,
+            out=np.full(self.num_cells, np.inf), where=density > 0)
+        self.speed = np.maximum(
+            np.minimum(self.speed_limit, congested_speed), 0)
+
+        self.time += dt
+        return flow_src.sum(), flow_exit.sum()
+
+
+class CTMSimulation(KernelSimulation):
+    """Simulation kernel for the macroscopic cell transmission model.
+
+    Extends flow.core.kernel.simulation.KernelSimulation
+    """
+
+    def __init__(self, master_kernel):
+        """See parent class."""
+        KernelSimulation.__init__(self, master_kernel)
+        self.sim_step = None
+
+    def start_simulation(self, scenario, sim_params):
+        """Start a cell transmission model instance.
+
+        The fundamental diagram is computed from the (average) time headway
+        and minimum gap of the vehicle types in the vehicle kernel, and the
+        inflows of the scenario are added to the model.
+
+        Parameters
+        ----------
+        scenario : flow.core.kernel.scenario.CTMScenario
+            the scenario kernel
+        sim_params : flow.core.params.SimParams
+            simulation-specific parameters. Only the simulation step size is
+            used.
+
+        Returns
+        -------
+        CTMSimulator
+            the simulator, which acts as the kernel api
+        """
+        self.sim_step = sim_params.sim_step
+
+        vehicles = self.master_kernel.vehicle
+        type_params = vehicles.type_parameters
+        if len(type_params) > 0:
+            tau = np.mean([
+                params["car_following_params"].controller_params["tau"]
+                for params in type_params.values()])
+            min_gap = np.mean(list(vehicles.minGap.values()))
+        else:
+            tau, min_gap = DEFAULT_TAU, DEFAULT_MIN_GAP
+
+        edges = [(edge, scenario.edge_length(edge), scenario.num_lanes(edge),
+                  scenario.speed_limit(edge))
+                 for edge in scenario.get_edge_list()]
+        simulator = CTMSimulator(edges, scenario.movements, self.sim_step,
+                                 tau=tau, min_gap=min_gap)
+
+        for inflow in scenario.network.net_params.inflows.get():
+            edge = inflow["route"][len("route"):]
+            begin = float(inflow.get("begin", 0))
+            end = inflow.get("end")
+            end = float("inf") if end is None else float(end)
+            if "vehsPerHour" in inflow:
+                rate = float(inflow["vehsPerHour"]) / 3600
+            elif "probability" in inflow:
+                rate = float(inflow["probability"])
+            elif "period" in inflow:
+                rate = 1 / float(inflow["period"])
+            elif "number" in inflow:
+                if np.isinf(end):
+                    # without an end time, the vehicles enter the network as
+                    # soon as possible
+                    simulator.add_batch(edge, float(inflow["number"]), begin)
+                    continue
+                rate = float(inflow["number"]) / (end - begin)
+            else:
+                raise ValueError('Inflow {} does not specify a rate.'.format(
+                    inflow["name"]))
+            simulator.add_inflow(edge, rate, begin, end)
+
+        return simulator
+
+    def simulation_step(self, num_steps=1):
+        """See parent class."""
+        self.kernel_api.step(num_steps)
+
+    def update(self, reset):
+        """See parent class."""
+        pass
+
+    def check_collision(self):
+        """See parent class.
+
+        Vehicles cannot collide in a macroscopic model.
+        """
+        return False
+
+    def get_collision_ids(self):
+        """See parent class.
+
+        Vehicles cannot collide in a macroscopic model.
+        """
+        return []
+
+    def get_insertion_backlog(self):
+        """See parent class.
+
+        This is the number of vehicles in the inflow queues.
+        """
+        return float(np.sum(self.kernel_api.queue))
+
+    def close(self):
+        """See parent class."""
+        pass
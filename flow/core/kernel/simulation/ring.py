@@ -0,0 +1,443 @@
+"""Script containing the NumPy ring road simulator and its kernel class.
+
+The ring simulator is a lightweight, in-process alternative to sumo for
+networks consisting of closed, single-lane rings (e.g. LoopScenario and
+MultiLoopScenario). Vehicles are stored in contiguous numpy arrays, and the
+positions and speeds of all vehicles are advanced in a single vectorized
+operation every simulation step.
+"""
+
+import collections
+
+import numpy as np
+
+from flow.core.kernel.simulation import KernelSimulation
+
+# car following models supported by the ring simulator
+KRAUSS = 0
+IDM = 1
+CAR_FOLLOWING_MODELS = {"Krauss": KRAUSS, "IDM": IDM}
+
+# bits of the sumo speed mode that are replicated by the ring simulator
+# (see: http://sumo.dlr.de/wiki/TraCI/Change_Vehicle_State)
+REGARD_SAFE_SPEED = 1
+REGARD_MAX_ACCEL = 2
+REGARD_MAX_DECEL = 4
+
+
+class RingSimulator(object):
+    """Vectorized simulator of vehicles driving on closed single-lane rings.
+
+    Vehicles are identified by their position ``pos`` along the ring they
+    are located in ``ring``, as measured from the start of the ring. Every
+    simulation step, the speeds of all vehicles are computed from their
+    car following model (Krauss or IDM), unless a speed was commanded via
+    ``set_speed``, and positions are then updated with an Euler step, matching
+    the default integration scheme of sumo.
+
+    Vehicles added to the network are only inserted at the end of the next
+    simulation step, similar to vehicles added via traci.
+
+    Attributes
+    ----------
+    ring_lengths : numpy ndarray (float)
+        length of each ring, in meters
+    sim_step : float
+        simulation step size, in seconds
+    time : float
+        current simulation time, in seconds
+    num_vehicles : int
+        number of vehicles currently in the network
+    ids : list of str
+        ids of the vehicles in the network, ordered by their index in the
+        vehicle arrays
+    index : dict < str, int >
+        index of every vehicle in the vehicle arrays
+    speed : numpy ndarray (float)
+        speed of every vehicle
+    default_speed : numpy ndarray (float)
+        speed every vehicle would have had in the last step according to its
+        car following model, i.e. if its speed had not been commanded
+    leader : numpy ndarray (int)
+        index of the leader of every vehicle, or -1 if the vehicle is alone on
+        its ring
+    follower : numpy ndarray (int)
+        index of the follower of every vehicle, or -1 if the vehicle is alone
+        on its ring
+    gap : numpy ndarray (float)
+        bumper-to-bumper distance between every vehicle and its leader
+    departed_ids : list of str
+        ids of the vehicles that were inserted in the last simulation step
+    collided_ids : list of str
+        ids of the vehicles that collided with their leader in the last
+        simulation step
+    """
+
+    # names of the per-vehicle arrays, and their data types
+    _float_fields = ("ring_pos", "speed", "default_speed", "length", "accel",
+                     "decel", "tau", "min_gap", "max_speed", "sigma",
+                     "command", "gap")
+    _int_fields = ("ring", "model", "speed_mode", "leader", "follower")
+
+    def __init__(self, ring_lengths, sim_step, seed=None, capacity=32):
+        """Instantiate the simulator.
+
+        Parameters
+        ----------
+        ring_lengths : array_like
+            length of each ring, in meters
+        sim_step : float
+            simulation step size, in seconds
+        seed : int, optional
+            seed for the random number generator used by the Krauss model
+        capacity : int, optional
+            initial number of vehicles memory is allocated for. Arrays are
+            grown as needed.
+        """
+        self.ring_lengths = np.asarray(ring_lengths, dtype=float)
+        self.sim_step = sim_step
+        self.rng = np.random.RandomState(seed)
+        self.time = 0.
+
+        self.num_vehicles = 0
+        self.ids = []
+        self.index = {}
+        for name in self._float_fields:
+            setattr(self, name, np.zeros(capacity))
+        for name in self._int_fields:
+            setattr(self, name, np.zeros(capacity, dtype=int))
+
+        self.departed_ids = []
+        self.collided_ids = []
+        self._pending = collections.OrderedDict()
+
+    def add(self, veh_id, ring, pos, speed, params):
+        """Add a vehicle to the network at the end of the next step.
+
+        If a vehicle with the same id is already in the network, it is removed
+        first.
+
+        Parameters
+        ----------
+        veh_id : str
+            vehicle identifier
+        ring : int
+            index of the ring the vehicle is placed in
+        pos : float
+            position of the front bumper of the vehicle along the ring
+        speed : float
+            initial speed of the vehicle
+        params : dict
+            car following parameters of the vehicle, with keys "length",
+            "accel", "decel", "tau", "min_gap", "max_speed", "sigma", "model",
+            and "speed_mode"
+        """
+        self.remove(veh_id)
+        self._pending[veh_id] = (ring, pos, speed, params)
+
+    def remove(self, veh_id):
+        """Remove one or several vehicles from the network, if in it.
+
+        When removing a single vehicle, the last vehicle in the arrays is
+        moved into the freed index. When removing a list of vehicles, the
+        remaining vehicles are compacted in a single vectorized operation.
+
+        Parameters
+        ----------
+        veh_id : str or list of str
+            vehicle identifier(s)
+        """
+        if not isinstance(veh_id, str):
+            return self._remove_many(veh_id)
+
+        self._pending.pop(veh_id, None)
+        i = self.index.pop(veh_id, None)
+        if i is None:
+            return
+
+        last = self.num_vehicles - 1
+        if i != last:
+            for name in self._float_fields + self._int_fields:
+                values = getattr(self, name)
+                values[i] = values[last]
+            self.ids[i] = self.ids[last]
+            self.index[self.ids[i]] = i
+        self.ids.pop()
+        self.num_vehicles -= 1
+        self._update_leaders()
+
+    def _remove_many(self, veh_ids):
+        """Remove a list of vehicles from the network, if in it."""
+        n = self.num_vehicles
+        keep = np.ones(n, dtype=bool)
+        for veh_id in veh_ids:
+            self._pending.pop(veh_id, None)
+            i = self.index.get(veh_id)
+            if i is not None:
+                keep[i] = False
+
+        if keep.all():
+            return
+
+        for name in self._float_fields + self._int_fields:
+            values = getattr(self, name)
+            remaining = values[:n][keep]
+            values[:len(remaining)] = remaining
+        self.ids = [self.ids[i] for i in np.flatnonzero(keep)]
+        self.index = {veh_id: i for i, veh_id in enumerate(self.ids)}
+        self.num_vehicles = len(self.ids)
+        self._update_leaders()
+
+    def set_speed(self, veh_id, speed):
+        """Command the speed of a vehicle for the next simulation step.
+
+        The commanded speed is subject to the checks specified by the speed
+        mode of the vehicle.
+        """
+        self.command[self.index[veh_id]] = speed
+
+    def step(self, num_steps=1, rings=None):
+        """Advance the simulation by a number of steps.
+
+        Parameters
+        ----------
+        num_steps : int, optional
+            number of simulation steps
+        rings : array_like of int, optional
+            indices of the rings that are advanced. Vehicles on all other
+            rings are frozen in place. Defaults to all rings.
+        """
+        self.departed_ids = []
+        self.collided_ids = []
+
+        active = None
+        if rings is not None:
+            active = np.zeros(len(self.ring_lengths), dtype=bool)
+            active[rings] = True
+
+        for _ in range(num_steps):
+            self._step(active)
+
+    def _step(self, active=None):
+        """Advance the simulation by a single step.
+
+        Parameters
+        ----------
+        active : numpy ndarray (bool), optional
+            mask of the rings that are advanced. Defaults to all rings.
+        """
+        n = self.num_vehicles
+        dt = self.sim_step
+
+        if n > 0:
+            speed = self.speed[:n]
+            leader = self.leader[:n]
+            has_leader = leader >= 0
+            v_lead = np.where(has_leader, self.speed[leader], 0.)
+            gap = self.gap[:n]
+
+            accel = self.accel[:n]
+            decel = self.decel[:n]
+            tau = self.tau[:n]
+            min_gap = self.min_gap[:n]
+            max_speed = self.max_speed[:n]
+
+            # maximum speed that allows a vehicle to stop behind its leader
+            # (Krauss, 1998)
+            v_safe = np.where(
+                has_leader,
+                v_lead + (gap - min_gap - v_lead * tau) /
+                ((speed + v_lead) / (2 * decel) + tau),
+                np.inf)
+
+            # Krauss model, including random dawdling
+            v_krauss = np.minimum(np.minimum(v_safe, speed + accel * dt),
+                                  max_speed)
+            v_krauss -= self.sigma[:n] * accel * dt * self.rng.rand(n)
+
+            # intelligent driver model
+            s_star = min_gap + np.maximum(
+                0, speed * tau + speed * (speed - v_lead) /
+                (2 * np.sqrt(accel * decel)))
+            interaction = np.where(
+                has_leader, (s_star / np.maximum(gap, 1e-3)) ** 2, 0.)
+            a_idm = accel * (1 - (speed / max_speed) ** 4 - interaction)
+            v_idm = speed + a_idm * dt
+
+            v_next = np.where(self.model[:n] == IDM, v_idm, v_krauss)
+            self.default_speed[:n] = np.clip(v_next, 0, max_speed)
+
+            # commanded speeds, subject to the checks in the speed modes
+            command = self.command[:n]
+            commanded = ~np.isnan(command)
+            if commanded.any():
+                mode = self.speed_mode[:n]
+                v_cmd = np.where(mode & REGARD_SAFE_SPEED,
+                                 np.minimum(command, v_safe), command)
+                v_cmd = np.where(mode & REGARD_MAX_ACCEL,
+                                 np.minimum(v_cmd, speed + accel * dt), v_cmd)
+                v_cmd = np.where(mode & REGARD_MAX_DECEL,
+                                 np.maximum(v_cmd, speed - decel * dt), v_cmd)
+                v_next = np.where(commanded, v_cmd, v_next)
+                command.fill(np.nan)
+
+            v_next = np.clip(v_next, 0, max_speed)
+
+            ring = self.ring[:n]
+            if active is not None:
+                # vehicles on the rings that are not advanced are frozen
+                moving = active[ring]
+                v_next = np.where(moving, v_next, speed)
+                dx = np.where(moving, v_next * dt, 0.)
+            else:
+                dx = v_next * dt
+
+            # update the positions and gaps of all vehicles
+            lengths = self.ring_lengths[ring]
+            dx_lead = np.where(has_leader, dx[leader], 0.)
+            self.ring_pos[:n] = np.mod(self.ring_pos[:n] + dx, lengths)
+            self.speed[:n] = v_next
+            gap += dx_lead - dx
+
+            # vehicles with a negative gap collided with their leader, and are
+            # placed right behind it
+            collided = has_leader & (gap < 0)
+            if collided.any():
+                for i in np.flatnonzero(collided):
+                    j = leader[i]
+                    self.ring_pos[i] = np.mod(
+                        self.ring_pos[j] - self.length[j], lengths[i])
+                    gap[i] = 0.
+                    self.collided_ids.append(self.ids[i])
+
+        self.time += dt
+
+        # insert the vehicles that were added during the last step
+        if self._pending:
+            for veh_id, (ring, pos, speed, params) in self._pending.items():
+                self._insert(veh_id, ring, pos, speed, params)
+                self.departed_ids.append(veh_id)
+            self._pending.clear()
+            self._update_leaders()
+
+    def _insert(self, veh_id, ring, pos, speed, params):
+        """Insert a vehicle in the vehicle arrays."""
+        i = self.num_vehicles
+        if i == self.speed.shape[0]:
+            for name in self._float_fields + self._int_fields:
+                values = getattr(self, name)
+                setattr(self, name, np.concatenate(
+                    (values, np.zeros_like(values))))
+
+        self.ring[i] = ring
+        self.ring_pos[i] = np.mod(pos, self.ring_lengths[ring])
+        self.speed[i] = speed
+        self.default_speed[i] = speed
+        self.command[i] = np.nan
+        for key in ("length", "accel", "decel", "tau", "min_gap",
+                    "max_speed", "sigma", "model", "speed_mode"):
+            getattr(self, key)[i] = params[key]
+
+        self.ids.append(veh_id)
+        self.index[veh_id] = i
+        self.num_vehicles += 1
+
+    def _update_leaders(self):
+        """Recompute the leader of every vehicle, and its gap.
+
+        Vehicles cannot pass each other on a single lane, so the (cyclic)
+        ordering of vehicles on a ring only changes when vehicles are added or
+        removed, and the leaders are otherwise kept from step to step.
+        """
+        n = self.num_vehicles
+        if n == 0:
+            return
+
+        ring = self.ring[:n]
+        order = np.lexsort((self.ring_pos[:n], ring))
+        sorted_ring = ring[order]
+
+        # the leader of every vehicle is the next vehicle on the same ring,
+        # with the last vehicle of a ring following the first one
+        leader_order = np.roll(order, -1)
+        first = np.ones(n, dtype=bool)
+        first[1:] = sorted_ring[1:] != sorted_ring[:-1]
+        starts = np.flatnonzero(first)
+        ends = np.append(starts[1:], n) - 1
+        leader_order[ends] = order[starts]
+
+        leader = np.empty(n, dtype=int)
+        leader[order] = leader_order
+        # vehicles alone on their ring do not have a leader
+        leader[order[starts[starts == ends]]] = -1
+        self.leader[:n] = leader
+
+        has_leader = leader >= 0
+        follower = np.full(n, -1, dtype=int)
+        follower[leader[has_leader]] = np.flatnonzero(has_leader)
+        self.follower[:n] = follower
+
+        lengths = self.ring_lengths[ring]
+        gap = np.mod(self.ring_pos[leader] - self.ring_pos[:n], lengths) \
+            - self.length[leader]
+        self.gap[:n] = np.where(has_leader, gap, np.inf)
+
+
+class RingSimulation(KernelSimulation):
+    """Simulation kernel for the NumPy ring road simulator.
+
+    Extends flow.core.kernel.simulation.KernelSimulation
+    """
+
+    def __init__(self, master_kernel):
+        """See parent class."""
+        KernelSimulation.__init__(self, master_kernel)
+        self.sim_step = None
+
+    def start_simulation(self, scenario, sim_params):
+        """Start a ring simulator instance.
+
+        Parameters
+        ----------
+        scenario : flow.core.kernel.scenario.RingScenario
+            the scenario kernel, which specifies the lengths of the rings
+        sim_params : flow.core.params.SimParams
+            simulation-specific parameters. Only the simulation step size and
+            the seed are used.
+
+        Returns
+        -------
+        RingSimulator
+            the simulator, which acts as the kernel api
+        """
+        self.sim_step = sim_params.sim_step
+        return RingSimulator(scenario.ring_lengths,
+                             sim_step=sim_params.sim_step,
+                             seed=sim_params.seed)
+
+    def simulation_step(self, num_steps=1):
+        """See parent class."""
+        self.kernel_api.step(num_steps)
+
+    def update(self, reset):
+        """See parent class."""
+        pass
+
+    def check_collision(self):
+        """See parent class."""
+        return len(self.kernel_api.collided_ids) > 0
+
+    def get_collision_ids(self):
+        """See parent class."""
+        return list(self.kernel_api.collided_ids)
+
+    def get_insertion_backlog(self):
+        """See parent class.
+
+        All vehicles are placed on the ring at the start of a rollout.
+        """
+        return 0
+
+    def close(self):
+        """See parent class."""
+        pass
@@ -2,6 +2,9 @@
 
 from flow.core.kernel.simulation import KernelSimulation
 from flow.core.util import ensure_dir
+from flow.core.kernel.traci_trace import TraCIRecorder, TraCIReplay, \
+    TraCITraceReader
+from flow.core.kernel.traci_stats import TraCIStats
 import flow.config as config
 import traci.constants as tc
 import traci
@@ -35,6 +38,28 @@ class TraCISimulation(KernelSimulation):
         KernelSimulation.__init__(self, master_kernel)
         # contains the subprocess.Popen instance used to start traci
         self.sumo_proc = None
+        # simulation step size, set when a simulation is started
+        self.sim_step = None
+        # reader of the replayed TraCI trace, shared by the connections of
+        # successive simulations (see flow/core/kernel/traci_trace.py)
+        self._trace_reader = None
+        # whether TraCI calls were already recorded by a previous simulation
+        self._trace_started = False
+
+        # state of the simulation after the last step, read from the
+        # simulation subscription by update
+        self._departed_ids = ()
+        self._arrived_ids = ()
+        self._teleport_ids = ()
+        self._collision_ids = ()
+        self._num_loaded = 0
+        self._min_expected = 0
+        # time and step size reported by sumo, in milliseconds
+        self._time_step = None
+        self._delta_t = None
+        # current time, in seconds, or None if the simulation was stepped
+        # since the last update
+        self._time = None
 
     def pass_api(self, kernel_api):
         """See parent class.
@@ -44,28 +69,93 @@ class TraCISimulation(KernelSimulation):
         KernelSimulation.pass_api(self, kernel_api)
 
         # subscribe some simulation parameters needed to check for entering,
-        # exiting, and colliding vehicles
+        # exiting, colliding, and pending vehicles
         self.kernel_api.simulation.subscribe([
             tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS,
             tc.VAR_TELEPORT_STARTING_VEHICLES_IDS, tc.VAR_TIME_STEP,
-            tc.VAR_DELTA_T
+            tc.VAR_DELTA_T, tc.VAR_COLLIDING_VEHICLES_IDS,
+            tc.VAR_LOADED_VEHICLES_NUMBER, tc.VAR_MIN_EXPECTED_VEHICLES
         ])
 
-    def simulation_step(self):
+    def simulation_step(self, num_steps=1):
         """See parent class."""
-        self.kernel_api.simulationStep()
+        if num_steps == 1:
+            self.kernel_api.simulationStep()
+        else:
+            # simulate up until the target time in a single traci call
+            time = self._time
+            if time is None:
+                time = self.kernel_api.simulation.getTime()
+            self.kernel_api.simulationStep(time + num_steps * self.sim_step)
+        self._time = None
 
     def update(self, reset):
-        """See parent class."""
-        pass
+        """See parent class.
+
+        The results of the simulation subscription are stored, so that the
+        queries on the state of the simulation (e.g. check_collision, or the
+        vehicles that departed and arrived, which are read by the vehicle
+        kernel) do not require additional calls to sumo.
+        """
+        sim_obs = self.kernel_api.simulation.getSubscriptionResults()
+        # the variables missing from the subscription (e.g. of traces that
+        # were recorded before they were subscribed to) are left empty
+        self._departed_ids = sim_obs.get(tc.VAR_DEPARTED_VEHICLES_IDS, ())
+        self._arrived_ids = sim_obs.get(tc.VAR_ARRIVED_VEHICLES_IDS, ())
+        self._teleport_ids = sim_obs.get(
+            tc.VAR_TELEPORT_STARTING_VEHICLES_IDS, ())
+        self._collision_ids = sim_obs.get(tc.VAR_COLLIDING_VEHICLES_IDS, ())
+        self._num_loaded = sim_obs.get(tc.VAR_LOADED_VEHICLES_NUMBER, 0)
+        self._min_expected = sim_obs.get(tc.VAR_MIN_EXPECTED_VEHICLES, 0)
+        self._time_step = sim_obs.get(tc.VAR_TIME_STEP)
+        self._delta_t = sim_obs.get(tc.VAR_DELTA_T)
+        self._time = None
+        if self._time_step is not None:
+            self._time = self._time_step / 1000
 
     def close(self):
         """See parent class."""
         self.kernel_api.close()
 
     def check_collision(self):
+        """See parent class.
+
+        Vehicles that collided, or started to be teleported (which sumo does
+        by default after a collision) in the last step are considered.
+        """
+        return len(self._teleport_ids) > 0 or len(self._collision_ids) > 0
+
+    def get_collision_ids(self):
         """See parent class."""
-        return self.kernel_api.simulation.getStartingTeleportNumber() != 0
+        return list(self._collision_ids)
+
+    def get_insertion_backlog(self):
+        """See parent class.
+
+        The minimum number of vehicles expected by sumo includes the vehicles
+        in the network and those waiting to be inserted.
+        """
+        num_running = len(self.master_kernel.vehicle.get_ids())
+        return max(self._min_expected - num_running, 0)
+
+    def get_departed_ids(self):
+        """Return the ids of the vehicles that departed in the last step."""
+        return self._departed_ids
+
+    def get_arrived_ids(self):
+        """Return the ids of the vehicles that arrived in the last step."""
+        return self._arrived_ids
+
+    def get_teleport_ids(self):
+        """Return the ids of the vehicles that started to be teleported."""
+        return self._teleport_ids
+
+    def get_time_step(self):
+        """Return the current time and the step size, in milliseconds.
+
+        Both are None if they were not reported by sumo.
+        """
+        return self._time_step, self._delta_t
 
     def start_simulation(self, scenario, sim_params):
         """Start a sumo simulation instance.
@@ -73,7 +163,25 @@ class TraCISimulation(KernelSimulation):
         This method uses the configuration files created by the scenario class
         to initialize a sumo instance. Also initializes a traci connection to
         interface with sumo from Python.
+
+        If ``sim_params.traci_replay_path`` is set, sumo is not started, and
+        the calls of the recorded trace are replayed instead. If
+        ``sim_params.traci_record_path`` is set, all calls to the connection
+        are recorded. If ``sim_params.traci_stats`` is set, the calls to the
+        connection are counted.
         """
+        self.sim_step = sim_params.sim_step
+
+        replay_path = getattr(sim_params, "traci_replay_path", None)
+        if replay_path is not None:
+            if self._trace_reader is None:
+                self._trace_reader = TraCITraceReader(replay_path)
+            traci_connection = TraCIReplay(self._trace_reader)
+            traci_connection = self._count_calls(traci_connection, sim_params)
+            traci_connection.setOrder(0)
+            traci_connection.simulationStep()
+            return traci_connection
+
         error = None
         for _ in range(RETRIES_ON_ERROR):
             try:
@@ -151,6 +259,18 @@ class TraCISimulation(KernelSimulation):
                     time.sleep(config.SUMO_SLEEP)
 
                 traci_connection = traci.connect(port, numRetries=100)
+
+                # record all calls to the connection (if requested)
+                record_path = getattr(sim_params, "traci_record_path", None)
+                if record_path is not None:
+                    traci_connection = TraCIRecorder(
+                        traci_connection, record_path,
+                        append=self._trace_started)
+                    self._trace_started = True
+
+                traci_connection = self._count_calls(traci_connection,
+                                                     sim_params)
+
                 traci_connection.setOrder(0)
                 traci_connection.simulationStep()
 
@@ -161,8 +281,18 @@ class TraCISimulation(KernelSimulation):
                 self.teardown_sumo()
         raise error
 
+    @staticmethod
+    def _count_calls(traci_connection, sim_params):
+        """Wrap a connection to count its calls, if requested."""
+        if not getattr(sim_params, "traci_stats", False):
+            return traci_connection
+        return TraCIStats(traci_connection,
+                          window=sim_params.traci_stats_window)
+
     def teardown_sumo(self):
         """Kill the sumo subprocess instance."""
+        if self.sumo_proc is None:
+            return
         try:
             os.killpg(self.sumo_proc.pid, signal.SIGTERM)
         except Exception as e:
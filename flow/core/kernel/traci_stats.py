@@ -0,0 +1,256 @@
+"""Accounting of the calls made to a TraCI connection.
+
+Most of the time of an environment simulated by sumo is spent communicating
+with sumo through TraCI, and each call to a command of a TraCI domain is a
+round trip to sumo, unless it reads subscription results. ``TraCIStats``
+wraps a TraCI connection, and counts the calls to every command, as well as
+the round trips to sumo and the bytes sent and received, for every simulation
+step. The statistics of the last steps are kept, so that the rolling number
+of calls and bytes per step can be read while the simulation runs.
+
+A step starts after a call to ``simulationStep``, and ends with the next one,
+so that the calls made by the environment and the kernel between two
+simulation steps (e.g. to apply the actions, and read the state of the
+simulation) are attributed to the same step.
+
+Getters called for many different vehicles (or other objects) in a single
+step are usually better served by a subscription, and a warning is issued the
+first time such a pattern is detected for a getter.
+
+Accounting is enabled with the ``traci_stats`` attribute of SumoParams, in
+which case the statistics are available from the ``traci_stats`` attribute of
+the kernel.
+
+Usage
+    >>> connection = TraCIStats(traci.connect(port))
+    >>> ...  # run the simulation through the connection
+    >>> connection.summary()["calls"]  # mean number of calls per step
+"""
+
+import collections
+import warnings
+
+import numpy as np
+
+# number of distinct objects (e.g. vehicles) a getter may be called for in a
+# single step before a per-vehicle call pattern is reported
+PER_VEHICLE_THRESHOLD = 20
+
+# commands reading subscription results, which are not sent to sumo
+_SUBSCRIPTION_COMMANDS = {"getSubscriptionResults",
+                          "getAllSubscriptionResults",
+                          "getContextSubscriptionResults",
+                          "getAllContextSubscriptionResults"}
+
+# counters of a step
+_COUNTERS = ["calls", "round_trips", "bytes_sent", "bytes_received"]
+
+
+class TraCIStats(object):
+    """Proxy of a TraCI connection counting the calls made through it.
+
+    Commands of the connection (e.g. ``simulationStep``) and of its domains
+    (e.g. ``vehicle.getSpeed``) are forwarded to the connection, and counted.
+    If the connection communicates with sumo through a socket (i.e. it is not
+    a replayed trace), the round trips and bytes exchanged are counted as
+    well.
+
+    Attributes
+    ----------
+    totals : collections.Counter
+        number of calls to every command since the connection was opened, by
+        name, e.g. "vehicle.getSpeed"
+    steps : collections.deque
+        statistics of the last steps, see ``step_stats``
+    per_vehicle_commands : dict
+        largest number of distinct objects every getter was called for in a
+        single step, for the getters that exceeded the threshold
+    """
+
+    def __init__(self, connection, window=100,
+                 per_vehicle_threshold=PER_VEHICLE_THRESHOLD):
+        """Instantiate the proxy.
+
+        Parameters
+        ----------
+        connection : traci.connection.Connection
+            the connection, or another proxy of a connection (e.g. a
+            TraCIRecorder)
+        window : int
+            number of steps whose statistics are kept
+        per_vehicle_threshold : int
+            number of distinct objects a getter may be called for in a single
+            step before a per-vehicle call pattern is reported
+        """
+        self._connection = connection
+        self._domains = {}
+        self.window = window
+        self.per_vehicle_threshold = per_vehicle_threshold
+
+        self.totals = collections.Counter()
+        self.steps = collections.deque(maxlen=window)
+        self.per_vehicle_commands = {}
+        self.num_steps = 0
+
+        # counters of the current step
+        self._step = dict.fromkeys(_COUNTERS, 0)
+        self._commands = collections.Counter()
+        self._objects = collections.defaultdict(set)
+
+        # count the bytes exchanged through the socket of the connection, or
+        # of the connection wrapped by another proxy
+        inner = connection.__dict__.get("_connection", connection)
+        socket = getattr(inner, "_socket", None)
+        self.measures_bytes = socket is not None
+        if socket is not None:
+            inner._socket = _CountingSocket(socket, self._step)
+
+    def __getattr__(self, name):
+        """Return a counting proxy of a command or domain."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._connection, name)
+        if callable(attr):
+            return self._wrap(name, attr)
+        if name not in self._domains:
+            self._domains[name] = _CountingDomain(self, name, attr)
+        return self._domains[name]
+
+    def simulationStep(self, *args, **kwargs):
+        """Advance the simulation, and start a new step."""
+        try:
+            return self._call("simulationStep",
+                              self._connection.simulationStep, args, kwargs)
+        finally:
+            self.end_step()
+
+    def end_step(self):
+        """Store the statistics of the current step, and start a new one."""
+        stats = dict(self._step)
+        stats["commands"] = self._commands
+        self.steps.append(stats)
+        self.totals.update(self._commands)
+        self.num_steps += 1
+
+        for name, objects in self._objects.items():
+            if len(objects) < self.per_vehicle_threshold:
+                continue
+            if name not in self.per_vehicle_commands:
+                warnings.warn(
+                    "{} was called for {} different objects in a single "
+                    "step. Consider subscribing to the variable instead."
+                    .format(name, len(objects)))
+            self.per_vehicle_commands[name] = max(
+                len(objects), self.per_vehicle_commands.get(name, 0))
+
+        for key in _COUNTERS:
+            self._step[key] = 0
+        self._commands = collections.Counter()
+        self._objects.clear()
+
+    def step_stats(self):
+        """Return the statistics of the last step.
+
+        Returns
+        -------
+        dict
+            number of "calls", "round_trips" to sumo, "bytes_sent" and
+            "bytes_received" during the step, and the number of calls to
+            every command ("commands"), or None if no step was taken yet
+        """
+        return self.steps[-1] if self.steps else None
+
+    def summary(self):
+        """Return the rolling statistics of the last steps.
+
+        Returns
+        -------
+        dict
+            * "num_steps": number of steps the statistics are computed over
+            * "calls", "round_trips", "bytes_sent", "bytes_received": mean
+              and max ("<name>_max") of the counters of a step
+            * "commands": mean number of calls per step to every command
+            * "domains": mean number of calls per step to every domain, e.g.
+              "vehicle", or "connection" for the commands of the connection
+        """
+        num_steps = len(self.steps)
+        summary = {"num_steps": num_steps}
+        for key in _COUNTERS:
+            values = [stats[key] for stats in self.steps] or [0]
+            summary[key] = float(np.mean(values))
+            summary[key + "_max"] = int(np.max(values))
+
+        commands = collections.Counter()
+        for stats in self.steps:
+            commands.update(stats["commands"])
+        domains = collections.Counter()
+        for name, count in commands.items():
+            domain = name.split(".")[0] if "." in name else "connection"
+            domains[domain] += count
+        summary["commands"] = {name: count / num_steps
+                               for name, count in commands.items()}
+        summary["domains"] = {name: count / num_steps
+                              for name, count in domains.items()}
+        return summary
+
+    def _wrap(self, name, method):
+        """Return a function calling and counting a command."""
+        command = name.rsplit(".", 1)[-1]
+        # getters sent to sumo, whose first argument is the id of an object
+        getter = command.startswith("get") and \
+            command not in _SUBSCRIPTION_COMMANDS
+
+        def _command(*args, **kwargs):
+            if getter and args and isinstance(args[0], str):
+                self._objects[name].add(args[0])
+            return self._call(name, method, args, kwargs)
+        return _command
+
+    def _call(self, name, method, args, kwargs):
+        """Call a command, and count the call."""
+        self._step["calls"] += 1
+        self._commands[name] += 1
+        return method(*args, **kwargs)
+
+
+class _CountingDomain(object):
+    """Proxy of a domain of a TraCI connection counting all calls."""
+
+    def __init__(self, stats, name, domain):
+        self._stats = stats
+        self._name = name
+        self._domain = domain
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._domain, name)
+        if not callable(attr):
+            return attr
+        command = self._stats._wrap("{}.{}".format(self._name, name), attr)
+        # cache the wrapper for the next calls to the command
+        setattr(self, name, command)
+        return command
+
+
+class _CountingSocket(object):
+    """Proxy of the socket of a TraCI connection counting the bytes."""
+
+    def __init__(self, socket, counters):
+        self._socket = socket
+        self._counters = counters
+
+    def send(self, data, *args):
+        # traci sends every command (or batch of commands) in a single call
+        self._counters["round_trips"] += 1
+        sent = self._socket.send(data, *args)
+        self._counters["bytes_sent"] += sent
+        return sent
+
+    def recv(self, size, *args):
+        data = self._socket.recv(size, *args)
+        self._counters["bytes_received"] += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._socket, name)
@@ -0,0 +1,341 @@
+"""Recording and replay of TraCI sessions.
+
+``TraCIRecorder`` wraps a TraCI connection, and logs every call made through
+it (the name of the called command, its arguments, and its result or the
+exception it raised) to a binary trace. ``TraCIReplay`` is a connection that
+serves the calls of a trace back in the same order, without a sumo process,
+so that a run can be reproduced deterministically, e.g. to debug an
+environment or profile the kernel at memory speed.
+
+Recording and replay are enabled with the ``traci_record_path`` and
+``traci_replay_path`` attributes of SumoParams. A replay only matches the
+recorded run if the environment issues the same calls, i.e. if it is seeded
+the same way as the recorded run.
+
+A trace starts with the TRACE_MAGIC bytes, followed by frames, each made up of
+the length of its data (4 bytes, little-endian) and the data itself, the
+zlib-compressed pickles of the calls made since the previous frame. A frame
+is written after every simulation step, so that a trace is complete up to the
+last step even if the process was killed. Every call is pickled as soon as it
+returns, since callers may modify the results (e.g. subscription results), as
+a tuple (name, args, kwargs, error, result), where name is e.g.
+"vehicle.getSpeed" for a command of a domain, or "simulationStep" for a
+command of the connection.
+
+Usage
+    >>> connection = TraCIRecorder(traci.connect(port), "run.trace")
+    >>> ...  # run the simulation through the connection
+    >>> connection.close()
+    >>> replay = TraCIReplay(TraCITraceReader("run.trace"))
+    >>> replay.vehicle.getSpeed("human_0")  # recorded result
+"""
+
+import io
+import pickle
+import struct
+import zlib
+
+from flow.utils.exceptions import FatalFlowError
+
+# first bytes of a trace
+TRACE_MAGIC = b"FLOWTRACI1\n"
+
+# header of a frame: length of its data
+_FRAME_HEADER = struct.Struct("<I")
+
+# name of the call marking the start of a connection in a trace
+_CONNECT = "__connect__"
+
+
+class TraceMismatchError(FatalFlowError):
+    """Error raised when a replayed call does not match the trace."""
+
+    pass
+
+
+class TraCIRecorder(object):
+    """Proxy of a TraCI connection recording all calls to a trace.
+
+    Commands of the connection (e.g. ``simulationStep``) and of its domains
+    (e.g. ``vehicle.getSpeed``) are forwarded to the connection, and recorded
+    along with their results. Attributes that are neither commands nor
+    domains are returned without being recorded.
+    """
+
+    def __init__(self, connection, path, append=False):
+        """Instantiate the recorder.
+
+        Parameters
+        ----------
+        connection : traci.connection.Connection
+            the recorded connection
+        path : str
+            path of the trace
+        append : bool
+            specifies whether to append the calls to an existing trace, e.g.
+            when the simulation is restarted, instead of overwriting it
+        """
+        self._connection = connection
+        self._file = open(path, "ab" if append else "wb")
+        if self._file.tell() == 0:
+            self._file.write(TRACE_MAGIC)
+        self._calls = [pickle.dumps((_CONNECT, (), {}, False, None),
+                                    protocol=4)]
+        self._domains = {}
+        # number of calls recorded, and of bytes written to the trace
+        self.num_calls = 0
+        self.num_bytes = self._file.tell()
+
+    def __getattr__(self, name):
+        """Return a recording proxy of a command or domain."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._connection, name)
+        if callable(attr):
+            return self._wrap(name, attr)
+        if name not in self._domains:
+            self._domains[name] = _RecordingDomain(self, name, attr)
+        return self._domains[name]
+
+    def simulationStep(self, *args, **kwargs):
+        """Advance the simulation, and write the calls of the step."""
+        result = self._call("simulationStep",
+                            self._connection.simulationStep, args, kwargs)
+        self.flush()
+        return result
+
+    def close(self, *args, **kwargs):
+        """Close the connection and the trace."""
+        try:
+            return self._call("close", self._connection.close, args, kwargs)
+        finally:
+            self.flush()
+            self._file.close()
+
+    def flush(self):
+        """Write the calls recorded since the last flush to the trace."""
+        if not self._calls or self._file.closed:
+            return
+        data = zlib.compress(b"".join(self._calls))
+        self._file.write(_FRAME_HEADER.pack(len(data)))
+        self._file.write(data)
+        self._file.flush()
+        self.num_bytes += _FRAME_HEADER.size + len(data)
+        self._calls = []
+
+    def _wrap(self, name, method):
+        """Return a function calling and recording a command."""
+        def _command(*args, **kwargs):
+            return self._call(name, method, args, kwargs)
+        return _command
+
+    def _call(self, name, method, args, kwargs):
+        """Call a command, and record the call."""
+        self.num_calls += 1
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            self._calls.append(pickle.dumps((name, args, kwargs, True, e),
+                                            protocol=4))
+            raise
+        self._calls.append(pickle.dumps((name, args, kwargs, False, result),
+                                        protocol=4))
+        return result
+
+
+class _RecordingDomain(object):
+    """Proxy of a domain of a TraCI connection recording all calls."""
+
+    def __init__(self, recorder, name, domain):
+        self._recorder = recorder
+        self._name = name
+        self._domain = domain
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._domain, name)
+        if not callable(attr):
+            return attr
+        command = self._recorder._wrap("{}.{}".format(self._name, name), attr)
+        # cache the wrapper for the next calls to the command
+        setattr(self, name, command)
+        return command
+
+
+class TraCITraceReader(object):
+    """Sequential reader of the calls of a trace.
+
+    Several replay connections may share a reader, e.g. when the simulation
+    is restarted, in which case each connection replays the calls that were
+    recorded through the matching connection.
+    """
+
+    def __init__(self, path):
+        """Open a trace.
+
+        Parameters
+        ----------
+        path : str
+            path of the trace
+
+        Raises
+        ------
+        ValueError
+            if the file is not a trace
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        if self._file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            self._file.close()
+            raise ValueError("{} is not a TraCI trace.".format(path))
+        self._calls = []
+        self._index = 0
+        # number of calls read so far
+        self.num_calls = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """Return the next call of the trace.
+
+        Raises
+        ------
+        StopIteration
+            if all calls were read
+        """
+        while self._index == len(self._calls):
+            if self._file.closed:
+                raise StopIteration
+            header = self._file.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size:
+                self._file.close()
+                raise StopIteration
+            data = zlib.decompress(
+                self._file.read(_FRAME_HEADER.unpack(header)[0]))
+            frame = io.BytesIO(data)
+            self._calls = []
+            while frame.tell() < len(data):
+                self._calls.append(pickle.load(frame))
+            self._index = 0
+        call = self._calls[self._index]
+        self._index += 1
+        self.num_calls += 1
+        return call
+
+    def close(self):
+        """Close the trace."""
+        self._file.close()
+
+
+class TraCIReplay(object):
+    """TraCI connection replaying the calls of a trace.
+
+    Every call made to the connection (or its domains) returns the result of
+    the next call of the trace, or raises the exception it raised, after
+    checking that the same command is called. Nothing is sent to sumo.
+    """
+
+    def __init__(self, reader, check_args=True):
+        """Instantiate the connection.
+
+        Parameters
+        ----------
+        reader : TraCITraceReader
+            reader of the trace, positioned at the start of a connection
+        check_args : bool
+            specifies whether to check that the arguments of every call match
+            the trace, in addition to the name of the called command
+
+        Raises
+        ------
+        TraceMismatchError
+            if the reader is not positioned at the start of a connection
+        """
+        self._reader = reader
+        self._check_args = check_args
+        self._closed = False
+        self._names = {}
+        # number of replayed calls
+        self.num_calls = 0
+        self._next(_CONNECT, (), {})
+
+    def __getattr__(self, name):
+        """Return a replayed command or domain."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._names:
+            self._names[name] = _ReplayName(self, name)
+        return self._names[name]
+
+    def _next(self, name, args, kwargs):
+        """Replay the next call of the trace.
+
+        Raises
+        ------
+        TraceMismatchError
+            if the trace ended, or its next call does not match this call
+        """
+        if self._closed:
+            if name == "close":
+                # like traci, closing a closed connection does nothing
+                return None
+            raise TraceMismatchError(
+                "Call to {} after the connection was closed.".format(name))
+        try:
+            call = next(self._reader)
+        except StopIteration:
+            raise TraceMismatchError(
+                "Call to {} after the end of the trace.".format(name))
+
+        recorded_name, recorded_args, recorded_kwargs, error, result = call
+        if recorded_name != name or (self._check_args and not (
+                _equal(recorded_args, args) and
+                _equal(recorded_kwargs, kwargs))):
+            raise TraceMismatchError(
+                "Call {} of {}: expected {}(*{}, **{}), got {}(*{}, **{})."
+                .format(self._reader.num_calls, self._reader.path,
+                        recorded_name, recorded_args, recorded_kwargs, name,
+                        args, kwargs))
+
+        self.num_calls += 1
+        if name == "close":
+            self._closed = True
+        if error:
+            raise result
+        return result
+
+
+class _ReplayName(object):
+    """Command or domain of a replay connection."""
+
+    def __init__(self, replay, name):
+        self._replay = replay
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        return self._replay._next(self._name, args, kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        command = _ReplayName(self._replay, "{}.{}".format(self._name, name))
+        setattr(self, name, command)
+        return command
+
+
+def _equal(recorded, value):
+    """Return whether a recorded value matches a value.
+
+    Values that cannot be compared with == (e.g. containing NumPy arrays) are
+    compared through their pickles.
+    """
+    if recorded is value:
+        return True
+    try:
+        return bool(recorded == value)
+    except ValueError:
+        # comparing arrays is ambiguous
+        return pickle.dumps(recorded, protocol=4) == \
+            pickle.dumps(value, protocol=4)
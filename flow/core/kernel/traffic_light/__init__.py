@@ -1,4 +1,7 @@
 from flow.core.kernel.traffic_light.base import KernelTrafficLight
 from flow.core.kernel.traffic_light.traci import TraCITrafficLight
+from flow.core.kernel.traffic_light.ring import RingTrafficLight
+from flow.core.kernel.traffic_light.ctm import CTMTrafficLight
 
-__all__ = ["KernelTrafficLight", "TraCITrafficLight"]
+__all__ = ["KernelTrafficLight", "TraCITrafficLight", "RingTrafficLight",
+           "CTMTrafficLight"]
@@ -0,0 +1,68 @@
+"""Script containing the traffic light kernel of the cell transmission model.
+"""
+
+from flow.core.kernel.traffic_light import KernelTrafficLight
+
+
+class CTMTrafficLight(KernelTrafficLight):
+    """Traffic light kernel for the macroscopic cell transmission model.
+
+    Lanes are not modeled individually, so the state of a traffic light acts
+    on all edges leaving its node: the flow entering these edges is scaled by
+    the fraction of green links ("G" or "g") in the state.
+
+    Extends flow.core.kernel.traffic_light.KernelTrafficLight
+    """
+
+    def __init__(self, master_kernel):
+        """See parent class."""
+        KernelTrafficLight.__init__(self, master_kernel)
+
+        self.__ids = []
+        self.__states = {}
+        self.num_traffic_lights = 0
+
+    def pass_api(self, kernel_api):
+        """See parent class.
+
+        The traffic lights of the scenario are collected here, and initialized
+        to the first phase of their program (if specified).
+        """
+        KernelTrafficLight.pass_api(self, kernel_api)
+
+        scenario = self.master_kernel.scenario
+        properties = scenario.network.traffic_lights.get_properties()
+        self.__ids = list(properties.keys())
+        self.num_traffic_lights = len(self.__ids)
+        self.__states = {}
+        for node_id, props in properties.items():
+            phases = props.get("phases")
+            if phases:
+                self.set_state(node_id, phases[0]["state"])
+
+    def update(self, reset):
+        """See parent class.
+
+        Traffic lights only change state through ``set_state``.
+        """
+        pass
+
+    def get_ids(self):
+        """See parent class."""
+        return self.__ids
+
+    def set_state(self, node_id, state, link_index="all"):
+        """See parent class."""
+        if link_index != "all":
+            links = list(self.__states[node_id])
+            links[link_index] = state
+            state = "".join(links)
+        self.__states[node_id] = state
+
+        green = sum(link in "Gg" for link in state) / max(len(state), 1)
+        for edge in self.master_kernel.scenario.outgoing_edges(node_id):
+            self.kernel_api.set_supply_factor(edge, green)
+
+    def get_state(self, node_id):
+        """See parent class."""
+        return self.__states[node_id]
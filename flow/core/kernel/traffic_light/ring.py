@@ -0,0 +1,43 @@
+"""Script containing the traffic light kernel of the NumPy ring simulator."""
+
+from flow.core.kernel.traffic_light import KernelTrafficLight
+
+
+class RingTrafficLight(KernelTrafficLight):
+    """Traffic light kernel for the NumPy ring simulator.
+
+    Rings do not contain any intersections, and therefore any traffic lights,
+    so this kernel is empty.
+
+    Extends flow.core.kernel.traffic_light.KernelTrafficLight
+    """
+
+    def update(self, reset):
+        """See parent class."""
+        pass
+
+    def get_ids(self):
+        """See parent class."""
+        return []
+
+    def set_state(self, node_id, state, link_index="all"):
+        """See parent class.
+
+        Raises
+        ------
+        KeyError
+            since there are no traffic lights in the network
+        """
+        raise KeyError(
+            'Node {} does not have a traffic light.'.format(node_id))
+
+    def get_state(self, node_id):
+        """See parent class.
+
+        Raises
+        ------
+        KeyError
+            since there are no traffic lights in the network
+        """
+        raise KeyError(
+            'Node {} does not have a traffic light.'.format(node_id))
@@ -1,4 +1,6 @@
 from flow.core.kernel.vehicle.base import KernelVehicle
 from flow.core.kernel.vehicle.traci import TraCIVehicle
+from flow.core.kernel.vehicle.ring import RingVehicle
+from flow.core.kernel.vehicle.ctm import CTMVehicle
 
-__all__ = ['KernelVehicle', 'TraCIVehicle']
+__all__ = ['KernelVehicle', 'TraCIVehicle', 'RingVehicle', 'CTMVehicle']
@@ -1,5 +1,9 @@
 """Script containing the base vehicle kernel class."""
 
+import numpy as np
+
+from flow.core.accumulators import RingBuffer
+
 
 class KernelVehicle(object):
     """Flow vehicle kernel.
@@ -52,6 +56,56 @@ class KernelVehicle(object):
         self.kernel_api = None
         self.sim_step = sim_params.sim_step
 
+        # contains the parameters associated with each type of vehicle
+        self.type_parameters = {}
+
+        # rolling histories of vehicle attributes, indexed by (attribute,
+        # window) and then by vehicle id (see get_history)
+        self._histories = {}
+
+        # segment aggregates computed since the last update, indexed by
+        # (edge, number of segments)
+        self._segment_totals = {}
+
+    def build_controller(self, veh_id, veh_type, key):
+        """Instantiate a controller of a vehicle from its type parameters.
+
+        Vehicle kernels construct the controllers of vehicles lazily via this
+        method, the first time they are requested, so that vehicles whose
+        controllers are never queried (e.g. vehicles controlled by the
+        simulator) do not incur the cost of constructing them.
+
+        Parameters
+        ----------
+        veh_id : str
+            vehicle identifier
+        veh_type : str
+            type of the vehicle, as specified in ``self.type_parameters``
+        key : str
+            one of "acc_controller", "lane_changer", or "router"
+
+        Returns
+        -------
+        flow.controllers.base_controller.BaseController or None
+            the controller of the vehicle, or None if the vehicle does not have
+            a routing controller
+        """
+        type_params = self.type_parameters[veh_type]
+        if key == "acc_controller":
+            controller = type_params["acceleration_controller"]
+            return controller[0](
+                veh_id,
+                car_following_params=type_params["car_following_params"],
+                **controller[1])
+        elif key == "lane_changer":
+            controller = type_params["lane_change_controller"]
+            return controller[0](veh_id=veh_id, **controller[1])
+        else:
+            controller = type_params["routing_controller"]
+            if controller is None:
+                return None
+            return controller[0](veh_id=veh_id, router_params=controller[1])
+
     def pass_api(self, kernel_api):
         """Acquire the kernel api that was generated by the simulation kernel.
 
@@ -80,6 +134,25 @@ class KernelVehicle(object):
         """
         raise NotImplementedError
 
+    def synchronize(self, num_steps=1):
+        """Match the vehicles in the kernel with those in the simulator.
+
+        This is meant to be called before ``update`` whenever the simulation
+        was advanced by several steps without the kernel being updated in
+        between (see ``KernelSimulation.simulation_step``), so that vehicles
+        that entered or exited the network during the skipped steps are added
+        to or removed from the kernel. The departure and arrival histories are
+        padded with one empty entry for every skipped step but the last, which
+        is recorded by ``update``, so that inflow and outflow rates are still
+        computed over the time that elapsed in the simulation.
+
+        Parameters
+        ----------
+        num_steps : int
+            number of steps the simulation was advanced by
+        """
+        raise NotImplementedError
+
     def add(self, veh_id, type_id, route_id, pos, lane, speed):
         """Add a vehicle to the network.
 
@@ -260,6 +333,171 @@ class KernelVehicle(object):
         """
         raise NotImplementedError
 
+    def get_history(self, veh_id, window, attr="speed"):
+        """Return the rolling history of an attribute of a vehicle.
+
+        Histories are only maintained for the vehicles and attributes that are
+        requested: the first call for a given vehicle, attribute, and window
+        creates a buffer containing the current value of the attribute, which
+        is then appended to after every simulation step (see
+        update_aggregates) until the vehicle leaves the network. Controllers
+        requesting the same history share the same buffer.
+
+        Parameters
+        ----------
+        veh_id : str
+            vehicle id
+        window : int
+            number of most recent values kept in the history
+        attr : str, optional
+            name of the attribute, such that ``get_<attr>`` is a getter of the
+            kernel accepting lists of vehicle ids, e.g. "speed" or "headway"
+
+        Returns
+        -------
+        flow.core.accumulators.RingBuffer
+            history of the attribute, with its running mean and variance. The
+            buffer should not be modified by the caller.
+        """
+        buffers = self._histories.setdefault((attr, window), {})
+        history = buffers.get(veh_id)
+        if history is None:
+            history = RingBuffer(window)
+            history.push(getattr(self, "get_" + attr)(veh_id))
+            buffers[veh_id] = history
+        return history
+
+    def update_aggregates(self, reset):
+        """Update the state derived from the vehicles after a simulation step.
+
+        This is called by the master kernel after every update of the vehicle
+        kernel. The current values of the attributes are appended to their
+        histories (see get_history), and the cached segment aggregates (see
+        get_segment_counts) are discarded. Histories of vehicles that left the
+        network are discarded, and all histories are discarded when the
+        simulation is reset.
+
+        Parameters
+        ----------
+        reset : bool
+            specifies whether the simulator was reset in the last simulation
+            step
+        """
+        self._segment_totals.clear()
+
+        if reset:
+            self._histories.clear()
+            return
+        if not self._histories:
+            return
+
+        present = set(self.get_ids())
+        for (attr, _), buffers in self._histories.items():
+            for veh_id in [veh_id for veh_id in buffers
+                           if veh_id not in present]:
+                del buffers[veh_id]
+            if buffers:
+                values = getattr(self, "get_" + attr)(list(buffers.keys()))
+                for history, value in zip(buffers.values(), values):
+                    history.push(value)
+
+    def get_speed_distribution(self):
+        """Return the speeds in the network, with the number of vehicles.
+
+        For simulators with individual vehicles, these are the speeds of all
+        vehicles (in the order of get_ids), each of which accounts for a
+        single vehicle. Simulators without individual vehicles (e.g.
+        macroscopic ones) may instead return the speeds of groups of vehicles,
+        along with the (possibly fractional) number of vehicles in each group.
+
+        Returns
+        -------
+        numpy ndarray (float)
+            speeds, in m/s
+        numpy ndarray (float)
+            number of vehicles at each speed
+        numpy ndarray (str)
+            edge of each speed
+        """
+        ids = self.get_ids()
+        speeds = np.asarray(self.get_speed(ids), dtype=float).reshape(-1)
+        edges = np.array(self.get_edge(ids), dtype=object).reshape(-1)
+        return speeds, np.ones(len(speeds)), edges
+
+    def get_segment_counts(self, edge, num_segments=1):
+        """Return the number of vehicles in each segment and lane of an edge.
+
+        The edge is split into ``num_segments`` segments of equal length.
+        Simulators without individual vehicles (e.g. macroscopic ones) may
+        return fractional numbers of vehicles. Segment aggregates are computed
+        at most once per simulation step, so that several controllers may
+        request them at no additional cost.
+
+        Parameters
+        ----------
+        edge : str
+            name of the edge
+        num_segments : int, optional
+            number of segments the edge is split into
+
+        Returns
+        -------
+        numpy ndarray (float)
+            number of vehicles in each segment (first dimension) and lane
+            (second dimension) of the edge
+        """
+        return self._get_cached_segment_totals(edge, num_segments)[0]
+
+    def get_segment_densities(self, edge, num_segments=1):
+        """Return the density (in veh/m) in each segment and lane of an edge.
+
+        See get_segment_counts.
+        """
+        segment_length = \
+            self.master_kernel.scenario.edge_length(edge) / num_segments
+        return self.get_segment_counts(edge, num_segments) / segment_length
+
+    def get_segment_speeds(self, edge, num_segments=1):
+        """Return the mean speed in each segment and lane of an edge.
+
+        Segments and lanes without vehicles have a mean speed of zero. See
+        get_segment_counts.
+        """
+        counts, speeds = self._get_cached_segment_totals(edge, num_segments)
+        return np.divide(speeds, counts, out=np.zeros_like(speeds),
+                         where=counts > 0)
+
+    def _get_cached_segment_totals(self, edge, num_segments):
+        """Return the segment totals of an edge, computed once per step."""
+        totals = self._segment_totals.get((edge, num_segments))
+        if totals is None:
+            totals = self._get_segment_totals(edge, num_segments)
+            self._segment_totals[edge, num_segments] = totals
+        return totals
+
+    def _get_segment_totals(self, edge, num_segments):
+        """Return the number and the sum of speeds of vehicles per segment.
+
+        This is computed from the states of individual vehicles, and may be
+        overridden by simulators with a cheaper aggregate representation.
+        """
+        scenario = self.master_kernel.scenario
+        shape = (num_segments, scenario.num_lanes(edge))
+        counts = np.zeros(shape)
+        speeds = np.zeros(shape)
+
+        ids = self.get_ids_by_edge(edge)
+        if len(ids) > 0:
+            segment_length = scenario.edge_length(edge) / num_segments
+            pos = np.asarray(self.get_position(ids), dtype=float)
+            segment = np.clip((pos // segment_length).astype(int), 0,
+                              num_segments - 1)
+            lane = np.asarray(self.get_lane(ids), dtype=int)
+            np.add.at(counts, (segment, lane), 1)
+            np.add.at(speeds, (segment, lane), self.get_speed(ids))
+
+        return counts, speeds
+
     def get_inflow_rate(self, time_span):
         """Return the inflow rate (in veh/hr) of vehicles from the network.
 
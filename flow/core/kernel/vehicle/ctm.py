@@ -0,0 +1,339 @@
+"""Script containing the vehicle kernel of the cell transmission model."""
+
+from copy import deepcopy
+
+import numpy as np
+
+from flow.core.kernel.vehicle import KernelVehicle
+
+
+class CTMVehicle(KernelVehicle):
+    """Flow vehicle kernel for the macroscopic cell transmission model.
+
+    The cell transmission model does not keep track of individual vehicles:
+    vehicles added to the network are merged into the density of the cell
+    they are placed in, and leave the kernel's list of ids. Accordingly, all
+    per-vehicle getters return their error value, and network-level
+    information is available through the aggregate getters, i.e. the
+    inflow/outflow rates, the number of arrived vehicles, and the
+    segment-level counts, densities, and speeds (see ``get_segment_counts``).
+
+    Extends flow.core.kernel.vehicle.base.KernelVehicle
+    """
+
+    def __init__(self,
+                 master_kernel,
+                 sim_params):
+        """See parent class."""
+        KernelVehicle.__init__(self, master_kernel, sim_params)
+
+        # total (possibly fractional) number of vehicles in the network,
+        # rounded to the closest integer
+        self.num_vehicles = 0
+        self.num_rl_vehicles = 0
+        self.minGap = {}
+        self.time_counter = 0
+
+        self._num_departed = []
+        self._num_arrived = []
+
+    def initialize(self, vehicles):
+        """Initialize vehicle state information.
+
+        See flow.core.kernel.vehicle.traci.TraCIVehicle.initialize.
+        """
+        self.type_parameters = deepcopy(vehicles.type_parameters)
+        self.minGap = dict(vehicles.minGap)
+        self.num_vehicles = 0
+        self.num_rl_vehicles = 0
+        self._num_departed = []
+        self._num_arrived = []
+
+    def update(self, reset):
+        """See parent class."""
+        sim = self.kernel_api
+        if reset:
+            self.time_counter = 0
+            self._num_departed.clear()
+            self._num_arrived.clear()
+        else:
+            self.time_counter += 1
+            self._num_departed.append(sim.num_departed)
+            self._num_arrived.append(sim.num_arrived)
+
+        self.num_vehicles = int(round(sim.num.sum()))
+
+    def synchronize(self, num_steps=1):
+        """See parent class.
+
+        There are no individual vehicles to synchronize, so only the histories
+        are padded. The flows of all skipped steps are accumulated by the
+        simulator, and recorded by ``update``.
+        """
+        for _ in range(num_steps - 1):
+            self.time_counter += 1
+            self._num_departed.append(0.)
+            self._num_arrived.append(0.)
+
+    def add(self, veh_id, type_id, route_id, pos, lane, speed):
+        """See parent class.
+
+        The vehicle is added to the density of the cell at its position. Its
+        type, lane, and speed are ignored.
+        """
+        self.master_kernel.metrics.invalidate()
+        edge = route_id[len("route"):] if route_id.startswith("route") \
+            else self.master_kernel.scenario.rts[route_id][0]
+        self.kernel_api.add(edge, float(pos))
+
+    def remove(self, veh_id):
+        """See parent class.
+
+        Vehicles are not tracked individually, so this does nothing.
+        """
+        pass
+
+    def apply_acceleration(self, veh_ids, acc):
+        """See parent class."""
+        pass
+
+    def apply_lane_change(self, veh_ids, direction):
+        """See parent class."""
+        if any(d not in [-1, 0, 1] for d in direction):
+            raise ValueError("Direction values for lane changes may only "
+                             "be: -1, 0, or 1.")
+
+    def choose_routes(self, veh_ids, route_choices):
+        """See parent class."""
+        pass
+
+    def set_max_speed(self, veh_id, max_speed):
+        """See parent class."""
+        pass
+
+    ###########################################################################
+    # Methods to visually distinguish vehicles by {RL, observed, unobserved}  #
+    ###########################################################################
+
+    def update_vehicle_colors(self):
+        """See parent class."""
+        pass
+
+    def set_observed(self, veh_id):
+        """See parent class."""
+        pass
+
+    def remove_observed(self, veh_id):
+        """See parent class."""
+        pass
+
+    def get_observed_ids(self):
+        """See parent class."""
+        return []
+
+    def get_color(self, veh_id):
+        """See parent class."""
+        return None
+
+    def set_color(self, veh_id, color):
+        """See parent class."""
+        pass
+
+    ###########################################################################
+    #                        State acquisition methods                        #
+    ###########################################################################
+
+    def get_orientation(self, veh_id):
+        """See parent class."""
+        return self._error(veh_id, -1001)
+
+    def get_timestep(self, veh_id):
+        """See parent class."""
+        return self._error(veh_id, -1001)
+
+    def get_timedelta(self, veh_id):
+        """See parent class."""
+        return self._error(veh_id, -1001)
+
+    def get_type(self, veh_id):
+        """See parent class."""
+        return self._error(veh_id, "")
+
+    def get_ids(self):
+        """See parent class."""
+        return []
+
+    def get_human_ids(self):
+        """See parent class."""
+        return []
+
+    def get_controlled_ids(self):
+        """See parent class."""
+        return []
+
+    def get_controlled_lc_ids(self):
+        """See parent class."""
+        return []
+
+    def get_rl_ids(self):
+        """See parent class."""
+        return []
+
+    def get_ids_by_edge(self, edges):
+        """See parent class."""
+        return []
+
+    def get_inflow_rate(self, time_span):
+        """See parent class."""
+        if len(self._num_departed) == 0:
+            return 0
+        num_inflow = self._num_departed[-int(time_span / self.sim_step):]
+        return 3600 * sum(num_inflow) / (len(num_inflow) * self.sim_step)
+
+    def get_outflow_rate(self, time_span):
+        """See parent class."""
+        if len(self._num_arrived) == 0:
+            return 0
+        num_outflow = self._num_arrived[-int(time_span / self.sim_step):]
+        return 3600 * sum(num_outflow) / (len(num_outflow) * self.sim_step)
+
+    def get_num_arrived(self):
+        """See parent class.
+
+        This may be a fractional number of vehicles.
+        """
+        if len(self._num_arrived) > 0:
+            return self._num_arrived[-1]
+        else:
+            return 0
+
+    def get_arrived_ids(self):
+        """See parent class."""
+        return []
+
+    def get_departed_ids(self):
+        """See parent class."""
+        return []
+
+    def _get_segment_totals(self, edge, num_segments):
+        """See parent class.
+
+        Every cell is attributed to the segment containing its center, and its
+        vehicles are spread evenly across its lanes.
+        """
+        sim = self.kernel_api
+        cells, segment = sim.get_segments(edge, num_segments)
+        num_lanes = sim.lanes[cells.start]
+        num = sim.num[cells]
+        counts = np.bincount(segment, weights=num,
+                             minlength=num_segments) / num_lanes
+        speeds = np.bincount(segment, weights=num * sim.speed[cells],
+                             minlength=num_segments) / num_lanes
+
+        return (np.repeat(counts[:, np.newaxis], num_lanes, axis=1),
+                np.repeat(speeds[:, np.newaxis], num_lanes, axis=1))
+
+    def get_speed_distribution(self):
+        """See parent class.
+
+        These are the speeds of the cells that contain vehicles, along with
+        the number of vehicles in each of them.
+        """
+        sim = self.kernel_api
+        occupied = sim.num > 0
+        return (sim.speed[occupied], sim.num[occupied],
+                sim.cell_edge[occupied])
+
+    def _error(self, veh_id, error):
+        """Return the error value of a getter for one or several vehicles."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [error] * len(veh_id)
+        return error
+
+    def get_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_default_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_position(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_edge(self, veh_id, error=""):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_lane(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_route(self, veh_id, error=list()):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_length(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_leader(self, veh_id, error=""):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_follower(self, veh_id, error=""):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_headway(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_last_lc(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_acc_controller(self, veh_id, error=None):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_lane_changing_controller(self, veh_id, error=None):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_routing_controller(self, veh_id, error=None):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_lane_headways(self, veh_id, error=list()):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_lane_leaders_speed(self, veh_id, error=list()):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_lane_followers_speed(self, veh_id, error=list()):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_lane_leaders(self, veh_id, error=list()):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_lane_tailways(self, veh_id, error=list()):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_lane_followers(self, veh_id, error=list()):
+        """See parent class."""
+        return self._error(veh_id, error)
+
+    def get_x_by_id(self, veh_id):
+        """See parent class."""
+        return self._error(veh_id, 0.)
+
+    def get_max_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._error(veh_id, error)
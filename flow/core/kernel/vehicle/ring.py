@@ -0,0 +1,617 @@
+"""Script containing the vehicle kernel class of the NumPy ring simulator."""
+
+import collections
+from copy import deepcopy
+
+import numpy as np
+
+from flow.core.kernel.vehicle import KernelVehicle
+from flow.core.kernel.scenario.base import VEHICLE_LENGTH
+from flow.core.kernel.simulation.ring import CAR_FOLLOWING_MODELS
+from flow.controllers.car_following_models import SimCarFollowingController
+from flow.controllers.rlcontroller import RLController
+from flow.controllers.lane_change_controllers import SimLaneChangeController
+
+# colors for vehicles
+WHITE = (255, 255, 255)
+CYAN = (0, 255, 255)
+RED = (255, 0, 0)
+
+
+class RingVehicle(KernelVehicle):
+    """Flow vehicle kernel for the NumPy ring simulator.
+
+    The state of the vehicles is read directly from the arrays of the
+    simulator (see flow.core.kernel.simulation.ring.RingSimulator). The edge
+    and relative position of all vehicles are computed once per update.
+
+    Extends flow.core.kernel.vehicle.base.KernelVehicle
+    """
+
+    def __init__(self,
+                 master_kernel,
+                 sim_params):
+        """See parent class."""
+        KernelVehicle.__init__(self, master_kernel, sim_params)
+
+        self.__ids = []  # ids of all vehicles
+        self.__human_ids = []  # ids of human-driven vehicles
+        self.__controlled_ids = []  # ids of flow-controlled vehicles
+        self.__controlled_lc_ids = []  # ids of flow lc-controlled vehicles
+        self.__rl_ids = []  # ids of rl-controlled vehicles
+        self.__observed_ids = []  # ids of the observed vehicles
+
+        # vehicles: Key = Vehicle ID, Value = Dictionary describing the vehicle
+        self.__vehicles = collections.OrderedDict()
+
+        # type and route of vehicles that were added, but not yet inserted by
+        # the simulator
+        self._pending = {}
+
+        # edge and relative position of every vehicle in the current step
+        self._edges = {}
+        self._positions = {}
+        self._ids_by_edge = dict()
+
+        # car following parameters of each type of vehicle, as expected by the
+        # simulator
+        self._sim_params = {}
+
+        self.num_vehicles = 0
+        self.num_rl_vehicles = 0
+        self.minGap = {}
+        self.time_counter = 0
+
+        self._num_departed = []
+        self._departed_ids = []
+        self._num_arrived = []
+        self._arrived_ids = []
+
+    def initialize(self, vehicles):
+        """Initialize vehicle state information.
+
+        See flow.core.kernel.vehicle.traci.TraCIVehicle.initialize.
+        """
+        self.type_parameters = deepcopy(vehicles.type_parameters)
+        self.minGap = dict(vehicles.minGap)
+
+        self.__ids = []
+        self.__human_ids = []
+        self.__controlled_ids = []
+        self.__controlled_lc_ids = []
+        self.__rl_ids = []
+        self.__observed_ids = []
+        self.__vehicles = collections.OrderedDict()
+        self._pending = {}
+        self._edges = {}
+        self._positions = {}
+        self._ids_by_edge = dict()
+        self._sim_params = {}
+        self._num_departed = []
+        self._departed_ids = []
+        self._num_arrived = []
+        self._arrived_ids = []
+
+        self.num_vehicles = 0
+        self.num_rl_vehicles = 0
+
+    def update(self, reset):
+        """See parent class.
+
+        Vehicles that were inserted by the simulator in the last step are
+        added to the kernel, and the edges and relative positions of all
+        vehicles are recomputed.
+        """
+        sim = self.kernel_api
+
+        for veh_id in sim.departed_ids:
+            veh_type, route = self._pending.pop(veh_id)
+            if veh_id not in self.__vehicles:
+                self._add_departed(veh_id, veh_type)
+            self.__vehicles[veh_id]["route"] = route
+
+        if reset:
+            self.time_counter = 0
+            for veh_id in self.__rl_ids:
+                self.__vehicles[veh_id]["last_lc"] = -float("inf")
+            self._num_departed.clear()
+            self._num_arrived.clear()
+            self._departed_ids.clear()
+            self._arrived_ids.clear()
+        else:
+            self.time_counter += 1
+            self._num_departed.append(len(sim.departed_ids))
+            self._num_arrived.append(0)
+            self._departed_ids.append(list(sim.departed_ids))
+            self._arrived_ids.append([])
+
+        # compute the edge and relative position of all vehicles
+        scenario = self.master_kernel.scenario
+        self._edges = {}
+        self._positions = {}
+        self._ids_by_edge = dict()
+        for veh_id, ring, pos in zip(sim.ids, sim.ring.tolist(),
+                                     sim.ring_pos.tolist()):
+            edge, pos = scenario.edge_position(ring, pos)
+            self._edges[veh_id] = edge
+            self._positions[veh_id] = pos
+            self._ids_by_edge.setdefault(edge, []).append(veh_id)
+
+        # make sure the rl vehicle list is still sorted
+        self.__rl_ids.sort()
+
+    def synchronize(self, num_steps=1):
+        """See parent class.
+
+        Vehicles only enter or exit the ring simulator through ``add`` and
+        ``remove``, so only the histories need to be padded. The vehicles
+        inserted during the skipped steps are recorded by ``update``.
+        """
+        for _ in range(num_steps - 1):
+            self.time_counter += 1
+            self._num_departed.append(0)
+            self._num_arrived.append(0)
+            self._departed_ids.append([])
+            self._arrived_ids.append([])
+
+    def _add_departed(self, veh_id, veh_type):
+        """Add a vehicle that was inserted by the simulator.
+
+        Parameters
+        ----------
+        veh_id: str
+            name of the vehicle
+        veh_type: str
+            type of vehicle, as specified in the VehicleParams object
+        """
+        self.num_vehicles += 1
+        self.__ids.append(veh_id)
+        self.__vehicles[veh_id] = {
+            "type": veh_type,
+            "last_lc": -float("inf"),
+            "initial_speed": self.type_parameters[veh_type]["initial_speed"],
+        }
+
+        accel_controller = \
+            self.type_parameters[veh_type]["acceleration_controller"]
+        lc_controller = \
+            self.type_parameters[veh_type]["lane_change_controller"]
+        if accel_controller[0] == RLController:
+            self.__rl_ids.append(veh_id)
+            self.num_rl_vehicles += 1
+        else:
+            self.__human_ids.append(veh_id)
+            if accel_controller[0] != SimCarFollowingController:
+                self.__controlled_ids.append(veh_id)
+            if lc_controller[0] != SimLaneChangeController:
+                self.__controlled_lc_ids.append(veh_id)
+
+    def _get_sim_params(self, veh_type, speed_limit):
+        """Return the car following parameters of a type of vehicle.
+
+        Raises
+        ------
+        ValueError
+            if the car following model of the type is not supported
+        """
+        key = (veh_type, speed_limit)
+        if key not in self._sim_params:
+            type_params = self.type_parameters[veh_type]
+            cf_params = type_params["car_following_params"]
+            params = cf_params.controller_params
+            model = params["carFollowModel"]
+            if model not in CAR_FOLLOWING_MODELS:
+                raise ValueError(
+                    'Car following model "{}" is not supported by the ring '
+                    'simulator; must be one of {}.'.format(
+                        model, sorted(CAR_FOLLOWING_MODELS)))
+
+            self._sim_params[key] = {
+                "length": VEHICLE_LENGTH,
+                "accel": params["accel"],
+                "decel": params["decel"],
+                "tau": params["tau"],
+                "min_gap": self.minGap[veh_type],
+                "max_speed": min(params["maxSpeed"],
+                                 speed_limit * params["speedFactor"]),
+                "sigma": params["sigma"],
+                "model": CAR_FOLLOWING_MODELS[model],
+                "speed_mode": int(cf_params.speed_mode),
+            }
+
+        return self._sim_params[key]
+
+    def add(self, veh_id, type_id, route_id, pos, lane, speed):
+        """See parent class.
+
+        The route is expected to be named "route" followed by the name of
+        the starting edge, as is the case for the routes of a scenario.
+        """
+        self.master_kernel.metrics.invalidate()
+        edge = route_id[len("route"):]
+        scenario = self.master_kernel.scenario
+        ring, ring_pos = scenario.ring_position(edge, float(pos))
+        params = self._get_sim_params(type_id, scenario.speed_limit(edge))
+
+        self._pending[veh_id] = (type_id, scenario.rts[edge])
+        self.kernel_api.add(veh_id, ring, ring_pos, float(speed), params)
+
+    def remove(self, veh_id):
+        """See parent class."""
+        self.master_kernel.metrics.invalidate()
+        self.kernel_api.remove(veh_id)
+        self._pending.pop(veh_id, None)
+
+        if veh_id not in self.__vehicles:
+            return
+
+        del self.__vehicles[veh_id]
+        self.__ids.remove(veh_id)
+        self.num_vehicles -= 1
+
+        if veh_id in self.__human_ids:
+            self.__human_ids.remove(veh_id)
+            if veh_id in self.__controlled_ids:
+                self.__controlled_ids.remove(veh_id)
+            if veh_id in self.__controlled_lc_ids:
+                self.__controlled_lc_ids.remove(veh_id)
+        else:
+            self.__rl_ids.remove(veh_id)
+            self.num_rl_vehicles -= 1
+
+        if veh_id in self.__observed_ids:
+            self.__observed_ids.remove(veh_id)
+
+    def _get(self, name, veh_id, error):
+        """Return the value of a simulator array for one or more vehicles."""
+        index = self.kernel_api.index
+        values = getattr(self.kernel_api, name)
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [values[index[v]].item() if v in index else error
+                    for v in veh_id]
+        i = index.get(veh_id)
+        return error if i is None else values[i].item()
+
+    def _get_neighbor(self, name, veh_id, error):
+        """Return the id of the leader or follower of one or more vehicles."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self._get_neighbor(name, v, error) for v in veh_id]
+        i = self.kernel_api.index.get(veh_id)
+        if i is None:
+            return error
+        j = getattr(self.kernel_api, name)[i]
+        return None if j < 0 else self.kernel_api.ids[j]
+
+    ###########################################################################
+    #               Methods for interacting with the simulator                #
+    ###########################################################################
+
+    def apply_acceleration(self, veh_ids, acc):
+        """See parent class."""
+        self.master_kernel.metrics.invalidate()
+        if self.master_kernel.recorder is not None:
+            self.master_kernel.recorder.set_accelerations(veh_ids, acc)
+        for i, vid in enumerate(veh_ids):
+            if acc[i] is not None:
+                this_vel = self.get_speed(vid)
+                next_vel = max([this_vel + acc[i] * self.sim_step, 0])
+                self.kernel_api.set_speed(vid, next_vel)
+
+    def test_set_speed(self, veh_id, speed):
+        """Set the speed of the specified vehicle.
+
+        Unlike ``apply_acceleration``, the speed is set in the simulator state
+        immediately, rather than being commanded for the next step.
+        """
+        self.master_kernel.metrics.invalidate()
+        self.kernel_api.speed[self.kernel_api.index[veh_id]] = speed
+
+    def apply_lane_change(self, veh_ids, direction):
+        """See parent class.
+
+        The ring simulator only supports single-lane networks, so lane change
+        actions are validated and otherwise ignored.
+        """
+        if any(d not in [-1, 0, 1] for d in direction):
+            raise ValueError("Direction values for lane changes may only be: "
+                             "-1, 0, or 1.")
+
+    def choose_routes(self, veh_ids, route_choices):
+        """See parent class.
+
+        Routes have no effect on the ring simulator, where vehicles keep
+        driving around their ring; they are only stored.
+        """
+        for i, veh_id in enumerate(veh_ids):
+            if route_choices[i] is not None:
+                self.__vehicles[veh_id]["route"] = route_choices[i]
+
+    def set_max_speed(self, veh_id, max_speed):
+        """See parent class."""
+        self.kernel_api.max_speed[self.kernel_api.index[veh_id]] = max_speed
+
+    ###########################################################################
+    # Methods to visually distinguish vehicles by {RL, observed, unobserved}  #
+    ###########################################################################
+
+    def update_vehicle_colors(self):
+        """See parent class."""
+        for veh_id in self.get_rl_ids():
+            self.set_color(veh_id=veh_id, color=RED)
+
+        for veh_id in self.get_human_ids():
+            color = CYAN if veh_id in self.get_observed_ids() else WHITE
+            self.set_color(veh_id=veh_id, color=color)
+
+        for veh_id in self.get_observed_ids():
+            self.remove_observed(veh_id)
+
+    def set_observed(self, veh_id):
+        """See parent class."""
+        if veh_id not in self.__observed_ids:
+            self.__observed_ids.append(veh_id)
+
+    def remove_observed(self, veh_id):
+        """See parent class."""
+        if veh_id in self.__observed_ids:
+            self.__observed_ids.remove(veh_id)
+
+    def get_observed_ids(self):
+        """See parent class."""
+        return self.__observed_ids
+
+    def get_color(self, veh_id):
+        """See parent class."""
+        return self.__vehicles[veh_id].get("color", WHITE)
+
+    def set_color(self, veh_id, color):
+        """See parent class."""
+        self.__vehicles[veh_id]["color"] = color
+
+    ###########################################################################
+    #                        State acquisition methods                        #
+    ###########################################################################
+
+    def get_orientation(self, veh_id):
+        """See parent class.
+
+        Rings are drawn as circles centered at the origin.
+        """
+        sim = self.kernel_api
+        i = sim.index[veh_id]
+        length = sim.ring_lengths[sim.ring[i]]
+        theta = 2 * np.pi * sim.ring_pos[i] / length - np.pi / 2
+        radius = length / (2 * np.pi)
+        return [radius * np.cos(theta), radius * np.sin(theta),
+                (90 - np.degrees(theta + np.pi / 2)) % 360]
+
+    def get_timestep(self, veh_id):
+        """See parent class."""
+        return int(round(self.kernel_api.time * 1000))
+
+    def get_timedelta(self, veh_id):
+        """See parent class."""
+        return int(round(self.sim_step * 1000))
+
+    def get_type(self, veh_id):
+        """Return the type of the vehicle of veh_id."""
+        return self.__vehicles[veh_id]["type"]
+
+    def get_ids(self):
+        """See parent class."""
+        return self.__ids
+
+    def get_human_ids(self):
+        """See parent class."""
+        return self.__human_ids
+
+    def get_controlled_ids(self):
+        """See parent class."""
+        return self.__controlled_ids
+
+    def get_controlled_lc_ids(self):
+        """See parent class."""
+        return self.__controlled_lc_ids
+
+    def get_rl_ids(self):
+        """See parent class."""
+        return self.__rl_ids
+
+    def get_ids_by_edge(self, edges):
+        """See parent class."""
+        if isinstance(edges, (list, np.ndarray)):
+            return sum([self.get_ids_by_edge(edge) for edge in edges], [])
+        return self._ids_by_edge.get(edges, [])
+
+    def get_inflow_rate(self, time_span):
+        """See parent class."""
+        if len(self._num_departed) == 0:
+            return 0
+        num_inflow = self._num_departed[-int(time_span / self.sim_step):]
+        return 3600 * sum(num_inflow) / (len(num_inflow) * self.sim_step)
+
+    def get_outflow_rate(self, time_span):
+        """See parent class."""
+        if len(self._num_arrived) == 0:
+            return 0
+        num_outflow = self._num_arrived[-int(time_span / self.sim_step):]
+        return 3600 * sum(num_outflow) / (len(num_outflow) * self.sim_step)
+
+    def get_num_arrived(self):
+        """See parent class."""
+        if len(self._num_arrived) > 0:
+            return self._num_arrived[-1]
+        else:
+            return 0
+
+    def get_arrived_ids(self):
+        """See parent class."""
+        if len(self._arrived_ids) > 0:
+            return self._arrived_ids[-1]
+        else:
+            return 0
+
+    def get_departed_ids(self):
+        """See parent class."""
+        if len(self._departed_ids) > 0:
+            return self._departed_ids[-1]
+        else:
+            return 0
+
+    def get_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._get("speed", veh_id, error)
+
+    def get_default_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._get("default_speed", veh_id, error)
+
+    def get_position(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_position(vehID, error) for vehID in veh_id]
+        return self._positions.get(veh_id, error)
+
+    def get_edge(self, veh_id, error=""):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_edge(vehID, error) for vehID in veh_id]
+        return self._edges.get(veh_id, error)
+
+    def get_lane(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane(vehID, error) for vehID in veh_id]
+        return 0 if veh_id in self.kernel_api.index else error
+
+    def get_route(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_route(vehID, error) for vehID in veh_id]
+        return self.__vehicles.get(veh_id, {}).get("route", error)
+
+    def get_length(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._get("length", veh_id, error)
+
+    def get_leader(self, veh_id, error=""):
+        """See parent class."""
+        return self._get_neighbor("leader", veh_id, error)
+
+    def get_follower(self, veh_id, error=""):
+        """See parent class."""
+        return self._get_neighbor("follower", veh_id, error)
+
+    def get_headway(self, veh_id, error=-1001):
+        """See parent class.
+
+        Vehicles without a leader have a headway of 1000 m, as in the TraCI
+        vehicle kernel.
+        """
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_headway(vehID, error) for vehID in veh_id]
+        headway = self._get("gap", veh_id, error)
+        return 1e3 if headway == float("inf") else headway
+
+    def get_last_lc(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_last_lc(vehID, error) for vehID in veh_id]
+        return self.__vehicles.get(veh_id, {}).get("last_lc", error)
+
+    def _get_controller(self, veh_id, key, error):
+        """Return a controller of a vehicle, constructing it if needed.
+
+        See flow.core.kernel.vehicle.traci.TraCIVehicle._get_controller.
+        """
+        vehicle = self.__vehicles.get(veh_id)
+        if vehicle is None:
+            return error
+
+        if key not in vehicle:
+            vehicle[key] = self.build_controller(veh_id, vehicle["type"], key)
+
+        return vehicle[key]
+
+    def get_acc_controller(self, veh_id, error=None):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_acc_controller(vehID, error) for vehID in veh_id]
+        return self._get_controller(veh_id, "acc_controller", error)
+
+    def get_lane_changing_controller(self, veh_id, error=None):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [
+                self.get_lane_changing_controller(vehID, error)
+                for vehID in veh_id
+            ]
+        return self._get_controller(veh_id, "lane_changer", error)
+
+    def get_routing_controller(self, veh_id, error=None):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [
+                self.get_routing_controller(vehID, error) for vehID in veh_id
+            ]
+        return self._get_controller(veh_id, "router", error)
+
+    def get_lane_headways(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_headways(vehID, error) for vehID in veh_id]
+        if veh_id not in self.kernel_api.index:
+            return error
+        return [self.get_headway(veh_id)]
+
+    def get_lane_leaders_speed(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_leaders_speed(vehID, error)
+                    for vehID in veh_id]
+        return [0 if lane_leader == '' else self.get_speed(lane_leader)
+                for lane_leader in self.get_lane_leaders(veh_id, error)]
+
+    def get_lane_followers_speed(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_followers_speed(vehID, error)
+                    for vehID in veh_id]
+        return [0 if lane_follower == '' else self.get_speed(lane_follower)
+                for lane_follower in self.get_lane_followers(veh_id, error)]
+
+    def get_lane_leaders(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_leaders(vehID, error) for vehID in veh_id]
+        if veh_id not in self.kernel_api.index:
+            return error
+        return [self.get_leader(veh_id) or ""]
+
+    def get_lane_tailways(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_tailways(vehID, error) for vehID in veh_id]
+        follower = self.get_follower(veh_id, error=None)
+        if follower is None:
+            return error if veh_id not in self.kernel_api.index else [1e3]
+        return [self.get_headway(follower)]
+
+    def get_lane_followers(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_followers(vehID, error) for vehID in veh_id]
+        if veh_id not in self.kernel_api.index:
+            return error
+        return [self.get_follower(veh_id) or ""]
+
+    def get_x_by_id(self, veh_id):
+        """See parent class."""
+        if self.get_edge(veh_id) == '':
+            return 0.
+        return self.master_kernel.scenario.get_x(
+            self.get_edge(veh_id), self.get_position(veh_id))
+
+    def get_max_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._get("max_speed", veh_id, error)
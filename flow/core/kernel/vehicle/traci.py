@@ -11,6 +11,7 @@ from flow.controllers.rlcontroller import RLController
 from flow.controllers.lane_change_controllers import SimLaneChangeController
 from bisect import bisect_left
 import itertools
+from copy import deepcopy
 
 # colors for vehicles
 WHITE = (255, 255, 255)
@@ -67,14 +68,47 @@ class TraCIVehicle(KernelVehicle):
         self._num_arrived = []
         self._arrived_ids = []
 
+        # vehicles that entered or exited the network during steps skipped by
+        # the simulation (see synchronize), and not yet recorded by update
+        self._skipped_departed_ids = []
+        self._skipped_arrived_ids = []
+
     def initialize(self, vehicles):
-        """
+        """Initialize vehicle state information.
+
+        This is responsible for collecting vehicle type information from the
+        VehicleParams object and placing them within the Vehicles kernel, as
+        well as clearing any state left over from a previous simulation. The
+        VehicleParams object is treated as an immutable template, and may be
+        shared by several environments (see make_create_env). The per-type
+        parameters are therefore deep-copied, so that controller parameters
+        modified through this kernel do not leak into other environments.
 
-        :param vehicles:
-        :return:
+        Parameters
+        ----------
+        vehicles : flow.core.params.VehicleParams
+            initial vehicle parameter information, including the types of
+            individual vehicles and their initial speeds
         """
-        self.type_parameters = vehicles.type_parameters
-        self.minGap = vehicles.minGap
+        self.type_parameters = deepcopy(vehicles.type_parameters)
+        self.minGap = dict(vehicles.minGap)
+
+        self.__ids = []
+        self.__human_ids = []
+        self.__controlled_ids = []
+        self.__controlled_lc_ids = []
+        self.__rl_ids = []
+        self.__observed_ids = []
+        self.__vehicles = collections.OrderedDict()
+        self.__sumo_obs = {}
+        self._ids_by_edge = dict()
+        self._num_departed = []
+        self._departed_ids = []
+        self._num_arrived = []
+        self._arrived_ids = []
+        self._skipped_departed_ids = []
+        self._skipped_arrived_ids = []
+
         self.num_vehicles = 0
         self.num_rl_vehicles = 0
 
@@ -96,11 +130,16 @@ class TraCIVehicle(KernelVehicle):
             step
         """
         vehicle_obs = self.kernel_api.vehicle.getSubscriptionResults()
-        sim_obs = self.kernel_api.simulation.getSubscriptionResults()
+        # the state of the simulation is read from the simulation kernel,
+        # which is updated first
+        simulation = self.master_kernel.simulation
+        sim_departed_ids = simulation.get_departed_ids()
+        sim_arrived_ids = simulation.get_arrived_ids()
+        teleport_ids = simulation.get_teleport_ids()
 
         # remove exiting vehicles from the vehicles class
-        for veh_id in sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS]:
-            if veh_id not in sim_obs[tc.VAR_TELEPORT_STARTING_VEHICLES_IDS]:
+        for veh_id in sim_arrived_ids:
+            if veh_id not in teleport_ids:
                 self.remove(veh_id)
             else:
                 # this is meant to resolve the KeyError bug when there are
@@ -108,7 +147,7 @@ class TraCIVehicle(KernelVehicle):
                 vehicle_obs[veh_id] = self.__sumo_obs[veh_id]
 
         # add entering vehicles into the vehicles class
-        for veh_id in sim_obs[tc.VAR_DEPARTED_VEHICLES_IDS]:
+        for veh_id in sim_departed_ids:
             veh_type = self.kernel_api.vehicle.getTypeID(veh_id)
             if veh_id in self.get_ids():
                 # this occurs when a vehicle is actively being removed and
@@ -132,6 +171,8 @@ class TraCIVehicle(KernelVehicle):
             self._num_arrived.clear()
             self._departed_ids.clear()
             self._arrived_ids.clear()
+            self._skipped_departed_ids = []
+            self._skipped_arrived_ids = []
         else:
             self.time_counter += 1
             # update the "last_lc" variable
@@ -141,21 +182,26 @@ class TraCIVehicle(KernelVehicle):
                         prev_lane and veh_id in self.__rl_ids:
                     self.__vehicles[veh_id]["last_lc"] = self.time_counter
 
-            # updated the list of departed and arrived vehicles
-            self._num_departed.append(
-                len(sim_obs[tc.VAR_DEPARTED_VEHICLES_IDS]))
-            self._num_arrived.append(len(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS]))
-            self._departed_ids.append(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS])
-            self._arrived_ids.append(sim_obs[tc.VAR_ARRIVED_VEHICLES_IDS])
+            # updated the list of departed and arrived vehicles. Vehicles that
+            # departed or arrived during skipped steps are recorded as part of
+            # this step, so that there is exactly one entry per update
+            departed_ids = self._skipped_departed_ids + \
+                list(sim_departed_ids)
+            arrived_ids = self._skipped_arrived_ids + list(sim_arrived_ids)
+            self._skipped_departed_ids = []
+            self._skipped_arrived_ids = []
+            self._num_departed.append(len(departed_ids))
+            self._num_arrived.append(len(arrived_ids))
+            self._departed_ids.append(departed_ids)
+            self._arrived_ids.append(arrived_ids)
 
         # update the "headway", "leader", and "follower" variables
+        _time_step, _time_delta = simulation.get_time_step()
         for veh_id in self.__ids:
             try:
                 _position = vehicle_obs.get(veh_id, {}).get(
                     tc.VAR_POSITION, -1001)
                 _angle = vehicle_obs.get(veh_id, {}).get(tc.VAR_ANGLE, -1001)
-                _time_step = sim_obs[tc.VAR_TIME_STEP]
-                _time_delta = sim_obs[tc.VAR_DELTA_T]
                 self.__vehicles[veh_id]["orientation"] = \
                     list(_position) + [_angle]
                 self.__vehicles[veh_id]["timestep"] = _time_step
@@ -186,6 +232,52 @@ class TraCIVehicle(KernelVehicle):
         # make sure the rl vehicle list is still sorted
         self.__rl_ids.sort()
 
+    def synchronize(self, num_steps=1):
+        """See parent class.
+
+        The departed and arrived vehicles in the simulation subscription only
+        cover the last simulation step; these are still left to be processed
+        by ``update``. The vehicles that departed or arrived during the other
+        skipped steps are recorded by the next call to ``update``, as the
+        steps they departed or arrived at are unknown.
+
+        Vehicles that both departed and arrived during the skipped steps are
+        never seen by the kernel, and are therefore not recorded.
+        """
+        # the kernel is not updated yet, so the state of the simulation after
+        # the skipped steps is read first
+        simulation = self.master_kernel.simulation
+        simulation.update(reset=False)
+        departed = set(simulation.get_departed_ids())
+        arrived = set(simulation.get_arrived_ids())
+        current_ids = self.kernel_api.vehicle.getIDList()
+
+        # remove vehicles that exited the network during the skipped steps
+        present = set(current_ids)
+        arrived_ids = [veh_id for veh_id in self.__ids
+                       if veh_id not in present and veh_id not in arrived]
+        for veh_id in arrived_ids:
+            self.remove(veh_id)
+
+        # add vehicles that entered the network during the skipped steps
+        known = set(self.__ids)
+        departed_ids = [veh_id for veh_id in current_ids
+                        if veh_id not in known and veh_id not in departed]
+        for veh_id in departed_ids:
+            self._add_departed(
+                veh_id, self.kernel_api.vehicle.getTypeID(veh_id))
+
+        self._skipped_departed_ids.extend(departed_ids)
+        self._skipped_arrived_ids.extend(arrived_ids)
+
+        # one entry per skipped step, the last one being added by update
+        for _ in range(num_steps - 1):
+            self.time_counter += 1
+            self._num_departed.append(0)
+            self._num_arrived.append(0)
+            self._departed_ids.append([])
+            self._arrived_ids.append([])
+
     def _add_departed(self, veh_id, veh_type):
         """Add a vehicle that entered the network from an inflow or reset.
 
@@ -206,30 +298,12 @@ class TraCIVehicle(KernelVehicle):
         # specify the type
         self.__vehicles[veh_id]["type"] = veh_type
 
-        car_following_params = \
-            self.type_parameters[veh_type]["car_following_params"]
-
-        # specify the acceleration controller class
+        # the controllers of the vehicle are only instantiated once they are
+        # first requested (see _get_controller)
         accel_controller = \
             self.type_parameters[veh_type]["acceleration_controller"]
-        self.__vehicles[veh_id]["acc_controller"] = \
-            accel_controller[0](veh_id,
-                                car_following_params=car_following_params,
-                                **accel_controller[1])
-
-        # specify the lane-changing controller class
         lc_controller = \
             self.type_parameters[veh_type]["lane_change_controller"]
-        self.__vehicles[veh_id]["lane_changer"] = \
-            lc_controller[0](veh_id=veh_id, **lc_controller[1])
-
-        # specify the routing controller class
-        rt_controller = self.type_parameters[veh_type]["routing_controller"]
-        if rt_controller is not None:
-            self.__vehicles[veh_id]["router"] = \
-                rt_controller[0](veh_id=veh_id, router_params=rt_controller[1])
-        else:
-            self.__vehicles[veh_id]["router"] = None
 
         # add the vehicle's id to the list of vehicle ids
         if accel_controller[0] == RLController:
@@ -285,8 +359,39 @@ class TraCIVehicle(KernelVehicle):
         # make sure that the order of rl_ids is kept sorted
         self.__rl_ids.sort()
 
+    def _get_controller(self, veh_id, key, error):
+        """Return a controller of a vehicle, constructing it if needed.
+
+        Controllers are created lazily from the type parameters of the vehicle
+        the first time they are requested (see ``build_controller``).
+
+        Parameters
+        ----------
+        veh_id : str
+            vehicle identifier
+        key : str
+            one of "acc_controller", "lane_changer", or "router"
+        error : any
+            value returned if the vehicle is not in the network
+
+        Returns
+        -------
+        flow.controllers.base_controller.BaseController or any
+            the controller of the vehicle, None if the vehicle does not have a
+            routing controller, or error if the vehicle is not in the network
+        """
+        vehicle = self.__vehicles.get(veh_id)
+        if vehicle is None:
+            return error
+
+        if key not in vehicle:
+            vehicle[key] = self.build_controller(veh_id, vehicle["type"], key)
+
+        return vehicle[key]
+
     def remove(self, veh_id):
         """See parent class."""
+        self.master_kernel.metrics.invalidate()
         # remove from sumo
         try:
             self.kernel_api.vehicle.unsubscribe(veh_id)
@@ -319,6 +424,7 @@ class TraCIVehicle(KernelVehicle):
 
     def test_set_speed(self, veh_id, speed):
         """Set the speed of the specified vehicle."""
+        self.master_kernel.metrics.invalidate()
         self.__sumo_obs[veh_id][tc.VAR_SPEED] = speed
 
     def set_follower(self, veh_id, follower):
@@ -497,7 +603,7 @@ class TraCIVehicle(KernelVehicle):
         """See parent class."""
         if isinstance(veh_id, (list, np.ndarray)):
             return [self.get_acc_controller(vehID, error) for vehID in veh_id]
-        return self.__vehicles.get(veh_id, {}).get("acc_controller", error)
+        return self._get_controller(veh_id, "acc_controller", error)
 
     def get_lane_changing_controller(self, veh_id, error=None):
         """See parent class."""
@@ -506,7 +612,7 @@ class TraCIVehicle(KernelVehicle):
                 self.get_lane_changing_controller(vehID, error)
                 for vehID in veh_id
             ]
-        return self.__vehicles.get(veh_id, {}).get("lane_changer", error)
+        return self._get_controller(veh_id, "lane_changer", error)
 
     def get_routing_controller(self, veh_id, error=None):
         """See parent class."""
@@ -514,7 +620,7 @@ class TraCIVehicle(KernelVehicle):
             return [
                 self.get_routing_controller(vehID, error) for vehID in veh_id
             ]
-        return self.__vehicles.get(veh_id, {}).get("router", error)
+        return self._get_controller(veh_id, "router", error)
 
     def set_lane_headways(self, veh_id, lane_headways):
         """Set the lane headways of the specified vehicle."""
@@ -811,6 +917,9 @@ class TraCIVehicle(KernelVehicle):
 
     def apply_acceleration(self, veh_ids, acc):
         """See parent class."""
+        self.master_kernel.metrics.invalidate()
+        if self.master_kernel.recorder is not None:
+            self.master_kernel.recorder.set_accelerations(veh_ids, acc)
         for i, vid in enumerate(veh_ids):
             if acc[i] is not None:
                 this_vel = self.get_speed(vid)
@@ -906,6 +1015,7 @@ class TraCIVehicle(KernelVehicle):
 
     def add(self, veh_id, type_id, route_id, pos, lane, speed):
         """See parent class."""
+        self.master_kernel.metrics.invalidate()
         self.kernel_api.vehicle.addFull(
             veh_id,
             route_id,
@@ -0,0 +1,180 @@
+"""Utilities for constructing observations without per-step allocations.
+
+Environments typically build their observations by appending values to python
+lists and concatenating numpy arrays every step. The classes in this file
+instead provide a preallocated buffer, with named slices for the different
+components of the observation, as well as an incrementally maintained mapping
+from vehicle ids to slots within these slices.
+
+Usage
+    >>> builder = ObservationBuilder(env.observation_space,
+    ...                              [("speed", num_veh), ("pos", num_veh)])
+    >>> builder.clear()
+    >>> builder["speed"][:] = speeds / max_speed
+    >>> builder["pos"][:] = positions / length
+    >>> obs = builder.get()
+"""
+
+import numpy as np
+
+
+class SlotMap(object):
+    """Mapping from vehicle ids to a fixed number of observation slots.
+
+    Slots are assigned to vehicles the first time they are seen, and released
+    once the vehicles are no longer present, so that a vehicle retains the same
+    slot for as long as it is in the network. Lookups are O(1).
+
+    Attributes
+    ----------
+    num_slots : int
+        total number of slots
+    """
+
+    def __init__(self, num_slots, ids=None):
+        """Instantiate the slot map.
+
+        Parameters
+        ----------
+        num_slots : int
+            total number of slots
+        ids : list of str, optional
+            ids that are permanently assigned to the first len(ids) slots, in
+            order. Slots of permanent ids are kept (and left empty) when the
+            vehicles leave the network.
+        """
+        self.num_slots = num_slots
+        self._permanent = {}
+        self._slots = {}
+        self._free = list(range(num_slots - 1, -1, -1))
+        for veh_id in ids or []:
+            slot = len(self._permanent)
+            self._permanent[veh_id] = slot
+            self._free.remove(slot)
+
+    def update(self, ids):
+        """Update the slots given the ids of vehicles currently present.
+
+        Vehicles without a slot are assigned one if any is available. Vehicles
+        that no longer exist release their slot.
+
+        Parameters
+        ----------
+        ids : list of str
+            ids of the vehicles currently present
+
+        Returns
+        -------
+        list of str
+            the ids that are assigned a slot
+        numpy ndarray (int)
+            the slot of each of the above ids
+        """
+        present = set(ids)
+        for veh_id in [v for v in self._slots if v not in present]:
+            self._free.append(self._slots.pop(veh_id))
+
+        slot_ids = []
+        slots = []
+        for veh_id in ids:
+            slot = self._permanent.get(veh_id, self._slots.get(veh_id))
+            if slot is None:
+                if not self._free:
+                    continue
+                slot = self._free.pop()
+                self._slots[veh_id] = slot
+            slot_ids.append(veh_id)
+            slots.append(slot)
+
+        return slot_ids, np.array(slots, dtype=int)
+
+    def get(self, veh_id, error=None):
+        """Return the slot of a vehicle, or error if it is not assigned one."""
+        return self._permanent.get(veh_id, self._slots.get(veh_id, error))
+
+    def reset(self):
+        """Release the slots of all non-permanent ids."""
+        self._free.extend(self._slots.values())
+        self._slots.clear()
+
+
+class ObservationBuilder(object):
+    """Preallocated observation buffer with named slices.
+
+    The components of an observation are specified as a list of (name, size)
+    or (name, (num_slots, slot_size)) pairs, which are laid out contiguously
+    and in order within a single float32 buffer matching the shape of the
+    environment's observation space. Each component can be accessed (and
+    filled in place) through ``builder[name]``; two-dimensional components are
+    returned as (num_slots, slot_size) views, so that per-vehicle data may be
+    written with a single fancy-indexing operation.
+
+    Note that the buffer returned by ``get`` is reused at every step, and must
+    be copied if it is to be stored.
+    """
+
+    def __init__(self, observation_space, fields):
+        """Instantiate the builder.
+
+        Parameters
+        ----------
+        observation_space : gym.spaces.Box
+            observation space of the environment
+        fields : list of tuple
+            (name, size) pairs, where size is either an int or a
+            (num_slots, slot_size) tuple
+
+        Raises
+        ------
+        ValueError
+            if the total size of the fields does not match the size of the
+            observation space
+        """
+        self.size = int(np.prod(observation_space.shape))
+        self.buffer = np.zeros(self.size, dtype=np.float32)
+
+        self._views = {}
+        start = 0
+        for name, shape in fields:
+            length = int(np.prod(shape))
+            view = self.buffer[start:start + length]
+            if isinstance(shape, tuple):
+                view = view.reshape(shape)
+            self._views[name] = view
+            start += length
+
+        if start != self.size:
+            raise ValueError(
+                'Observation fields are of size {}, but the observation space '
+                'is of size {}.'.format(start, self.size))
+
+    def __getitem__(self, name):
+        """Return the (writable) view of a component of the observation."""
+        return self._views[name]
+
+    def clear(self, value=0):
+        """Fill the full buffer with a default value."""
+        self.buffer.fill(value)
+
+    def fill(self, name, values, scale=1):
+        """Write a vector of values into a component of the observation.
+
+        If fewer values are provided than the size of the component, the
+        remaining elements are left unchanged.
+
+        Parameters
+        ----------
+        name : str
+            name of the component
+        values : array_like
+            values to be written
+        scale : float, optional
+            normalizing term the values are divided by
+        """
+        view = self._views[name].reshape(-1)
+        values = np.asarray(values, dtype=np.float32)
+        np.divide(values, scale, out=view[:values.shape[0]], casting='unsafe')
+
+    def get(self):
+        """Return the observation buffer."""
+        return self.buffer
@@ -196,6 +196,12 @@ class VehicleParams:
     This is used to describe the state of all vehicles in the network.
     State information on the vehicles for a given time step can be set or
     retrieved from this class.
+
+    Once passed to a scenario, this object acts as an immutable template: the
+    vehicle kernel is (re-)initialized from it on every restart of the
+    simulation without modifying or copying it, and the controllers of
+    individual vehicles are only instantiated from the type parameters when
+    they are first needed.
     """
 
     def __init__(self):
@@ -355,7 +361,15 @@ class SimParams(object):
                  save_render=False,
                  sight_radius=25,
                  show_radius=False,
-                 pxpm=2):
+                 pxpm=2,
+                 record_path=None,
+                 record_every_n_steps=1,
+                 record_chunk_size=100000,
+                 renderer="pyglet",
+                 render_every_n_steps=1,
+                 render_async=False,
+                 render_queue_size=2,
+                 render_block=False):
         """Instantiate SimParams.
 
         Parameters
@@ -388,6 +402,33 @@ class SimParams(object):
             specifies whether to render the radius of RL observation
         pxpm: int, optional
             specifies rendering resolution (pixel / meter)
+        record_path: str, optional
+            Path to the folder in which to record the trajectories of all
+            vehicles (see flow/core/kernel/recorder.py). Trajectories are not
+            recorded if this value is not specified
+        record_every_n_steps: int, optional
+            number of simulation steps between two recorded steps
+        record_chunk_size: int, optional
+            number of rows (vehicles and steps) of the recorded chunks
+        renderer: str, optional
+            renderer of the "gray", "dgray", "rgb" and "drgb" render modes
+
+            * "pyglet": draws frames in an OpenGL window
+            * "headless": draws frames with NumPy/OpenCV, without a display
+              or a GPU
+        render_every_n_steps: int, optional
+            number of simulation steps between two rendered frames
+        render_async: bool, optional
+            specifies whether to render frames in a background thread (see
+            flow/renderer/async_renderer.py), in which case the frame and
+            local observations of the environment are those of the most
+            recent completed frame
+        render_queue_size: int, optional
+            maximum number of steps waiting to be rendered asynchronously
+        render_block: bool, optional
+            specifies whether the simulation waits for the asynchronous
+            renderer when its queue is full. Otherwise, the oldest step
+            waiting to be rendered is dropped
         """
         self.sim_step = sim_step
         self.render = render
@@ -397,6 +438,14 @@ class SimParams(object):
         self.sight_radius = sight_radius
         self.pxpm = pxpm
         self.show_radius = show_radius
+        self.record_path = record_path
+        self.record_every_n_steps = record_every_n_steps
+        self.record_chunk_size = record_chunk_size
+        self.renderer = renderer
+        self.render_every_n_steps = render_every_n_steps
+        self.render_async = render_async
+        self.render_queue_size = render_queue_size
+        self.render_block = render_block
 
 
 class SumoParams(SimParams):
@@ -427,7 +476,19 @@ class SumoParams(SimParams):
                  print_warnings=True,
                  teleport_time=-1,
                  num_clients=1,
-                 sumo_binary=None):
+                 sumo_binary=None,
+                 record_path=None,
+                 record_every_n_steps=1,
+                 record_chunk_size=100000,
+                 renderer="pyglet",
+                 render_every_n_steps=1,
+                 render_async=False,
+                 render_queue_size=2,
+                 render_block=False,
+                 traci_record_path=None,
+                 traci_replay_path=None,
+                 traci_stats=False,
+                 traci_stats_window=100):
         """Instantiate SumoParams.
 
         Attributes
@@ -479,11 +540,52 @@ class SumoParams(SimParams):
             they teleport after teleport_time seconds
         num_clients: int, optional
             Number of clients that will connect to Traci
+        record_path: str, optional
+            Path to the folder in which to record the trajectories of all
+            vehicles, without sumo's emission output (see
+            flow/core/kernel/recorder.py). Trajectories are not recorded if
+            this value is not specified
+        record_every_n_steps: int, optional
+            number of simulation steps between two recorded steps
+        record_chunk_size: int, optional
+            number of rows (vehicles and steps) of the recorded chunks
+        renderer: str, optional
+            renderer of the "gray", "dgray", "rgb" and "drgb" render modes,
+            "pyglet" (default) or "headless" (without a display, see
+            flow/renderer/headless_renderer.py)
+        render_every_n_steps: int, optional
+            number of simulation steps between two rendered frames
+        render_async: bool, optional
+            specifies whether to render frames in a background thread (see
+            flow/renderer/async_renderer.py)
+        render_queue_size: int, optional
+            maximum number of steps waiting to be rendered asynchronously
+        render_block: bool, optional
+            specifies whether the simulation waits for the asynchronous
+            renderer when its queue is full, instead of dropping the oldest
+            step waiting to be rendered
+        traci_record_path: str, optional
+            path of a file in which to record all TraCI calls and their
+            results (see flow/core/kernel/traci_trace.py)
+        traci_replay_path: str, optional
+            path of a file recorded with traci_record_path, whose calls are
+            replayed instead of starting sumo. The network files of the
+            scenario are still generated.
+        traci_stats: bool, optional
+            specifies whether to count the TraCI calls, round trips and bytes
+            of every step, see flow/core/kernel/traci_stats.py. The
+            statistics are available from the traci_stats attribute of the
+            kernel
+        traci_stats_window: int, optional
+            number of steps the rolling TraCI statistics are computed over
 
         """
         super(SumoParams, self).__init__(
             sim_step, render, restart_instance, emission_path, save_render,
-            sight_radius, show_radius, pxpm)
+            sight_radius, show_radius, pxpm, record_path,
+            record_every_n_steps, record_chunk_size, renderer,
+            render_every_n_steps, render_async, render_queue_size,
+            render_block)
         self.port = port
         self.lateral_resolution = lateral_resolution
         self.no_step_log = no_step_log
@@ -492,6 +594,10 @@ class SumoParams(SimParams):
         self.print_warnings = print_warnings
         self.teleport_time = teleport_time
         self.num_clients = num_clients
+        self.traci_record_path = traci_record_path
+        self.traci_replay_path = traci_replay_path
+        self.traci_stats = traci_stats
+        self.traci_stats_window = traci_stats_window
         if sumo_binary is not None:
             warnings.simplefilter("always", PendingDeprecationWarning)
             warnings.warn(
@@ -515,7 +621,11 @@ class EnvParams:
                  horizon=500,
                  warmup_steps=0,
                  sims_per_step=1,
-                 evaluate=False):
+                 evaluate=False,
+                 profile_path=None,
+                 profile_every_n_episodes=100,
+                 profile_mode="sampling",
+                 profile_interval=0.01):
         """Instantiate EnvParams.
 
         Attributes
@@ -538,6 +648,19 @@ class EnvParams:
                 flag indicating that the evaluation reward should be used
                 so the evaluation reward should be used rather than the
                 normal reward
+            profile_path: str, optional
+                directory the profiles of the sampled episodes are written to.
+                Episodes are not profiled if set to None, see
+                flow/core/profiler.py
+            profile_every_n_episodes: int, optional
+                one in every profile_every_n_episodes episodes is profiled,
+                starting with the first one
+            profile_mode: str, optional
+                "sampling" to sample the stack at a fixed interval, or
+                "cprofile" to run the profiled episodes under cProfile
+            profile_interval: float, optional
+                interval between two samples of the stack in the "sampling"
+                mode, in seconds
 
         """
         self.additional_params = \
@@ -546,6 +669,10 @@ class EnvParams:
         self.warmup_steps = warmup_steps
         self.sims_per_step = sims_per_step
         self.evaluate = evaluate
+        self.profile_path = profile_path
+        self.profile_every_n_episodes = profile_every_n_episodes
+        self.profile_mode = profile_mode
+        self.profile_interval = profile_interval
 
     def get_additional_param(self, key):
         """Return a variable from additional_params."""
@@ -0,0 +1,310 @@
+"""Sampling profiler of the episodes of an environment.
+
+Long training jobs (e.g. the RLlib jobs of flow/benchmarks/rllib) spend most
+of their time in the environments, whose cost may drift as the policy changes
+the traffic. ``EpisodeProfiler`` profiles one in every N episodes of an
+environment, so that the profiles of a whole job can be inspected without
+slowing down the other episodes: the decision to profile an episode is made
+once per reset, and nothing runs during the steps of the episodes that are not
+profiled.
+
+An episode runs from a reset to the next reset (or the termination of the
+environment), and is profiled in one of the following modes:
+
+* "sampling": a background thread samples the stack of the thread running the
+  environment at a fixed interval. Both a collapsed-stack file (one line
+  "frame;frame;...;frame count" per stack, as read by flamegraph.pl,
+  speedscope, etc.) and a pstats file built from the samples are written.
+* "cprofile": the episode runs under cProfile, and a pstats file is written.
+  cProfile does not record full stacks, so no collapsed-stack file is
+  written in this mode.
+
+The outputs of an episode are named after the scenario, the process, the
+episode, the number of vehicles and the number of steps of the episode, e.g.
+"ring_pid123_ep10_veh22_steps1500.collapsed", and are tagged with a JSON file
+of the same name, containing these as well as the total number of steps taken
+by the environment, the duration of the episode, and the number of samples.
+
+Profiling is enabled with the ``profile_path`` attribute of EnvParams, and
+configured with its ``profile_every_n_episodes``, ``profile_mode`` and
+``profile_interval`` attributes.
+"""
+
+import cProfile
+import collections
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+
+from flow.core.util import ensure_dir
+
+# supported profiling modes
+PROFILE_MODES = ["sampling", "cprofile"]
+
+
+class EpisodeProfiler(object):
+    """Profiler of one in every N episodes of an environment.
+
+    Usage
+        >>> profiler = EpisodeProfiler("profiles", every_n_episodes=10)
+        >>> profiler.start_episode(env)  # at every reset
+        >>> ...
+        >>> profiler.close(env)  # when the environment is terminated
+    """
+
+    def __init__(self,
+                 path,
+                 every_n_episodes=100,
+                 mode="sampling",
+                 interval=0.01):
+        """Instantiate the profiler.
+
+        Parameters
+        ----------
+        path : str
+            directory the profiles are written to
+        every_n_episodes : int
+            one in every ``every_n_episodes`` episodes is profiled, starting
+            with the first one
+        mode : str
+            "sampling" or "cprofile", see the module documentation
+        interval : float
+            interval between two samples of the stack, in seconds, in the
+            "sampling" mode
+
+        Raises
+        ------
+        ValueError
+            if the mode is not supported, or the number of episodes or the
+            interval are not positive
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError("Profiling mode {} is not supported, expected "
+                             "one of {}.".format(mode, PROFILE_MODES))
+        if every_n_episodes < 1:
+            raise ValueError("every_n_episodes must be positive.")
+        if interval <= 0:
+            raise ValueError("interval must be positive.")
+
+        self.path = ensure_dir(path)
+        self.every_n_episodes = every_n_episodes
+        self.mode = mode
+        self.interval = interval
+        # number of episodes started, and paths of the profiles written
+        self.num_episodes = 0
+        self.outputs = []
+
+        self._profile = None
+        self._sampler = None
+        self._start_time = None
+        self._start_step = None
+
+    @property
+    def active(self):
+        """Return whether the current episode is profiled."""
+        return self._start_time is not None
+
+    def start_episode(self, env):
+        """Start an episode of an environment.
+
+        The profile of the previous episode, if any, is written, and the new
+        episode is profiled if it is one in every N episodes. This must be
+        called before the environment resets its counters.
+
+        Parameters
+        ----------
+        env : flow.envs.Env
+            the profiled environment
+        """
+        if self._start_time is not None:
+            self.stop(env)
+
+        self.num_episodes += 1
+        if (self.num_episodes - 1) % self.every_n_episodes != 0:
+            return
+
+        self._start_step = env.step_counter
+        self._start_time = time.time()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = _StackSampler(threading.get_ident(),
+                                          self.interval)
+
+    def stop(self, env):
+        """Stop profiling the current episode, and write its profile.
+
+        Parameters
+        ----------
+        env : flow.envs.Env
+            the profiled environment
+
+        Returns
+        -------
+        list of str
+            paths of the written files, empty if the episode is not profiled
+        """
+        if self._start_time is None:
+            return []
+        duration = time.time() - self._start_time
+        self._start_time = None
+
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+        num_vehicles = len(env.k.vehicle.get_ids())
+        prefix = os.path.join(
+            self.path, "{}_pid{}_ep{}_veh{}_steps{}".format(
+                env.scenario.orig_name, os.getpid(), self.num_episodes,
+                num_vehicles, env.time_counter))
+        tags = {
+            "scenario": env.scenario.orig_name,
+            "pid": os.getpid(),
+            "episode": self.num_episodes,
+            "num_vehicles": num_vehicles,
+            "time_counter": env.time_counter,
+            "step_counter": env.step_counter,
+            "episode_steps": max(env.step_counter - self._start_step, 0),
+            "duration": duration,
+            "mode": self.mode,
+        }
+
+        outputs = []
+        if self._profile is not None:
+            self._profile.dump_stats(prefix + ".pstats")
+            outputs.append(prefix + ".pstats")
+            self._profile = None
+        if self._sampler is not None:
+            samples = self._sampler.samples
+            tags["interval"] = self.interval
+            tags["num_samples"] = sum(samples.values())
+            write_collapsed(samples, prefix + ".collapsed")
+            write_pstats(samples, self.interval, prefix + ".pstats")
+            outputs += [prefix + ".collapsed", prefix + ".pstats"]
+            self._sampler = None
+
+        with open(prefix + ".json", "w") as f:
+            json.dump(tags, f, indent=2, sort_keys=True)
+        outputs.append(prefix + ".json")
+
+        self.outputs += outputs
+        return outputs
+
+    def close(self, env):
+        """Write the profile of the current episode, if it is profiled.
+
+        Parameters
+        ----------
+        env : flow.envs.Env
+            the profiled environment
+        """
+        self.stop(env)
+
+
+class _StackSampler(object):
+    """Thread sampling the stack of another thread at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        # number of samples of every stack, by stack. A stack is a tuple of
+        # functions (filename, first line, name), from the outermost one
+        self.samples = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                # the sampled thread exited
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    (code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+
+
+def write_collapsed(samples, path):
+    """Write stack samples in the collapsed-stack format of flamegraph.pl.
+
+    Parameters
+    ----------
+    samples : dict
+        number of samples of every stack, see _StackSampler
+    path : str
+        path of the written file
+    """
+    with open(path, "w") as f:
+        for stack, count in sorted(samples.items()):
+            f.write("{} {}\n".format(
+                ";".join("{} ({}:{})".format(name, filename, line)
+                         for filename, line, name in stack), count))
+
+
+def write_pstats(samples, interval, path):
+    """Write stack samples as a profile readable by pstats.
+
+    The time of every sample is the sampling interval. The number of calls of
+    a function is the number of samples in which it appears.
+
+    Parameters
+    ----------
+    samples : dict
+        number of samples of every stack, see _StackSampler
+    interval : float
+        sampling interval, in seconds
+    path : str
+        path of the written file
+    """
+    # stats of every function: number of calls, total time, cumulative time,
+    # and the stats of the calls from every caller, as in pstats.Stats.stats
+    stats = {}
+
+    def _function(func):
+        if func not in stats:
+            stats[func] = [0, 0., 0., {}]
+        return stats[func]
+
+    for stack, count in samples.items():
+        if not stack:
+            continue
+        seconds = count * interval
+        _function(stack[-1])[1] += seconds
+
+        # recursive functions are counted once per sample
+        seen = set()
+        for i, func in enumerate(stack):
+            if func in seen:
+                continue
+            seen.add(func)
+            entry = _function(func)
+            entry[0] += count
+            entry[2] += seconds
+            if i > 0:
+                caller = entry[3].get(stack[i - 1], (0, 0, 0., 0.))
+                leaf = seconds if i == len(stack) - 1 else 0.
+                entry[3][stack[i - 1]] = (caller[0] + count,
+                                          caller[1] + count,
+                                          caller[2] + leaf,
+                                          caller[3] + seconds)
+
+    with open(path, "wb") as f:
+        marshal.dump({func: (calls, calls, tottime, cumtime, callers)
+                      for func, (calls, tottime, cumtime, callers)
+                      in stats.items()}, f)
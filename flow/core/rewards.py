@@ -1,8 +1,31 @@
-"""This script contains of series of reward functions."""
+"""This script contains of series of reward functions.
+
+Reward functions read network-level data from the metrics snapshot of the
+kernel (``env.k.metrics``, see flow/core/kernel/metrics.py), which is computed
+at most once per step, so that environments may combine several of them
+without querying the vehicle kernel multiple times. Speeds are weighted by the
+number of vehicles at each of them, so that these rewards also apply to
+macroscopic simulators (e.g. "ctm"). Rewards that depend on the states of
+individual vehicles (e.g. headways) raise an error for such simulators.
+"""
 
 import numpy as np
 
 
+def _check_individual_vehicles(env, reward):
+    """Raise an error if the simulator does not model individual vehicles.
+
+    Raises
+    ------
+    NotImplementedError
+        if the simulator of the environment is macroscopic
+    """
+    if getattr(env, "simulator", None) == "ctm":
+        raise NotImplementedError(
+            'The {} reward requires individual vehicles, which are not '
+            'modeled by the "ctm" simulator.'.format(reward))
+
+
 def desired_velocity(env, fail=False, edge_list=None):
     """Encourage proximity to a desired velocity.
 
@@ -30,49 +53,43 @@ def desired_velocity(env, fail=False, edge_list=None):
         list of edges the reward is computed over. If no edge_list is defined,
         the reward is computed over all edges
     """
-    if edge_list is None:
-        veh_ids = env.k.vehicle.get_ids()
-    else:
-        veh_ids = env.k.vehicle.get_ids_by_edge(edge_list)
-
-    vel = np.array(env.k.vehicle.get_speed(veh_ids))
-    num_vehicles = len(veh_ids)
+    vel = env.k.metrics.get_speeds(edge_list)
+    num_vehicles = env.k.metrics.get_weights(edge_list)
 
-    if any(vel < -100) or fail:
+    if any(vel < -100) or fail or num_vehicles.sum() == 0:
         return 0.
 
     target_vel = env.env_params.additional_params['target_velocity']
-    max_cost = np.array([target_vel] * num_vehicles)
-    max_cost = np.linalg.norm(max_cost)
+    max_cost = target_vel * np.sqrt(num_vehicles.sum())
 
     cost = vel - target_vel
-    cost = np.linalg.norm(cost)
+    cost = np.sqrt(np.dot(num_vehicles, cost * cost))
 
     return max(max_cost - cost, 0) / max_cost
 
 
 def average_velocity(env, fail=False):
-    vel = np.array(env.k.vehicle.get_speed(env.k.vehicle.get_ids()))
+    vel = env.k.metrics.speeds
 
     if any(vel < -100) or fail:
         return 0.
     if len(vel) == 0:
         return 0.
 
-    return np.mean(vel)
+    return env.k.metrics.mean_speed
 
 
 def total_velocity(env, fail=False):
-    vel = np.array(env.k.vehicle.get_speed(env.k.vehicle.get_ids()))
+    vel = env.k.metrics.speeds
 
     if any(vel < -100) or fail:
         return 0.
     if len(vel) != 0:
-        return sum(vel)
+        return np.dot(env.k.metrics.weights, vel)
 
 
 def reward_density(env):
-    return env.k.vehicle.get_num_arrived() / env.sim_step
+    return env.k.metrics.num_arrived / env.sim_step
 
 
 def rl_forward_progress(env, gain=0.1):
@@ -86,7 +103,7 @@ def rl_forward_progress(env, gain=0.1):
     gain: float
         specifies how much to reward the RL vehicles
     """
-    rl_velocity = env.k.vehicle.get_speed(env.k.vehicle.get_rl_ids())
+    rl_velocity = env.k.metrics.rl_speeds
     rl_norm_vel = np.linalg.norm(rl_velocity, 1)
     return rl_norm_vel * gain
 
@@ -108,20 +125,17 @@ def min_delay(env):
         the environment variable, which contains information on the current
         state of the system.
     """
-    vel = np.array(env.k.vehicle.get_speed(env.k.vehicle.get_ids()))
-
+    vel = env.k.metrics.speeds
+    num_vehicles = env.k.metrics.weights[vel >= -1e-6]
     vel = vel[vel >= -1e-6]
-    v_top = max(
-        env.k.scenario.speed_limit(edge)
-        for edge in env.k.scenario.get_edge_list())
+    v_top = env.k.metrics.max_speed_limit
     time_step = env.sim_step
 
-    max_cost = time_step * sum(vel.shape)
-    try:
-        cost = time_step * sum((v_top - vel) / v_top)
-        return max((max_cost - cost) / max_cost, 0)
-    except ZeroDivisionError:
+    max_cost = time_step * num_vehicles.sum()
+    if max_cost == 0:
         return 0
+    cost = time_step * np.dot(num_vehicles, (v_top - vel) / v_top)
+    return max((max_cost - cost) / max_cost, 0)
 
 
 def min_delay_unscaled(env):
@@ -133,17 +147,16 @@ def min_delay_unscaled(env):
         the environment variable, which contains information on the current
         state of the system.
     """
-
-    vel = np.array(env.k.vehicle.get_speed(env.k.vehicle.get_ids()))
-
+    vel = env.k.metrics.speeds
+    weights = env.k.metrics.weights
+    num_vehicles = weights.sum()
+    weights = weights[vel >= -1e-6]
     vel = vel[vel >= -1e-6]
-    v_top = max(
-        env.k.scenario.speed_limit(edge)
-        for edge in env.k.scenario.get_edge_list())
+    v_top = env.k.metrics.max_speed_limit
     time_step = env.sim_step
 
-    cost = time_step * sum((v_top - vel) / v_top)
-    return cost / len(env.k.vehicle.get_ids())
+    cost = time_step * np.dot(weights, (v_top - vel) / v_top)
+    return cost / num_vehicles
 
 
 def penalize_standstill(env, gain=1):
@@ -161,17 +174,15 @@ def penalize_standstill(env, gain=1):
     gain : float
         multiplicative factor on the action penalty
     """
-    veh_ids = env.k.vehicle.get_ids()
-    vel = np.array(env.k.vehicle.get_speed(veh_ids))
-    num_standstill = len(vel[vel == 0])
+    vel = env.k.metrics.speeds
+    num_standstill = env.k.metrics.weights[vel == 0].sum()
     penalty = gain * num_standstill
     return -penalty
 
 
 def penalize_near_standstill(env, thresh=0.3, gain=1):
-    veh_ids = env.k.vehicle.get_ids()
-    vel = np.array(env.k.vehicle.get_speed(veh_ids))
-    penalize = len(vel[vel < thresh])
+    vel = env.k.metrics.speeds
+    penalize = env.k.metrics.weights[vel < thresh].sum()
     penalty = gain * penalize
     return -penalty
 
@@ -225,6 +236,7 @@ def punish_small_rl_headways(env,
     penalty_exponent: float, optional
         used to allow exponential punishing of smaller headways
     """
+    _check_individual_vehicles(env, "punish_small_rl_headways")
     headway_penalty = 0
     for veh_id in env.k.vehicle.get_rl_ids():
         if env.k.vehicle.get_headway(veh_id) < headway_threshold:
@@ -249,6 +261,7 @@ def punish_rl_lane_changes(env, penalty=1):
     penalty : float, optional
         penalty imposed on the reward function for any rl lane change action
     """
+    _check_individual_vehicles(env, "punish_rl_lane_changes")
     total_lane_change_penalty = 0
     for veh_id in env.k.vehicle.get_rl_ids():
         if env.k.vehicle.get_last_lc(veh_id) == env.timer:
@@ -281,6 +294,8 @@ def punish_queues_in_lane(env, edge, lane, penalty_gain=1, penalty_exponent=1):
         total reward (in this case a negative cost) corresponding to the queues
         in the lane in question
     """
+    _check_individual_vehicles(env, "punish_queues_in_lane")
+
     # IDs of all vehicles in passed-in lane
     lane_ids = [
         veh_id for veh_id in env.k.vehicle.get_ids_by_edge(edge)
@@ -307,6 +322,7 @@ def reward_rl_opening_headways(env, reward_gain=0.1, reward_exponent=1):
     float
         Reward value
     """
+    _check_individual_vehicles(env, "reward_rl_opening_headways")
     total_reward = 0
     for rl_id in env.k.vehicle.get_rl_ids():
         follower_id = env.k.vehicle.get_follower(rl_id)
@@ -8,12 +8,61 @@ E : etree.Element
 """
 import csv
 import errno
+import heapq
+import logging
 import os
+import pickle
+import shutil
+import tempfile
+import time
+from glob import glob
+
+import numpy as np
 from lxml import etree
-from xml.etree import ElementTree
+
+try:
+    # parquet output is only available if pyarrow is installed
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+    pq = None
 
 E = etree.Element
 
+# columns of the data extracted from emission files, along with their types.
+# The edge and lane number of a vehicle are parsed from its "lane" attribute,
+# and all other columns from the attribute of the same name (see
+# _EMISSION_ATTRIBUTES)
+EMISSION_COLUMNS = [
+    ('time', 'f8'), ('id', 'U'), ('type', 'U'), ('route', 'U'),
+    ('eclass', 'U'), ('edge_id', 'U'), ('lane_number', 'i8'),
+    ('relative_position', 'f8'), ('speed', 'f8'), ('x', 'f8'), ('y', 'f8'),
+    ('angle', 'f8'), ('waiting', 'f8'), ('CO', 'f8'), ('CO2', 'f8'),
+    ('HC', 'f8'), ('NOx', 'f8'), ('PMx', 'f8'), ('fuel', 'f8'),
+    ('electricity', 'f8'), ('noise', 'f8')
+]
+
+# order of the columns of csv files, which is that of the csv files generated
+# by previous versions of emission_to_csv
+_CSV_COLUMNS = [
+    'time', 'CO', 'y', 'CO2', 'electricity', 'type', 'id', 'eclass',
+    'waiting', 'NOx', 'fuel', 'HC', 'x', 'route', 'relative_position',
+    'noise', 'angle', 'PMx', 'speed', 'edge_id', 'lane_number'
+]
+
+# attributes of the vehicle elements of emission files that differ from the
+# name of their column
+_EMISSION_ATTRIBUTES = {'relative_position': 'pos'}
+
+# number of rows read at once from every sorted run during the merge phase of
+# the external sort
+_MERGE_BLOCK_SIZE = 4096
+
+# maximum number of sorted runs merged at once. If there are more runs, they
+# are merged in several passes, so that the number of open files is bounded
+_MERGE_FAN_IN = 64
+
 
 def makexml(name, nsl):
     """Create an xml file."""
@@ -47,6 +96,9 @@ def emission_to_csv(emission_path, output_path=None):
     flow. This means that some data, such as absolute position, is not
     immediately available from the emission file, but can be recreated.
 
+    The rows are sorted by vehicle id. The file is converted in bounded
+    memory (see emission_to_columnar).
+
     Parameters
     ----------
     emission_path: str
@@ -55,53 +107,354 @@ def emission_to_csv(emission_path, output_path=None):
         path to the csv file that will be generated, default is the same
         directory as the emission file, with the same name
     """
-    parser = etree.XMLParser(recover=True)
-    tree = ElementTree.parse(emission_path, parser=parser)
-    root = tree.getroot()
+    # default output path
+    if output_path is None:
+        output_path = emission_path[:-3] + 'csv'
 
-    # parse the xml data into a dict
-    out_data = []
-    for time in root.findall('timestep'):
-        t = float(time.attrib['time'])
+    emission_to_columnar(emission_path, output_path, fmt='csv', sort=True)
 
-        for car in time:
-            out_data.append(dict())
-            try:
-                out_data[-1]['time'] = t
-                out_data[-1]['CO'] = float(car.attrib['CO'])
-                out_data[-1]['y'] = float(car.attrib['y'])
-                out_data[-1]['CO2'] = float(car.attrib['CO2'])
-                out_data[-1]['electricity'] = float(car.attrib['electricity'])
-                out_data[-1]['type'] = car.attrib['type']
-                out_data[-1]['id'] = car.attrib['id']
-                out_data[-1]['eclass'] = car.attrib['eclass']
-                out_data[-1]['waiting'] = float(car.attrib['waiting'])
-                out_data[-1]['NOx'] = float(car.attrib['NOx'])
-                out_data[-1]['fuel'] = float(car.attrib['fuel'])
-                out_data[-1]['HC'] = float(car.attrib['HC'])
-                out_data[-1]['x'] = float(car.attrib['x'])
-                out_data[-1]['route'] = car.attrib['route']
-                out_data[-1]['relative_position'] = float(car.attrib['pos'])
-                out_data[-1]['noise'] = float(car.attrib['noise'])
-                out_data[-1]['angle'] = float(car.attrib['angle'])
-                out_data[-1]['PMx'] = float(car.attrib['PMx'])
-                out_data[-1]['speed'] = float(car.attrib['speed'])
-                out_data[-1]['edge_id'] = car.attrib['lane'].rpartition('_')[0]
-                out_data[-1]['lane_number'] = car.attrib['lane'].\
-                    rpartition('_')[-1]
-            except KeyError:
-                del out_data[-1]
 
-    # sort the elements of the dictionary by the vehicle id
-    out_data = sorted(out_data, key=lambda k: k['id'])
+def emission_to_columnar(emission_path,
+                         output_path=None,
+                         fmt=None,
+                         sort=False,
+                         chunk_size=100000):
+    """Convert an emission file generated by sumo into typed columnar chunks.
+
+    The emission file is parsed incrementally, and the rows (one per vehicle
+    and time step, with the columns of EMISSION_COLUMNS) are written in
+    chunks of at most ``chunk_size`` rows, so that memory usage does not
+    depend on the size of the file. Vehicles missing any of the attributes
+    are skipped.
+
+    Rows may be sorted by vehicle id (and time) with an external merge sort:
+    every chunk is sorted and spilled to a temporary directory, and the
+    sorted runs are then merged block by block.
+
+    Parameters
+    ----------
+    emission_path : str
+        path to the emission file that should be converted
+    output_path : str, optional
+        path of the output. For the "npz" format, this is a directory in which
+        the chunks are written as compressed .npz files (chunk_00000.npz,
+        chunk_00001.npz, ...); for the "parquet" and "csv" formats, this is a
+        single file. Defaults to the path of the emission file with the
+        extension of the format (or without extension for "npz").
+    fmt : str, optional
+        one of "npz", "parquet", or "csv". Defaults to "parquet" if pyarrow
+        is installed, and to "npz" otherwise.
+    sort : bool, optional
+        whether to sort the rows by vehicle id. Rows are otherwise ordered by
+        time, as in the emission file.
+    chunk_size : int, optional
+        maximum number of rows held in memory and written at once
+
+    Returns
+    -------
+    dict
+        throughput of the conversion: number of rows ("rows"), time in
+        seconds ("seconds"), and rows and input megabytes converted per
+        second ("rows_per_second", "mb_per_second")
+
+    Raises
+    ------
+    ValueError
+        if the format is not supported, or parquet is requested while pyarrow
+        is not installed
+    """
+    if fmt is None:
+        fmt = 'npz' if pyarrow is None else 'parquet'
+    if fmt not in _WRITERS:
+        raise ValueError('Format "{}" is not supported; must be one of {}.'
+                         .format(fmt, sorted(_WRITERS)))
+    if fmt == 'parquet' and pyarrow is None:
+        raise ValueError('pyarrow must be installed to write parquet files.')
 
     # default output path
     if output_path is None:
-        output_path = emission_path[:-3] + 'csv'
+        output_path = emission_path[:-4]
+        if fmt != 'npz':
+            output_path += '.' + fmt
+
+    t0 = time.time()
+    num_rows = 0
+    writer = _WRITERS[fmt](output_path)
+    run_dir = tempfile.mkdtemp() if sort else None
+    num_runs = 0
+    try:
+        for chunk in _iter_emission_chunks(emission_path, chunk_size):
+            num_rows += len(chunk['time'])
+            if sort:
+                _save_run(run_dir, num_runs, _sort_chunk(chunk))
+                num_runs += 1
+            else:
+                writer.write(chunk)
+
+        if sort:
+            for chunk in _merge_runs(run_dir, num_runs, chunk_size):
+                writer.write(chunk)
+    finally:
+        writer.close()
+        if run_dir is not None:
+            shutil.rmtree(run_dir)
+
+    seconds = time.time() - t0
+    megabytes = os.path.getsize(emission_path) / 1e6
+    stats = {
+        'rows': num_rows,
+        'seconds': seconds,
+        'rows_per_second': num_rows / max(seconds, 1e-9),
+        'mb_per_second': megabytes / max(seconds, 1e-9),
+    }
+    logging.info('Converted {} rows of {} in {:.2f}s ({:.0f} rows/s, '
+                 '{:.1f} MB/s)'.format(num_rows, emission_path, seconds,
+                                       stats['rows_per_second'],
+                                       stats['mb_per_second']))
+    return stats
+
+
+def read_columnar_chunks(path, columns=None):
+    """Read the chunks of a file generated by emission_to_columnar.
+
+    Parameters
+    ----------
+    path : str
+        path of the output of emission_to_columnar, either a directory of
+        .npz chunks, a parquet file, or a csv file
+    columns : list of str, optional
+        columns to be read, defaults to all columns
+
+    Yields
+    ------
+    dict of numpy.ndarray
+        values of every column in a chunk of rows
+    """
+    if columns is None:
+        columns = [name for name, _ in EMISSION_COLUMNS]
+
+    if os.path.isdir(path):
+        for chunk_path in sorted(glob(os.path.join(path, 'chunk_*.npz'))):
+            with np.load(chunk_path) as chunk:
+                yield {name: chunk[name] for name in columns}
+    elif path.endswith('.parquet'):
+        for batch in pq.ParquetFile(path).iter_batches(columns=columns):
+            yield {name: batch.column(name).to_numpy(zero_copy_only=False)
+                   for name in columns}
+    else:
+        dtypes = dict(EMISSION_COLUMNS)
+        with open(path, 'r') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            index = [header.index(name) for name in columns]
+            while True:
+                rows = [row for _, row in zip(range(100000), reader)]
+                if len(rows) == 0:
+                    break
+                values = list(zip(*rows))
+                yield {name: np.array(values[i], dtype=dtypes[name])
+                       for name, i in zip(columns, index)}
+
+
+def _iter_emission_chunks(emission_path, chunk_size):
+    """Parse an emission file incrementally into chunks of rows.
+
+    Elements are cleared as soon as they are parsed, so that the parsed tree
+    never holds more than one time step.
+
+    Yields
+    ------
+    dict of numpy.ndarray
+        values of every column of EMISSION_COLUMNS in a chunk of rows
+    """
+    # numerical attributes, following the time, ids, edge and lane columns
+    attributes = [(_EMISSION_ATTRIBUTES.get(name, name), float)
+                  for name, dtype in EMISSION_COLUMNS[1:] if dtype == 'f8']
+    rows = []
+    t = None
+    for event, elem in etree.iterparse(emission_path,
+                                       events=('start', 'end'),
+                                       tag=('timestep', 'vehicle'),
+                                       recover=True):
+        if event == 'start':
+            if elem.tag == 'timestep':
+                t = float(elem.get('time'))
+            continue
+
+        if elem.tag == 'vehicle':
+            attrib = elem.attrib
+            try:
+                edge, _, lane = attrib['lane'].rpartition('_')
+                row = [t, attrib['id'], attrib['type'], attrib['route'],
+                       attrib['eclass'], edge, int(lane)]
+                row.extend(convert(attrib[key]) for key, convert in attributes)
+            except KeyError:
+                pass
+            else:
+                rows.append(row)
+                if len(rows) == chunk_size:
+                    yield _to_columns(rows)
+                    rows = []
+        else:
+            # also discard the (cleared) time steps that were parsed so far
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    if len(rows) > 0:
+        yield _to_columns(rows)
+
+
+def _to_columns(rows):
+    """Convert a list of rows into a dict of typed column arrays."""
+    values = list(zip(*rows))
+    return {name: np.array(values[i], dtype=dtype)
+            for i, (name, dtype) in enumerate(EMISSION_COLUMNS)}
+
+
+def _sort_chunk(chunk):
+    """Sort the rows of a chunk by vehicle id and time."""
+    order = np.lexsort((chunk['time'], chunk['id']))
+    return {name: values[order] for name, values in chunk.items()}
+
+
+def _run_path(run_dir, run):
+    """Return the path of a sorted run."""
+    return os.path.join(run_dir, 'run_{}.pkl'.format(run))
+
+
+def _save_run(run_dir, run, chunk):
+    """Spill a sorted chunk to disk, as a new sorted run."""
+    with open(_run_path(run_dir, run), 'wb') as f:
+        _write_run_blocks(f, chunk)
+
+
+def _write_run_blocks(f, chunk):
+    """Append the rows of a sorted chunk to a run, block by block."""
+    num_rows = len(chunk['time'])
+    for start in range(0, num_rows, _MERGE_BLOCK_SIZE):
+        pickle.dump({name: values[start:start + _MERGE_BLOCK_SIZE]
+                     for name, values in chunk.items()}, f, protocol=4)
+
+
+def _iter_run(path):
+    """Iterate over the rows of a sorted run, reading it block by block.
+
+    Every run is a single file of consecutive blocks of rows, so that merging
+    runs only requires one open file per run.
+
+    Yields
+    ------
+    tuple
+        sort key (vehicle id and time) followed by the values of the row
+    """
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                break
+            columns = [block[name].tolist() for name, _ in EMISSION_COLUMNS]
+            for row in zip(*columns):
+                yield (row[1], row[0]) + row
+
+
+def _merge_runs(run_dir, num_runs, chunk_size):
+    """Merge sorted runs into sorted chunks of rows.
+
+    At most _MERGE_FAN_IN runs are merged at once: if there are more runs,
+    consecutive groups of runs are first merged into longer runs, until few
+    enough runs are left. Rows with the same sort key are ordered by run,
+    i.e. by their position in the emission file.
+    """
+    runs = [_run_path(run_dir, run) for run in range(num_runs)]
+    next_run = num_runs
+    while len(runs) > _MERGE_FAN_IN:
+        merged = []
+        for start in range(0, len(runs), _MERGE_FAN_IN):
+            group = runs[start:start + _MERGE_FAN_IN]
+            path = _run_path(run_dir, next_run)
+            next_run += 1
+            with open(path, 'wb') as f:
+                for chunk in _merge_group(group, chunk_size):
+                    _write_run_blocks(f, chunk)
+            for run_path in group:
+                os.remove(run_path)
+            merged.append(path)
+        runs = merged
+
+    for chunk in _merge_group(runs, chunk_size):
+        yield chunk
+
+
+def _merge_group(runs, chunk_size):
+    """Merge a group of sorted runs into sorted chunks of rows."""
+    rows = []
+    for row in heapq.merge(*[_iter_run(path) for path in runs]):
+        rows.append(row[2:])
+        if len(rows) == chunk_size:
+            yield _to_columns(rows)
+            rows = []
+    if len(rows) > 0:
+        yield _to_columns(rows)
+
+
+class _NpzWriter(object):
+    """Write chunks of rows as compressed .npz files in a directory."""
+
+    def __init__(self, path):
+        self.path = ensure_dir(path)
+        self.num_chunks = 0
+
+    def write(self, chunk):
+        np.savez_compressed(
+            os.path.join(self.path, 'chunk_{:05d}.npz'.format(
+                self.num_chunks)), **chunk)
+        self.num_chunks += 1
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter(object):
+    """Write chunks of rows as row groups of a parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, chunk):
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(chunk[name]) for name, _ in EMISSION_COLUMNS],
+            names=[name for name, _ in EMISSION_COLUMNS])
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _CsvWriter(object):
+    """Write chunks of rows to a csv file."""
+
+    def __init__(self, path):
+        self.file = open(path, 'w')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(_CSV_COLUMNS)
+
+    def write(self, chunk):
+        self.writer.writerows(
+            zip(*[chunk[name].tolist() for name in _CSV_COLUMNS]))
+
+    def close(self):
+        self.file.close()
+
 
-    # output the dict data into a csv file
-    keys = out_data[0].keys()
-    with open(output_path, 'w') as output_file:
-        dict_writer = csv.DictWriter(output_file, keys)
-        dict_writer.writeheader()
-        dict_writer.writerows(out_data)
+# writers of the formats supported by emission_to_columnar
+_WRITERS = {
+    'npz': _NpzWriter,
+    'parquet': _ParquetWriter,
+    'csv': _CsvWriter,
+}
@@ -0,0 +1,231 @@
+"""Asynchronous RLlib environment interleaving several Flow simulations.
+
+The standard Flow environment steps synchronously: the python process idles
+while the simulator computes a simulation step, and the simulator idles while
+python computes controllers, observations, and rewards. The environment in
+this file runs several Flow environments on separate threads and exposes them
+through RLlib's ``BaseEnv`` interface, so that the simulation step of one
+environment overlaps with the python-side work of another (TraCI releases the
+GIL while waiting on the socket).
+"""
+
+import threading
+import queue
+
+from ray.rllib.env import BaseEnv
+
+try:
+    from ray.rllib.env.base_env import _DUMMY_AGENT_ID
+except ImportError:
+    _DUMMY_AGENT_ID = "agent0"
+
+
+class _EnvThread(threading.Thread):
+    """Thread responsible for stepping a single Flow environment.
+
+    Actions are passed to the thread through an input queue, and the results
+    of every step/reset are placed in a queue shared by all threads. Errors
+    raised by the environment are placed in the results queue instead, so
+    that they are re-raised by the async env rather than killing the thread.
+    """
+
+    def __init__(self, env_id, env, results):
+        """Instantiate the thread.
+
+        Parameters
+        ----------
+        env_id : int
+            index of the environment within the async env
+        env : flow.envs.Env
+            the environment to be stepped
+        results : queue.Queue
+            queue shared by all threads, in which the outputs of the
+            environments are placed
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.env_id = env_id
+        self.env = env
+        self.commands = queue.Queue()
+        self.results = results
+
+    def run(self):
+        """Execute the commands requested by the async env."""
+        while True:
+            cmd, data = self.commands.get()
+            if cmd == "close":
+                self.env.terminate()
+                break
+
+            try:
+                if cmd == "step":
+                    result = self.env.step(data)
+                else:
+                    result = (self.env.reset(), None, None, None)
+            except Exception as e:
+                result = e
+            self.results.put((self.env_id, result))
+
+
+class FlowAsyncEnv(BaseEnv):
+    """RLlib-compatible asynchronous Flow environment.
+
+    Runs several (single or multi-agent) Flow environments on a single worker
+    and interleaves their execution. Observations are returned from ``poll``
+    as soon as any of the environments has completed its step, and actions are
+    passed to the environments that are ready via ``send_actions``.
+
+    Usage
+        >>> from flow.envs.async_env import FlowAsyncEnv
+        >>> from flow.utils.registry import make_create_env
+        >>> create_env, env_name = make_create_env(flow_params)
+        >>> register_env(env_name,
+        ...              lambda cfg: FlowAsyncEnv([create_env(cfg)
+        ...                                        for _ in range(4)]))
+
+    Attributes
+    ----------
+    envs : list of flow.envs.Env
+        the environments interleaved by this class
+    observation_space : gym.spaces.Space
+        observation space of the environments
+    action_space : gym.spaces.Space
+        action space of the environments
+    """
+
+    def __init__(self, envs):
+        """Instantiate the async environment and reset all sub-environments.
+
+        Parameters
+        ----------
+        envs : list of flow.envs.Env
+            the environments to interleave. They must share their observation
+            and action spaces.
+        """
+        self.envs = envs
+        self.observation_space = envs[0].observation_space
+        self.action_space = envs[0].action_space
+        self._results = queue.Queue()
+        self._threads = [_EnvThread(i, env, self._results)
+                         for i, env in enumerate(envs)]
+        # number of environments performing a step or reset, or whose
+        # results were not returned by poll yet
+        self._pending = 0
+        # results received but not returned yet, since poll raised the error
+        # of another environment
+        self._ready = []
+
+        for thread in self._threads:
+            thread.start()
+            thread.commands.put(("reset", None))
+            self._pending += 1
+
+    def poll(self):
+        """Return the outputs of all environments that finished a step.
+
+        This blocks until at least one environment is ready.
+
+        Returns
+        -------
+        dict
+            observations, keyed by env id and agent id
+        dict
+            rewards, keyed by env id and agent id
+        dict
+            done flags, keyed by env id and agent id (plus "__all__")
+        dict
+            info dicts, keyed by env id and agent id
+        dict
+            off-policy actions (always empty)
+
+        Raises
+        ------
+        Exception
+            any error raised by the step or reset of an environment. Errors
+            are raised one at a time, and the outputs of the other
+            environments that are ready are returned by the next calls
+        """
+        obs, rewards, dones, infos = {}, {}, {}, {}
+        if self._pending == 0:
+            # no environment is running, so there is nothing to wait for
+            return obs, rewards, dones, infos, {}
+
+        if len(self._ready) == 0:
+            self._ready.append(self._results.get())
+        while True:
+            try:
+                self._ready.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+
+        for i, (_, result) in enumerate(self._ready):
+            if isinstance(result, Exception):
+                del self._ready[i]
+                self._pending -= 1
+                raise result
+
+        ready, self._ready = self._ready, []
+        self._pending -= len(ready)
+
+        for env_id, (ob, rew, done, info) in ready:
+            if isinstance(ob, dict):
+                # multi-agent environments are already keyed by agent id
+                obs[env_id] = ob
+                rewards[env_id] = rew if rew is not None else \
+                    {key: 0 for key in ob}
+                dones[env_id] = done if done is not None else \
+                    {"__all__": False}
+                infos[env_id] = info if info is not None else \
+                    {key: {} for key in ob}
+            else:
+                done = bool(done)
+                obs[env_id] = {_DUMMY_AGENT_ID: ob}
+                rewards[env_id] = {_DUMMY_AGENT_ID: rew or 0}
+                dones[env_id] = {_DUMMY_AGENT_ID: done, "__all__": done}
+                infos[env_id] = {_DUMMY_AGENT_ID: info or {}}
+
+        return obs, rewards, dones, infos, {}
+
+    def send_actions(self, action_dict):
+        """Send actions to the environments that are ready.
+
+        Each environment starts its step as soon as its actions are received,
+        so this method returns immediately.
+
+        Parameters
+        ----------
+        action_dict : dict
+            actions keyed by env id and agent id
+        """
+        for env_id, actions in action_dict.items():
+            if _DUMMY_AGENT_ID in actions and len(actions) == 1:
+                actions = actions[_DUMMY_AGENT_ID]
+            self._threads[env_id].commands.put(("step", actions))
+            self._pending += 1
+
+    def try_reset(self, env_id):
+        """Reset a single environment.
+
+        This is only called by RLlib once the environment is done, at which
+        point its thread is idle, so the reset is performed in the calling
+        thread.
+
+        Returns
+        -------
+        dict
+            initial observations, keyed by agent id
+        """
+        obs = self.envs[env_id].reset()
+        if isinstance(obs, dict):
+            return obs
+        return {_DUMMY_AGENT_ID: obs}
+
+    def get_unwrapped(self):
+        """Return the underlying Flow environments."""
+        return self.envs
+
+    def close(self):
+        """Terminate all environments."""
+        for thread in self._threads:
+            thread.commands.put(("close", None))
+        for thread in self._threads:
+            thread.join()
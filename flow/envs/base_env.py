@@ -1,13 +1,16 @@
 """Base environment class. This is the parent of all other environments."""
 
 import os
-from copy import deepcopy
 import atexit
 import time
 import traceback
 import numpy as np
 import random
-from flow.renderer.pyglet_renderer import PygletRenderer as Renderer
+import functools
+from flow.renderer.pyglet_renderer import PygletRenderer
+from flow.renderer.headless_renderer import HeadlessRenderer
+from flow.renderer.ring_buffer import ArrayRingBuffer
+from flow.renderer.async_renderer import AsyncRenderer
 
 import gym
 from gym.spaces import Box
@@ -25,6 +28,10 @@ except ImportError:
 
 from flow.core.util import ensure_dir
 from flow.core.kernel import Kernel
+from flow.core.profiler import EpisodeProfiler
+from flow.controllers.car_following_models import SimCarFollowingController
+from flow.controllers.rlcontroller import RLController
+from flow.controllers.lane_change_controllers import SimLaneChangeController
 from flow.utils.exceptions import FatalFlowError
 
 # pick out the correct class definition
@@ -62,9 +69,12 @@ class Env(*classdef):
        see flow/core/params.py
     scenario: Scenario type
         see flow/scenarios/base_scenario.py
+    simulator: str, optional
+        the simulator used, one of {'traci', 'ring', 'ctm'}. Defaults to
+        'traci'.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         # Invoke serializable if using rllab
         if serializable_flag:
             Serializable.quick_init(self, locals())
@@ -88,12 +98,24 @@ class Env(*classdef):
         self.initial_state = {}
         self.state = None
         self.obs_var_labels = []
+        # preallocated observation buffer (see flow/core/observation.py). This
+        # is created by environments on their first call to get_state
+        self.obs_builder = None
+
+        # profiler of one in every N episodes (see flow/core/profiler.py)
+        self.profiler = None
+        if env_params.profile_path is not None:
+            self.profiler = EpisodeProfiler(
+                env_params.profile_path,
+                every_n_episodes=env_params.profile_every_n_episodes,
+                mode=env_params.profile_mode,
+                interval=env_params.profile_interval)
 
         # simulation step size
         self.sim_step = sim_params.sim_step
 
         # the simulator used by this environment
-        self.simulator = 'traci'
+        self.simulator = simulator
 
         # create the Flow kernel
         self.k = Kernel(simulator=self.simulator,
@@ -103,8 +125,9 @@ class Env(*classdef):
         # scenario components within the scenario kernel
         self.k.scenario.generate_network(scenario)
 
-        # initial the vehicles kernel using the VehicleParams object
-        self.k.vehicle.initialize(deepcopy(scenario.vehicles))
+        # initial the vehicles kernel using the VehicleParams object. This
+        # object is only read from, and therefore does not need to be copied
+        self.k.vehicle.initialize(scenario.vehicles)
 
         # initialize the simulation using the simulation kernel. This will use
         # the scenario kernel as an input in order to determine what network
@@ -121,15 +144,7 @@ class Env(*classdef):
         self.available_routes = self.k.scenario.rts
 
         # store the initial vehicle ids
-        self.initial_ids = deepcopy(scenario.vehicles.ids)
-
-        # store the initial state of the vehicles kernel (needed for restarting
-        # the simulation)
-        self.k.vehicle.kernel_api = None
-        self.k.vehicle.master_kernel = None
-        self.initial_vehicles = deepcopy(self.k.vehicle)
-        self.k.vehicle.kernel_api = self.k.kernel_api
-        self.k.vehicle.master_kernel = self.k
+        self.initial_ids = list(scenario.vehicles.ids)
 
         self.setup_initial_state()
 
@@ -148,14 +163,31 @@ class Env(*classdef):
                 lane_poly = [i for pt in _lane_poly for i in pt]
                 network.append(lane_poly)
 
-            # instantiate a pyglet renderer
-            self.renderer = Renderer(
+            # instantiate a pyglet or headless renderer
+            renderer = self.sim_params.renderer
+            if renderer == "pyglet":
+                Renderer = PygletRenderer
+            elif renderer == "headless":
+                Renderer = HeadlessRenderer
+            else:
+                raise ValueError('Renderer %s is not supported!' % renderer)
+            make_renderer = functools.partial(
+                Renderer,
                 network,
                 self.sim_params.render,
                 save_render,
                 sight_radius=sight_radius,
                 pxpm=pxpm,
                 show_radius=show_radius)
+            if self.sim_params.render_async:
+                # render in a background thread, see
+                # flow/renderer/async_renderer.py
+                self.renderer = AsyncRenderer(
+                    make_renderer,
+                    queue_size=self.sim_params.render_queue_size,
+                    block=self.sim_params.render_block)
+            else:
+                self.renderer = make_renderer()
 
             # render a frame
             self.render(reset=True)
@@ -184,8 +216,10 @@ class Env(*classdef):
         """
         self.k.close()
 
-        # killed the sumo process if using sumo/TraCI
-        if self.simulator == 'traci':
+        # killed the sumo process if using sumo/TraCI (no process is started
+        # when replaying a TraCI trace)
+        if self.simulator == 'traci' and \
+                self.k.simulation.sumo_proc is not None:
             self.k.simulation.sumo_proc.kill()
 
         if render is not None:
@@ -196,7 +230,7 @@ class Env(*classdef):
             self.sim_params.emission_path = sim_params.emission_path
 
         self.k.scenario.generate_network(self.scenario)
-        self.k.vehicle.initialize(deepcopy(self.scenario.vehicles))
+        self.k.vehicle.initialize(self.scenario.vehicles)
         kernel_api = self.k.simulation.start_simulation(
             scenario=self.k.scenario, sim_params=self.sim_params)
         self.k.pass_api(kernel_api)
@@ -260,57 +294,7 @@ class Env(*classdef):
             contains other diagnostic information from the previous action
         """
         for _ in range(self.env_params.sims_per_step):
-            self.time_counter += 1
-            self.step_counter += 1
-
-            # perform acceleration actions for controlled human-driven vehicles
-            if len(self.k.vehicle.get_controlled_ids()) > 0:
-                accel = []
-                for veh_id in self.k.vehicle.get_controlled_ids():
-                    action = self.k.vehicle.get_acc_controller(
-                        veh_id).get_action(self)
-                    accel.append(action)
-                self.k.vehicle.apply_acceleration(
-                    self.k.vehicle.get_controlled_ids(), accel)
-
-            # perform lane change actions for controlled human-driven vehicles
-            if len(self.k.vehicle.get_controlled_lc_ids()) > 0:
-                direction = []
-                for veh_id in self.k.vehicle.get_controlled_lc_ids():
-                    target_lane = self.k.vehicle.get_lane_changing_controller(
-                        veh_id).get_action(self)
-                    direction.append(target_lane)
-                self.k.vehicle.apply_lane_change(
-                    self.k.vehicle.get_controlled_lc_ids(),
-                    direction=direction)
-
-            # perform (optionally) routing actions for all vehicles in the
-            # network, including RL and SUMO-controlled vehicles
-            routing_ids = []
-            routing_actions = []
-            for veh_id in self.k.vehicle.get_ids():
-                if self.k.vehicle.get_routing_controller(veh_id) \
-                        is not None:
-                    routing_ids.append(veh_id)
-                    route_contr = self.k.vehicle.get_routing_controller(
-                        veh_id)
-                    routing_actions.append(route_contr.choose_route(self))
-
-            self.k.vehicle.choose_routes(routing_ids, routing_actions)
-
-            self.apply_rl_actions(rl_actions)
-
-            self.additional_command()
-
-            # advance the simulation in the simulator by one step
-            self.k.simulation.simulation_step()
-
-            # store new observations in the vehicles and traffic lights class
-            self.k.update(reset=False)
-
-            # update the colors of vehicles
-            if self.sim_params.render:
-                self.k.vehicle.update_vehicle_colors()
+            self._simulation_step(rl_actions)
 
             # crash encodes whether the simulator experienced a collision
             crash = self.k.simulation.check_collision()
@@ -352,10 +336,15 @@ class Env(*classdef):
                 infos[key] = {}
         else:
             # collect information of the state of the network based on the
-            # environment class used
+            # environment class used. For the one-dimensional observations of
+            # most environments, this is a view and does not allocate memory
             self.state = np.asarray(states).T
 
-            # collect observation new state associated with action
+            # collect observation new state associated with action. The states
+            # are copied since environments may return a buffer that is reused
+            # at every step (see flow.core.observation), whereas the caller
+            # (e.g. the replay buffer of an RL algorithm) may keep a reference
+            # to the observation.
             next_observation = np.copy(states)
 
             # test if the agent should terminate due to a crash
@@ -370,6 +359,128 @@ class Env(*classdef):
 
         return next_observation, reward, done, infos
 
+    def _simulation_step(self, rl_actions):
+        """Advance the simulation by a single simulation step.
+
+        This performs the simulation-side work of an environment step:
+        computing the actions of controlled human-driven vehicles, routing
+        vehicles, applying the rl actions, and running the env-specific
+        ``additional_command``, before advancing the simulator and updating
+        the kernel. Observations and rewards are not computed.
+
+        Parameters
+        ----------
+        rl_actions : array_like or dict or None
+            actions provided by the rl algorithm, or None if the rl agents are
+            to be left to the control of the simulator
+        """
+        self.time_counter += 1
+        self.step_counter += 1
+
+        # perform acceleration actions for controlled human-driven vehicles
+        if len(self.k.vehicle.get_controlled_ids()) > 0:
+            accel = []
+            for veh_id in self.k.vehicle.get_controlled_ids():
+                action = self.k.vehicle.get_acc_controller(
+                    veh_id).get_action(self)
+                accel.append(action)
+            self.k.vehicle.apply_acceleration(
+                self.k.vehicle.get_controlled_ids(), accel)
+
+        # perform lane change actions for controlled human-driven vehicles
+        if len(self.k.vehicle.get_controlled_lc_ids()) > 0:
+            direction = []
+            for veh_id in self.k.vehicle.get_controlled_lc_ids():
+                target_lane = self.k.vehicle.get_lane_changing_controller(
+                    veh_id).get_action(self)
+                direction.append(target_lane)
+            self.k.vehicle.apply_lane_change(
+                self.k.vehicle.get_controlled_lc_ids(),
+                direction=direction)
+
+        # perform (optionally) routing actions for all vehicles in the
+        # network, including RL and SUMO-controlled vehicles
+        routing_ids = []
+        routing_actions = []
+        for veh_id in self.k.vehicle.get_ids():
+            if self.k.vehicle.get_routing_controller(veh_id) is not None:
+                routing_ids.append(veh_id)
+                route_contr = self.k.vehicle.get_routing_controller(veh_id)
+                routing_actions.append(route_contr.choose_route(self))
+
+        self.k.vehicle.choose_routes(routing_ids, routing_actions)
+
+        self.apply_rl_actions(rl_actions)
+
+        self.additional_command()
+
+        # advance the simulation in the simulator by one step
+        self.k.simulation.simulation_step()
+
+        # store new observations in the vehicles and traffic lights class
+        self.k.update(reset=False)
+
+        # update the colors of vehicles
+        if self.sim_params.render:
+            self.k.vehicle.update_vehicle_colors()
+
+    def _warmup(self):
+        """Perform the warm-up steps at the start of a rollout.
+
+        Only the simulation-side work of a step is performed (see
+        ``_simulation_step``), as any observations and rewards would be
+        discarded. Moreover, if no Flow-specified controllers or env-specific
+        commands are active, all warm-up steps are simulated by the simulator
+        in a single call.
+        """
+        num_steps = self.env_params.warmup_steps * \
+            self.env_params.sims_per_step
+
+        if num_steps > 1 and self._can_fast_forward():
+            self.time_counter += num_steps
+            self.step_counter += num_steps
+
+            self.k.simulation.simulation_step(num_steps)
+            self.k.vehicle.synchronize(num_steps)
+            self.k.update(reset=False)
+
+            if self.sim_params.render:
+                self.k.vehicle.update_vehicle_colors()
+        else:
+            for _ in range(num_steps):
+                self._simulation_step(rl_actions=None)
+
+    def _can_fast_forward(self):
+        """Check whether the simulation may be advanced without Flow.
+
+        This is the case if neither the vehicle types (including those of
+        inflows) use Flow-specified acceleration, lane-changing, or routing
+        controllers, nor the environment specifies additional commands.
+
+        Moreover, sumo only reports the vehicles that departed or arrived in
+        the last step, so vehicles of inflows that would both enter and exit
+        the network during the warm-up steps would be missing from the
+        departure and arrival histories. The warm-up steps are therefore not
+        skipped in networks with inflows simulated by sumo.
+        """
+        if type(self).additional_command is not Env.additional_command:
+            return False
+
+        if self.simulator == 'traci' and \
+                len(self.scenario.net_params.inflows.get()) > 0:
+            return False
+
+        for type_params in self.k.vehicle.type_parameters.values():
+            accel_controller = type_params["acceleration_controller"][0]
+            lc_controller = type_params["lane_change_controller"][0]
+            if accel_controller not in (SimCarFollowingController,
+                                        RLController) \
+                    or lc_controller != SimLaneChangeController \
+                    or type_params["routing_controller"] is not None:
+                return False
+
+        return True
+
     def reset(self):
         """Reset the environment.
 
@@ -386,6 +497,11 @@ class Env(*classdef):
             the initial observation of the space. The initial reward is assumed
             to be zero.
         """
+        # write the profile of the previous episode, and decide whether to
+        # profile the next one
+        if self.profiler is not None:
+            self.profiler.start_episode(self)
+
         # reset the time counter
         self.time_counter = 0
 
@@ -409,9 +525,8 @@ class Env(*classdef):
             # issue a random seed to induce randomness into the next rollout
             self.sim_params.seed = random.randint(0, 1e5)
 
-            self.k.vehicle = deepcopy(self.initial_vehicles)
-            self.k.vehicle.master_kernel = self.k
-            # restart the sumo instance
+            # restart the sumo instance. This also re-initializes the vehicle
+            # kernel from the VehicleParams object of the scenario
             self.restart_simulation(self.sim_params)
 
         elif self.scenario.initial_config.shuffle:
@@ -419,11 +534,17 @@ class Env(*classdef):
             self.setup_initial_state()
 
         # clear all vehicles from the network and the vehicles class
-        for veh_id in self.k.kernel_api.vehicle.getIDList():  # FIXME: hack
-            try:
-                self.k.vehicle.remove(veh_id)
-            except (FatalTraCIError, TraCIException):
-                print("Error during start: {}".format(traceback.format_exc()))
+        if self.simulator == 'traci':
+            for veh_id in self.k.kernel_api.vehicle.getIDList():  # FIXME: hack
+                try:
+                    self.k.vehicle.remove(veh_id)
+                except (FatalTraCIError, TraCIException):
+                    print("Error during start: {}".format(
+                        traceback.format_exc()))
+        elif self.simulator == 'ctm':
+            # vehicles are not tracked individually by the cell transmission
+            # model, so the densities of all cells are reset instead
+            self.k.kernel_api.clear()
 
         # clear all vehicles from the network and the vehicles class
         # FIXME (ev, ak) this is weird and shouldn't be necessary
@@ -482,6 +603,9 @@ class Env(*classdef):
                 msg += '- {}: {}\n'.format(veh_id, self.initial_state[veh_id])
             raise FatalFlowError(msg=msg)
 
+        # perform (optional) warm-up steps before training
+        self._warmup()
+
         states = self.get_state()
         if isinstance(states, dict):
             self.state = {}
@@ -499,13 +623,10 @@ class Env(*classdef):
             # environment class used
             self.state = np.asarray(states).T
 
-            # observation associated with the reset (no warm-up steps)
+            # observation associated with the reset (copied for the same
+            # reason as in step)
             observation = np.copy(states)
 
-        # perform (optional) warm-up steps before training
-        for _ in range(self.env_params.warmup_steps):
-            observation, _, _, _ = self.step(rl_actions=None)
-
         # render a frame
         self.render(reset=True)
 
@@ -632,6 +753,8 @@ class Env(*classdef):
                 "Closing connection to TraCI and stopping simulation.\n"
                 "Note, this may print an error message when it closes."
             )
+            if self.profiler is not None:
+                self.profiler.close(self)
             self.k.close()
 
             # close pyglet renderer
@@ -652,23 +775,31 @@ class Env(*classdef):
             length of the buffer
         """
         if self.sim_params.render in ['gray', 'dgray', 'rgb', 'drgb']:
-            # render a frame
-            self.pyglet_render()
+            # render a frame every render_every_n_steps steps, the frame and
+            # local observations are otherwise those of the last render
+            if reset or self.step_counter % \
+                    self.sim_params.render_every_n_steps == 0:
+                self.pyglet_render(reset)
 
-            # cache rendering
+            # cache rendering in fixed-size ring buffers
             if reset:
-                self.frame_buffer = [self.frame.copy() for _ in range(5)]
-                self.sights_buffer = [self.sights.copy() for _ in range(5)]
-            else:
-                if self.step_counter % int(1/self.sim_step) == 0:
-                    self.frame_buffer.append(self.frame.copy())
-                    self.sights_buffer.append(self.sights.copy())
-                if len(self.frame_buffer) > buffer_length:
-                    self.frame_buffer.pop(0)
-                    self.sights_buffer.pop(0)
+                self.frame_buffer = ArrayRingBuffer(buffer_length)
+                self.sights_buffer = ArrayRingBuffer(buffer_length)
+                self.frame_buffer.fill(self.frame)
+                self.sights_buffer.fill(self.sights)
+            elif self.step_counter % int(1/self.sim_step) == 0:
+                self.frame_buffer.append(self.frame)
+                self.sights_buffer.append(self.sights)
 
-    def pyglet_render(self):
-        """Render a frame using pyglet."""
+    def pyglet_render(self, reset=False):
+        """Render a frame using pyglet.
+
+        Parameters
+        ----------
+        reset: bool
+            specifies whether to wait for the frame to be rendered, if the
+            frame is rendered asynchronously
+        """
 
         # get human and RL simulation status
         human_idlist = self.k.vehicle.get_human_ids()
@@ -711,26 +842,26 @@ class Env(*classdef):
             machine_dynamics.append(
                 self.k.vehicle.get_speed(id)/max_speed)
 
+        render_args = (human_orientations,
+                       machine_orientations,
+                       human_dynamics,
+                       machine_dynamics,
+                       human_logs,
+                       machine_logs)
+        sight_ids = [log[2] for log in machine_logs]
+
+        if self.sim_params.render_async:
+            # hand the step to the background renderer, and use the most
+            # recent completed frame
+            self.renderer.submit(render_args, machine_orientations,
+                                 sight_ids, wait=reset)
+            self.frame, self.sights = self.renderer.get_latest()
+            return
+
         # step the renderer
-        self.frame = self.renderer.render(human_orientations,
-                                          machine_orientations,
-                                          human_dynamics,
-                                          machine_dynamics,
-                                          human_logs,
-                                          machine_logs)
-
-        # get local observation of RL vehicles
-        self.sights = []
-        for id in human_idlist:
-            # Force tracking human vehicles by adding "track" in vehicle id.
-            # The tracked human vehicles will be treated as machine vehicles.
-            if "track" in id:
-                orientation = self.k.vehicle.get_orientation(id)
-                sight = self.renderer.get_sight(
-                    orientation, id)
-                self.sights.append(sight)
-        for id in machine_idlist:
-            orientation = self.k.vehicle.get_orientation(id)
-            sight = self.renderer.get_sight(
-                orientation, id)
-            self.sights.append(sight)
+        self.frame = self.renderer.render(*render_args)
+
+        # get local observation of RL vehicles and tracked human vehicles, in
+        # the order of machine_orientations, at once
+        self.sights = self.renderer.get_sights(machine_orientations,
+                                               sight_ids)
@@ -60,8 +60,8 @@ class BayBridgeEnv(Env):
         vehicles collide into one another.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
-        super().__init__(env_params, sim_params, scenario)
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
+        super().__init__(env_params, sim_params, scenario, simulator)
         self.edge_dict = defaultdict(list)
         self.cars_waiting_for_toll = dict()
         self.cars_before_ramp = dict()
@@ -216,7 +216,7 @@ class BayBridgeEnv(Env):
     # TODO: decide on a good reward function
     def compute_reward(self, rl_actions, **kwargs):
         """See class definition."""
-        return np.mean(self.k.vehicle.get_speed(self.k.vehicle.get_ids()))
+        return self.k.metrics.mean_speed
 
     """ The below methods need to be updated by child classes. """
 
@@ -22,6 +22,8 @@ import numpy as np
 from gym.spaces.box import Box
 
 from flow.core import rewards
+from flow.core.accumulators import RingBuffer
+from flow.core.observation import ObservationBuilder, SlotMap
 from flow.envs.base_env import Env
 
 MAX_LANES = 4  # base number of largest number of lanes in the network
@@ -92,7 +94,7 @@ PERIOD = 10.0
 
 
 class BottleneckEnv(Env):
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         """Environment used as a simplified representation of the toll booth
         portion of the bay bridge. Contains ramp meters, and a toll both.
 
@@ -110,7 +112,7 @@ class BottleneckEnv(Env):
             if p not in scenario.net_params.additional_params:
                 raise KeyError('Net parameter "{}" not supplied'.format(p))
 
-        super().__init__(env_params, sim_params, scenario)
+        super().__init__(env_params, sim_params, scenario, simulator)
         env_add_params = self.env_params.additional_params
         # tells how scaled the number of lanes are
         self.scaling = scenario.net_params.additional_params.get("scaling")
@@ -148,8 +150,8 @@ class BottleneckEnv(Env):
         self.red_min = 2
         self.feedback_coeff = env_add_params.get("feedback_coeff", 20)
 
-        self.smoothed_num = np.zeros(10)  # averaged number of vehs in '4'
-        self.outflow_index = 0
+        # averaged number of vehs in '4'
+        self.smoothed_num = RingBuffer(10, fill=0.)
 
     def additional_command(self):
         super().additional_command()
@@ -179,10 +181,7 @@ class BottleneckEnv(Env):
             self.alinea()
 
         # compute the outflow
-        veh_ids = self.k.vehicle.get_ids_by_edge('4')
-        self.smoothed_num[self.outflow_index] = len(veh_ids)
-        self.outflow_index = \
-            (self.outflow_index + 1) % self.smoothed_num.shape[0]
+        self.smoothed_num.push(self.k.vehicle.get_segment_counts('4').sum())
 
         if self.time_counter > self.next_period:
             self.density = self.cars_arrived  # / (PERIOD/self.sim_step)
@@ -241,7 +240,7 @@ class BottleneckEnv(Env):
             # now implement the integral controller update
             # find all the vehicles in an edge
             q_update = self.feedback_coeff * (
-                self.n_crit - np.average(self.smoothed_num))
+                self.n_crit - self.smoothed_num.mean)
             self.q = np.clip(
                 self.q + q_update, a_min=self.q_min, a_max=self.q_max)
             # convert q to cycle time
@@ -343,21 +342,25 @@ class BottleneckEnv(Env):
 
     def get_bottleneck_density(self, lanes=None):
         BOTTLE_NECK_LEN = 280
-        bottleneck_ids = self.k.vehicle.get_ids_by_edge(['3', '4'])
-        if lanes:
-            veh_ids = [
-                veh_id for veh_id in bottleneck_ids
-                if str(self.k.vehicle.get_edge(veh_id)) + "_" +
-                str(self.k.vehicle.get_lane(veh_id)) in lanes
-            ]
-        else:
-            veh_ids = self.k.vehicle.get_ids_by_edge(['3', '4'])
-        return len(veh_ids) / BOTTLE_NECK_LEN
+        num_vehicles = 0
+        for edge in ['3', '4']:
+            # number of vehicles in each lane of the edge
+            counts = self.k.vehicle.get_segment_counts(edge).sum(axis=0)
+            if lanes:
+                counts = [count for lane, count in enumerate(counts)
+                          if "{}_{}".format(edge, lane) in lanes]
+            num_vehicles += sum(counts)
+        return num_vehicles / BOTTLE_NECK_LEN
 
     def get_avg_bottleneck_velocity(self):
-        veh_ids = self.k.vehicle.get_ids_by_edge(['3', '4', '5'])
-        return sum(self.k.vehicle.get_speed(veh_ids)) / len(veh_ids) \
-            if len(veh_ids) != 0 else 0
+        num_vehicles = 0
+        total_speed = 0
+        for edge in ['3', '4', '5']:
+            counts = self.k.vehicle.get_segment_counts(edge)
+            speeds = self.k.vehicle.get_segment_speeds(edge)
+            num_vehicles += counts.sum()
+            total_speed += (counts * speeds).sum()
+        return total_speed / num_vehicles if num_vehicles > 0 else 0
 
     # Dummy action and observation spaces
     @property
@@ -418,14 +421,20 @@ class BottleNeckAccelEnv(BottleneckEnv):
 
        """
 
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         for p in ADDITIONAL_RL_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
                 raise KeyError(
                     'Environment parameter "{}" not supplied'.format(p))
 
-        super().__init__(env_params, sim_params, scenario)
+        super().__init__(env_params, sim_params, scenario, simulator)
         self.add_rl_if_exit = env_params.get_additional_param("add_rl_if_exit")
+        self.num_rl = self.scenario.vehicles.num_rl_vehicles
+        self.max_speed = self.k.scenario.max_speed()
+
+        # maps rl vehicles to their position in the observation. The initial
+        # rl vehicles keep their slots, even if they exit the network
+        self.rl_slots = SlotMap(self.num_rl, ids=self.rl_id_list)
 
     @property
     def observation_space(self):
@@ -440,105 +449,74 @@ class BottleNeckAccelEnv(BottleneckEnv):
     def get_state(self):
         """See class definition."""
         headway_scale = 1000
-
-        rl_ids = self.k.vehicle.get_rl_ids()
-
-        # rl vehicle data (absolute position, speed, and lane index)
-        rl_obs = np.empty(0)
-        id_counter = 0
-        for veh_id in rl_ids:
-            # check if we have skipped a vehicle, if not, pad
-            rl_id_num = self.rl_id_list.index(veh_id)
-            if rl_id_num != id_counter:
-                rl_obs = np.concatenate(
-                    (rl_obs, np.zeros(4 * (rl_id_num - id_counter))))
-                id_counter = rl_id_num + 1
-            else:
-                id_counter += 1
-
-            # get the edge and convert it to a number
-            edge_num = self.k.vehicle.get_edge(veh_id)
-            if edge_num is None:
-                edge_num = -1
-            elif edge_num == '':
-                edge_num = -1
-            elif edge_num[0] == ':':
-                edge_num = -1
-            else:
-                edge_num = int(edge_num) / 6
-            rl_obs = np.concatenate((rl_obs, [
-                self.k.vehicle.get_x_by_id(veh_id) / 1000,
-                (self.k.vehicle.get_speed(veh_id) / self.max_speed),
-                (self.k.vehicle.get_lane(veh_id) / MAX_LANES), edge_num
-            ]))
-        # if all the missing vehicles are at the end, pad
-        diff = self.num_rl - int(rl_obs.shape[0] / 4)
-        if diff > 0:
-            rl_obs = np.concatenate((rl_obs, np.zeros(4 * diff)))
+        num_lanes = MAX_LANES * self.scaling
+        edge_list = self.k.scenario.get_edge_list()
+
+        if self.obs_builder is None:
+            self.obs_builder = ObservationBuilder(
+                self.observation_space,
+                [("rl", (self.num_rl, 4)),
+                 ("relative", (self.num_rl, 4, num_lanes)),
+                 ("edge", (len(edge_list), 2))])
+
+        # rl vehicles that are missing from the network are padded with zeros
+        # at their normal position in the order
+        rl_ids, slots = self.rl_slots.update(self.k.vehicle.get_rl_ids())
+
+        # rl vehicle data (absolute position, speed, lane index, and edge
+        # number)
+        rl_obs = self.obs_builder["rl"]
+        rl_obs[:] = 0
+        if len(rl_ids) > 0:
+            # get the edges and convert them to numbers
+            edge_num = [
+                -1 if not edge or edge[0] == ':' else int(edge) / 6
+                for edge in self.k.vehicle.get_edge(rl_ids)
+            ]
+            rl_obs[slots, 0] = np.asarray(
+                [self.k.vehicle.get_x_by_id(veh_id)
+                 for veh_id in rl_ids]) / 1000
+            rl_obs[slots, 1] = np.asarray(
+                self.k.vehicle.get_speed(rl_ids)) / self.max_speed
+            rl_obs[slots, 2] = np.asarray(
+                self.k.vehicle.get_lane(rl_ids)) / MAX_LANES
+            rl_obs[slots, 3] = edge_num
 
         # relative vehicles data (lane headways, tailways, vel_ahead, and
-        # vel_behind)
-        relative_obs = np.empty(0)
-        id_counter = 0
-        for veh_id in rl_ids:
-            # check if we have skipped a vehicle, if not, pad
-            rl_id_num = self.rl_id_list.index(veh_id)
-            if rl_id_num != id_counter:
-                pad_mat = np.zeros(
-                    4 * MAX_LANES * self.scaling * (rl_id_num - id_counter))
-                relative_obs = np.concatenate((relative_obs, pad_mat))
-                id_counter = rl_id_num + 1
-            else:
-                id_counter += 1
-            num_lanes = MAX_LANES * self.scaling
-            headway = np.asarray([1000
-                                  for _ in range(num_lanes)]) / headway_scale
-            tailway = np.asarray([1000
-                                  for _ in range(num_lanes)]) / headway_scale
-            vel_in_front = np.asarray([0 for _ in range(num_lanes)
-                                       ]) / self.max_speed
-            vel_behind = np.asarray([0 for _ in range(num_lanes)
-                                     ]) / self.max_speed
-
-            lane_leaders = self.k.vehicle.get_lane_leaders(veh_id)
-            lane_followers = self.k.vehicle.get_lane_followers(veh_id)
+        # vel_behind). Missing vehicles imply large headways/tailways
+        relative_obs = self.obs_builder["relative"]
+        relative_obs[:, :2] = 1000 / headway_scale
+        relative_obs[:, 2:] = 0
+        for veh_id, slot in zip(rl_ids, slots):
             lane_headways = self.k.vehicle.get_lane_headways(veh_id)
             lane_tailways = self.k.vehicle.get_lane_tailways(veh_id)
-            headway[0:len(lane_headways)] = (
-                np.asarray(lane_headways) / headway_scale)
-            tailway[0:len(lane_tailways)] = (
-                np.asarray(lane_tailways) / headway_scale)
-            for i, lane_leader in enumerate(lane_leaders):
-                if lane_leader != '':
-                    vel_in_front[i] = (
-                        self.k.vehicle.get_speed(lane_leader) / self.max_speed)
-            for i, lane_follower in enumerate(lane_followers):
-                if lane_followers != '':
-                    vel_behind[i] = (self.k.vehicle.get_speed(lane_follower) /
-                                     self.max_speed)
-
-            relative_obs = np.concatenate((relative_obs, headway, tailway,
-                                           vel_in_front, vel_behind))
-
-        # if all the missing vehicles are at the end, pad
-        diff = self.num_rl - int(relative_obs.shape[0] / (4 * MAX_LANES))
-        if diff > 0:
-            relative_obs = np.concatenate((relative_obs,
-                                           np.zeros(4 * MAX_LANES * diff)))
-
-        # per edge data (average speed, density
-        edge_obs = []
-        for edge in self.k.scenario.get_edge_list():
+            lane_leaders = self.k.vehicle.get_lane_leaders(veh_id)
+            lane_followers = self.k.vehicle.get_lane_followers(veh_id)
+
+            relative_obs[slot, 0, :len(lane_headways)] = \
+                np.asarray(lane_headways) / headway_scale
+            relative_obs[slot, 1, :len(lane_tailways)] = \
+                np.asarray(lane_tailways) / headway_scale
+            relative_obs[slot, 2, :len(lane_leaders)] = np.where(
+                [lane_leader != '' for lane_leader in lane_leaders],
+                self.k.vehicle.get_speed(lane_leaders), 0) / self.max_speed
+            relative_obs[slot, 3, :len(lane_followers)] = np.where(
+                [lane_follower != '' for lane_follower in lane_followers],
+                self.k.vehicle.get_speed(lane_followers), 0) / self.max_speed
+
+        # per edge data (average speed, density)
+        edge_obs = self.obs_builder["edge"]
+        for i, edge in enumerate(edge_list):
             veh_ids = self.k.vehicle.get_ids_by_edge(edge)
             if len(veh_ids) > 0:
-                avg_speed = (sum(self.k.vehicle.get_speed(veh_ids)) /
-                             len(veh_ids)) / self.max_speed
-                density = len(veh_ids) / self.k.scenario.edge_length(edge)
-                edge_obs += [avg_speed, density]
+                edge_obs[i, 0] = (sum(self.k.vehicle.get_speed(veh_ids)) /
+                                  len(veh_ids)) / self.max_speed
+                edge_obs[i, 1] = \
+                    len(veh_ids) / self.k.scenario.edge_length(edge)
             else:
-                edge_obs += [0, 0]
+                edge_obs[i] = 0
 
-        return np.concatenate((rl_obs, relative_obs, edge_obs))
+        return self.obs_builder.get()
 
     def compute_reward(self, rl_actions, **kwargs):
         """See class definition."""
@@ -622,8 +600,8 @@ class DesiredVelocityEnv(BottleneckEnv):
            for RL vehicles making forward progress
     """
 
-    def __init__(self, env_params, sim_params, scenario):
-        super().__init__(env_params, sim_params, scenario)
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
+        super().__init__(env_params, sim_params, scenario, simulator)
         for p in ADDITIONAL_VSL_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
                 raise KeyError(
@@ -634,7 +612,7 @@ class DesiredVelocityEnv(BottleneckEnv):
         default = [("1", 1, True), ("2", 1, True), ("3", 1, True),
                    ("4", 1, True), ("5", 1, True)]
         super(DesiredVelocityEnv, self).__init__(env_params, sim_params,
-                                                 scenario)
+                                                 scenario, simulator)
         self.segments = add_env_params.get("controlled_segments", default)
 
         # number of segments for each edge
@@ -752,61 +730,74 @@ class DesiredVelocityEnv(BottleneckEnv):
         # number of rl vehicles in each segment in each lane
         # mean speed in each segment, and mean rl speed in each
         # segment in each lane
-        num_vehicles_list = []
-        num_rl_vehicles_list = []
-        vehicle_speeds_list = []
-        rl_speeds_list = []
         NUM_VEHICLE_NORM = 20
-        for i, edge in enumerate(EDGE_LIST):
-            num_lanes = self.k.scenario.num_lanes(edge)
-            num_vehicles = np.zeros((self.num_obs_segments[i], num_lanes))
-            num_rl_vehicles = np.zeros((self.num_obs_segments[i], num_lanes))
-            vehicle_speeds = np.zeros((self.num_obs_segments[i], num_lanes))
-            rl_vehicle_speeds = np.zeros((self.num_obs_segments[i], num_lanes))
+
+        if self.obs_builder is None:
+            # offset of each observed edge within the segment-level fields
+            self.obs_offsets = {}
+            num_cells = 0
+            for edge, num_segments in self.obs_segments:
+                self.obs_offsets[edge] = num_cells
+                num_cells += num_segments * self.k.scenario.num_lanes(edge)
+            self.obs_builder = ObservationBuilder(
+                self.observation_space,
+                [("num_vehicles", num_cells), ("num_rl_vehicles", num_cells),
+                 ("mean_speed", num_cells), ("mean_rl_speed", num_cells),
+                 ("outflow", 1)])
+
+        num_vehicles = self.obs_builder["num_vehicles"]
+        num_rl_vehicles = self.obs_builder["num_rl_vehicles"]
+        vehicle_speeds = self.obs_builder["mean_speed"]
+        rl_vehicle_speeds = self.obs_builder["mean_rl_speed"]
+        self.obs_builder.clear()
+
+        rl_ids = set(self.k.vehicle.get_rl_ids())
+        for edge, num_segments in self.obs_segments:
+            if self.simulator == 'ctm':
+                # the cell transmission model has no individual vehicles, so
+                # all vehicles are counted as human-driven vehicles
+                counts = self.k.vehicle.get_segment_counts(edge, num_segments)
+                speeds = self.k.vehicle.get_segment_speeds(edge, num_segments)
+                cells = slice(self.obs_offsets[edge],
+                              self.obs_offsets[edge] + counts.size)
+                num_vehicles[cells] = counts.reshape(-1)
+                vehicle_speeds[cells] = (counts * speeds).reshape(-1)
+                continue
+
             ids = self.k.vehicle.get_ids_by_edge(edge)
-            lane_list = self.k.vehicle.get_lane(ids)
-            pos_list = self.k.vehicle.get_position(ids)
-            for i, id in enumerate(ids):
-                segment = np.searchsorted(self.obs_slices[edge],
-                                          pos_list[i]) - 1
-                if id in self.k.vehicle.get_rl_ids():
-                    rl_vehicle_speeds[segment, lane_list[i]] \
-                        += self.k.vehicle.get_speed(id)
-                    num_rl_vehicles[segment, lane_list[i]] += 1
-                else:
-                    vehicle_speeds[segment, lane_list[i]] \
-                        += self.k.vehicle.get_speed(id)
-                    num_vehicles[segment, lane_list[i]] += 1
-
-            # normalize
-
-            num_vehicles /= NUM_VEHICLE_NORM
-            num_rl_vehicles /= NUM_VEHICLE_NORM
-            num_vehicles_list += num_vehicles.flatten().tolist()
-            num_rl_vehicles_list += num_rl_vehicles.flatten().tolist()
-            vehicle_speeds_list += vehicle_speeds.flatten().tolist()
-            rl_speeds_list += rl_vehicle_speeds.flatten().tolist()
-
-        unnorm_veh_list = np.asarray(num_vehicles_list) * \
-            NUM_VEHICLE_NORM
-        unnorm_rl_list = np.asarray(num_rl_vehicles_list) * \
-            NUM_VEHICLE_NORM
-        # compute the mean speed if the speed isn't zero
-        num_rl = len(num_rl_vehicles_list)
-        num_veh = len(num_vehicles_list)
-        mean_speed = np.nan_to_num([
-            vehicle_speeds_list[i] / unnorm_veh_list[i]
-            if int(unnorm_veh_list[i]) else 0 for i in range(num_veh)
-        ])
-        mean_speed_norm = mean_speed / 50
-        mean_rl_speed = np.nan_to_num([
-            rl_speeds_list[i] / unnorm_rl_list[i]
-            if int(unnorm_rl_list[i]) else 0 for i in range(num_rl)
-        ]) / 50
-        outflow = np.asarray(
-            self.k.vehicle.get_outflow_rate(20 * self.sim_step) / 2000.0)
-        return np.concatenate((num_vehicles_list, num_rl_vehicles_list,
-                               mean_speed_norm, mean_rl_speed, [outflow]))
+            if len(ids) == 0:
+                continue
+            num_lanes = self.k.scenario.num_lanes(edge)
+            lanes = np.asarray(self.k.vehicle.get_lane(ids), dtype=int)
+            pos = np.asarray(self.k.vehicle.get_position(ids))
+            speeds = np.asarray(self.k.vehicle.get_speed(ids))
+            is_rl = np.array([veh_id in rl_ids for veh_id in ids])
+
+            # index of the (segment, lane) cell of each vehicle
+            segment = np.maximum(
+                np.searchsorted(self.obs_slices[edge], pos) - 1, 0)
+            cell = self.obs_offsets[edge] + segment * num_lanes + lanes
+
+            # accumulate the number of vehicles and the sum of their speeds
+            np.add.at(num_vehicles, cell[~is_rl], 1)
+            np.add.at(vehicle_speeds, cell[~is_rl], speeds[~is_rl])
+            np.add.at(num_rl_vehicles, cell[is_rl], 1)
+            np.add.at(rl_vehicle_speeds, cell[is_rl], speeds[is_rl])
+
+        # compute the mean speed if the number of vehicles isn't zero
+        np.divide(vehicle_speeds, 50 * num_vehicles, out=vehicle_speeds,
+                  where=num_vehicles > 0)
+        np.divide(rl_vehicle_speeds, 50 * num_rl_vehicles,
+                  out=rl_vehicle_speeds, where=num_rl_vehicles > 0)
+
+        # normalize
+        num_vehicles /= NUM_VEHICLE_NORM
+        num_rl_vehicles /= NUM_VEHICLE_NORM
+
+        self.obs_builder["outflow"][0] = \
+            self.k.vehicle.get_outflow_rate(20 * self.sim_step) / 2000.0
+
+        return self.obs_builder.get()
 
     def _apply_rl_actions(self, rl_actions):
         """
@@ -815,6 +806,10 @@ class DesiredVelocityEnv(BottleneckEnv):
         Then they're split into segment actions.
         Then they're split into lane actions.
         """
+        if self.simulator == 'ctm':
+            self._apply_speed_limits(rl_actions)
+            return
+
         for rl_id in self.k.vehicle.get_rl_ids():
             edge = self.k.vehicle.get_edge(rl_id)
             lane = self.k.vehicle.get_lane(rl_id)
@@ -842,6 +837,31 @@ class DesiredVelocityEnv(BottleneckEnv):
                     # set the desired velocity of the controller to the default
                     self.k.vehicle.set_max_speed(rl_id, 23.0)
 
+    def _apply_speed_limits(self, rl_actions):
+        """Apply the actions as variable speed limits.
+
+        The cell transmission model has no individual rl vehicles, so the
+        action of every segment is instead added to the speed limit of the
+        segment, which then applies to all vehicles within it. As cells span
+        all lanes of an edge, the actions of the lanes of a segment are
+        averaged.
+        """
+        sim = self.k.kernel_api
+        for edge in self.controlled_edges:
+            num_segments = len(self.slices[edge]) - 1
+            start = self.action_index[edge][0]
+            if self.symmetric:
+                actions = rl_actions[start:start + num_segments]
+            else:
+                num_lanes = self.k.scenario.num_lanes(edge)
+                actions = np.reshape(
+                    rl_actions[start:start + num_segments * num_lanes],
+                    (num_segments, num_lanes)).mean(axis=1)
+
+            speed_limit = sim.get_speed_limit(edge, num_segments)
+            sim.set_speed_limit(
+                edge, np.clip(speed_limit + actions, 0.01, 23.0))
+
     def compute_reward(self, rl_actions, **kwargs):
         """Outflow rate over last ten seconds normalized to max of 1."""
 
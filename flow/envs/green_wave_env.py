@@ -6,6 +6,7 @@ from gym.spaces.box import Box
 from gym.spaces.tuple_space import Tuple
 
 from flow.core import rewards
+from flow.core.observation import ObservationBuilder
 from flow.envs.base_env import Env
 
 ADDITIONAL_ENV_PARAMS = {
@@ -63,7 +64,7 @@ class TrafficLightGridEnv(Env):
         vehicles.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
 
         for p in ADDITIONAL_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
@@ -77,7 +78,7 @@ class TrafficLightGridEnv(Env):
         self.num_traffic_lights = self.rows * self.cols
         self.tl_type = env_params.additional_params.get('tl_type')
 
-        super().__init__(env_params, sim_params, scenario)
+        super().__init__(env_params, sim_params, scenario, simulator)
 
         # Saving env variables for plotting
         self.steps = env_params.horizon
@@ -464,8 +465,8 @@ class PO_TrafficLightGridEnv(TrafficLightGridEnv):
 
     """
 
-    def __init__(self, env_params, sim_params, scenario):
-        super().__init__(env_params, sim_params, scenario)
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
+        super().__init__(env_params, sim_params, scenario, simulator)
 
         for p in ADDITIONAL_PO_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
@@ -502,66 +503,59 @@ class PO_TrafficLightGridEnv(TrafficLightGridEnv):
         light and for each vehicle its velocity, distance to intersection,
         edge_number traffic light state. This is partially observed
         """
-        speeds = []
-        dist_to_intersec = []
-        edge_number = []
-        max_speed = max(
-            self.k.scenario.speed_limit(edge)
-            for edge in self.k.scenario.get_edge_list())
+        mapping = self.scenario.get_node_mapping()
+        if self.obs_builder is None:
+            num_edges = sum(len(edges) for _, edges in mapping)
+            observed = (num_edges, self.num_observed)
+            num_all_edges = len(self.k.scenario.get_edge_list())
+            self.obs_builder = ObservationBuilder(
+                self.observation_space,
+                [("speed", observed), ("dist_to_intersec", observed),
+                 ("edge_number", observed), ("density", num_all_edges),
+                 ("velocity_avg", num_all_edges),
+                 ("last_change", self.last_change.size)])
+
+        max_speed = self.k.metrics.max_speed_limit
         max_dist = max(self.scenario.short_length, self.scenario.long_length,
                        self.scenario.inner_length)
         all_observed_ids = []
 
-        for node, edges in self.scenario.get_node_mapping():
+        # unobserved vehicles (if fewer than num_observed are present on an
+        # edge) are padded with zeros
+        self.obs_builder.clear()
+        speed = self.obs_builder["speed"]
+        dist_to_intersec = self.obs_builder["dist_to_intersec"]
+        edge_number = self.obs_builder["edge_number"]
+        i = 0
+        for node, edges in mapping:
             for edge in edges:
                 observed_ids = \
                     self.k_closest_to_intersection(edge, self.num_observed)
                 all_observed_ids += observed_ids
 
-                # check which edges we have so we can always pad in the right
-                # positions
-                speeds += [
-                    self.k.vehicle.get_speed(veh_id) / max_speed
-                    for veh_id in observed_ids
-                ]
-                dist_to_intersec += [
-                    (self.k.scenario.edge_length(
-                        self.k.vehicle.get_edge(veh_id))
-                     - self.k.vehicle.get_position(veh_id)) / max_dist
-                    for veh_id in observed_ids
-                ]
-                edge_number += \
-                    [self._convert_edge(self.k.vehicle.get_edge(veh_id))
-                     / (self.k.scenario.network.num_edges - 1)
-                     for veh_id in observed_ids]
-
-                if len(observed_ids) < self.num_observed:
-                    diff = self.num_observed - len(observed_ids)
-                    speeds += [0] * diff
-                    dist_to_intersec += [0] * diff
-                    edge_number += [0] * diff
+                for j, veh_id in enumerate(observed_ids):
+                    veh_edge = self.k.vehicle.get_edge(veh_id)
+                    speed[i, j] = self.k.vehicle.get_speed(veh_id) / max_speed
+                    dist_to_intersec[i, j] = \
+                        (self.k.scenario.edge_length(veh_edge)
+                         - self.k.vehicle.get_position(veh_id)) / max_dist
+                    edge_number[i, j] = self._convert_edge(veh_edge) \
+                        / (self.k.scenario.network.num_edges - 1)
+                i += 1
 
         # now add in the density and average velocity on the edges
-        density = []
-        velocity_avg = []
-        for edge in self.k.scenario.get_edge_list():
+        density = self.obs_builder["density"]
+        velocity_avg = self.obs_builder["velocity_avg"]
+        for i, edge in enumerate(self.k.scenario.get_edge_list()):
             ids = self.k.vehicle.get_ids_by_edge(edge)
             if len(ids) > 0:
-                density += [5 * len(ids) / self.k.scenario.edge_length(edge)]
-                velocity_avg += [
-                    np.mean(
-                        [self.k.vehicle.get_speed(veh_id)
-                         for veh_id in ids]) / max_speed
-                ]
-            else:
-                density += [0]
-                velocity_avg += [0]
+                density[i] = 5 * len(ids) / self.k.scenario.edge_length(edge)
+                velocity_avg[i] = np.mean(
+                    self.k.vehicle.get_speed(ids)) / max_speed
+        self.obs_builder.fill("last_change", self.last_change.flatten())
         self.observed_ids = all_observed_ids
-        return np.array(
-            np.concatenate([
-                speeds, dist_to_intersec, edge_number, density, velocity_avg,
-                self.last_change.flatten().tolist()
-            ]))
+
+        return self.obs_builder.get()
 
     def compute_reward(self, rl_actions, **kwargs):
         """See class definition."""
@@ -2,6 +2,7 @@
 
 from flow.envs.loop.loop_accel import AccelEnv
 from flow.core import rewards
+from flow.core.observation import ObservationBuilder
 
 from gym.spaces.box import Box
 import numpy as np
@@ -69,13 +70,13 @@ class LaneChangeAccelEnv(AccelEnv):
         vehicles collide into one another.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         for p in ADDITIONAL_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
                 raise KeyError(
                     'Environment parameter "{}" not supplied'.format(p))
 
-        super().__init__(env_params, sim_params, scenario)
+        super().__init__(env_params, sim_params, scenario, simulator)
 
     @property
     def action_space(self):
@@ -113,6 +114,13 @@ class LaneChangeAccelEnv(AccelEnv):
 
     def get_state(self):
         """See class definition."""
+        if self.obs_builder is None:
+            num_vehicles = self.scenario.vehicles.num_vehicles
+            self.obs_builder = ObservationBuilder(
+                self.observation_space,
+                [("speed", num_vehicles), ("pos", num_vehicles),
+                 ("lane", num_vehicles)])
+
         # normalizers
         max_speed = self.k.scenario.max_speed()
         length = self.k.scenario.length()
@@ -120,14 +128,17 @@ class LaneChangeAccelEnv(AccelEnv):
             self.k.scenario.num_lanes(edge)
             for edge in self.k.scenario.get_edge_list())
 
-        speed = [self.k.vehicle.get_speed(veh_id) / max_speed
-                 for veh_id in self.sorted_ids]
-        pos = [self.k.vehicle.get_x_by_id(veh_id) / length
-               for veh_id in self.sorted_ids]
-        lane = [self.k.vehicle.get_lane(veh_id) / max_lanes
-                for veh_id in self.sorted_ids]
+        sorted_ids = self.sorted_ids
+        self.obs_builder.clear()
+        self.obs_builder.fill("speed", self.k.vehicle.get_speed(sorted_ids),
+                              scale=max_speed)
+        self.obs_builder.fill("pos", [self.k.vehicle.get_x_by_id(veh_id)
+                                      for veh_id in sorted_ids],
+                              scale=length)
+        self.obs_builder.fill("lane", self.k.vehicle.get_lane(sorted_ids),
+                              scale=max_lanes)
 
-        return np.array(speed + pos + lane)
+        return self.obs_builder.get()
 
     def _apply_rl_actions(self, actions):
         """See class definition."""
@@ -188,8 +199,8 @@ class LaneChangeAccelPOEnv(LaneChangeAccelEnv):
         See parent class.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
-        super().__init__(env_params, sim_params, scenario)
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
+        super().__init__(env_params, sim_params, scenario, simulator)
 
         # maximum number of lanes on any edge in the network
         self.num_lanes = max(self.k.scenario.num_lanes(edge)
@@ -210,53 +221,55 @@ class LaneChangeAccelPOEnv(LaneChangeAccelEnv):
 
     def get_state(self):
         """See class definition."""
-        obs = [
-            0
-            for _ in range(4 * self.k.vehicle.num_rl_vehicles * self.num_lanes)
-        ]
+        num_rl = self.scenario.vehicles.num_rl_vehicles
+        if self.obs_builder is None:
+            self.obs_builder = ObservationBuilder(
+                self.observation_space,
+                [("lanes", (num_rl, 4, self.num_lanes)), ("speed", num_rl)])
 
-        self.visible = []
-        for i, rl_id in enumerate(self.k.vehicle.get_rl_ids()):
-            # normalizers
-            max_length = self.k.scenario.length()
-            max_speed = self.k.scenario.max_speed()
-
-            # set to 1000 since the absence of a vehicle implies a large
-            # headway
-            headway = [1] * self.num_lanes
-            tailway = [1] * self.num_lanes
-            vel_in_front = [0] * self.num_lanes
-            vel_behind = [0] * self.num_lanes
+        # normalizers
+        max_length = self.k.scenario.length()
+        max_speed = self.k.scenario.max_speed()
 
-            lane_leaders = self.k.vehicle.get_lane_leaders(rl_id)
-            lane_followers = self.k.vehicle.get_lane_followers(rl_id)
+        # headways and tailways are set to 1 since the absence of a vehicle
+        # implies a large headway
+        lanes = self.obs_builder["lanes"]
+        lanes[:, :2] = 1
+        lanes[:, 2:] = 0
+        self.obs_builder["speed"][:] = 0
+
+        self.visible = []
+        rl_ids = self.k.vehicle.get_rl_ids()[:num_rl]
+        for i, rl_id in enumerate(rl_ids):
             lane_headways = self.k.vehicle.get_lane_headways(rl_id)
             lane_tailways = self.k.vehicle.get_lane_tailways(rl_id)
-            headway[0:len(lane_headways)] = lane_headways
-            tailway[0:len(lane_tailways)] = lane_tailways
-
-            for j, lane_leader in enumerate(lane_leaders):
-                if lane_leader != '':
-                    lane_headways[j] /= max_length
-                    vel_in_front[j] = self.k.vehicle.get_speed(lane_leader) \
-                        / max_speed
-                    self.visible.extend([lane_leader])
-            for j, lane_follower in enumerate(lane_followers):
-                if lane_follower != '':
-                    lane_headways[j] /= max_length
-                    vel_behind[j] = self.k.vehicle.get_speed(lane_follower) \
-                        / max_speed
-                    self.visible.extend([lane_follower])
+            lane_leaders = self.k.vehicle.get_lane_leaders(rl_id)
+            lane_followers = self.k.vehicle.get_lane_followers(rl_id)
 
             # add the headways, tailways, and speed for all lane leaders
             # and followers
-            obs[4*self.num_lanes*i:4*self.num_lanes*(i+1)] = \
-                np.concatenate((headway, tailway, vel_in_front, vel_behind))
-
-            # add the speed for the ego rl vehicle
-            obs.append(self.k.vehicle.get_speed(rl_id))
-
-            return np.array(obs)
+            lanes[i, 0, :len(lane_headways)] = np.minimum(
+                np.asarray(lane_headways) / max_length, 1)
+            lanes[i, 1, :len(lane_tailways)] = np.minimum(
+                np.asarray(lane_tailways) / max_length, 1)
+            lanes[i, 2, :len(lane_leaders)] = np.where(
+                [lane_leader != '' for lane_leader in lane_leaders],
+                self.k.vehicle.get_speed(lane_leaders), 0) / max_speed
+            lanes[i, 3, :len(lane_followers)] = np.where(
+                [lane_follower != '' for lane_follower in lane_followers],
+                self.k.vehicle.get_speed(lane_followers), 0) / max_speed
+
+            self.visible.extend([lane_leader for lane_leader in lane_leaders
+                                 if lane_leader != ''])
+            self.visible.extend([lane_follower
+                                 for lane_follower in lane_followers
+                                 if lane_follower != ''])
+
+        # add the speed for the ego rl vehicles
+        self.obs_builder.fill("speed", self.k.vehicle.get_speed(rl_ids),
+                              scale=max_speed)
+
+        return self.obs_builder.get()
 
     def additional_command(self):
         """Define which vehicles are observed for visualization purposes."""
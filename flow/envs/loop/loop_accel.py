@@ -1,6 +1,7 @@
 """Environment for training the acceleration behavior of vehicles in a loop."""
 
 from flow.core import rewards
+from flow.core.observation import ObservationBuilder
 from flow.envs.base_env import Env
 
 from gym.spaces.box import Box
@@ -56,7 +57,7 @@ class AccelEnv(Env):
         vehicles collide into one another.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         for p in ADDITIONAL_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
                 raise KeyError(
@@ -67,7 +68,7 @@ class AccelEnv(Env):
         self.prev_pos = dict()
         self.absolute_position = dict()
 
-        super().__init__(env_params, sim_params, scenario)
+        super().__init__(env_params, sim_params, scenario, simulator)
 
     @property
     def action_space(self):
@@ -99,18 +100,27 @@ class AccelEnv(Env):
     def compute_reward(self, rl_actions, **kwargs):
         """See class definition."""
         if self.env_params.evaluate:
-            return np.mean(self.k.vehicle.get_speed(self.k.vehicle.get_ids()))
+            return self.k.metrics.mean_speed
         else:
             return rewards.desired_velocity(self, fail=kwargs['fail'])
 
     def get_state(self):
         """See class definition."""
-        speed = [self.k.vehicle.get_speed(veh_id) / self.k.scenario.max_speed()
-                 for veh_id in self.sorted_ids]
-        pos = [self.k.vehicle.get_x_by_id(veh_id) / self.k.scenario.length()
-               for veh_id in self.sorted_ids]
-
-        return np.array(speed + pos)
+        if self.obs_builder is None:
+            num_vehicles = self.scenario.vehicles.num_vehicles
+            self.obs_builder = ObservationBuilder(
+                self.observation_space,
+                [("speed", num_vehicles), ("pos", num_vehicles)])
+
+        sorted_ids = self.sorted_ids
+        self.obs_builder.clear()
+        self.obs_builder.fill("speed", self.k.vehicle.get_speed(sorted_ids),
+                              scale=self.k.scenario.max_speed())
+        self.obs_builder.fill("pos", [self.k.vehicle.get_x_by_id(veh_id)
+                                      for veh_id in sorted_ids],
+                              scale=self.k.scenario.length())
+
+        return self.obs_builder.get()
 
     def additional_command(self):
         """See parent class.
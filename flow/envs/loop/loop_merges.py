@@ -2,6 +2,7 @@
 
 from flow.envs.base_env import Env
 from flow.core import rewards
+from flow.core.observation import ObservationBuilder
 from gym.spaces.box import Box
 import numpy as np
 
@@ -60,7 +61,7 @@ class TwoLoopsMergePOEnv(Env):
         vehicles.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         for p in ADDITIONAL_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
                 raise KeyError(
@@ -75,7 +76,7 @@ class TwoLoopsMergePOEnv(Env):
         self.obs_var_labels = \
             ["speed", "pos", "queue_length", "velocity_stats"]
 
-        super().__init__(env_params, sim_params, scenario)
+        super().__init__(env_params, sim_params, scenario, simulator)
 
     @property
     def observation_space(self):
@@ -176,27 +177,29 @@ class TwoLoopsMergePOEnv(Env):
         pos[:self.n_obs_vehicles - self.n_merging_in] = np.array(
             [self.k.vehicle.get_x_by_id(veh_id) for veh_id in vehicles])
 
-        # normalize the speed
-        # FIXME(cathywu) can divide by self.max_speed
-        normalized_vel = np.array(vel) / self.k.scenario.max_speed()
+        if self.obs_builder is None:
+            self.obs_builder = ObservationBuilder(
+                self.observation_space,
+                [("speed", self.n_obs_vehicles), ("pos", self.n_obs_vehicles),
+                 ("queue_length", 1), ("velocity_stats", 2)])
 
-        # normalize the position
-        normalized_pos = np.array(pos) / self.k.scenario.length()
+        # normalize the speed and position
+        # FIXME(cathywu) can divide by self.max_speed
+        self.obs_builder.fill("speed", vel, scale=self.k.scenario.max_speed())
+        self.obs_builder.fill("pos", pos, scale=self.k.scenario.length())
 
         # Compute number of vehicles in the outer ring
-        queue_length = np.zeros(1)
-        queue_length[0] = len(sorted) - num_inner
+        self.obs_builder["queue_length"][0] = len(sorted) - num_inner
 
         # Compute mean velocity on inner and outer rings
         # Note: merging vehicles count towards the inner ring stats
-        vel_stats = np.zeros(2)
         vel_all = self.k.vehicle.get_speed(sorted)
+        vel_stats = self.obs_builder["velocity_stats"]
         vel_stats[0] = np.mean(vel_all[:num_inner])
         vel_stats[1] = np.mean(vel_all[num_inner:])
-        vel_stats = np.nan_to_num(vel_stats)
+        np.nan_to_num(vel_stats, copy=False)
 
-        return np.concatenate(
-            (normalized_vel, normalized_pos, queue_length, vel_stats))
+        return self.obs_builder.get()
 
     @property
     def sorted_ids(self):
@@ -10,11 +10,11 @@ abs/1710.05465, 2017. [Online]. Available: https://arxiv.org/abs/1710.05465
 
 from flow.core.params import InitialConfig
 from flow.core.params import NetParams
+from flow.core.observation import ObservationBuilder
 from flow.envs.base_env import Env
 
 from gym.spaces.box import Box
 
-from copy import deepcopy
 import numpy as np
 import random
 from scipy.optimize import fsolve
@@ -29,6 +29,69 @@ ADDITIONAL_ENV_PARAMS = {
     'ring_length': [220, 270],
 }
 
+# normalizer of the speeds in the observations of WaveAttenuationPOEnv
+MAX_SPEED = 15.
+
+
+def wave_attenuation_reward(mean_speed, mean_abs_accel):
+    """Compute the reward of the wave attenuation environments.
+
+    High average speeds of all vehicles are rewarded, and accelerations of
+    the rl vehicles are penalized. Arrays may be passed to compute the
+    rewards of several environments at once.
+
+    Parameters
+    ----------
+    mean_speed : float or array_like
+        average speed of all vehicles in the network, in m/s
+    mean_abs_accel : float or array_like
+        average absolute acceleration requested by the rl vehicles, in m/s^2
+
+    Returns
+    -------
+    float or numpy.ndarray
+        the reward
+    """
+    # reward average velocity
+    eta_2 = 4.
+    reward = eta_2 * np.asarray(mean_speed) / 20
+
+    # punish accelerations (should lead to reduced stop-and-go waves)
+    eta = 8  # 0.25
+    accel_threshold = 0
+    mean_abs_accel = np.asarray(mean_abs_accel)
+    return reward + np.where(mean_abs_accel > accel_threshold,
+                             eta * (accel_threshold - mean_abs_accel), 0)
+
+
+def wave_attenuation_po_state(speed, lead_speed, headway, max_length):
+    """Compute the observation of WaveAttenuationPOEnv.
+
+    Arrays may be passed to compute the observations of several environments
+    at once, in which case one observation is returned per row.
+
+    Parameters
+    ----------
+    speed : float or array_like
+        speed of the rl vehicle, in m/s
+    lead_speed : float or array_like
+        speed of the leader of the rl vehicle, in m/s
+    headway : float or array_like
+        headway of the rl vehicle, in m
+    max_length : float or array_like
+        maximum length of the ring, used to normalize the headway
+
+    Returns
+    -------
+    numpy.ndarray
+        normalized speed, speed difference with the leader, and headway of
+        the rl vehicle
+    """
+    speed = np.asarray(speed, dtype=float)
+    return np.stack([speed / MAX_SPEED,
+                     (np.asarray(lead_speed) - speed) / MAX_SPEED,
+                     np.asarray(headway) / max_length], axis=-1)
+
 
 class WaveAttenuationEnv(Env):
     """Fully observable wave attenuation environment.
@@ -60,13 +123,13 @@ class WaveAttenuationEnv(Env):
         vehicles collide into one another.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         for p in ADDITIONAL_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
                 raise KeyError(
                     'Environment parameter \'{}\' not supplied'.format(p))
 
-        super().__init__(env_params, sim_params, scenario)
+        super().__init__(env_params, sim_params, scenario, simulator)
 
     @property
     def action_space(self):
@@ -106,28 +169,26 @@ class WaveAttenuationEnv(Env):
         if any(vel < -100) or kwargs['fail']:
             return 0.
 
-        # reward average velocity
-        eta_2 = 4.
-        reward = eta_2 * np.mean(vel) / 20
-
-        # punish accelerations (should lead to reduced stop-and-go waves)
-        eta = 8  # 0.25
-        rl_actions = np.array(rl_actions)
-        accel_threshold = 0
-
-        if np.mean(np.abs(rl_actions)) > accel_threshold:
-            reward += eta * (accel_threshold - np.mean(np.abs(rl_actions)))
-
-        return float(reward)
+        return float(wave_attenuation_reward(
+            np.mean(vel), np.mean(np.abs(np.array(rl_actions)))))
 
     def get_state(self):
         """See class definition."""
-        speed = [self.k.vehicle.get_speed(veh_id) / self.k.scenario.max_speed()
-                 for veh_id in self.k.vehicle.get_ids()]
-        pos = [self.k.vehicle.get_x_by_id(veh_id) / self.k.scenario.length()
-               for veh_id in self.k.vehicle.get_ids()]
-
-        return np.array(speed + pos)
+        if self.obs_builder is None:
+            num_vehicles = self.scenario.vehicles.num_vehicles
+            self.obs_builder = ObservationBuilder(
+                self.observation_space,
+                [("speed", num_vehicles), ("pos", num_vehicles)])
+
+        ids = self.k.vehicle.get_ids()
+        self.obs_builder.clear()
+        self.obs_builder.fill("speed", self.k.vehicle.get_speed(ids),
+                              scale=self.k.scenario.max_speed())
+        self.obs_builder.fill("pos", [self.k.vehicle.get_x_by_id(veh_id)
+                                      for veh_id in ids],
+                              scale=self.k.scenario.length())
+
+        return self.obs_builder.get()
 
     def additional_command(self):
         """Define which vehicles are observed for visualization purposes."""
@@ -164,16 +225,15 @@ class WaveAttenuationEnv(Env):
         self.scenario = self.scenario.__class__(
             self.scenario.orig_name, self.scenario.vehicles,
             net_params, initial_config)
-        self.k.vehicle = deepcopy(self.initial_vehicles)
-        self.k.vehicle.kernel_api = self.k.kernel_api
-        self.k.vehicle.master_kernel = self.k
 
-        # solve for the velocity upper bound of the ring
+        # solve for the velocity upper bound of the ring. Note that the kernel
+        # scenario is only updated once the simulation is restarted, so the
+        # length of the new ring is read from its net params
         def v_eq_max_function(v):
-            num_veh = self.k.vehicle.num_vehicles - 1
+            num_veh = self.scenario.vehicles.num_vehicles - 1
             # maximum gap in the presence of one rl vehicle
-            s_eq_max = (self.k.scenario.length() -
-                        self.k.vehicle.num_vehicles * 5) / num_veh
+            s_eq_max = (net_params.additional_params['length'] -
+                        self.scenario.vehicles.num_vehicles * 5) / num_veh
 
             v0 = 30
             s0 = 2
@@ -245,18 +305,11 @@ class WaveAttenuationPOEnv(WaveAttenuationEnv):
         rl_id = self.k.vehicle.get_rl_ids()[0]
         lead_id = self.k.vehicle.get_leader(rl_id) or rl_id
 
-        # normalizers
-        max_speed = 15.
-        max_length = self.env_params.additional_params['ring_length'][1]
-
-        observation = np.array([
-            self.k.vehicle.get_speed(rl_id) / max_speed,
-            (self.k.vehicle.get_speed(lead_id) -
-             self.k.vehicle.get_speed(rl_id)) / max_speed,
-            self.k.vehicle.get_headway(rl_id) / max_length
-        ])
-
-        return observation
+        return wave_attenuation_po_state(
+            self.k.vehicle.get_speed(rl_id),
+            self.k.vehicle.get_speed(lead_id),
+            self.k.vehicle.get_headway(rl_id),
+            self.env_params.additional_params['ring_length'][1])
 
     def additional_command(self):
         """Define which vehicles are observed for visualization purposes."""
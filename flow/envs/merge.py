@@ -7,6 +7,7 @@ TODO(ak): add paper after it has been published.
 
 from flow.envs.base_env import Env
 from flow.core import rewards
+from flow.core.observation import ObservationBuilder
 
 from gym.spaces.box import Box
 
@@ -70,7 +71,7 @@ class WaveAttenuationMergePOEnv(Env):
         vehicles collide into one another.
     """
 
-    def __init__(self, env_params, sim_params, scenario):
+    def __init__(self, env_params, sim_params, scenario, simulator='traci'):
         for p in ADDITIONAL_ENV_PARAMS.keys():
             if p not in env_params.additional_params:
                 raise KeyError(
@@ -86,7 +87,7 @@ class WaveAttenuationMergePOEnv(Env):
         self.leader = []
         self.follower = []
 
-        super().__init__(env_params, sim_params, scenario)
+        super().__init__(env_params, sim_params, scenario, simulator)
 
     @property
     def action_space(self):
@@ -119,7 +120,12 @@ class WaveAttenuationMergePOEnv(Env):
         max_speed = self.k.scenario.max_speed()
         max_length = self.k.scenario.length()
 
-        observation = [0 for _ in range(5 * self.num_rl)]
+        if self.obs_builder is None:
+            self.obs_builder = ObservationBuilder(
+                self.observation_space, [("rl", (self.num_rl, 5))])
+
+        observation = self.obs_builder["rl"]
+        observation[:] = 0
         for i, rl_id in enumerate(self.rl_veh):
             this_speed = self.k.vehicle.get_speed(rl_id)
             lead_id = self.k.vehicle.get_leader(rl_id)
@@ -145,18 +151,18 @@ class WaveAttenuationMergePOEnv(Env):
                 follow_speed = self.k.vehicle.get_speed(follower)
                 follow_head = self.k.vehicle.get_headway(follower)
 
-            observation[5 * i + 0] = this_speed / max_speed
-            observation[5 * i + 1] = (lead_speed - this_speed) / max_speed
-            observation[5 * i + 2] = lead_head / max_length
-            observation[5 * i + 3] = (this_speed - follow_speed) / max_speed
-            observation[5 * i + 4] = follow_head / max_length
+            observation[i, 0] = this_speed / max_speed
+            observation[i, 1] = (lead_speed - this_speed) / max_speed
+            observation[i, 2] = lead_head / max_length
+            observation[i, 3] = (this_speed - follow_speed) / max_speed
+            observation[i, 4] = follow_head / max_length
 
-        return observation
+        return self.obs_builder.get()
 
     def compute_reward(self, rl_actions, **kwargs):
         """See class definition."""
         if self.env_params.evaluate:
-            return np.mean(self.k.vehicle.get_speed(self.k.vehicle.get_ids()))
+            return self.k.metrics.mean_speed
         else:
             # return a reward of 0 if a collision occurred
             if kwargs["fail"]:
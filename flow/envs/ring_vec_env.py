@@ -0,0 +1,339 @@
+"""Batched environment simulating many ring roads in a single process.
+
+All sub-environments share one NumPy ring simulator (see
+flow/core/kernel/simulation/ring.py), in which each sub-environment occupies
+its own ring. Vehicles of all rings are stored in the same flat arrays, so that
+every simulation step of the whole batch is a handful of vectorized operations,
+and rings of different lengths and with different numbers of vehicles can be
+mixed without padding.
+"""
+
+import numpy as np
+from gym.spaces.box import Box
+
+from flow.controllers.car_following_models import IDMController, \
+    SimCarFollowingController
+from flow.controllers.rlcontroller import RLController
+from flow.core.kernel.scenario.base import VEHICLE_LENGTH
+from flow.core.kernel.simulation.ring import RingSimulator, \
+    CAR_FOLLOWING_MODELS, IDM
+from flow.envs.loop.wave_attenuation import wave_attenuation_reward, \
+    wave_attenuation_po_state
+
+# initial config used by WaveAttenuationEnv upon reset
+BUNCHING = 50
+
+# headway reported by the vehicle kernels for vehicles without leader
+NO_LEADER_HEADWAY = 1e3
+
+
+def _engine_params(veh_type, type_params, min_gap, speed_limit):
+    """Return the ring simulator parameters of a type of vehicle.
+
+    Vehicles controlled by an IDMController are simulated by the built-in IDM
+    model of the simulator, with the parameters of the controller.
+
+    Raises
+    ------
+    ValueError
+        if the controllers of the vehicle type cannot be simulated in batch
+    """
+    controller, controller_params = type_params["acceleration_controller"]
+    cf_params = type_params["car_following_params"]
+    params = cf_params.controller_params
+    model = params["carFollowModel"]
+    if model not in CAR_FOLLOWING_MODELS:
+        raise ValueError(
+            'Car following model "{}" is not supported by the ring '
+            'simulator; must be one of {}.'.format(
+                model, sorted(CAR_FOLLOWING_MODELS)))
+
+    engine_params = {
+        "length": VEHICLE_LENGTH,
+        "accel": params["accel"],
+        "decel": params["decel"],
+        "tau": params["tau"],
+        "min_gap": min_gap,
+        "max_speed": min(params["maxSpeed"],
+                         speed_limit * params["speedFactor"]),
+        "sigma": params["sigma"],
+        "model": CAR_FOLLOWING_MODELS[model],
+        "speed_mode": int(cf_params.speed_mode),
+    }
+
+    if controller == IDMController:
+        if controller_params.get("noise", 0) != 0 or \
+                controller_params.get("delta", 4) != 4:
+            raise ValueError('Only noise-free IDMControllers with delta=4 '
+                             'can be simulated in batch.')
+        engine_params.update({
+            "accel": controller_params.get("a", 1),
+            "decel": controller_params.get("b", 1.5),
+            "tau": controller_params.get("T", 1),
+            "min_gap": controller_params.get("s0", 2),
+            "max_speed": controller_params.get("v0", 30),
+            "model": IDM,
+        })
+    elif controller not in (SimCarFollowingController, RLController):
+        raise ValueError(
+            'Vehicles of type "{}" use a {}, which cannot be simulated in '
+            'batch.'.format(veh_type, controller.__name__))
+
+    return engine_params
+
+
+class RingVecEnv(object):
+    """Batched version of WaveAttenuationPOEnv.
+
+    Runs ``num_envs`` copies of the wave attenuation task on a shared ring
+    simulator, and exposes them with the same interface as
+    flow.envs.vec_env.VecEnv. Each sub-environment is a single-lane ring whose
+    length is sampled from the "ring_length" range of the environment
+    parameters at every reset, and which contains exactly one rl vehicle.
+    Sub-environments are reset automatically once they are done, in which case
+    the terminal observation is available from the "terminal_observation"
+    element of the sub-environment's info dict.
+
+    Human-driven vehicles must be controlled by the simulator, either through
+    SimCarFollowingController or IDMController, as per-vehicle Flow
+    controllers would defeat the purpose of the batched simulation.
+
+    Usage
+        >>> from flow.envs.ring_vec_env import RingVecEnv
+        >>> env = RingVecEnv(flow_params, num_envs=1024, seed=0)
+        >>> obs = env.reset()  # numpy array of shape (1024, 3)
+        >>> obs, rewards, dones, infos = env.step(actions)
+
+    Attributes
+    ----------
+    num_envs : int
+        number of sub-environments
+    observation_space : gym.spaces.Box
+        observation space of a single sub-environment
+    action_space : gym.spaces.Box
+        action space of a single sub-environment
+    sim : flow.core.kernel.simulation.ring.RingSimulator
+        simulator shared by all sub-environments, in which the i-th
+        sub-environment is simulated on ring i
+    """
+
+    def __init__(self, flow_params, num_envs, seed=None):
+        """Instantiate the batched environment.
+
+        Parameters
+        ----------
+        flow_params : dict or list of dict
+            flow-related parameters (see flow.utils.registry.make_create_env)
+            of the WaveAttenuationPOEnv environment. A list of num_envs
+            dicts may be passed to vary the vehicles and ring lengths of the
+            sub-environments, in which case the simulation step sizes and the
+            action bounds of all sub-environments must match.
+        num_envs : int
+            number of sub-environments
+        seed : int, optional
+            base seed. The ring lengths of the i-th sub-environment are sampled
+            with the seed ``seed + i``, and the random dawdling of the Krauss
+            model of all sub-environments is seeded with ``seed``.
+
+        Raises
+        ------
+        ValueError
+            if the parameters of the sub-environments are not compatible with
+            the batched simulation
+        """
+        if isinstance(flow_params, dict):
+            flow_params = [flow_params] * num_envs
+        if len(flow_params) != num_envs:
+            raise ValueError('Expected {} flow_params, got {}.'.format(
+                num_envs, len(flow_params)))
+
+        self.num_envs = num_envs
+        self.flow_params = flow_params
+
+        env_params = flow_params[0]['env']
+        self.sim_step = flow_params[0]['sim'].sim_step
+        self.horizons = np.array(
+            [params['env'].horizon for params in flow_params])
+        self.warmup_steps = env_params.warmup_steps
+        self.sims_per_step = env_params.sims_per_step
+        max_accel = env_params.additional_params['max_accel']
+        max_decel = env_params.additional_params['max_decel']
+        for params in flow_params:
+            additional = params['env'].additional_params
+            if params['sim'].sim_step != self.sim_step \
+                    or params['env'].sims_per_step != self.sims_per_step \
+                    or additional['max_accel'] != max_accel \
+                    or additional['max_decel'] != max_decel:
+                raise ValueError('The simulation step sizes and action bounds '
+                                 'of all sub-environments must match.')
+
+        self.observation_space = Box(low=0, high=1, shape=(3, ),
+                                     dtype=np.float32)
+        self.action_space = Box(low=-np.abs(max_decel), high=max_accel,
+                                shape=(1, ), dtype=np.float32)
+
+        # vehicles of every sub-environment, with their simulator parameters
+        self._vehicles = []
+        self._rl_ids = []
+        for i, params in enumerate(flow_params):
+            vehicles = params['veh']
+            if vehicles.num_rl_vehicles != 1:
+                raise ValueError('Every sub-environment must contain exactly '
+                                 'one rl vehicle.')
+            speed_limit = params['net'].additional_params['speed_limit']
+            type_params = {
+                veh_type: _engine_params(veh_type, type_params,
+                                         vehicles.minGap[veh_type],
+                                         speed_limit)
+                for veh_type, type_params in vehicles.type_parameters.items()
+            }
+            self._vehicles.append([
+                ('{}_{}'.format(i, veh_id),
+                 type_params[vehicles.get_type(veh_id)])
+                for veh_id in vehicles.ids])
+            self._rl_ids.extend(
+                '{}_{}'.format(i, veh_id) for veh_id in vehicles.ids
+                if vehicles.type_parameters[vehicles.get_type(veh_id)][
+                    'acceleration_controller'][0] == RLController)
+
+        self._ring_length_ranges = np.array(
+            [params['env'].additional_params['ring_length']
+             for params in flow_params])
+        self._max_lengths = self._ring_length_ranges[:, 1].astype(float)
+        self._rngs = [np.random.RandomState(None if seed is None else seed + i)
+                      for i in range(num_envs)]
+
+        self.sim = RingSimulator(np.zeros(num_envs), sim_step=self.sim_step,
+                                 seed=seed,
+                                 capacity=sum(map(len, self._vehicles)))
+        self._num_steps = np.zeros(num_envs, dtype=int)
+
+        # indices of the rl vehicles in the simulator arrays. These only
+        # change when vehicles are added or removed, i.e. upon reset
+        self._rl_index = np.zeros(num_envs, dtype=int)
+
+    def _reset_envs(self, envs):
+        """Reset some sub-environments.
+
+        The initial vehicles of the sub-environments are placed back in their
+        rings, with new ring lengths, and their warm-up steps are performed.
+
+        Parameters
+        ----------
+        envs : array_like of int
+            indices of the sub-environments
+        """
+        self.sim.remove([veh_id for i in envs
+                         for veh_id, _ in self._vehicles[i]])
+
+        for i in envs:
+            low, high = self._ring_length_ranges[i]
+            length = self._rngs[i].randint(low, high + 1)
+            self.sim.ring_lengths[i] = length
+
+            # uniform starting positions, as in WaveAttenuationEnv
+            vehicles = self._vehicles[i]
+            increment = (length - BUNCHING) / len(vehicles)
+            for j, (veh_id, params) in enumerate(vehicles):
+                self.sim.add(veh_id, i, j * increment, 0, params)
+
+        # the vehicles are inserted in the first simulation step
+        num_steps = 1 + self.warmup_steps * self.sims_per_step
+        self.sim.step(num_steps, rings=envs)
+        self._num_steps[envs] = 0
+        self._rl_index = np.array(
+            [self.sim.index[veh_id] for veh_id in self._rl_ids])
+
+    def _get_state(self):
+        """Return the observations of all sub-environments."""
+        sim = self.sim
+        rl = self._rl_index
+        leader = sim.leader[rl]
+        has_leader = leader >= 0
+        speed = sim.speed[rl]
+        lead_speed = np.where(has_leader, sim.speed[leader], speed)
+        headway = np.where(has_leader, sim.gap[rl], NO_LEADER_HEADWAY)
+
+        return wave_attenuation_po_state(speed, lead_speed, headway,
+                                         self._max_lengths)
+
+    def reset(self):
+        """Reset all sub-environments.
+
+        Returns
+        -------
+        numpy ndarray
+            initial observations, of shape (num_envs, 3)
+        """
+        self._reset_envs(np.arange(self.num_envs))
+        return self._get_state()
+
+    def step(self, actions):
+        """Advance all sub-environments by one step.
+
+        Parameters
+        ----------
+        actions : array_like
+            accelerations of the rl vehicles, of shape (num_envs, 1)
+
+        Returns
+        -------
+        numpy ndarray
+            observations, of shape (num_envs, 3)
+        numpy ndarray
+            rewards, of shape (num_envs,)
+        numpy ndarray
+            done flags, of shape (num_envs,)
+        list of dict
+            info dict of each sub-environment
+        """
+        sim = self.sim
+        actions = np.clip(
+            np.asarray(actions, dtype=float).reshape(self.num_envs),
+            self.action_space.low[0], self.action_space.high[0])
+
+        rl = self._rl_index
+        crash = np.zeros(self.num_envs, dtype=bool)
+        for _ in range(self.sims_per_step):
+            sim.command[rl] = np.maximum(
+                sim.speed[rl] + actions * self.sim_step, 0)
+
+            # as in Env.step, a sub-environment is not simulated any further
+            # once a collision occurred in it, while the others keep going
+            if crash.any():
+                sim.step(rings=np.flatnonzero(~crash))
+            else:
+                sim.step()
+
+            if sim.collided_ids:
+                crash[[sim.ring[sim.index[veh_id]]
+                       for veh_id in sim.collided_ids]] = True
+
+        obs = self._get_state()
+
+        # reward high average speeds and penalize accelerations, as in
+        # WaveAttenuationEnv
+        n = sim.num_vehicles
+        ring = sim.ring[:n]
+        counts = np.bincount(ring, minlength=self.num_envs)
+        mean_speed = np.bincount(ring, weights=sim.speed[:n],
+                                 minlength=self.num_envs) / counts
+        rewards = wave_attenuation_reward(mean_speed, np.abs(actions))
+        rewards[crash] = 0
+
+        self._num_steps += 1
+        dones = crash | (self._num_steps >= self.horizons)
+        infos = [{} for _ in range(self.num_envs)]
+
+        done_envs = np.flatnonzero(dones)
+        if len(done_envs) > 0:
+            for i in done_envs:
+                infos[i]['terminal_observation'] = obs[i].copy()
+            self._reset_envs(done_envs)
+            obs[done_envs] = self._get_state()[done_envs]
+
+        return obs, rewards, dones, infos
+
+    def close(self):
+        """Release the simulator."""
+        self.sim = None
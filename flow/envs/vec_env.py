@@ -0,0 +1,397 @@
+"""Vectorized environment for stepping several Flow environments at once.
+
+Each sub-environment lives in its own process and holds its own simulator
+instance (e.g. a sumo process). Observations, rewards, and dones are written by
+the workers directly into shared-memory numpy buffers, so only the (small)
+actions and info dicts are sent through pipes during a step.
+"""
+
+import os
+import random
+import tempfile
+import traceback
+import multiprocessing
+from copy import deepcopy
+
+import numpy as np
+from gym.spaces import Box
+
+from flow.utils.registry import make_create_env
+
+# directory used to back the shared observation buffer. /dev/shm is a memory
+# backed filesystem on most linux distributions
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class _RemoteTraceback(Exception):
+    """Traceback of an error raised in a worker process."""
+
+    def __init__(self, tb):
+        super().__init__(tb)
+        self.tb = tb
+
+    def __str__(self):
+        return self.tb
+
+
+class _WorkerError(object):
+    """Error raised in a worker process, sent to the VecEnv through its pipe.
+    """
+
+    def __init__(self, error, tb):
+        self.error = error
+        self.tb = tb
+
+
+def _send_error(remote, error):
+    """Send an error raised in a worker process to the VecEnv."""
+    tb = traceback.format_exc()
+    try:
+        remote.send(_WorkerError(error, tb))
+    except Exception:
+        # the error cannot be pickled, or the VecEnv closed the pipe
+        try:
+            remote.send(_WorkerError(RuntimeError(repr(error)), tb))
+        except Exception:
+            pass
+
+
+def _recv(remote):
+    """Receive a message from a worker, and re-raise the error it raised.
+
+    Raises
+    ------
+    Exception
+        the error raised in the worker process, if any, whose cause is the
+        traceback of the error in the worker
+    """
+    message = remote.recv()
+    if isinstance(message, _WorkerError):
+        raise message.error from _RemoteTraceback(message.tb)
+    return message
+
+
+def _worker(remote, parent_remote, flow_params, seed, render, rewards, dones):
+    """Run a single Flow environment inside a subprocess.
+
+    Parameters
+    ----------
+    remote : multiprocessing.Connection
+        end of the pipe used by the worker
+    parent_remote : multiprocessing.Connection
+        end of the pipe used by the VecEnv (closed within the worker)
+    flow_params : dict
+        flow-related parameters (see flow.utils.registry.make_create_env)
+    seed : int or None
+        seed for the simulator and the python/numpy random number generators
+    render : bool or None
+        overrides the render attribute in SimParams (if not None)
+    rewards : multiprocessing.RawArray
+        shared buffer of rewards, one element per sub-environment
+    dones : multiprocessing.RawArray
+        shared buffer of done flags, one element per sub-environment
+
+    Errors raised by the environment are sent to the VecEnv in place of the
+    expected message, after which the worker shuts down.
+    """
+    parent_remote.close()
+    env = None
+
+    try:
+        # seed the random number generators used by flow and the simulator
+        params = dict(flow_params)
+        params['sim'] = deepcopy(flow_params['sim'])
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+            params['sim'].seed = seed
+
+        create_env, _ = make_create_env(params, render=render)
+        env = create_env()
+        horizon = env.env_params.horizon
+
+        remote.send((env.observation_space, env.action_space))
+
+        # the VecEnv sends None instead of the observation buffer if it failed
+        # to initialize, in which case the worker shuts down
+        handshake = remote.recv()
+        if handshake is None:
+            return
+        index, obs_path = handshake
+
+        # attach to the observation buffer created by the VecEnv
+        shape = (env.observation_space.shape[0],)
+        obs_buffer = np.memmap(obs_path, dtype=np.float64, mode='r+',
+                               shape=(index + 1,) + shape)[index]
+        reward_buffer = np.frombuffer(rewards, dtype=np.float64)
+        done_buffer = np.frombuffer(dones, dtype=np.uint8)
+
+        num_steps = 0
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                obs, reward, done, info = env.step(data)
+                num_steps += 1
+                # the rollout also terminates once the horizon is met
+                done = bool(done) or num_steps >= horizon
+                if done:
+                    # store the terminal observation before it is overwritten
+                    # by the observation of the next rollout
+                    info = dict(info)
+                    info['terminal_observation'] = np.asarray(obs)
+                    obs = env.reset()
+                    num_steps = 0
+                obs_buffer[:] = obs
+                reward_buffer[index] = reward
+                done_buffer[index] = done
+                remote.send(info)
+            elif cmd == 'reset':
+                obs_buffer[:] = env.reset()
+                num_steps = 0
+                remote.send(None)
+            elif cmd == 'close':
+                remote.send(None)
+                break
+            else:
+                raise NotImplementedError(
+                    'Command "{}" is not supported.'.format(cmd))
+    except Exception as e:
+        _send_error(remote, e)
+    finally:
+        if env is not None:
+            env.terminate()
+        remote.close()
+
+
+class VecEnv(object):
+    """Vectorized Flow environment.
+
+    Runs ``num_envs`` copies of the environment specified by ``flow_params`` in
+    separate processes, each with its own simulator instance. Stepping is split
+    into ``step_async`` and ``step_wait`` so that the caller may perform other
+    work (e.g. computing the next actions of a policy) while the simulations
+    are advanced. Sub-environments are reset automatically once they are done,
+    in which case the terminal observation is available from the
+    "terminal_observation" element of the sub-environment's info dict.
+
+    Usage
+        >>> from flow.envs.vec_env import VecEnv
+        >>> env = VecEnv(flow_params, num_envs=8, seed=0)
+        >>> obs = env.reset()  # numpy array of shape (8, obs_dim)
+        >>> env.step_async(actions)  # actions of shape (8, action_dim)
+        >>> obs, rewards, dones, infos = env.step_wait()
+        >>> env.close()
+
+    Only single-agent environments with Box observation spaces are supported.
+
+    Attributes
+    ----------
+    num_envs : int
+        number of sub-environments
+    observation_space : gym.spaces.Box
+        observation space of a single sub-environment
+    action_space : gym.spaces.Space
+        action space of a single sub-environment
+    """
+
+    def __init__(self,
+                 flow_params,
+                 num_envs,
+                 seed=None,
+                 render=None,
+                 start_method=None):
+        """Instantiate the vectorized environment.
+
+        Parameters
+        ----------
+        flow_params : dict
+            flow-related parameters (see flow.utils.registry.make_create_env)
+        num_envs : int
+            number of sub-environments
+        seed : int, optional
+            base seed. The i-th sub-environment is seeded with ``seed + i``. If
+            not specified, the sub-environments are not explicitly seeded.
+        render : bool, optional
+            specifies whether to use the gui during execution. This overrides
+            the render attribute in SimParams
+        start_method : str, optional
+            multiprocessing start method ("fork", "spawn", or "forkserver"),
+            defaults to the platform default
+
+        Raises
+        ------
+        ValueError
+            if the observation space of the environment is not a flat Box
+        RuntimeError
+            if any of the sub-environments failed to start
+        """
+        self.num_envs = num_envs
+        self.closed = False
+        self.waiting = False
+        self._obs_path = None
+        # whether the workers received the observation buffer, and are
+        # therefore waiting for commands
+        self._attached = False
+        ctx = multiprocessing.get_context(start_method)
+
+        # shared buffers for rewards and dones; the size of these does not
+        # depend on the environment, so they can be passed to the processes
+        # at creation
+        self._shared_rewards = ctx.RawArray('d', num_envs)
+        self._shared_dones = ctx.RawArray('B', num_envs)
+        self._rewards = np.frombuffer(self._shared_rewards, dtype=np.float64)
+        self._dones = np.frombuffer(self._shared_dones, dtype=np.uint8)
+
+        self.remotes, work_remotes = zip(
+            *[ctx.Pipe() for _ in range(num_envs)])
+        self.processes = []
+        for i, (work_remote, remote) in enumerate(
+                zip(work_remotes, self.remotes)):
+            env_seed = None if seed is None else seed + i
+            args = (work_remote, remote, flow_params, env_seed, render,
+                    self._shared_rewards, self._shared_dones)
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        # the observation space is only known once the environments are built
+        spaces = []
+        for remote in self.remotes:
+            try:
+                spaces.append(_recv(remote))
+            except EOFError:
+                self.close()
+                raise RuntimeError('A sub-environment failed to start, see '
+                                   'the traceback of its worker process.')
+            except Exception as e:
+                self.close()
+                raise RuntimeError(
+                    'A sub-environment failed to start.') from e
+        self.observation_space, self.action_space = spaces[0]
+        if not isinstance(self.observation_space, Box) \
+                or len(self.observation_space.shape) != 1:
+            self.close()
+            raise ValueError('VecEnv only supports flat Box observations.')
+
+        # create the shared observation buffer and pass it to the workers
+        fd, self._obs_path = tempfile.mkstemp(prefix='flow-vec-env-',
+                                              dir=SHM_DIR)
+        os.close(fd)
+        shape = (num_envs, self.observation_space.shape[0])
+        self._obs = np.memmap(self._obs_path, dtype=np.float64, mode='w+',
+                              shape=shape)
+        for i, remote in enumerate(self.remotes):
+            remote.send((i, self._obs_path))
+        self._attached = True
+
+    def reset(self):
+        """Reset all sub-environments.
+
+        Returns
+        -------
+        numpy ndarray
+            initial observations, of shape (num_envs, obs_dim)
+
+        Raises
+        ------
+        Exception
+            the error raised by a sub-environment, if any (see step_wait)
+        """
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        self._recv_all()
+        return np.array(self._obs)
+
+    def step_async(self, actions):
+        """Send actions to all sub-environments without waiting for results.
+
+        Parameters
+        ----------
+        actions : array_like
+            actions for each sub-environment; the first dimension must be of
+            size num_envs
+        """
+        if self.waiting:
+            raise RuntimeError('step_async called while waiting for results.')
+        for remote, action in zip(self.remotes, actions):
+            remote.send(('step', action))
+        self.waiting = True
+
+    def step_wait(self):
+        """Wait for the results of the last call to step_async.
+
+        Returns
+        -------
+        numpy ndarray
+            observations, of shape (num_envs, obs_dim)
+        numpy ndarray
+            rewards, of shape (num_envs,)
+        numpy ndarray
+            done flags, of shape (num_envs,)
+        list of dict
+            info dict of each sub-environment
+
+        Raises
+        ------
+        Exception
+            the error raised by a sub-environment, if any. The results of the
+            other sub-environments are received first, so that the VecEnv can
+            still be closed. The sub-environment that failed is terminated.
+        """
+        self.waiting = False
+        infos = self._recv_all()
+        return (np.array(self._obs), self._rewards.copy(),
+                self._dones.astype(bool), infos)
+
+    def _recv_all(self):
+        """Receive a message from every worker.
+
+        The first error raised by the workers, if any, is re-raised once all
+        messages were received.
+        """
+        messages = []
+        error = None
+        for remote in self.remotes:
+            try:
+                messages.append(_recv(remote))
+            except Exception as e:
+                messages.append(None)
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+        return messages
+
+    def step(self, actions):
+        """Advance all sub-environments by one step.
+
+        See step_async and step_wait.
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        """Terminate all sub-environments and release the shared buffers."""
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote, process in zip(self.remotes, self.processes):
+            if process.is_alive():
+                try:
+                    if self._attached:
+                        remote.send(('close', None))
+                        remote.recv()
+                    else:
+                        # abort the handshake of workers that are still
+                        # waiting for the observation buffer
+                        remote.send(None)
+                except (BrokenPipeError, ConnectionResetError, EOFError):
+                    # the worker already shut down after an error
+                    pass
+            process.join()
+        if self._obs_path is not None:
+            os.remove(self._obs_path)
+        self.closed = True
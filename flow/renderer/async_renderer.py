@@ -0,0 +1,182 @@
+"""Contains the asynchronous renderer class.
+
+The asynchronous renderer decouples rendering from the simulation: the
+environment hands the state needed to draw a frame (orientations, dynamics
+and logs of the vehicles) to a background thread through a bounded queue, and
+reads the most recent completed frame and local observations, so that the
+simulation is not slowed down to the speed of rendering and saving frames.
+"""
+
+import threading
+import queue
+
+import numpy as np
+
+
+class AsyncRenderer(object):
+    """Renderer drawing frames in a background thread.
+
+    The renderer (PygletRenderer or HeadlessRenderer) is created by, and only
+    used from, the background thread, since OpenGL contexts are bound to the
+    thread that created them.
+
+    If the queue of pending snapshots is full, the oldest pending snapshot is
+    dropped, so that the simulation never waits for the renderer, unless
+    ``block`` is set, in which case the simulation waits for a free slot
+    (backpressure).
+
+    Usage
+        >>> renderer = AsyncRenderer(lambda: HeadlessRenderer(network, "gray"))
+        >>> renderer.submit(render_args, sight_orientations, sight_ids)
+        >>> renderer.frame, renderer.sights  # most recent completed frame
+        >>> renderer.close()
+    """
+
+    def __init__(self, make_renderer, queue_size=2, block=False):
+        """Instantiate the renderer and start the background thread.
+
+        Parameters
+        ----------
+        make_renderer : callable
+            function creating the renderer, called by the background thread
+        queue_size : int
+            maximum number of snapshots waiting to be rendered
+        block : bool
+            specifies whether submitting a snapshot waits for the renderer if
+            the queue is full, instead of dropping the oldest pending snapshot
+
+        Raises
+        ------
+        Exception
+            any error raised while creating the renderer
+        """
+        self.block = block
+        self.num_submitted = 0
+        self.num_rendered = 0
+        self.num_dropped = 0
+
+        self.frame = None
+        self.sights = None
+        self._lock = threading.Lock()
+        self._snapshots = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._started = threading.Event()
+
+        self._thread = threading.Thread(
+            target=self._run, args=(make_renderer,), daemon=True)
+        self._thread.start()
+        self._started.wait()
+        self._check()
+
+    def submit(self, render_args, sight_orientations, sight_ids, wait=False):
+        """Hand the state of a simulation step to the renderer.
+
+        Parameters
+        ----------
+        render_args : tuple
+            human orientations, machine orientations, human dynamics, machine
+            dynamics, human logs and machine logs, see PygletRenderer.render
+        sight_orientations : list
+            orientations of the vehicles whose local observations are
+            extracted, see PygletRenderer.get_sights
+        sight_ids : list of str
+            ids of these vehicles
+        wait : bool
+            specifies whether to wait for the frame to be rendered
+
+        Raises
+        ------
+        Exception
+            any error raised by the renderer since the last submission
+        """
+        self._check()
+        done = threading.Event() if wait else None
+        snapshot = (render_args, sight_orientations, sight_ids, done)
+        self.num_submitted += 1
+
+        if self.block or wait:
+            self._snapshots.put(snapshot)
+        else:
+            while True:
+                try:
+                    self._snapshots.put_nowait(snapshot)
+                    break
+                except queue.Full:
+                    try:
+                        dropped = self._snapshots.get_nowait()
+                    except queue.Empty:
+                        continue
+                    self.num_dropped += 1
+                    if dropped[3] is not None:
+                        dropped[3].set()
+
+        if done is not None:
+            done.wait()
+            self._check()
+
+    def get_latest(self):
+        """Return the most recent completed frame and local observations.
+
+        Returns
+        -------
+        numpy.ndarray
+            frame, or None if no frame has been rendered yet
+        numpy.ndarray
+            local observations of the vehicles
+        """
+        with self._lock:
+            return self.frame, self.sights
+
+    def close(self):
+        """Render the pending snapshots, and close the renderer.
+
+        Raises
+        ------
+        Exception
+            any error raised by the renderer
+        """
+        if self._thread.is_alive():
+            self._snapshots.put(None)
+            self._thread.join()
+        self._check()
+
+    def _run(self, make_renderer):
+        """Render the submitted snapshots in the background thread."""
+        try:
+            renderer = make_renderer()
+        except Exception as e:
+            self._error = e
+            self._started.set()
+            return
+        self._started.set()
+
+        while True:
+            snapshot = self._snapshots.get()
+            if snapshot is None:
+                break
+            render_args, sight_orientations, sight_ids, done = snapshot
+            try:
+                if self._error is None:
+                    frame = renderer.render(*render_args)
+                    sights = renderer.get_sights(sight_orientations,
+                                                 sight_ids)
+                    # the renderer reuses its buffers
+                    frame, sights = np.copy(frame), np.copy(sights)
+                    with self._lock:
+                        self.frame, self.sights = frame, sights
+                    self.num_rendered += 1
+            except Exception as e:
+                self._error = e
+            if done is not None:
+                done.set()
+
+        try:
+            renderer.close()
+        except Exception as e:
+            self._error = e
+
+    def _check(self):
+        """Re-raise the error raised by the renderer, if any."""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
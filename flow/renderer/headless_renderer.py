@@ -0,0 +1,198 @@
+"""Contains the headless renderer class."""
+
+import numpy as np
+import cv2
+import os
+from os.path import expanduser
+import time
+import copy
+
+from flow.renderer.rasterizer import Rasterizer, SightExtractor
+HOME = expanduser("~")
+
+
+class HeadlessRenderer():
+
+    def __init__(self, network, mode,
+                 save_render=False,
+                 path=HOME+"/flow_rendering",
+                 sight_radius=50,
+                 show_radius=False,
+                 pxpm=2):
+        """Instantiate a headless renderer class.
+
+        This renderer has the same interface and produces the same frames as
+        PygletRenderer, but draws them into a NumPy frame buffer with OpenCV
+        (see flow/renderer/rasterizer.py) instead of an OpenGL window, so
+        that it runs on machines without a display or a GPU. It is selected
+        by setting ``SimParams.renderer`` to "headless".
+
+            Parameters
+            ----------
+            network: list
+                A list of road network polygons
+            mode: str
+                "gray": static grayscale rendering, which is good for training
+                "dgray": dynamic grayscale rendering
+                "rgb": static RGB rendering
+                "drgb": dynamic RGB rendering, which is good for visualization
+            save_render: bool
+                Specify whether to save rendering data to disk
+            path: str
+                Specify where to store the rendering data
+            sight_radius: int
+                Set the radius of observation for RL vehicles (meter)
+            show_radius: bool
+                Specify whether to render the radius of RL observation
+            pxpm: int
+                Specify rendering resolution (pixel / meter)
+        """
+        self.mode = mode
+        if self.mode not in ["rgb", "drgb", "gray", "dgray"]:
+            raise ValueError("Mode %s is not supported!" % self.mode)
+        self.save_render = save_render
+        self.path = path + '/' + time.strftime("%Y-%m-%d-%H%M%S")
+        if self.save_render:
+            if not os.path.exists(path):
+                os.mkdir(path)
+            os.mkdir(self.path)
+            self.data = [network]
+        self.sight_radius = sight_radius
+        self.pxpm = pxpm  # Pixel per meter
+        self.show_radius = show_radius
+        self.time = 0
+
+        self.rasterizer = Rasterizer(network, mode, sight_radius, show_radius,
+                                     pxpm)
+        self.width = self.rasterizer.width
+        self.height = self.rasterizer.height
+        self.x_shift = self.rasterizer.x_shift
+        self.x_scale = self.rasterizer.x_scale
+        self.y_shift = self.rasterizer.y_shift
+        self.y_scale = self.rasterizer.y_scale
+        self.frame = self.rasterizer.frame
+
+        # circular masks of the local observations, by radius (pixel)
+        self._sight_masks = {}
+        self.sight_extractor = SightExtractor()
+
+    def render(self,
+               human_orientations,
+               machine_orientations,
+               human_dynamics,
+               machine_dynamics,
+               human_logs,
+               machine_logs,
+               save_render=None,
+               sight_radius=None,
+               show_radius=None):
+        """Update the rendering frame.
+
+        See PygletRenderer.render.
+        """
+        if save_render is None:
+            save_render = self.save_render
+        if sight_radius is None:
+            sight_radius = self.sight_radius
+        if show_radius is None:
+            show_radius = self.show_radius
+
+        self.time += 1
+
+        _frame = self.rasterizer.draw(human_orientations,
+                                      machine_orientations,
+                                      human_dynamics,
+                                      machine_dynamics,
+                                      sight_radius,
+                                      show_radius)
+        self.frame = self.rasterizer.frame
+
+        if save_render:
+            cv2.imwrite("%s/frame_%06d.png" %
+                        (self.path, self.time), _frame)
+            self.data.append(copy.deepcopy(
+                [human_orientations, machine_orientations,
+                 human_dynamics, machine_dynamics,
+                 human_logs, machine_logs]))
+        return _frame
+
+    def get_sight(self, orientation, id, sight_radius=None, save_render=None):
+        """Return the local observation of a vehicle.
+
+        See PygletRenderer.get_sight. Areas of the observation outside of the
+        frame are black.
+        """
+        if sight_radius is None:
+            sight_radius = self.sight_radius
+        if save_render is None:
+            save_render = self.save_render
+        radius = int(sight_radius * self.pxpm)
+
+        x, y, ang = orientation
+        x, y = self.rasterizer.to_pixels(x, y)
+        x_min = int(x - radius)
+        y_min = int(y - radius)
+        fixed_sight = np.zeros((2 * radius, 2 * radius, 3), np.uint8)
+        src = self.frame[max(y_min, 0):max(y_min + 2 * radius, 0),
+                         max(x_min, 0):max(x_min + 2 * radius, 0)]
+        fixed_sight[max(-y_min, 0):max(-y_min, 0) + src.shape[0],
+                    max(-x_min, 0):max(-x_min, 0) + src.shape[1]] = src
+
+        if radius not in self._sight_masks:
+            mask = np.zeros((2 * radius, 2 * radius), np.uint8)
+            cv2.circle(mask, (radius, radius), radius, 255, thickness=-1)
+            self._sight_masks[radius] = mask
+        rotated_sight = cv2.bitwise_and(fixed_sight, fixed_sight,
+                                        mask=self._sight_masks[radius])
+        rotation = cv2.getRotationMatrix2D((radius, radius), ang, 1.0)
+        rotated_sight = cv2.warpAffine(rotated_sight, rotation,
+                                       (2 * radius, 2 * radius))
+        if "gray" in self.mode:
+            _rotated_sight = cv2.cvtColor(rotated_sight, cv2.COLOR_BGR2GRAY)
+        else:
+            _rotated_sight = rotated_sight
+        if save_render:
+            cv2.imwrite("%s/sight_%s_%06d.png" %
+                        (self.path, id, self.time),
+                        _rotated_sight)
+        return _rotated_sight
+
+    def get_sights(self, orientations, ids, sight_radius=None,
+                   save_render=None):
+        """Return the local observations of several vehicles at once.
+
+        See PygletRenderer.get_sights.
+        """
+        if sight_radius is None:
+            sight_radius = self.sight_radius
+        if save_render is None:
+            save_render = self.save_render
+        radius = int(sight_radius * self.pxpm)
+
+        orientations = np.asarray(orientations, dtype=float).reshape(-1, 3)
+        px, py = self.rasterizer.to_pixels(orientations[:, 0],
+                                           orientations[:, 1])
+        sights = self.sight_extractor.extract(
+            self.frame, np.stack([px, py], axis=1), orientations[:, 2],
+            radius)
+        if "gray" in self.mode and len(sights) == 0:
+            sights = sights[..., 0]
+        elif "gray" in self.mode:
+            gray = cv2.cvtColor(sights.reshape(-1, 2 * radius, 3),
+                                cv2.COLOR_BGR2GRAY)
+            sights = gray.reshape(sights.shape[:3])
+        if save_render:
+            for id, sight in zip(ids, sights):
+                cv2.imwrite("%s/sight_%s_%06d.png" %
+                            (self.path, id, self.time),
+                            sight)
+        return sights
+
+    def close(self):
+        """Terminate the renderer.
+        """
+        if self.save_render:
+            data = np.empty(len(self.data), dtype=object)
+            for i, step in enumerate(self.data):
+                data[i] = step
+            np.save("%s/data_%06d.npy" % (self.path, self.time), data)
@@ -1,7 +1,6 @@
 """Contains the pyglet renderer class."""
 
 import pyglet
-import matplotlib.cm as cm
 import matplotlib.colors as colors
 import numpy as np
 import cv2
@@ -11,8 +10,16 @@ from os.path import expanduser
 import time
 import copy
 import warnings
+
+from flow.renderer.rasterizer import HUMAN_LUT, MACHINE_LUT, \
+    VEHICLE_SIZE, SightExtractor, lookup_colors
 HOME = expanduser("~")
 
+# colors of human and RL vehicles in dynamic modes, indexed by normalized
+# speed, in the RGB order used by pyglet
+HUMAN_RGB_LUT = np.ascontiguousarray(HUMAN_LUT[:, ::-1])
+MACHINE_RGB_LUT = np.ascontiguousarray(MACHINE_LUT[:, ::-1])
+
 
 def truncate_colormap(cmap, minval=0.25, maxval=0.75, n=100):
     """Truncate a matplotlib colormap.
@@ -90,6 +97,8 @@ class PygletRenderer():
         self.y_shift = shift - self.sight_radius
         self.y_scale = scale
 
+        self.sight_extractor = SightExtractor()
+
         self.lane_colors = []
         for lane_poly in self.lane_polys:
             lane_poly[::2] = [(x-self.x_shift)*self.x_scale*self.pxpm
@@ -107,8 +116,17 @@ class PygletRenderer():
         try:
             self.window = pyglet.window.Window(width=self.width,
                                                height=self.height)
+
+            # lanes never move, so the static network layer is rasterized
+            # once into a texture, which is copied at the start of every frame
+            self.lane_batch = pyglet.graphics.Batch()
+            self.add_lane_polys()
+            pyglet.gl.glClearColor(0.125, 0.125, 0.125, 1)
+            self.window.clear()
+            self.lane_batch.draw()
             buffer = pyglet.image.get_buffer_manager().get_color_buffer()
             image_data = buffer.get_image_data()
+            self.lane_layer = image_data.get_texture()
             frame = np.fromstring(image_data.data, dtype=np.uint8, sep='')
             frame = frame.reshape(buffer.height, buffer.width, 4)
             self.frame = frame[::-1, :, 0:3][..., ::-1]
@@ -188,19 +206,12 @@ class PygletRenderer():
         self.window.switch_to()
         self.window.dispatch_events()
 
-        self.lane_batch = pyglet.graphics.Batch()
-        self.add_lane_polys()
-        self.lane_batch.draw()
+        self.lane_layer.blit(0, 0)
         self.vehicle_batch = pyglet.graphics.Batch()
         if "d" in self.mode:
-            red_cmap = truncate_colormap(cm.Greens, 0.2, 0.8)
-            human_conditions = [
-                (255*np.array(red_cmap(d)[:3])).astype(np.uint8).tolist()
-                for d in human_dynamics]
-            blue_cmap = truncate_colormap(cm.Blues, 0.2, 0.8)
-            machine_conditions = [
-                (255*np.array(blue_cmap(d)[:3])).astype(np.uint8).tolist()
-                for d in machine_dynamics]
+            human_conditions = lookup_colors(HUMAN_RGB_LUT, human_dynamics)
+            machine_conditions = lookup_colors(MACHINE_RGB_LUT,
+                                               machine_dynamics)
         else:
             human_conditions = [[0, 128, 128] for d in human_dynamics]
             machine_conditions = [[255, 255, 255] for d in machine_dynamics]
@@ -282,6 +293,57 @@ class PygletRenderer():
                         _rotated_sight)
         return _rotated_sight
 
+    def get_sights(self, orientations, ids, sight_radius=None,
+                   save_render=None):
+        """Return the local observations of several vehicles at once.
+
+        This is equivalent to calling get_sight for every vehicle, but
+        extracts all observations in a single pass over the frame (see
+        flow.renderer.rasterizer.SightExtractor).
+
+            Parameters
+            ----------
+            orientations: list
+                A list of orientations [x, y, angle]
+            ids: list of str
+                The vehicles to observe for
+            sight_radius: int
+                Set the radius of observation for RL vehicles (meter)
+            save_render: bool
+                Specify whether to save rendering data to disk
+
+            Returns
+            -------
+            numpy.ndarray
+                (N, H, W, 3) array of observations, or (N, H, W) in
+                grayscale modes, which is overwritten by the next call
+        """
+        if sight_radius is None:
+            sight_radius = self.sight_radius
+        if save_render is None:
+            save_render = self.save_render
+        radius = int(sight_radius * self.pxpm)
+
+        orientations = np.asarray(orientations, dtype=float).reshape(-1, 3)
+        px = (orientations[:, 0]-self.x_shift)*self.x_scale*self.pxpm
+        py = self.height - \
+            (orientations[:, 1]-self.y_shift)*self.y_scale*self.pxpm
+        sights = self.sight_extractor.extract(
+            self.frame, np.stack([px, py], axis=1), orientations[:, 2],
+            radius)
+        if "gray" in self.mode and len(sights) == 0:
+            sights = sights[..., 0]
+        elif "gray" in self.mode:
+            gray = cv2.cvtColor(sights.reshape(-1, 2*radius, 3),
+                                cv2.COLOR_BGR2GRAY)
+            sights = gray.reshape(sights.shape[:3])
+        if save_render:
+            for id, sight in zip(ids, sights):
+                cv2.imwrite("%s/sight_%s_%06d.png" %
+                            (self.path, id, self.time),
+                            sight)
+        return sights
+
     def close(self):
         """Terminate the renderer.
         """
@@ -315,6 +377,8 @@ class PygletRenderer():
     def add_vehicle_polys(self, orientations, colors, sight_radius):
         """Render vehicle polygons.
 
+        The polygons of all vehicles are added to the batch at once.
+
             Parameters
             ----------
             orientation: list
@@ -325,78 +389,122 @@ class PygletRenderer():
             sight_radius: int
                 Set the radius of observation for RL vehicles (meter)
         """
-        for orientation, color in zip(orientations, colors):
-            x, y, ang = orientation
-            x = (x-self.x_shift)*self.x_scale*self.pxpm
-            y = (y-self.y_shift)*self.y_scale*self.pxpm
-            self._add_vehicle_poly_triangle((x, y), ang, 4.5, color)
-            self._add_vehicle_poly_circle((x, y), sight_radius, color)
-
-    def _add_vehicle_poly_triangle(self, center, angle, size, color):
-        """Internal pyglet method to render a vehicle as a triangle.
+        if len(orientations) == 0:
+            return
+        orientations = np.asarray(orientations, dtype=float).reshape(-1, 3)
+        centers = np.stack([
+            (orientations[:, 0]-self.x_shift)*self.x_scale*self.pxpm,
+            (orientations[:, 1]-self.y_shift)*self.y_scale*self.pxpm],
+            axis=1)
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        self._add_vehicle_poly_triangles(centers, orientations[:, 2],
+                                         VEHICLE_SIZE, colors)
+        self._add_vehicle_poly_circles(centers, sight_radius, colors)
+
+    def _add_vehicle_poly_triangles(self, centers, angles, size, colors):
+        """Internal pyglet method to render vehicles as triangles.
 
             Parameters
             ----------
-            center: tuple
-                The center coordinate of the vehicle
-            angle: float
-                The angle of the vehicle
+            centers: numpy.ndarray
+                The center coordinates of the vehicles
+            angles: numpy.ndarray
+                The angles of the vehicles
             size: int
-                The size of the rendered triangle
-            color: list
-                The color of the vehicle  [r, g, b].
+                The size of the rendered triangles
+            colors: numpy.ndarray
+                The colors of the vehicles [r, g, b].
         """
-        cx, cy = center
-        ang = np.radians(angle)
-        s = size*self.pxpm
-        pt1 = [cx, cy]
-        pt1_ = [cx - s*self.x_scale*np.sin(ang),
-                cy - s*self.y_scale*np.cos(ang)]
-        pt2 = [pt1_[0] + 0.25*s*self.x_scale*np.sin(np.pi/2-ang),
-               pt1_[1] - 0.25*s*self.y_scale*np.cos(np.pi/2-ang)]
-        pt3 = [pt1_[0] - 0.25*s*self.x_scale*np.sin(np.pi/2-ang),
-               pt1_[1] + 0.25*s*self.y_scale*np.cos(np.pi/2-ang)]
-        vertex_list = []
-        vertex_color = []
-        for point in [pt1, pt2, pt3]:
-            vertex_list += point
-            vertex_color += color
-        index = [x for x in range(3)]
-        group = pyglet.graphics.Group()
-        self.vehicle_batch.add_indexed(3, pyglet.gl.GL_POLYGON,
-                                       group, index,
-                                       ("v2f", vertex_list),
-                                       ("c3B", vertex_color))
+        vertices = vehicle_triangles(centers, angles, size*self.pxpm,
+                                     self.x_scale, self.y_scale)
+        self.vehicle_batch.add(3*len(centers), pyglet.gl.GL_TRIANGLES, None,
+                               ("v2f", vertices.ravel().tolist()),
+                               ("c3B", np.repeat(colors, 3, axis=0)
+                                .ravel().tolist()))
 
-    def _add_vehicle_poly_circle(self, center, radius, color):
-        """Internal pyglet method to render a vehicle as a circle or to render
-        its observation radius.
+    def _add_vehicle_poly_circles(self, centers, radius, colors):
+        """Internal pyglet method to render the observation radius of vehicles.
 
             Parameters
             ----------
-            center: tuple
-                The center coordinate of the vehicle
+            centers: numpy.ndarray
+                The center coordinates of the vehicles
             radius: float
-                The size of the rendered vehicle or the radius of observation
-            color: list
-                The color of the vehicle  [r, g, b].
+                The radius of observation
+            colors: numpy.ndarray
+                The colors of the vehicles [r, g, b].
         """
         if radius == 0:
             return
-        cx, cy = center
-        radius = radius * self.pxpm
-        pxpm = int(self.pxpm*50)
-        vertex_list = []
-        vertex_color = []
-        for idx in range(pxpm):
-            angle = np.radians(float(idx)/pxpm * 360.0)
-            x = radius*self.x_scale*np.cos(angle) + cx
-            y = radius*self.y_scale*np.sin(angle) + cy
-            vertex_list += [x, y]
-            vertex_color += color
-        index = [x for x in range(pxpm)]
-        group = pyglet.graphics.Group()
-        self.vehicle_batch.add_indexed(pxpm, pyglet.gl.GL_LINE_LOOP,
-                                       group, index,
-                                       ("v2f", vertex_list),
-                                       ("c3B", vertex_color))
+        num_points = int(self.pxpm*50)
+        vertices = vehicle_circles(centers, radius*self.pxpm, num_points,
+                                   self.x_scale, self.y_scale)
+        self.vehicle_batch.add(2*num_points*len(centers),
+                               pyglet.gl.GL_LINES, None,
+                               ("v2f", vertices.ravel().tolist()),
+                               ("c3B", np.repeat(colors, 2*num_points, axis=0)
+                                .ravel().tolist()))
+
+
+def vehicle_triangles(centers, angles, size, x_scale=1, y_scale=1):
+    """Return the vertices of the triangles representing vehicles.
+
+    The tip of a triangle is at the position of its vehicle, and its base is
+    ``size`` pixels behind, in the direction opposite to the angle.
+
+    Parameters
+    ----------
+    centers: numpy.ndarray
+        (N, 2) array of the positions of the vehicles (pixel, y upwards)
+    angles: numpy.ndarray
+        angles of the vehicles, in degrees clockwise from the north
+    size: float
+        length of the triangles (pixel)
+    x_scale: float
+        scaling of the x axis of the frame
+    y_scale: float
+        scaling of the y axis of the frame
+
+    Returns
+    -------
+    numpy.ndarray
+        (N, 3, 2) array of the vertices of the triangles
+    """
+    ang = np.radians(angles)
+    sin, cos = np.sin(ang), np.cos(ang)
+    cx, cy = centers[:, 0], centers[:, 1]
+    bx = cx - size*x_scale*sin
+    by = cy - size*y_scale*cos
+    dx = 0.25*size*x_scale*cos
+    dy = 0.25*size*y_scale*sin
+    return np.stack([np.stack([cx, cy], axis=1),
+                     np.stack([bx + dx, by - dy], axis=1),
+                     np.stack([bx - dx, by + dy], axis=1)], axis=1)
+
+
+def vehicle_circles(centers, radius, num_points, x_scale=1, y_scale=1):
+    """Return the line segments of the circles around vehicles.
+
+    Parameters
+    ----------
+    centers: numpy.ndarray
+        (N, 2) array of the positions of the vehicles (pixel)
+    radius: float
+        radius of the circles (pixel)
+    num_points: int
+        number of points of every circle
+    x_scale: float
+        scaling of the x axis of the frame
+    y_scale: float
+        scaling of the y axis of the frame
+
+    Returns
+    -------
+    numpy.ndarray
+        (N, 2 * num_points, 2) array of the end points of the segments
+    """
+    angles = np.radians(np.arange(num_points) / num_points * 360.0)
+    points = np.stack([radius*x_scale*np.cos(angles),
+                       radius*y_scale*np.sin(angles)], axis=1)
+    segments = np.stack([points, np.roll(points, -1, axis=0)], axis=1)
+    return centers[:, np.newaxis] + segments.reshape(1, -1, 2)
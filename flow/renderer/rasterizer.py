@@ -0,0 +1,380 @@
+"""Contains a rasterizer drawing frames of the network with NumPy and OpenCV.
+
+The rasterizer reproduces the frames of the pyglet renderer (same geometry,
+colors and BGR channel order) without a window or an OpenGL context, so that
+frames can be drawn on machines without a display, and in several processes at
+once (see flow/renderer/replay.py).
+"""
+
+import matplotlib.cm as cm
+import numpy as np
+import cv2
+
+# colors of the background and the lanes in static and dynamic modes (BGR)
+BACKGROUND_COLOR = (32, 32, 32)
+STATIC_LANE_COLOR = (0, 200, 200)
+DYNAMIC_LANE_COLOR = (224, 224, 224)
+
+# colors of human and RL vehicles in static modes (BGR)
+STATIC_HUMAN_COLOR = (128, 128, 0)
+STATIC_MACHINE_COLOR = (255, 255, 255)
+
+# length of the triangles representing vehicles (meter)
+VEHICLE_SIZE = 4.5
+
+# number of fractional bits of the pixel coordinates passed to cv2
+SHIFT = 4
+
+# offset of the pixels outside of the local observations (pixel)
+OUTSIDE = 1e6
+
+
+def colormap_lut(cmap, minval=0.25, maxval=0.75, n=256):
+    """Return the lookup table of a truncated matplotlib colormap.
+
+    The table replaces the evaluation of the colormap returned by
+    flow.renderer.pyglet_renderer.truncate_colormap for every vehicle.
+
+    Parameters
+    ----------
+    cmap : matplotlib.colors.Colormap
+        colormap to be truncated
+    minval : float
+        lower bound of the truncated colormap, in [0, 1]
+    maxval : float
+        upper bound of the truncated colormap, in [0, 1]
+    n : int
+        number of entries of the table
+
+    Returns
+    -------
+    numpy.ndarray
+        (n, 3) array of uint8 BGR colors, from minval to maxval
+    """
+    rgb = cmap(np.linspace(minval, maxval, n))[:, :3]
+    return (255 * rgb[:, ::-1]).astype(np.uint8)
+
+
+# colors of human and RL vehicles in dynamic modes, indexed by normalized speed
+HUMAN_LUT = colormap_lut(cm.Greens, 0.2, 0.8)
+MACHINE_LUT = colormap_lut(cm.Blues, 0.2, 0.8)
+
+
+def lookup_colors(lut, dynamics):
+    """Return the colors of a lookup table for normalized speeds.
+
+    Parameters
+    ----------
+    lut : numpy.ndarray
+        lookup table, see colormap_lut
+    dynamics : list of float
+        speeds normalized by the maximum speed, i.e. in [0, 1]
+
+    Returns
+    -------
+    numpy.ndarray
+        (len(dynamics), 3) array of uint8 colors
+    """
+    index = np.asarray(dynamics, dtype=float) * (len(lut) - 1)
+    index = np.clip(np.nan_to_num(index), 0, len(lut) - 1)
+    return lut[np.round(index).astype(int)]
+
+
+class Rasterizer(object):
+    """Rasterizer of the network and the vehicles into a NumPy frame buffer.
+
+    The static layer (background and lanes) is drawn once upon instantiation.
+    Every frame is then a copy of this layer onto a preallocated buffer, on
+    which vehicles are drawn, so that the cost of a frame only depends on the
+    number of vehicles.
+
+    Usage
+        >>> rasterizer = Rasterizer(network, "drgb", pxpm=2)
+        >>> frame = rasterizer.draw(human_orientations, machine_orientations,
+        >>>                         human_dynamics, machine_dynamics)
+    """
+
+    def __init__(self, network, mode, sight_radius=50, show_radius=False,
+                 pxpm=2):
+        """Instantiate the rasterizer.
+
+        Parameters
+        ----------
+        network : list
+            A list of road network polygons, each a flat list of coordinates
+            [x0, y0, x1, y1, ...]
+        mode : str
+            "gray", "dgray", "rgb" or "drgb", see PygletRenderer
+        sight_radius : int
+            radius of observation of RL vehicles (meter)
+        show_radius : bool
+            specifies whether to draw the radius of observation of RL vehicles
+        pxpm : int
+            rendering resolution (pixel / meter)
+        """
+        if mode not in ["rgb", "drgb", "gray", "dgray"]:
+            raise ValueError("Mode %s is not supported!" % mode)
+        self.mode = mode
+        self.sight_radius = sight_radius
+        self.show_radius = show_radius
+        self.pxpm = pxpm
+
+        # same frame geometry as PygletRenderer
+        lane_polys_flat = [pt for poly in network for pt in poly]
+
+        polys_x = np.asarray(lane_polys_flat[::2])
+        width = int(polys_x.max() - polys_x.min())
+        self.x_shift = polys_x.min() - 2 - self.sight_radius
+        self.x_scale = (width - 4) / width
+        self.width = int((width + 2 * self.sight_radius) * self.pxpm)
+
+        polys_y = np.asarray(lane_polys_flat[1::2])
+        height = int(polys_y.max() - polys_y.min())
+        self.y_shift = polys_y.min() - 2 - self.sight_radius
+        self.y_scale = (height - 4) / height
+        self.height = int((height + 2 * self.sight_radius) * self.pxpm)
+
+        # static layer
+        self.background = np.empty((self.height, self.width, 3), np.uint8)
+        self.background[:] = BACKGROUND_COLOR
+        lane_color = DYNAMIC_LANE_COLOR if "d" in mode else STATIC_LANE_COLOR
+        lanes = []
+        for lane_poly in network:
+            poly = np.asarray(lane_poly, dtype=float).reshape(-1, 2)
+            lanes.append(self._fixed_point(*self.to_pixels(
+                poly[:, 0], poly[:, 1])))
+        cv2.polylines(self.background, lanes, False, lane_color, 1,
+                      cv2.LINE_8, SHIFT)
+
+        self.frame = np.empty_like(self.background)
+
+    def to_pixels(self, x, y):
+        """Convert positions in the network to pixel coordinates.
+
+        Parameters
+        ----------
+        x : array_like
+            x coordinates (meter)
+        y : array_like
+            y coordinates (meter)
+
+        Returns
+        -------
+        numpy.ndarray
+            columns of the pixels
+        numpy.ndarray
+            rows of the pixels, from the top of the frame
+        """
+        px = (np.asarray(x) - self.x_shift) * self.x_scale * self.pxpm
+        py = (np.asarray(y) - self.y_shift) * self.y_scale * self.pxpm
+        return px, self.height - py
+
+    def draw(self,
+             human_orientations,
+             machine_orientations,
+             human_dynamics,
+             machine_dynamics,
+             sight_radius=None,
+             show_radius=None):
+        """Draw a frame.
+
+        Parameters
+        ----------
+        human_orientations : list
+            orientations [x, y, angle] of all human vehicles
+        machine_orientations : list
+            orientations [x, y, angle] of all RL vehicles
+        human_dynamics : list
+            speeds of all human vehicles normalized by the max speed
+        machine_dynamics : list
+            speeds of all RL vehicles normalized by the max speed
+        sight_radius : int, optional
+            radius of observation of RL vehicles (meter)
+        show_radius : bool, optional
+            specifies whether to draw the radius of observation
+
+        Returns
+        -------
+        numpy.ndarray
+            the frame, in BGR or grayscale depending on the mode. The BGR
+            frame is stored in the ``frame`` attribute, which is overwritten
+            by the next call.
+        """
+        if sight_radius is None:
+            sight_radius = self.sight_radius
+        if show_radius is None:
+            show_radius = self.show_radius
+
+        if "d" in self.mode:
+            human_colors = lookup_colors(HUMAN_LUT, human_dynamics)
+            machine_colors = lookup_colors(MACHINE_LUT, machine_dynamics)
+        else:
+            human_colors = [STATIC_HUMAN_COLOR] * len(human_orientations)
+            machine_colors = [STATIC_MACHINE_COLOR] * len(machine_orientations)
+
+        np.copyto(self.frame, self.background)
+        self.draw_vehicles(human_orientations, human_colors, 0)
+        self.draw_vehicles(machine_orientations, machine_colors,
+                           sight_radius if show_radius else 0)
+
+        if "gray" in self.mode:
+            return cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        return self.frame
+
+    def draw_vehicles(self, orientations, colors, sight_radius):
+        """Draw vehicles as triangles pointing in their direction of travel.
+
+        Parameters
+        ----------
+        orientations : list
+            orientations [x, y, angle] of the vehicles, where angles are in
+            degrees, clockwise from the north
+        colors : list
+            BGR colors of the vehicles
+        sight_radius : float
+            radius of the circles drawn around the vehicles (meter), or 0
+        """
+        if len(orientations) == 0:
+            return
+        orientations = np.asarray(orientations, dtype=float).reshape(-1, 3)
+        cx, cy = self.to_pixels(orientations[:, 0], orientations[:, 1])
+        ang = np.radians(orientations[:, 2])
+        sin, cos = np.sin(ang), np.cos(ang)
+
+        # the tip of a triangle is at the position of the vehicle, and its
+        # base is VEHICLE_SIZE meters behind (the y axis points downwards)
+        s = VEHICLE_SIZE * self.pxpm
+        bx = cx - s * self.x_scale * sin
+        by = cy + s * self.y_scale * cos
+        dx = 0.25 * s * self.x_scale * cos
+        dy = 0.25 * s * self.y_scale * sin
+        triangles = self._fixed_point(
+            np.stack([cx, bx + dx, bx - dx], axis=1),
+            np.stack([cy, by + dy, by - dy], axis=1))
+
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3).tolist()
+        for triangle, color in zip(triangles, colors):
+            cv2.fillConvexPoly(self.frame, triangle, color, cv2.LINE_8, SHIFT)
+
+        if sight_radius > 0:
+            radius = int(sight_radius * self.pxpm * self.x_scale
+                         * (1 << SHIFT))
+            centers = self._fixed_point(cx, cy)
+            for center, color in zip(centers, colors):
+                cv2.circle(self.frame, tuple(center.tolist()), radius, color,
+                           1, cv2.LINE_8, SHIFT)
+
+    @staticmethod
+    def _fixed_point(px, py):
+        """Return pixel coordinates as the int32 points expected by cv2."""
+        points = np.stack([px, py], axis=-1) * (1 << SHIFT)
+        return np.round(points).astype(np.int32)
+
+
+class SightExtractor(object):
+    """Extractor of the local observations of several vehicles at once.
+
+    The local observation of a vehicle is the disk of frame around it,
+    rotated by its angle (see PygletRenderer.get_sight). Instead of cropping,
+    masking and rotating the frame vehicle by vehicle, the pixel coordinates
+    of the observations of all vehicles are computed at once from
+    precomputed grids, and the frame is sampled with a single call to
+    cv2.remap, into a preallocated (N, H, W, C) array. Pixels outside of the
+    disks are mapped outside of the frame, so that they are black, which
+    saves masking the observations.
+    """
+
+    # maximum number of rows sampled by a call to cv2.remap
+    MAX_ROWS = 32000
+
+    def __init__(self):
+        """Instantiate the extractor."""
+        self._radius = None
+        self._out = None
+        self._maps = None
+
+    def extract(self, frame, centers, angles, radius):
+        """Return the local observations of vehicles.
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            (H, W, C) frame
+        centers : numpy.ndarray
+            (N, 2) array of the columns and rows of the vehicles in the frame
+        angles : numpy.ndarray
+            angles of the vehicles (degree)
+        radius : int
+            radius of the observations (pixel)
+
+        Returns
+        -------
+        numpy.ndarray
+            (N, 2 * radius, 2 * radius, C) array of observations. Areas of
+            the observations outside of the frame are black. The array is
+            overwritten by the next call.
+        """
+        size = 2 * radius
+        num = len(centers)
+        self._allocate(frame, num, radius)
+        out = self._out[:num]
+        if num == 0:
+            return out
+
+        # the observations are rotated around the centers of the crops of
+        # the frame of PygletRenderer.get_sight
+        centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        cx = (centers[:, 0] - radius).astype(int) + radius
+        cy = (centers[:, 1] - radius).astype(int) + radius
+        ang = np.radians(np.asarray(angles, dtype=float))
+        cos = np.cos(ang).astype(np.float32)[:, np.newaxis]
+        sin = np.sin(ang).astype(np.float32)[:, np.newaxis]
+        map_x, map_y, tmp = [m[:num] for m in self._maps]
+        np.multiply(cos, self._du, out=map_x)
+        np.multiply(sin, self._dv, out=tmp)
+        map_x -= tmp
+        map_x += cx[:, np.newaxis].astype(np.float32)
+        np.multiply(sin, self._du, out=map_y)
+        np.multiply(cos, self._dv, out=tmp)
+        map_y += tmp
+        map_y += cy[:, np.newaxis].astype(np.float32)
+
+        step = max(self.MAX_ROWS // size, 1)
+        for i in range(0, num, step):
+            j = min(i + step, num)
+            cv2.remap(frame,
+                      map_x[i:j].reshape(-1, size),
+                      map_y[i:j].reshape(-1, size),
+                      cv2.INTER_LINEAR,
+                      dst=out[i:j].reshape((-1, size) + frame.shape[2:]),
+                      borderMode=cv2.BORDER_CONSTANT,
+                      borderValue=0)
+        return out
+
+    def _allocate(self, frame, num, radius):
+        """Allocate the grids, maps and observations for a number of vehicles.
+        """
+        size = 2 * radius
+        if radius != self._radius:
+            # offsets of the pixels from the center of the observations.
+            # Pixels outside of the disks are offset far outside of the
+            # frame, in a direction which is not cancelled by any rotation
+            mask = np.zeros((size, size), np.uint8)
+            cv2.circle(mask, (radius, radius), radius, 1, thickness=-1)
+            dv, du = np.mgrid[0:size, 0:size] - radius
+            du = np.where(mask.ravel(), du.ravel(), OUTSIDE)
+            dv = np.where(mask.ravel(), dv.ravel(), OUTSIDE)
+            self._du = du.astype(np.float32)
+            self._dv = dv.astype(np.float32)
+            self._radius = radius
+            self._maps = None
+            self._out = None
+
+        if self._maps is None or len(self._maps[0]) < num:
+            self._maps = [np.empty((num, size * size), np.float32)
+                          for _ in range(3)]
+
+        shape = (num, size, size) + frame.shape[2:]
+        if self._out is None or self._out.shape[1:] != shape[1:] or \
+                len(self._out) < num or self._out.dtype != frame.dtype:
+            self._out = np.empty(shape, dtype=frame.dtype)
@@ -0,0 +1,361 @@
+"""Contains an offline renderer of recorded rollouts.
+
+Rollouts are replayed from either the rendering data saved by the pyglet
+renderer (``save_render=True``), or the trajectories recorded by the kernel
+(``SimParams.record_path``, see flow/core/kernel/recorder.py). Frames are drawn
+by the NumPy/OpenCV rasterizer in a pool of processes, and streamed in order to
+a video encoder, without writing intermediate images and without re-running
+the simulation.
+
+Usage
+    >>> from flow.renderer.replay import load_render_data, render_video
+    >>> network, snapshots = load_render_data(
+    >>>     "~/flow_rendering/<date>/data_003000.npy")
+    >>> render_video(network, snapshots, "replay.mp4", num_workers=8)
+
+or, from the command line:
+
+    $ python flow/renderer/replay.py ~/flow_rendering/<date>/data_003000.npy \
+          replay.mp4 --num_workers 8
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import cv2
+
+from flow.core.kernel.recorder import TrajectoryReader
+from flow.renderer.rasterizer import Rasterizer
+
+# minimum displacement between two samples of a vehicle from which its
+# heading is updated (meter)
+MIN_DISPLACEMENT = 1e-3
+
+
+def load_render_data(path):
+    """Load the rendering data saved by the pyglet renderer.
+
+    Parameters
+    ----------
+    path : str
+        path to the data_XXXXXX.npy file written by PygletRenderer.close
+
+    Returns
+    -------
+    list
+        road network polygons
+    list of tuple
+        human orientations, machine orientations, human dynamics and machine
+        dynamics of every frame
+    """
+    data = np.load(os.path.expanduser(path), allow_pickle=True)
+    network = list(data[0])
+    snapshots = [tuple(step[:4]) for step in data[1:]]
+    return network, snapshots
+
+
+def iter_trajectory_snapshots(path, max_speed=None, machine_ids=None,
+                              episode=None):
+    """Iterate over the frames of a recording of the kernel.
+
+    Recordings do not include the angles of the vehicles, which are computed
+    from the displacement of every vehicle until its next sample.
+
+    Parameters
+    ----------
+    path : str
+        directory of the recording, see TrajectoryReader
+    max_speed : float, optional
+        speed normalizing the dynamics of the vehicles, defaults to the
+        largest recorded speed
+    machine_ids : list of str, optional
+        ids of the vehicles rendered as RL vehicles. Defaults to the vehicles
+        whose id contains "rl" or "track" (tracked human vehicles, see
+        Env.pyglet_render).
+    episode : int, optional
+        only replay an episode, defaults to all episodes
+
+    Yields
+    ------
+    tuple
+        human orientations, machine orientations, human dynamics and machine
+        dynamics of every recorded step
+    """
+    reader = TrajectoryReader(path)
+    if machine_ids is None:
+        is_machine = np.array(["rl" in veh_id or "track" in veh_id
+                               for veh_id in reader.ids], dtype=bool)
+    else:
+        machine_ids = set(machine_ids)
+        is_machine = np.array([veh_id in machine_ids
+                               for veh_id in reader.ids], dtype=bool)
+    if max_speed is None:
+        max_speed = max([chunk["speed"].max() for chunk in
+                         reader.iter_chunks(["speed"])
+                         if len(chunk["speed"]) > 0] + [1e-6])
+
+    angle = np.zeros(len(reader.ids))
+    next_x = np.full(len(reader.ids), np.nan)
+    next_y = np.full(len(reader.ids), np.nan)
+
+    def snapshot(step, next_step):
+        """Return the frame of a step, updating the angles of its vehicles."""
+        ids, x, y, speed = step[2:]
+        next_x[:] = np.nan
+        next_y[:] = np.nan
+        if next_step is not None and next_step[1] == step[1]:
+            next_x[next_step[2]] = next_step[3]
+            next_y[next_step[2]] = next_step[4]
+        dx = next_x[ids] - x
+        dy = next_y[ids] - y
+        moved = np.hypot(np.nan_to_num(dx), np.nan_to_num(dy)) > \
+            MIN_DISPLACEMENT
+        angle[ids[moved]] = np.degrees(np.arctan2(dx[moved], dy[moved]))
+
+        orientations = np.stack([x, y, angle[ids]], axis=1)
+        dynamics = speed / max_speed
+        machine = is_machine[ids]
+        return (orientations[~machine].tolist(),
+                orientations[machine].tolist(),
+                dynamics[~machine].tolist(),
+                dynamics[machine].tolist())
+
+    columns = ["time", "episode", "id", "x", "y", "speed"]
+    carry = None
+    pending = None
+    for chunk in reader.iter_chunks(columns):
+        if episode is not None:
+            mask = chunk["episode"] == episode
+            chunk = {name: values[mask] for name, values in chunk.items()}
+        if carry is not None:
+            chunk = {name: np.concatenate([carry[name], chunk[name]])
+                     for name in columns}
+        if len(chunk["time"]) == 0:
+            continue
+
+        # the rows of a step may be split across chunks, so the last step of
+        # a chunk is carried over to the next one
+        starts = np.flatnonzero(
+            (chunk["time"][1:] != chunk["time"][:-1]) |
+            (chunk["episode"][1:] != chunk["episode"][:-1])) + 1
+        bounds = np.concatenate([[0], starts, [len(chunk["time"])]])
+        for start, end in zip(bounds[:-2], bounds[1:-1]):
+            step = tuple(chunk[name][start:end] if name not in
+                         ("time", "episode") else chunk[name][start]
+                         for name in columns)
+            if pending is not None:
+                yield snapshot(pending, step)
+            pending = step
+        carry = {name: values[bounds[-2]:] for name, values in chunk.items()}
+
+    if carry is not None:
+        step = tuple(carry[name] if name not in ("time", "episode")
+                     else carry[name][0] for name in columns)
+        if pending is not None:
+            yield snapshot(pending, step)
+        yield snapshot(step, None)
+
+
+def render_video(network,
+                 snapshots,
+                 output_path,
+                 mode="drgb",
+                 fps=10,
+                 num_workers=None,
+                 sight_radius=50,
+                 show_radius=False,
+                 pxpm=2,
+                 encoder=None):
+    """Render the frames of a rollout into a video.
+
+    Frames are drawn in a pool of processes, at most a few frames ahead of
+    the encoder, so that memory usage does not depend on the length of the
+    rollout.
+
+    Parameters
+    ----------
+    network : list
+        road network polygons, see PygletRenderer
+    snapshots : iterable of tuple
+        human orientations, machine orientations, human dynamics and machine
+        dynamics of every frame, see load_render_data and
+        iter_trajectory_snapshots
+    output_path : str
+        path of the video
+    mode : str
+        "gray", "dgray", "rgb" or "drgb", see PygletRenderer
+    fps : int
+        frames per second of the video
+    num_workers : int, optional
+        number of processes drawing frames, defaults to the number of CPUs.
+        Frames are drawn in the current process if set to 1.
+    sight_radius : int
+        radius of observation of RL vehicles (meter)
+    show_radius : bool
+        specifies whether to draw the radius of observation of RL vehicles
+    pxpm : int
+        rendering resolution (pixel / meter)
+    encoder : str, optional
+        "ffmpeg", to pipe frames to an ffmpeg process, or "opencv", to
+        encode frames with cv2.VideoWriter. Defaults to ffmpeg if it is
+        installed, and opencv otherwise.
+
+    Returns
+    -------
+    int
+        number of frames of the video
+    """
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if encoder is None:
+        encoder = "ffmpeg" if shutil.which("ffmpeg") else "opencv"
+    if encoder not in ["ffmpeg", "opencv"]:
+        raise ValueError("Encoder {} is not supported!".format(encoder))
+
+    rasterizer_args = (network, mode, sight_radius, show_radius, pxpm)
+    rasterizer = Rasterizer(*rasterizer_args)
+    size = (rasterizer.width, rasterizer.height)
+    is_color = "gray" not in mode
+    if encoder == "ffmpeg":
+        writer = _FFmpegWriter(output_path, size, fps, is_color)
+    else:
+        writer = _OpenCVWriter(output_path, size, fps, is_color)
+
+    num_frames = 0
+    try:
+        if num_workers == 1:
+            for snapshot in snapshots:
+                writer.write(rasterizer.draw(*snapshot))
+                num_frames += 1
+        else:
+            pool = multiprocessing.Pool(
+                num_workers, _init_worker, rasterizer_args)
+            try:
+                pending = collections.deque()
+                for snapshot in snapshots:
+                    pending.append(pool.apply_async(_draw_frame, snapshot))
+                    if len(pending) >= 4 * num_workers:
+                        writer.write(pending.popleft().get())
+                        num_frames += 1
+                while pending:
+                    writer.write(pending.popleft().get())
+                    num_frames += 1
+            finally:
+                pool.terminate()
+    finally:
+        writer.close()
+
+    return num_frames
+
+
+# rasterizer of every worker process of render_video
+_worker_rasterizer = None
+
+
+def _init_worker(*rasterizer_args):
+    """Create the rasterizer of a worker process."""
+    global _worker_rasterizer
+    _worker_rasterizer = Rasterizer(*rasterizer_args)
+
+
+def _draw_frame(*snapshot):
+    """Draw a frame in a worker process."""
+    return _worker_rasterizer.draw(*snapshot)
+
+
+class _FFmpegWriter(object):
+    """Video writer streaming raw frames to the standard input of ffmpeg."""
+
+    def __init__(self, output_path, size, fps, is_color):
+        self.process = subprocess.Popen(
+            ["ffmpeg", "-y", "-loglevel", "error",
+             "-f", "rawvideo", "-pix_fmt", "bgr24" if is_color else "gray",
+             "-s", "{}x{}".format(*size), "-r", str(fps), "-i", "-",
+             "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p",
+             output_path],
+            stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(
+                "ffmpeg exited with code {}".format(self.process.returncode))
+
+
+class _OpenCVWriter(object):
+    """Video writer encoding frames with cv2.VideoWriter."""
+
+    def __init__(self, output_path, size, fps, is_color):
+        self.writer = cv2.VideoWriter(
+            output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size,
+            is_color)
+        if not self.writer.isOpened():
+            raise RuntimeError("Cannot open {}".format(output_path))
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+def create_parser():
+    """Create the parser of the replay renderer."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="[Flow] Renders a recorded rollout into a video.")
+    parser.add_argument(
+        "path", type=str,
+        help="rendering data saved by the pyglet renderer (.npy), or "
+             "directory of trajectories recorded by the kernel")
+    parser.add_argument("output", type=str, help="path of the video")
+    parser.add_argument(
+        "--network", type=str,
+        help="road network polygons of recorded trajectories, as rendering "
+             "data (.npy) or a json list of polygons")
+    parser.add_argument("--episode", type=int, help="episode to replay")
+    parser.add_argument("--mode", type=str, default="drgb",
+                        help="gray, dgray, rgb or drgb")
+    parser.add_argument("--fps", type=int, default=10,
+                        help="frames per second of the video")
+    parser.add_argument("--num_workers", type=int,
+                        help="number of processes drawing frames")
+    parser.add_argument("--pxpm", type=int, default=2,
+                        help="rendering resolution (pixel / meter)")
+    parser.add_argument("--sight_radius", type=int, default=50,
+                        help="radius of observation of RL vehicles (meter)")
+    parser.add_argument("--show_radius", action="store_true",
+                        help="draw the radius of observation of RL vehicles")
+    parser.add_argument("--encoder", type=str,
+                        help="ffmpeg or opencv, defaults to ffmpeg if it is "
+                             "installed")
+    return parser
+
+
+if __name__ == "__main__":
+    args = create_parser().parse_args()
+    if os.path.isdir(args.path):
+        if args.network is None:
+            raise ValueError("--network is required to replay trajectories")
+        if args.network.endswith(".json"):
+            with open(args.network) as f:
+                network = json.load(f)
+        else:
+            network = load_render_data(args.network)[0]
+        snapshots = iter_trajectory_snapshots(args.path, episode=args.episode)
+    else:
+        network, snapshots = load_render_data(args.path)
+    num_frames = render_video(
+        network, snapshots, args.output, mode=args.mode, fps=args.fps,
+        num_workers=args.num_workers, sight_radius=args.sight_radius,
+        show_radius=args.show_radius, pxpm=args.pxpm, encoder=args.encoder)
+    print("Rendered {} frames to {}".format(num_frames, args.output))
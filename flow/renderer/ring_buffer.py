@@ -0,0 +1,77 @@
+"""Contains a fixed-size ring buffer of arrays."""
+
+import numpy as np
+
+
+class ArrayRingBuffer(object):
+    """Fixed-size buffer of the most recent arrays appended to it.
+
+    Arrays are copied into preallocated slots, which are reused as long as
+    the shapes of the appended arrays do not change, so that appending does
+    neither allocate memory nor shift the other entries. For windows of
+    scalar values and their running statistics, see
+    flow.core.accumulators.RingBuffer instead.
+
+    Usage
+        >>> frames = ArrayRingBuffer(5)
+        >>> frames.fill(frame)
+        >>> frames.append(next_frame)
+        >>> frames[-1]  # most recent frame
+        >>> np.stack(list(frames))  # frames from the oldest to the newest
+    """
+
+    def __init__(self, length):
+        """Instantiate the buffer.
+
+        Parameters
+        ----------
+        length : int
+            maximum number of arrays stored in the buffer
+        """
+        self.length = length
+        self._slots = [None] * length
+        self._start = 0
+        self._size = 0
+
+    def append(self, value):
+        """Append an array, replacing the oldest one if the buffer is full.
+        """
+        value = np.asarray(value)
+        if self._size < self.length:
+            i = (self._start + self._size) % self.length
+            self._size += 1
+        else:
+            i = self._start
+            self._start = (self._start + 1) % self.length
+
+        slot = self._slots[i]
+        if slot is not None and slot.shape == value.shape and \
+                slot.dtype == value.dtype:
+            np.copyto(slot, value)
+        else:
+            self._slots[i] = value.copy()
+
+    def fill(self, value):
+        """Replace the content of the buffer by copies of an array."""
+        self._start = 0
+        self._size = 0
+        for _ in range(self.length):
+            self.append(value)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        """Return an array, indexed from the oldest to the most recent.
+
+        The returned array is overwritten once the buffer wraps around.
+        """
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ring buffer index out of range")
+        return self._slots[(self._start + index) % self.length]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
@@ -7,8 +7,6 @@ from rllab and rllib.
 """
 
 from flow.core.experiment import Experiment
-from flow.core.params import InitialConfig
-from flow.core.params import TrafficLightParams
 from flow.utils.rllib import get_flow_params, get_rllib_config
 from flow.utils.registry import make_create_env
 
@@ -49,7 +47,8 @@ AVAILABLE_BENCHMARKS = {
 }
 
 
-def evaluate_policy(benchmark, _get_actions, _get_states=None):
+def evaluate_policy(benchmark, _get_actions, _get_states=None,
+                    num_workers=1, seed=None):
     """Evaluate the performance of a controller on a predefined benchmark.
 
     Parameters
@@ -63,6 +62,12 @@ def evaluate_policy(benchmark, _get_actions, _get_states=None):
             a mapping from the environment object in Flow to some state, which
             overrides the _get_states method of the environment. Note that the
             same cannot be done for the actions.
+        num_workers : int, optional
+            number of simulations performed in parallel (see
+            flow.core.experiment.Experiment.run)
+        seed : int, optional
+            base seed of the simulations; the i-th simulation is seeded with
+            ``seed + i``
 
     Returns
     -------
@@ -83,54 +88,34 @@ def evaluate_policy(benchmark, _get_actions, _get_states=None):
             "benchmark {} is not available. Check spelling?".format(benchmark))
 
     # get the flow params from the benchmark
-    flow_params = AVAILABLE_BENCHMARKS[benchmark]
-
-    exp_tag = flow_params["exp_tag"]
-    sim_params = flow_params["sim"]
-    vehicles = flow_params["veh"]
-    env_params = flow_params["env"]
-    env_params.evaluate = True  # Set to true to get evaluation returns
-    net_params = flow_params["net"]
-    initial_config = flow_params.get("initial", InitialConfig())
-    traffic_lights = flow_params.get("tls", TrafficLightParams())
-
-    # import the environment and scenario classes
-    module = __import__("flow.envs", fromlist=[flow_params["env_name"]])
-    env_class = getattr(module, flow_params["env_name"])
-    module = __import__("flow.scenarios", fromlist=[flow_params["scenario"]])
-    scenario_class = getattr(module, flow_params["scenario"])
-
-    # recreate the scenario and environment
-    scenario = scenario_class(
-        name=exp_tag,
-        vehicles=vehicles,
-        net_params=net_params,
-        initial_config=initial_config,
-        traffic_lights=traffic_lights)
+    flow_params = dict(AVAILABLE_BENCHMARKS[benchmark])
+    flow_params["env"].evaluate = True  # Set to true to get evaluation returns
 
     # make sure the _get_states method of the environment is the one
     # specified by the user
     if _get_states is not None:
+        module = __import__("flow.envs", fromlist=[flow_params["env_name"]])
+        env_class = getattr(module, flow_params["env_name"])
 
         class _env_class(env_class):
             def get_state(self):
                 return _get_states(self)
 
-        env_class = _env_class
-
-    env = env_class(
-        env_params=env_params, sim_params=sim_params, scenario=scenario)
+        flow_params["env_name"] = _env_class
 
     # create a Experiment object with the "rl_actions" method as
     # described in the inputs. Note that the state may not be that which is
-    # specified by the environment.
-    exp = Experiment(env=env)
+    # specified by the environment. Every simulation creates its own
+    # environment from the flow params.
+    exp = Experiment(flow_params=flow_params)
 
     # run the experiment and return the reward
     res = exp.run(
         num_runs=NUM_RUNS,
-        num_steps=env.env_params.horizon,
-        rl_actions=_get_actions)
+        num_steps=flow_params["env"].horizon,
+        rl_actions=_get_actions,
+        num_workers=num_workers,
+        seed=seed)
 
     return np.mean(res["returns"]), np.std(res["returns"])
 
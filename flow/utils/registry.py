@@ -3,7 +3,7 @@
 import gym
 from gym.envs.registration import register
 
-from copy import deepcopy
+from copy import copy
 
 import flow.envs
 from flow.core.params import InitialConfig
@@ -41,6 +41,8 @@ def make_create_env(params, version=0, render=None):
            upon initialization/reset (see flow.core.params.InitialConfig)
          - tls (optional): traffic lights to be introduced to specific nodes
            (see flow.core.params.TrafficLightParams)
+         - simulator (optional): simulator used by the environment, one of
+           "traci" (default), "ring", or "ctm"
     version : int, optional
         environment version number
     render : bool, optional
@@ -67,8 +69,12 @@ def make_create_env(params, version=0, render=None):
     traffic_lights = params.get("tls", TrafficLightParams())
 
     def create_env(*_):
-        sim_params = deepcopy(params['sim'])
-        vehicles = deepcopy(params['veh'])
+        # the environment only reassigns (scalar) attributes of sim_params, so
+        # a shallow copy suffices. The VehicleParams object is only read from
+        # by the scenario and vehicle kernel (which deep-copies its per-type
+        # parameters), and may be shared between environments
+        sim_params = copy(params['sim'])
+        vehicles = params['veh']
 
         scenario = scenario_class(
             name=exp_tag,
@@ -98,7 +104,8 @@ def make_create_env(params, version=0, render=None):
                 kwargs={
                     "env_params": env_params,
                     "sim_params": sim_params,
-                    "scenario": scenario
+                    "scenario": scenario,
+                    "simulator": params.get("simulator", "traci")
                 })
         except Exception:
             pass
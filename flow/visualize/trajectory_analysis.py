@@ -0,0 +1,533 @@
+"""Analysis of recorded vehicle trajectories.
+
+The functions in this module operate on columnar trajectory data, either
+recorded by the kernel (see flow/core/kernel/recorder.py) or converted from
+sumo emission files (see flow.core.util.emission_to_columnar), and process it
+chunk by chunk with vectorized operations, so that memory usage does not
+depend on the length of the recording. They cover:
+
+* time-space diagrams of the speeds on a sequence of edges
+* Edie's generalized flow, density, and speed over space-time cells, from
+  which fundamental diagrams can be drawn
+* virtual loop detectors at arbitrary positions
+* travel time distributions
+
+Usage
+    >>> from flow.visualize import trajectory_analysis as ta
+    >>> edges = [("bottom", 57.5), ("right", 57.5)]
+    >>> cells = ta.edie_cells(ta.load_chunks(path), edges, dt=10, dx=10)
+    >>> plt.scatter(cells["density"], cells["flow"])  # fundamental diagram
+
+Running this module benchmarks the analyses on a synthetic recording of 10
+million rows:
+
+    $ python flow/visualize/trajectory_analysis.py --num_rows 10000000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from glob import glob
+
+import numpy as np
+
+from flow.core.kernel.recorder import TrajectoryReader, TRAJECTORY_COLUMNS
+from flow.core.util import read_columnar_chunks
+
+
+def load_chunks(path, episode=None):
+    """Load the chunks of a recording in a common format.
+
+    Parameters
+    ----------
+    path : str
+        either a directory recorded by flow.core.kernel.recorder, or the
+        output of flow.core.util.emission_to_columnar
+    episode : int, optional
+        only keep the rows of an episode of a recording of the kernel. All
+        rows are kept by default, in which case the vehicles of different
+        episodes are considered as different vehicles.
+
+    Yields
+    ------
+    dict of numpy.ndarray
+        "time", "vehicle" (a key identifying every vehicle), "edge" (names
+        of the edges), "lane", "position" (on the edge), and "speed" of the
+        rows of a chunk
+    """
+    if _is_recording(path):
+        reader = TrajectoryReader(path)
+        edges = np.array(reader.edges, dtype=str)
+        num_ids = max(len(reader.ids), 1)
+        for chunk in reader.iter_chunks():
+            if episode is not None:
+                mask = chunk["episode"] == episode
+                chunk = {name: values[mask] for name, values in chunk.items()}
+            yield {
+                "time": chunk["time"],
+                "vehicle": chunk["episode"].astype(np.int64) * num_ids +
+                chunk["id"],
+                "edge": edges[chunk["edge"]],
+                "lane": chunk["lane"],
+                "position": chunk["position"],
+                "speed": chunk["speed"],
+            }
+    else:
+        columns = ["time", "id", "edge_id", "lane_number",
+                   "relative_position", "speed"]
+        for chunk in read_columnar_chunks(path, columns):
+            yield {
+                "time": chunk["time"],
+                "vehicle": chunk["id"],
+                "edge": chunk["edge_id"],
+                "lane": chunk["lane_number"],
+                "position": chunk["relative_position"],
+                "speed": chunk["speed"],
+            }
+
+
+def time_space_diagram(chunks, edges, dt, dx, lane=None):
+    """Compute the time-space diagram of the speeds on a sequence of edges.
+
+    Parameters
+    ----------
+    chunks : iterable of dict
+        chunks of trajectory data, see load_chunks
+    edges : list of (str, float)
+        names and lengths of the edges, in the order in which they are laid
+        out along the space axis
+    dt : float
+        duration of the time bins, in seconds
+    dx : float
+        length of the space bins, in meters
+    lane : int, optional
+        only consider the vehicles on this lane, defaults to all lanes
+
+    Returns
+    -------
+    dict
+        * "time_edges": bounds of the time bins
+        * "space_edges": bounds of the space bins
+        * "speed": mean speed of the samples within every cell, of shape
+          (number of time bins, number of space bins), and nan in cells
+          without samples
+        * "count": number of samples within every cell
+    """
+    grid = _Grid(edges, dt, dx)
+    for chunk in chunks:
+        t, x, speed = grid.locate(chunk, lane)
+        grid.add(t, x, count=np.ones(len(t)), speed=speed)
+
+    count, speed = grid.values("count", "speed")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_speed = speed / count
+    return {
+        "time_edges": grid.time_edges(),
+        "space_edges": grid.space_edges,
+        "speed": mean_speed,
+        "count": count,
+    }
+
+
+def edie_cells(chunks, edges, dt, dx, lane=None, sample_period=None):
+    """Compute Edie's generalized traffic variables over space-time cells.
+
+    Every sample of a vehicle is assumed to stand for the ``sample_period``
+    seconds that follow it. The total distance traveled and time spent by
+    all vehicles within every cell then yield its flow (distance over area),
+    density (time over area), and speed (distance over time).
+
+    Parameters
+    ----------
+    chunks : iterable of dict
+        chunks of trajectory data, see load_chunks
+    edges : list of (str, float)
+        names and lengths of the edges, in the order in which they are laid
+        out along the space axis
+    dt : float
+        duration of the cells, in seconds
+    dx : float
+        length of the cells, in meters
+    lane : int, optional
+        only consider the vehicles on this lane. Defaults to all lanes, in
+        which case the flows and densities are totals over all lanes.
+    sample_period : float, optional
+        time between two samples of a vehicle, in seconds. Defaults to the
+        smallest time difference between the samples of the first chunks,
+        which are kept in memory until they contain two different times.
+
+    Returns
+    -------
+    dict
+        * "time_edges": bounds of the time bins
+        * "space_edges": bounds of the space bins
+        * "flow": flow in every cell, in veh/hr
+        * "density": density in every cell, in veh/km
+        * "speed": space-mean speed in every cell, in m/s, and nan in cells
+          no vehicle traveled through
+
+        each of shape (number of time bins, number of space bins)
+
+    Raises
+    ------
+    ValueError
+        if the sample period is not specified, and all samples were taken at
+        the same time
+    """
+    grid = _Grid(edges, dt, dx)
+    # chunks read before the sample period is known
+    pending = []
+    for chunk in chunks:
+        pending.append(chunk)
+        if sample_period is None:
+            times = np.unique(np.concatenate([c["time"] for c in pending]))
+            if len(times) < 2:
+                continue
+            sample_period = np.diff(times).min()
+        for c in pending:
+            t, x, speed = grid.locate(c, lane)
+            grid.add(t, x, distance=speed * sample_period,
+                     duration=np.full(len(t), sample_period))
+        pending = []
+
+    if any(len(c["time"]) > 0 for c in pending):
+        raise ValueError("The sample period cannot be inferred from samples "
+                         "taken at a single time, please specify it.")
+
+    distance, duration = grid.values("distance", "duration")
+    area = dt * dx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speed = distance / duration
+    return {
+        "time_edges": grid.time_edges(),
+        "space_edges": grid.space_edges,
+        "flow": 3600 * distance / area,
+        "density": 1000 * duration / area,
+        "speed": speed,
+    }
+
+
+def virtual_detectors(chunks, detectors, interval, max_gap=None):
+    """Count the vehicles crossing virtual loop detectors.
+
+    A vehicle crosses a detector if it is upstream of the detector's position
+    on its edge in one sample, and at or downstream of it in the next sample
+    of the same vehicle, and on the same edge. The time and speed of the
+    crossing are interpolated between the two samples.
+
+    Only the last sample of every vehicle is carried from one chunk to the
+    next, so that memory usage is bounded by the size of the chunks and the
+    number of vehicles simultaneously in the network.
+
+    Parameters
+    ----------
+    chunks : iterable of dict
+        chunks of trajectory data ordered by time (within every episode), see
+        load_chunks
+    detectors : list of tuple
+        edge and position (in meters) of every detector, optionally followed
+        by a lane, in which case only the vehicles on this lane are counted
+    interval : float
+        aggregation interval of the detectors, in seconds
+    max_gap : float, optional
+        maximum time between two consecutive samples of a vehicle. Vehicles
+        that have not been sampled for longer are considered to have left the
+        network. Defaults to 10 times the aggregation interval.
+
+    Returns
+    -------
+    dict
+        * "time_edges": bounds of the aggregation intervals
+        * "count": number of vehicles crossing every detector in every
+          interval, of shape (number of detectors, number of intervals)
+        * "flow": corresponding flow, in veh/hr
+        * "speed": mean speed of the crossing vehicles, in m/s, and nan in
+          intervals without crossings
+    """
+    if max_gap is None:
+        max_gap = 10 * interval
+
+    columns = ["time", "vehicle", "edge", "lane", "position", "speed"]
+    carry = None
+    num_intervals = 0
+    count = np.zeros((len(detectors), 0))
+    speed_sum = np.zeros((len(detectors), 0))
+
+    for chunk in chunks:
+        chunk = {name: chunk[name] for name in columns}
+        if len(chunk["time"]) == 0:
+            continue
+        if carry is not None:
+            chunk = {name: np.concatenate([carry[name], chunk[name]])
+                     for name in columns}
+
+        # consecutive samples of every vehicle
+        order = np.lexsort((chunk["time"], chunk["vehicle"]))
+        chunk = {name: values[order] for name, values in chunk.items()}
+        vehicle, t, pos = chunk["vehicle"], chunk["time"], chunk["position"]
+        same = (vehicle[1:] == vehicle[:-1]) & \
+            (chunk["edge"][1:] == chunk["edge"][:-1]) & \
+            (t[1:] > t[:-1]) & (t[1:] - t[:-1] <= max_gap)
+        prev = np.flatnonzero(same)
+        nxt = prev + 1
+
+        for d, detector in enumerate(detectors):
+            edge, position = detector[:2]
+            crossed = (chunk["edge"][prev] == edge) & \
+                (pos[prev] < position) & (pos[nxt] >= position)
+            if len(detector) > 2:
+                crossed &= chunk["lane"][prev] == detector[2]
+            i, j = prev[crossed], nxt[crossed]
+            frac = (position - pos[i]) / (pos[j] - pos[i])
+            cross_time = t[i] + frac * (t[j] - t[i])
+            cross_speed = chunk["speed"][i] + \
+                frac * (chunk["speed"][j] - chunk["speed"][i])
+
+            bins = (cross_time // interval).astype(int)
+            if len(bins) > 0 and bins.max() >= num_intervals:
+                num_intervals = bins.max() + 1
+                count = _grow(count, num_intervals, axis=1)
+                speed_sum = _grow(speed_sum, num_intervals, axis=1)
+            count[d] += np.bincount(bins, minlength=num_intervals)
+            speed_sum[d] += np.bincount(bins, weights=cross_speed,
+                                        minlength=num_intervals)
+
+        # carry the last sample of every vehicle that may still be in the
+        # network over to the next chunk
+        last = np.append(vehicle[1:] != vehicle[:-1], True)
+        last &= t >= t.max() - max_gap
+        carry = {name: values[last] for name, values in chunk.items()}
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_speed = speed_sum / count
+    return {
+        "time_edges": interval * np.arange(num_intervals + 1),
+        "count": count,
+        "flow": 3600 * count / interval,
+        "speed": mean_speed,
+    }
+
+
+def travel_times(chunks, edges=None):
+    """Compute the travel time of every vehicle.
+
+    The travel time of a vehicle is the time between its first and last
+    samples, optionally restricted to a set of edges.
+
+    Parameters
+    ----------
+    chunks : iterable of dict
+        chunks of trajectory data, see load_chunks
+    edges : list of str, optional
+        edges over which travel times are measured, defaults to all edges
+
+    Returns
+    -------
+    numpy.ndarray
+        key of every vehicle (see load_chunks)
+    numpy.ndarray
+        travel time of every vehicle, in seconds
+    """
+    vehicles = None
+    first = last = np.zeros(0)
+    for chunk in chunks:
+        vehicle, t = chunk["vehicle"], chunk["time"]
+        if edges is not None:
+            mask = np.isin(chunk["edge"], edges)
+            vehicle, t = vehicle[mask], t[mask]
+        if len(t) == 0:
+            continue
+        if vehicles is not None:
+            vehicle = np.concatenate([vehicles, vehicle])
+            t_min = np.concatenate([first, t])
+            t_max = np.concatenate([last, t])
+        else:
+            t_min = t_max = t
+
+        vehicles, inverse = np.unique(vehicle, return_inverse=True)
+        first = np.full(len(vehicles), np.inf)
+        last = np.full(len(vehicles), -np.inf)
+        np.minimum.at(first, inverse, t_min)
+        np.maximum.at(last, inverse, t_max)
+
+    if vehicles is None:
+        return np.zeros(0), np.zeros(0)
+    return vehicles, last - first
+
+
+class _Grid(object):
+    """Space-time grid over a sequence of edges, accumulating sums per cell.
+
+    The number of time bins grows as samples are added, so that the duration
+    of the recording need not be known in advance.
+    """
+
+    def __init__(self, edges, dt, dx):
+        self.dt = dt
+        self.dx = dx
+        self.edge_names = np.array([edge for edge, _ in edges], dtype=str)
+        self._sorter = np.argsort(self.edge_names)
+        lengths = np.array([length for _, length in edges], dtype=float)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        self.lengths = lengths
+        self.num_x = max(int(np.ceil(lengths.sum() / dx)), 1)
+        self.space_edges = dx * np.arange(self.num_x + 1)
+        self.num_t = 0
+        self.sums = {}
+
+    def locate(self, chunk, lane=None):
+        """Return the time and space bins and speeds of the rows on the grid.
+        """
+        mask = np.isin(chunk["edge"], self.edge_names)
+        if lane is not None:
+            mask &= chunk["lane"] == lane
+        edge = self._sorter[np.searchsorted(
+            self.edge_names, chunk["edge"][mask], sorter=self._sorter)]
+        pos = np.clip(chunk["position"][mask], 0, self.lengths[edge])
+        x = np.minimum(((self.offsets[edge] + pos) // self.dx).astype(int),
+                       self.num_x - 1)
+        t = (chunk["time"][mask] // self.dt).astype(int)
+        return t, x, chunk["speed"][mask]
+
+    def add(self, t, x, **weights):
+        """Add the weights of samples to the sums of their cells."""
+        if len(t) == 0:
+            return
+        if t.max() >= self.num_t:
+            self.num_t = t.max() + 1
+            for name in self.sums:
+                self.sums[name] = _grow(self.sums[name], self.num_t, axis=0)
+        index = t * self.num_x + x
+        for name, values in weights.items():
+            if name not in self.sums:
+                self.sums[name] = np.zeros((self.num_t, self.num_x))
+            self.sums[name] += np.bincount(
+                index, weights=values,
+                minlength=self.num_t * self.num_x).reshape(self.num_t, -1)
+
+    def values(self, *names):
+        """Return the sums of the requested weights."""
+        return [self.sums.get(name, np.zeros((self.num_t, self.num_x)))
+                for name in names]
+
+    def time_edges(self):
+        """Return the bounds of the time bins."""
+        return self.dt * np.arange(self.num_t + 1)
+
+
+def _grow(values, size, axis):
+    """Pad an axis of an array with zeros up to a size."""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (0, size - values.shape[axis])
+    return np.pad(values, pad, mode="constant")
+
+
+def _is_recording(path):
+    """Return whether a path is a recording of the kernel."""
+    chunk_paths = sorted(glob(os.path.join(path, "chunk_*.npz")))
+    if not os.path.isdir(path) or len(chunk_paths) == 0:
+        return False
+    with np.load(chunk_paths[0]) as chunk:
+        return "episode" in chunk.files
+
+
+def _write_synthetic_recording(path, num_rows, chunk_size, num_vehicles=1000,
+                               length=5000., sim_step=0.5):
+    """Write a recording of vehicles driving through stop-and-go waves.
+
+    The recording has the format of flow.core.kernel.recorder, with vehicles
+    evenly spaced on a ring of a single edge.
+    """
+    dtypes = dict(TRAJECTORY_COLUMNS)
+    rng = np.random.RandomState(0)
+    pos = np.linspace(0, length, num_vehicles, endpoint=False)
+    ids = np.array(["veh_{}".format(i) for i in range(num_vehicles)])
+    num_steps = int(np.ceil(num_rows / num_vehicles))
+    rows_per_chunk = max(chunk_size // num_vehicles, 1)
+
+    for c, start in enumerate(range(0, num_steps, rows_per_chunk)):
+        steps = np.arange(start, min(start + rows_per_chunk, num_steps))
+        t = steps * sim_step
+        # speeds oscillate with a wave traveling upstream
+        phase = 2 * np.pi * (pos[np.newaxis] / 500 + t[:, np.newaxis] / 60)
+        speed = 10 + 5 * np.sin(phase) + rng.uniform(0, 0.5, phase.shape)
+        position = (pos[np.newaxis] + 10 * t[:, np.newaxis]
+                    - 300 * np.cos(phase) / (2 * np.pi)) % length
+        num = len(steps) * num_vehicles
+        columns = {
+            "time": np.repeat(t, num_vehicles),
+            "episode": np.zeros(num),
+            "id": np.tile(np.arange(num_vehicles), len(steps)),
+            "edge": np.zeros(num),
+            "lane": np.zeros(num),
+            "position": position.ravel(),
+            "speed": speed.ravel(),
+            "x": np.zeros(num),
+            "y": np.zeros(num),
+            "accel": np.full(num, np.nan),
+        }
+        np.savez_compressed(
+            os.path.join(path, "chunk_{:05d}.npz".format(c)),
+            ids=ids if c == 0 else np.zeros(0, dtype=str),
+            edges=np.array(["ring"] if c == 0 else [], dtype=str),
+            id_offset=0 if c == 0 else num_vehicles,
+            edge_offset=0 if c == 0 else 1,
+            **{name: values.astype(dtypes[name])
+               for name, values in columns.items()})
+    return length
+
+
+def benchmark(num_rows, chunk_size=1000000):
+    """Time the analyses on a synthetic recording.
+
+    Returns
+    -------
+    dict
+        time taken by every analysis, in seconds
+    """
+    path = tempfile.mkdtemp()
+    try:
+        t0 = time.time()
+        length = _write_synthetic_recording(path, num_rows, chunk_size)
+        results = {"write": time.time() - t0}
+        edges = [("ring", length)]
+
+        analyses = {
+            "time_space_diagram": lambda chunks: time_space_diagram(
+                chunks, edges, dt=10, dx=10),
+            "edie_cells": lambda chunks: edie_cells(
+                chunks, edges, dt=10, dx=10),
+            "virtual_detectors": lambda chunks: virtual_detectors(
+                chunks, [("ring", x) for x in range(0, int(length), 500)],
+                interval=60),
+            "travel_times": lambda chunks: travel_times(chunks),
+        }
+        for name, analysis in analyses.items():
+            t0 = time.time()
+            analysis(load_chunks(path))
+            results[name] = time.time() - t0
+    finally:
+        shutil.rmtree(path)
+    return results
+
+
+def create_parser():
+    """Create the parser of the benchmark."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="Benchmarks the trajectory analyses on a synthetic "
+                    "recording.")
+    parser.add_argument("--num_rows", type=int, default=10000000,
+                        help="number of rows of the recording")
+    parser.add_argument("--chunk_size", type=int, default=1000000,
+                        help="number of rows per chunk")
+    return parser
+
+
+if __name__ == "__main__":
+    args = create_parser().parse_args()
+    for name, seconds in benchmark(args.num_rows, args.chunk_size).items():
+        print("{:<20} {:8.2f}s {:12.0f} rows/s".format(
+            name, seconds, args.num_rows / seconds))
@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+
+from flow.core.accumulators import RingBuffer, ExponentialMovingAverage, \
+    WindowedMinMax
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Tests the RingBuffer object in flow/core/accumulators.py"""
+
+    def test_window(self):
+        """Tests that the buffer keeps the most recent values in order."""
+        buf = RingBuffer(3)
+        self.assertEqual(len(buf), 0)
+        self.assertIsNone(buf.last)
+
+        for value in [1, 2]:
+            buf.push(value)
+        np.testing.assert_array_equal(buf.values(), [1, 2])
+        self.assertFalse(buf.full)
+
+        for value in [3, 4, 5]:
+            buf.push(value)
+        np.testing.assert_array_equal(buf.values(), [3, 4, 5])
+        self.assertTrue(buf.full)
+        self.assertEqual(buf.last, 5)
+
+    def test_moments(self):
+        """Tests the running mean and variance against numpy."""
+        rng = np.random.RandomState(0)
+        values = rng.normal(1e3, 5, size=1000)
+        buf = RingBuffer(37)
+        for i, value in enumerate(values):
+            buf.push(value)
+            window = values[max(i - 36, 0):i + 1]
+            self.assertAlmostEqual(buf.mean, np.mean(window))
+            self.assertAlmostEqual(buf.var, np.var(window), places=5)
+
+    def test_fill(self):
+        """Tests buffers initialized with a fill value."""
+        buf = RingBuffer(4, fill=0.)
+        self.assertTrue(buf.full)
+        buf.push(4)
+        self.assertEqual(buf.mean, 1)
+
+        buf.clear()
+        self.assertEqual(len(buf), 0)
+        self.assertTrue(np.isnan(buf.mean))
+
+    def test_capacity(self):
+        """Tests that the capacity must be positive."""
+        self.assertRaises(ValueError, RingBuffer, 0)
+
+
+class TestExponentialMovingAverage(unittest.TestCase):
+    """Tests the ExponentialMovingAverage object."""
+
+    def test_average(self):
+        ema = ExponentialMovingAverage(0.5)
+        self.assertIsNone(ema.value)
+        self.assertEqual(ema.push(4), 4)
+        self.assertEqual(ema.push(2), 3)
+        self.assertEqual(ema.push(3), 3)
+
+        ema.clear()
+        self.assertIsNone(ema.value)
+        self.assertEqual(ExponentialMovingAverage.from_span(3).alpha, 0.5)
+        self.assertRaises(ValueError, ExponentialMovingAverage, 0)
+
+
+class TestWindowedMinMax(unittest.TestCase):
+    """Tests the WindowedMinMax object."""
+
+    def test_extrema(self):
+        """Tests the extrema against numpy."""
+        rng = np.random.RandomState(0)
+        values = rng.randint(0, 20, size=500)
+        window = WindowedMinMax(10)
+        self.assertIsNone(window.min)
+        for i, value in enumerate(values):
+            window.push(value)
+            recent = values[max(i - 9, 0):i + 1]
+            self.assertEqual(window.min, recent.min())
+            self.assertEqual(window.max, recent.max())
+            self.assertEqual(len(window), len(recent))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import os
+import time
+
+from flow.benchmarks.figureeight0 import flow_params
+from flow.envs.async_env import FlowAsyncEnv
+from flow.utils.registry import make_create_env
+
+os.environ["TEST_FLAG"] = "True"
+
+
+class TestFlowAsyncEnv(unittest.TestCase):
+    """Tests the asynchronous RLlib environment."""
+
+    def setUp(self):
+        create_env, _ = make_create_env(flow_params)
+        self.env = FlowAsyncEnv([create_env() for _ in range(2)])
+
+    def tearDown(self):
+        self.env.close()
+        self.env = None
+
+    def test_poll_and_send_actions(self):
+        """Tests that all environments are polled after being stepped."""
+        # collect the initial observations of all environments
+        ready = set()
+        while len(ready) < 2:
+            obs, _, _, _, _ = self.env.poll()
+            ready.update(obs.keys())
+        self.assertEqual(ready, {0, 1})
+
+        # step all environments and collect their outputs
+        self.env.send_actions({0: {"agent0": [0]}, 1: {"agent0": [0]}})
+        stepped = set()
+        while len(stepped) < 2:
+            obs, rewards, dones, infos, _ = self.env.poll()
+            stepped.update(obs.keys())
+            for env_id in obs:
+                self.assertEqual(obs[env_id]["agent0"].shape, (28,))
+                self.assertFalse(dones[env_id]["__all__"])
+        self.assertEqual(stepped, {0, 1})
+
+        # nothing is pending, so poll should return immediately
+        obs, _, _, _, _ = self.env.poll()
+        self.assertEqual(obs, {})
+
+    def test_try_reset(self):
+        """Tests that try_reset returns the observations of the agents."""
+        # wait for the initial resets to complete
+        while self.env._pending > 0:
+            self.env.poll()
+        obs = self.env.try_reset(0)
+        self.assertEqual(obs["agent0"].shape, (28,))
+
+    def test_step_error(self):
+        """Tests that errors in the environments are raised by poll."""
+        while self.env._pending > 0:
+            self.env.poll()
+
+        def step(rl_actions):
+            raise ValueError("step failed")
+        self.env.envs[0].step = step
+
+        self.env.send_actions({0: {"agent0": [0]}})
+        self.assertRaises(ValueError, self.env.poll)
+
+        # the thread is still alive, and can be closed
+        self.assertTrue(self.env._threads[0].is_alive())
+
+    def test_step_error_batch(self):
+        """Tests that an error does not discard the outputs of other envs."""
+        while self.env._pending > 0:
+            self.env.poll()
+
+        def step(rl_actions):
+            raise ValueError("step failed")
+        self.env.envs[0].step = step
+
+        # wait for both environments to complete their step, so that their
+        # outputs are received in the same batch
+        self.env.send_actions({0: {"agent0": [0]}, 1: {"agent0": [0]}})
+        while self.env._results.qsize() < 2:
+            time.sleep(0.01)
+        self.assertRaises(ValueError, self.env.poll)
+
+        # the output of the other environment is returned by the next poll
+        obs, _, _, _, _ = self.env.poll()
+        self.assertEqual(list(obs.keys()), [1])
+        self.assertEqual(self.env._pending, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import threading
+import unittest
+
+import numpy as np
+
+from flow.renderer.async_renderer import AsyncRenderer
+from flow.renderer.headless_renderer import HeadlessRenderer
+
+
+def ring_network(length=230, num_points=64):
+    """Return the polygon of a ring centered at the origin."""
+    radius = length / (2 * np.pi)
+    theta = np.linspace(0, 2 * np.pi, num_points)
+    return [np.stack([radius * np.cos(theta),
+                      radius * np.sin(theta)], axis=1).ravel().tolist()]
+
+
+RENDER_ARGS = ([[0, -36.6, 90]], [[36.6, 0, 0]], [0.5], [1],
+               [[0, 100, "human_0"]], [[0, 100, "rl_0"]])
+
+
+class SlowRenderer(HeadlessRenderer):
+    """Headless renderer waiting for an event before rendering a frame."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.go = threading.Event()
+
+    def render(self, *args, **kwargs):
+        self.go.wait()
+        return super().render(*args, **kwargs)
+
+
+class TestAsyncRenderer(unittest.TestCase):
+    """Tests flow/renderer/async_renderer.py"""
+
+    def test_latest_frame(self):
+        renderer = AsyncRenderer(
+            lambda: HeadlessRenderer(ring_network(), "drgb", sight_radius=10,
+                                     pxpm=3))
+        self.assertEqual(renderer.get_latest(), (None, None))
+        renderer.submit(RENDER_ARGS, [[36.6, 0, 0]], ["rl_0"], wait=True)
+
+        expected = HeadlessRenderer(ring_network(), "drgb", sight_radius=10,
+                                    pxpm=3)
+        frame, sights = renderer.get_latest()
+        np.testing.assert_array_equal(frame, expected.render(*RENDER_ARGS))
+        np.testing.assert_array_equal(
+            sights, expected.get_sights([[36.6, 0, 0]], ["rl_0"]))
+        renderer.close()
+        self.assertEqual(renderer.num_rendered, 1)
+
+    def test_drop_oldest(self):
+        slow = []
+
+        def make_renderer():
+            slow.append(SlowRenderer(ring_network(), "gray"))
+            return slow[0]
+
+        renderer = AsyncRenderer(make_renderer, queue_size=2)
+        # the first snapshot is taken by the worker, the next ones fill the
+        # queue, and the oldest pending ones are dropped
+        for _ in range(6):
+            renderer.submit(RENDER_ARGS, [], [])
+        self.assertGreaterEqual(renderer.num_dropped, 3)
+        slow[0].go.set()
+        renderer.close()
+        self.assertEqual(renderer.num_submitted, 6)
+        self.assertEqual(renderer.num_rendered + renderer.num_dropped, 6)
+        self.assertEqual(renderer.frame.ndim, 2)
+
+    def test_backpressure(self):
+        slow = []
+
+        def make_renderer():
+            slow.append(SlowRenderer(ring_network(), "gray"))
+            return slow[0]
+
+        renderer = AsyncRenderer(make_renderer, queue_size=1, block=True)
+        submit = threading.Thread(
+            target=lambda: [renderer.submit(RENDER_ARGS, [], [])
+                            for _ in range(4)])
+        submit.start()
+        # the simulation waits for the renderer instead of dropping frames
+        submit.join(0.2)
+        self.assertTrue(submit.is_alive())
+        slow[0].go.set()
+        submit.join()
+        renderer.close()
+        self.assertEqual(renderer.num_rendered, 4)
+        self.assertEqual(renderer.num_dropped, 0)
+
+    def test_errors(self):
+        def fail():
+            raise ValueError("no display")
+
+        self.assertRaises(ValueError, AsyncRenderer, fail)
+
+        renderer = AsyncRenderer(lambda: HeadlessRenderer(ring_network(),
+                                                          "gray"))
+        self.assertRaises(TypeError, renderer.submit, ([],), [], [],
+                          wait=True)
+        renderer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
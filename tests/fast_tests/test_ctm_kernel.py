@@ -0,0 +1,261 @@
+import unittest
+from copy import deepcopy
+
+import numpy as np
+
+from flow.benchmarks.bottleneck0 import flow_params as bottleneck_params
+from flow.controllers import SimCarFollowingController, ContinuousRouter
+from flow.core import rewards
+from flow.core.kernel.simulation.ctm import CTMSimulator
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams, InFlows, TrafficLightParams
+from flow.envs.bottleneck_env import BottleneckEnv, ADDITIONAL_ENV_PARAMS
+from flow.scenarios.bottleneck import BottleneckScenario, \
+    ADDITIONAL_NET_PARAMS
+from flow.utils.registry import make_create_env
+
+
+class TestCTMSimulator(unittest.TestCase):
+    """Tests the cell transmission model in flow/core/kernel/simulation/ctm.py
+    """
+
+    def test_conservation(self):
+        """Tests that vehicles are only created and removed at the borders."""
+        sim = CTMSimulator(
+            edges=[("a", 200, 2, 20), ("b", 100, 1, 10), ("c", 300, 2, 30)],
+            movements=[("a", "b", 0.5), ("a", "c", 0.5), ("b", "c", 1),
+                       ("c", None, 1)],
+            sim_step=0.5)
+        sim.add_inflow("a", rate=0.5)
+        sim.add("b", 50, num=3)
+
+        total = sim.num.sum()
+        for _ in range(200):
+            sim.step()
+            total += sim.num_departed - sim.num_arrived
+            self.assertAlmostEqual(sim.num.sum(), total)
+            self.assertTrue(np.all(sim.num >= -1e-9))
+            self.assertTrue(np.all(sim.speed <= sim.speed_limit + 1e-9))
+
+    def test_capacity(self):
+        """Tests that the outflow of a lane drop is bounded by its capacity."""
+        sim = CTMSimulator(
+            edges=[("a", 500, 2, 20), ("b", 500, 1, 20)],
+            movements=[("a", "b", 1), ("b", None, 1)],
+            sim_step=0.5)
+        sim.add_inflow("a", rate=1.0)
+
+        arrived = 0
+        for i in range(2400):
+            sim.step()
+            if i >= 1200:
+                arrived += sim.num_arrived
+        outflow = arrived / (1200 * sim.sim_step)
+        self.assertAlmostEqual(outflow, sim.capacity[-1], places=3)
+
+        # vehicles queue upstream of the lane drop and at the inflow
+        start, num_cells = sim.edge_cells["a"]
+        density = sim.num / (sim.length * sim.lanes)
+        self.assertGreater(density[start:start + num_cells].min(),
+                           density[start + num_cells:].max())
+        self.assertGreater(sim.queue[0], 0)
+
+    def test_red_light(self):
+        """Tests that a supply factor of zero blocks an edge."""
+        sim = CTMSimulator(
+            edges=[("a", 200, 1, 20), ("b", 200, 1, 20)],
+            movements=[("a", "b", 1), ("b", None, 1)],
+            sim_step=0.5)
+        sim.add("a", 150, num=5)
+        sim.set_supply_factor("b", 0)
+        sim.step(100)
+
+        start, num_cells = sim.edge_cells["b"]
+        self.assertEqual(sim.num[start:start + num_cells].sum(), 0)
+        self.assertAlmostEqual(sim.num.sum(), 5)
+
+    def test_batch(self):
+        """Tests that batches of vehicles enter once their time is reached."""
+        sim = CTMSimulator(
+            edges=[("a", 200, 1, 20)], movements=[("a", None, 1)],
+            sim_step=0.5)
+        sim.add_batch("a", 30, time=5)
+        sim.step(10)
+        self.assertEqual(sim.num.sum(), 0)
+
+        departed = 0
+        for _ in range(200):
+            sim.step()
+            departed += sim.num_departed
+        self.assertAlmostEqual(departed, 30)
+        self.assertAlmostEqual(sim.queue.sum(), 0)
+
+    def test_speed_limit(self):
+        """Tests setting the speed limits of the segments of an edge."""
+        sim = CTMSimulator(
+            edges=[("a", 200, 1, 20)], movements=[("a", None, 1)],
+            sim_step=0.5)
+        sim.set_speed_limit("a", [5, 30])
+        np.testing.assert_array_almost_equal(
+            sim.get_speed_limit("a", 2), [5, 20])
+        sim.set_speed_limit("a", 10)
+        np.testing.assert_array_almost_equal(
+            sim.get_speed_limit("a", 2), [10, 10])
+
+
+class TestCTMKernel(unittest.TestCase):
+    """Tests running a Flow environment with the cell transmission model."""
+
+    def setUp(self):
+        vehicles = VehicleParams()
+        vehicles.add("human",
+                     acceleration_controller=(SimCarFollowingController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=5)
+
+        inflow = InFlows()
+        inflow.add(veh_type="human", edge="1", vehsPerHour=2500,
+                   departLane="random", departSpeed=10)
+
+        traffic_lights = TrafficLightParams(baseline=False)
+        traffic_lights.add(node_id="2")
+        traffic_lights.add(node_id="3")
+
+        additional_net_params = ADDITIONAL_NET_PARAMS.copy()
+        additional_net_params["scaling"] = 1
+        net_params = NetParams(inflows=inflow, no_internal_links=False,
+                               additional_params=additional_net_params)
+
+        scenario = BottleneckScenario(
+            name="bottleneck",
+            vehicles=vehicles,
+            net_params=net_params,
+            initial_config=InitialConfig(
+                spacing="uniform", edges_distribution=["2", "3", "4", "5"]),
+            traffic_lights=traffic_lights)
+
+        self.env = BottleneckEnv(
+            EnvParams(horizon=1000,
+                      additional_params=ADDITIONAL_ENV_PARAMS.copy()),
+            SumoParams(sim_step=0.5),
+            scenario,
+            simulator="ctm")
+
+    def tearDown(self):
+        self.env.terminate()
+        self.env = None
+
+    def test_run(self):
+        """Tests that inflows reach the end of the bottleneck."""
+        self.env.reset()
+        self.assertEqual(self.env.k.vehicle.num_vehicles, 5)
+        self.assertEqual(self.env.k.vehicle.get_ids(), [])
+
+        for _ in range(1000):
+            self.env.step(None)
+        self.assertAlmostEqual(self.env.k.vehicle.get_outflow_rate(100), 2500,
+                               delta=1)
+        self.assertGreater(self.env.get_bottleneck_density(), 0)
+        self.assertGreater(self.env.get_avg_bottleneck_velocity(), 0)
+
+        # the densities are cleared upon reset
+        self.env.reset()
+        self.assertEqual(self.env.k.vehicle.num_vehicles, 5)
+
+    def test_rewards(self):
+        """Tests that rewards are computed from the cell densities."""
+        self.env.reset()
+        for _ in range(100):
+            self.env.step(None)
+
+        sim = self.env.k.kernel_api
+        target = 25
+        self.env.env_params.additional_params["target_velocity"] = target
+        cost = np.sqrt(np.sum(sim.num * (sim.speed - target) ** 2))
+        max_cost = target * np.sqrt(sim.num.sum())
+        self.assertAlmostEqual(rewards.desired_velocity(self.env),
+                               max(max_cost - cost, 0) / max_cost)
+        self.assertAlmostEqual(rewards.average_velocity(self.env),
+                               np.sum(sim.num * sim.speed) / sim.num.sum())
+
+        # rewards of individual vehicles are not supported
+        self.assertRaises(NotImplementedError,
+                          rewards.punish_small_rl_headways, self.env)
+
+    def test_warmup(self):
+        """Tests that skipping the warm-up steps preserves the flow rates."""
+        self.env.env_params.warmup_steps = 400
+        # start the inflows in both episodes at the same point of their cycle
+        self.env.reset()
+        rates = []
+        for fast_forward in [True, False]:
+            self.env._can_fast_forward = lambda: fast_forward
+            self.env.reset()
+            vehicles = self.env.k.vehicle
+            self.assertEqual(vehicles.time_counter, 400)
+            self.assertEqual(len(vehicles._num_arrived), 400)
+            rates.append((vehicles.get_inflow_rate(200),
+                          vehicles.get_outflow_rate(200)))
+
+        self.assertGreater(rates[1][1], 0)
+        np.testing.assert_array_almost_equal(rates[0], rates[1])
+
+    def test_number_inflow(self):
+        """Tests that inflows of a number of vehicles without end all enter."""
+        inflow = InFlows()
+        inflow.add(veh_type="human", edge="1", number=20, begin=0, end=None)
+        net_params = NetParams(inflows=inflow, no_internal_links=False,
+                               additional_params=ADDITIONAL_NET_PARAMS.copy())
+        scenario = BottleneckScenario(
+            name="bottleneck",
+            vehicles=self.env.scenario.vehicles,
+            net_params=net_params,
+            initial_config=InitialConfig(),
+            traffic_lights=TrafficLightParams())
+        env = BottleneckEnv(
+            EnvParams(additional_params=ADDITIONAL_ENV_PARAMS.copy()),
+            SumoParams(sim_step=0.5),
+            scenario,
+            simulator="ctm")
+        try:
+            env.reset()
+            sim = env.k.kernel_api
+            self.assertAlmostEqual(sim.queue.sum() + sim.num.sum(), 20 + 5)
+            self.assertAlmostEqual(env.k.simulation.get_insertion_backlog(),
+                                   sim.queue.sum())
+
+            for _ in range(100):
+                env.step(None)
+            self.assertAlmostEqual(sim.queue.sum(), 0)
+            self.assertAlmostEqual(env.k.simulation.get_insertion_backlog(),
+                                   0)
+        finally:
+            env.terminate()
+
+
+class TestCTMDesiredVelocityEnv(unittest.TestCase):
+    """Tests DesiredVelocityEnv with the cell transmission model."""
+
+    def test_speed_limits(self):
+        """Tests that actions are applied as variable speed limits."""
+        flow_params = deepcopy(bottleneck_params)
+        flow_params["simulator"] = "ctm"
+        env = make_create_env(flow_params)[0]()
+        try:
+            env.reset()
+            sim = env.k.kernel_api
+            limits = {edge: sim.get_speed_limit(edge, 2)
+                      for edge in env.controlled_edges}
+
+            obs, reward, _, _ = env.step(-np.ones(env.action_space.shape))
+            for edge in env.controlled_edges:
+                np.testing.assert_array_almost_equal(
+                    sim.get_speed_limit(edge, 2), limits[edge] - 1)
+            self.assertGreater(obs[:len(obs) // 4].sum(), 0)
+            self.assertTrue(np.isfinite(reward))
+        finally:
+            env.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
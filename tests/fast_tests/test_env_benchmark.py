@@ -0,0 +1,79 @@
+import unittest
+
+from flow.benchmarks.perf.env_benchmark import benchmark_env, compare, \
+    PHASES
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.envs.loop.loop_accel import ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import ADDITIONAL_NET_PARAMS
+
+
+class TestEnvBenchmark(unittest.TestCase):
+    """Tests flow/benchmarks/perf/env_benchmark.py"""
+
+    def test_benchmark_env(self):
+        vehicles = VehicleParams()
+        vehicles.add("human",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=10)
+        vehicles.add("rl",
+                     acceleration_controller=(RLController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=1)
+        flow_params = dict(
+            exp_tag="env_benchmark_loop",
+            env_name="AccelEnv",
+            scenario="LoopScenario",
+            simulator="ring",
+            sim=SumoParams(sim_step=0.1),
+            env=EnvParams(horizon=15,
+                          additional_params=ADDITIONAL_ENV_PARAMS),
+            net=NetParams(additional_params=ADDITIONAL_NET_PARAMS.copy()),
+            veh=vehicles,
+            initial=InitialConfig(),
+        )
+
+        result = benchmark_env(flow_params, num_steps=20, num_resets=2,
+                               policy="random")
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(result["num_vehicles"], 11)
+        self.assertGreater(result["steps_per_sec"], 0)
+        self.assertGreater(result["peak_rss_mb"], 0)
+        self.assertIsNone(result["sumo_peak_rss_mb"])
+
+        # the phases add up to the duration of a step
+        self.assertEqual(sorted(result["phases"]), sorted(PHASES))
+        self.assertTrue(all(seconds >= 0 for phase, seconds in
+                            result["phases"].items() if phase != "other"))
+        self.assertAlmostEqual(sum(result["phases"].values()),
+                               1 / result["steps_per_sec"])
+        self.assertGreater(result["phases"]["kernel_update"], 0)
+
+    def test_compare(self):
+        previous = {"results": {
+            "grid0": {"status": "ok", "startup": 2, "reset": 1,
+                      "steps_per_sec": 100, "peak_rss_mb": 100},
+            "merge0": {"status": "ok", "startup": 2, "reset": 1,
+                       "steps_per_sec": 100, "peak_rss_mb": 100},
+            "merge1": {"status": "ok", "startup": 2},
+        }}
+        results = {"results": {
+            "grid0": {"status": "ok", "startup": 2.1, "reset": 1.5,
+                      "steps_per_sec": 80, "peak_rss_mb": 95},
+            "merge0": {"status": "ok", "startup": 1, "reset": 1,
+                       "steps_per_sec": 120, "peak_rss_mb": 100},
+            "merge1": {"status": "skipped",
+                       "reason": "sumo is not installed"},
+        }}
+        comparisons = compare(results, previous, threshold=0.1)
+        self.assertEqual(len(comparisons), 8)
+        regressions = [(c["benchmark"], c["measure"]) for c in comparisons
+                       if c["regression"]]
+        self.assertEqual(regressions, [("grid0", "reset"),
+                                       ("grid0", "steps_per_sec")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 
 from flow.core.params import SumoParams, EnvParams, InitialConfig, \
-    NetParams, SumoCarFollowingParams
+    NetParams, SumoCarFollowingParams, InFlows
 from flow.core.params import VehicleParams
 
 from flow.controllers.routing_controllers import ContinuousRouter
@@ -273,6 +273,81 @@ class TestWarmUpSteps(unittest.TestCase):
         # ensure that the difference in time is equal to sims_per_step
         self.assertEqual(t2 - t1, warmup_step)
 
+    def test_fast_forward(self):
+        """Ensures that the simulation is advanced by all warmup steps at once
+        when no Flow controllers are active, and that the vehicles kernel is
+        kept consistent with the simulator."""
+        warmup_step = 5  # some value
+
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="human", num_vehicles=5)
+
+        env_params = EnvParams(
+            warmup_steps=warmup_step, additional_params=ADDITIONAL_ENV_PARAMS)
+        env, scenario = ring_road_exp_setup(
+            env_params=env_params, vehicles=vehicles)
+        self.assertTrue(env._can_fast_forward())
+
+        time = env.k.kernel_api.simulation.getTime()
+        env.reset()
+        self.assertEqual(env.time_counter, warmup_step)
+        self.assertAlmostEqual(
+            env.k.kernel_api.simulation.getTime() - time,
+            (warmup_step + 1) * env.sim_step)
+        self.assertListEqual(
+            sorted(env.k.vehicle.get_ids()),
+            sorted(env.k.kernel_api.vehicle.getIDList()))
+
+        env.terminate()
+
+    def test_fast_forward_outflow(self):
+        """Ensures that skipping the warmup steps does not change the outflow
+        rate of the network."""
+        warmup_step = 200
+
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="human", num_vehicles=5)
+
+        outflows = []
+        for fast_forward in [True, False]:
+            env_params = EnvParams(warmup_steps=warmup_step,
+                                   additional_params=ADDITIONAL_ENV_PARAMS)
+            env, scenario = highway_exp_setup(
+                sim_params=SumoParams(sim_step=0.1, seed=0),
+                env_params=env_params,
+                vehicles=vehicles)
+            self.assertTrue(env._can_fast_forward())
+            env._can_fast_forward = lambda: fast_forward
+            env.reset()
+
+            self.assertEqual(env.k.vehicle.time_counter, warmup_step)
+            self.assertEqual(len(env.k.vehicle._num_arrived), warmup_step)
+            outflows.append((sum(env.k.vehicle._num_arrived),
+                             env.k.vehicle.get_outflow_rate(10)))
+            env.terminate()
+
+        # some vehicles exited the highway during the warmup steps
+        self.assertGreater(outflows[1][0], 0)
+        self.assertEqual(outflows[0], outflows[1])
+
+    def test_no_fast_forward_inflows(self):
+        """Ensures that the warmup steps are not skipped in networks with
+        inflows, whose vehicles may enter and exit during these steps."""
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="human", num_vehicles=5)
+
+        inflow = InFlows()
+        inflow.add(veh_type="human", edge="highway_0", vehs_per_hour=1000)
+        net_params = NetParams(
+            inflows=inflow,
+            additional_params={"length": 100, "lanes": 1, "speed_limit": 30,
+                               "resolution": 40, "num_edges": 1})
+
+        env, scenario = highway_exp_setup(
+            vehicles=vehicles, net_params=net_params)
+        self.assertFalse(env._can_fast_forward())
+        env.terminate()
+
 
 class TestSimsPerStep(unittest.TestCase):
     """Ensures that the appropriate number of simultaions are run at any given
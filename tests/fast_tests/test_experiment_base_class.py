@@ -4,9 +4,11 @@ import time
 
 from flow.core.experiment import Experiment
 from flow.core.params import VehicleParams
-from flow.controllers import RLController, ContinuousRouter
+from flow.controllers import RLController, ContinuousRouter, IDMController
 from flow.core.params import SumoCarFollowingParams
-from flow.core.params import SumoParams
+from flow.core.params import SumoParams, EnvParams, NetParams, InitialConfig
+from flow.envs.loop.wave_attenuation import ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import ADDITIONAL_NET_PARAMS
 
 from tests.setup_scripts import ring_road_exp_setup
 import numpy as np
@@ -126,5 +128,60 @@ class TestConvertToCSV(unittest.TestCase):
             scenario.name)))
 
 
+class TestParallelRuns(unittest.TestCase):
+    """
+    Tests that runs created from flow_params are seeded and aggregated
+    independently of the number of workers.
+    """
+
+    def setUp(self):
+        vehicles = VehicleParams()
+        vehicles.add("human",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=5)
+        vehicles.add("rl",
+                     acceleration_controller=(RLController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=1)
+
+        self.flow_params = dict(
+            exp_tag="parallel_ring",
+            env_name="WaveAttenuationPOEnv",
+            scenario="LoopScenario",
+            simulator="ring",
+            sim=SumoParams(sim_step=0.1),
+            env=EnvParams(horizon=50,
+                          additional_params=ADDITIONAL_ENV_PARAMS.copy()),
+            net=NetParams(additional_params=ADDITIONAL_NET_PARAMS.copy()),
+            veh=vehicles,
+            initial=InitialConfig(),
+        )
+
+    def test_num_workers(self):
+        def rl_actions(*_):
+            return [1]
+
+        runs = []
+        exp = Experiment(flow_params=self.flow_params)
+        res1 = exp.run(3, 50, rl_actions=rl_actions, seed=0,
+                       callback=lambda i, info: runs.append(i))
+        res2 = exp.run(3, 50, rl_actions=rl_actions, seed=0, num_workers=2)
+
+        self.assertEqual(runs, [0, 1, 2])
+        self.assertEqual(res1["seeds"], [0, 1, 2])
+        np.testing.assert_array_almost_equal(res1["returns"], res2["returns"])
+        np.testing.assert_array_almost_equal(res1["velocities"],
+                                             res2["velocities"])
+
+        # the ring lengths, and therefore the returns, differ across seeds
+        self.assertNotAlmostEqual(res1["returns"][0], res1["returns"][1])
+
+    def test_invalid_args(self):
+        self.assertRaises(ValueError, Experiment)
+        exp = Experiment(flow_params=self.flow_params)
+        self.assertRaises(ValueError, exp.run, 1, 10, backend="dask")
+
+
 if __name__ == '__main__':
     unittest.main()
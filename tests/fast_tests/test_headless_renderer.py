@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from flow.renderer.headless_renderer import HeadlessRenderer as Renderer
+from flow.renderer.rasterizer import MACHINE_LUT
+from flow.renderer.replay import load_render_data
+
+
+def ring_network(length=230, num_points=64):
+    """Return the polygon of a ring centered at the origin."""
+    radius = length / (2 * np.pi)
+    theta = np.linspace(0, 2 * np.pi, num_points)
+    return [np.stack([radius * np.cos(theta),
+                      radius * np.sin(theta)], axis=1).ravel().tolist()]
+
+
+class TestHeadlessRenderer(unittest.TestCase):
+    """Tests headless_renderer"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_headless_renderer(self):
+        renderer = Renderer(
+            ring_network(),
+            "drgb",
+            save_render=False,
+            sight_radius=10,
+            pxpm=3,
+            show_radius=False)
+
+        # ensure that the attributes match their correct values
+        self.assertEqual(renderer.mode, "drgb")
+        self.assertEqual(renderer.save_render, False)
+        self.assertEqual(renderer.sight_radius, 10)
+        self.assertEqual(renderer.pxpm, 3)
+        self.assertEqual(renderer.show_radius, False)
+
+        frame = renderer.render([[0, -36.6, 90]], [[36.6, 0, 0]], [0.5], [1],
+                                [[0, 100, "human_0"]], [[0, 100, "rl_0"]])
+        self.assertEqual(frame.shape, (renderer.height, renderer.width, 3))
+        self.assertIs(renderer.frame, frame)
+
+        sight = renderer.get_sight([36.6, 0, 0], "rl_0")
+        self.assertEqual(sight.shape, (60, 60, 3))
+        # the rl vehicle points north, so its body is drawn below the center
+        # of its local observation
+        rows, cols = np.nonzero((sight == MACHINE_LUT[-1]).all(axis=2))
+        self.assertGreater(len(rows), 0)
+        self.assertTrue(np.all(rows >= 29))
+        self.assertTrue(np.all(np.abs(cols - 30) <= 5))
+        # the observation is rotated by the angle of the vehicle
+        sight = renderer.get_sight([36.6, 0, 90], "rl_0")
+        rows, cols = np.nonzero((sight == MACHINE_LUT[-1]).all(axis=2))
+        self.assertTrue(np.all(cols >= 29))
+        self.assertTrue(np.all(np.abs(rows - 30) <= 5))
+
+        # observations may extend beyond the frame
+        sight = renderer.get_sight([36.6, 0, 0], "rl_0", sight_radius=100)
+        self.assertEqual(sight.shape, (600, 600, 3))
+
+    def test_get_sights(self):
+        """Tests that batched observations match individual observations."""
+        renderer = Renderer(ring_network(), "drgb", sight_radius=10, pxpm=3)
+        radius = 230 / (2 * np.pi)
+        theta = np.linspace(0, 2 * np.pi, 20, endpoint=False)
+        orientations = [[radius * np.cos(t), radius * np.sin(t),
+                         -np.degrees(t) % 360] for t in theta]
+        # a vehicle close to the border of the frame
+        orientations.append([-60, -60, 33])
+        renderer.render(orientations[:10], orientations[10:], [0.5] * 10,
+                        [1] * 11, [], [])
+
+        ids = ["veh_{}".format(i) for i in range(21)]
+        sights = renderer.get_sights(orientations, ids)
+        self.assertEqual(sights.shape, (21, 60, 60, 3))
+        expected = np.stack([renderer.get_sight(orientation, id)
+                             for orientation, id in zip(orientations, ids)])
+
+        # observations only differ by interpolation at the edge of the disk
+        rows, cols = np.mgrid[0:60, 0:60] - 30
+        dist = np.hypot(rows, cols)
+        diff = np.abs(sights.astype(int) - expected.astype(int))
+        self.assertLessEqual(diff[:, dist < 28].max(), 1)
+        self.assertEqual(sights[:, dist > 31].max(), 0)
+
+        # the buffer of observations is reused
+        self.assertEqual(len(renderer.get_sights(orientations[:3], ids)), 3)
+        self.assertEqual(len(renderer.get_sights([], [])), 0)
+
+        gray = Renderer(ring_network(), "gray", sight_radius=10, pxpm=3)
+        gray.render(orientations, [], [0.5] * 21, [], [], [])
+        self.assertEqual(gray.get_sights(orientations, ids).shape,
+                         (21, 60, 60))
+        self.assertEqual(gray.get_sights([], []).shape, (0, 60, 60))
+
+    def test_save_render(self):
+        renderer = Renderer(ring_network(), "gray", save_render=True,
+                            path=self.path)
+        for _ in range(3):
+            frame = renderer.render([[0, -36.6, 90]], [], [0.5], [],
+                                    [[0, 100, "human_0"]], [])
+            self.assertEqual(frame.ndim, 2)
+        sight = renderer.get_sight([0, -36.6, 90], "human_0")
+        self.assertEqual(sight.ndim, 2)
+        renderer.close()
+
+        files = os.listdir(renderer.path)
+        self.assertIn("frame_000003.png", files)
+        self.assertIn("sight_human_0_000003.png", files)
+        network, snapshots = load_render_data(
+            os.path.join(renderer.path, "data_000003.npy"))
+        self.assertEqual(len(network), 1)
+        self.assertEqual(snapshots[0], ([[0, -36.6, 90]], [], [0.5], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+import numpy as np
+
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core import rewards
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.envs.loop.loop_accel import AccelEnv, ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+
+class TestStepMetrics(unittest.TestCase):
+    """Tests the metrics snapshot in flow/core/kernel/metrics.py"""
+
+    def setUp(self):
+        vehicles = VehicleParams()
+        vehicles.add("human",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=5)
+        vehicles.add("rl",
+                     acceleration_controller=(RLController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=1)
+        scenario = LoopScenario(
+            "loop", vehicles,
+            NetParams(additional_params=ADDITIONAL_NET_PARAMS.copy()),
+            InitialConfig())
+        self.env = AccelEnv(
+            EnvParams(additional_params=ADDITIONAL_ENV_PARAMS),
+            SumoParams(sim_step=0.1), scenario, simulator="ring")
+        self.env.reset()
+
+    def tearDown(self):
+        self.env.terminate()
+
+    def test_speeds(self):
+        """Tests that the metrics match the vehicle kernel."""
+        k = self.env.k
+        for _ in range(10):
+            self.env.step(np.array([1]))
+        speeds = k.vehicle.get_speed(k.vehicle.get_ids())
+        np.testing.assert_array_almost_equal(k.metrics.speeds, speeds)
+        np.testing.assert_array_almost_equal(
+            k.metrics.rl_speeds, k.vehicle.get_speed(k.vehicle.get_rl_ids()))
+        self.assertAlmostEqual(rewards.average_velocity(self.env),
+                               np.mean(speeds))
+        self.assertEqual(k.metrics.max_speed_limit, 30)
+
+        # speeds on a subset of edges
+        bottom = k.vehicle.get_ids_by_edge("bottom")
+        np.testing.assert_array_almost_equal(
+            sorted(k.metrics.get_speeds(["bottom"])),
+            sorted(k.vehicle.get_speed(bottom)))
+
+    def test_invalidation(self):
+        """Tests that the metrics are recomputed when the state changes."""
+        k = self.env.k
+        speeds = k.metrics.speeds
+        self.assertIs(k.metrics.speeds, speeds)
+
+        # metrics are discarded after every step
+        self.env.step(np.array([1]))
+        self.assertIsNot(k.metrics.speeds, speeds)
+
+        # metrics are discarded when vehicles are removed
+        k.vehicle.remove("human_0")
+        self.assertEqual(len(k.metrics.speeds), 5)
+        self.assertNotIn("human_0", k.metrics.ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
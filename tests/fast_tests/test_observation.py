@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+from gym.spaces.box import Box
+
+from flow.core.observation import ObservationBuilder, SlotMap
+
+
+class TestObservationBuilder(unittest.TestCase):
+    """Tests the methods in flow/core/observation.py::ObservationBuilder."""
+
+    def setUp(self):
+        self.space = Box(low=0, high=1, shape=(11,), dtype=np.float32)
+        self.builder = ObservationBuilder(
+            self.space, [("speed", 3), ("rl", (2, 4))])
+
+    def test_invalid_size(self):
+        """Tests that fields must match the size of the observation space."""
+        self.assertRaises(ValueError, ObservationBuilder, self.space,
+                          [("speed", 3)])
+
+    def test_views(self):
+        """Tests that named fields are views of the same buffer."""
+        self.assertEqual(self.builder["speed"].shape, (3,))
+        self.assertEqual(self.builder["rl"].shape, (2, 4))
+
+        self.builder["rl"][1] = [1, 2, 3, 4]
+        np.testing.assert_array_equal(
+            self.builder.get(), [0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4])
+        self.assertEqual(self.builder.get().dtype, np.float32)
+
+    def test_fill(self):
+        """Tests that fill writes (normalized) values in place."""
+        buffer = self.builder.get()
+        self.builder.fill("speed", [2, 4], scale=4)
+        np.testing.assert_array_almost_equal(buffer[:3], [0.5, 1, 0])
+
+        self.builder.clear()
+        np.testing.assert_array_equal(buffer, np.zeros(11))
+        self.assertIs(self.builder.get(), buffer)
+
+
+class TestSlotMap(unittest.TestCase):
+    """Tests the methods in flow/core/observation.py::SlotMap."""
+
+    def test_permanent_ids(self):
+        """Tests that permanent ids keep their slot when they are absent."""
+        slots = SlotMap(3, ids=["rl_0", "rl_1"])
+        ids, index = slots.update(["rl_1"])
+        self.assertListEqual(ids, ["rl_1"])
+        np.testing.assert_array_equal(index, [1])
+        self.assertEqual(slots.get("rl_0"), 0)
+
+    def test_dynamic_ids(self):
+        """Tests that new ids are assigned and release free slots."""
+        slots = SlotMap(2)
+        ids, index = slots.update(["a", "b", "c"])
+        self.assertListEqual(ids, ["a", "b"])
+        np.testing.assert_array_equal(index, [0, 1])
+
+        # "a" exits, so "c" takes its slot, while "b" keeps its own
+        ids, index = slots.update(["b", "c"])
+        self.assertListEqual(ids, ["b", "c"])
+        np.testing.assert_array_equal(index, [1, 0])
+
+        slots.reset()
+        self.assertIsNone(slots.get("b"))
+
+
+if __name__ == '__main__':
+    unittest.main()
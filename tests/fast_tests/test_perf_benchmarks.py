@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from flow.benchmarks.perf.fake_api import FakeKernelAPI, record_trace
+from flow.benchmarks.perf.kernel_benchmark import make_env, replay_kernel, \
+    benchmark, compare, scaling, OPERATIONS
+from flow.core.kernel.vehicle import TraCIVehicle
+
+
+class TestFakeKernelAPI(unittest.TestCase):
+    """Tests flow/benchmarks/perf/fake_api.py"""
+
+    def test_replay(self):
+        """Tests that the TraCI kernel replays the state of the ring."""
+        env = make_env(20)
+        rl_actions = np.zeros(env.action_space.shape)
+        ring = env.k
+        trace = record_trace(env, 5, rl_actions)
+        self.assertEqual(len(trace["steps"]), 6)
+
+        # state of the ring simulator at the end of the trace
+        ids = list(ring.vehicle.get_ids())
+        speeds = ring.vehicle.get_speed(ids)
+        headways = ring.vehicle.get_headway(ids)
+        leaders = ring.vehicle.get_leader(ids)
+
+        k = replay_kernel(env, trace)
+        self.assertIsInstance(k.vehicle, TraCIVehicle)
+        self.assertIs(env.k, k)
+        self.assertEqual(sorted(k.vehicle.get_ids()), sorted(ids))
+        self.assertEqual(len(k.vehicle.get_rl_ids()), 2)
+        for _ in range(5):
+            k.simulation.simulation_step()
+            k.update(reset=False)
+        np.testing.assert_allclose(k.vehicle.get_speed(ids), speeds)
+        np.testing.assert_allclose(k.vehicle.get_headway(ids), headways)
+        self.assertEqual(k.vehicle.get_leader(ids), leaders)
+        self.assertEqual(env.get_state().shape, (40,))
+
+        # commands sent to the simulator are counted, and the trace is
+        # replayed from its second step
+        env.step(rl_actions)
+        self.assertEqual(k.kernel_api.step, 1)
+        self.assertEqual(k.kernel_api.calls["vehicle.slowDown"], 20)
+        env.terminate()
+
+    def test_fake_api(self):
+        trace = {"steps": [({}, {})] * 3, "types": {}, "lengths": {},
+                 "max_speed": 30}
+        api = FakeKernelAPI(trace)
+        for step in [1, 2, 1, 2]:
+            api.simulationStep()
+            self.assertEqual(api.step, step)
+        api.vehicle.setColor("veh_0", (255, 0, 0, 255))
+        self.assertEqual(api.calls, {"vehicle.setColor": 1})
+        self.assertEqual(api.trafficlight.getIDList(), [])
+
+
+class TestKernelBenchmark(unittest.TestCase):
+    """Tests flow/benchmarks/perf/kernel_benchmark.py"""
+
+    def test_benchmark(self):
+        results = benchmark(sizes=[10, 20], num_steps=2)
+        self.assertEqual(sorted(results["results"]), sorted(OPERATIONS))
+        for name in OPERATIONS:
+            self.assertEqual(sorted(results["results"][name]), ["10", "20"])
+            self.assertIsNotNone(results["scaling"][name])
+        self.assertIn("python", results["metadata"])
+
+        # no regression with respect to itself
+        comparisons = compare(results, results)
+        self.assertEqual(len(comparisons), 2 * len(OPERATIONS))
+        self.assertFalse(any(c["regression"] for c in comparisons))
+
+    def test_compare(self):
+        def latency(median):
+            return {"median": median, "p90": median}
+
+        baseline = {"results": {"get_state": {"10": latency(1),
+                                              "100": latency(10)}}}
+        results = {"results": {"get_state": {"10": latency(1.005),
+                                             "100": latency(13),
+                                             "1000": latency(100)}}}
+        comparisons = compare(results, baseline, threshold=0.25)
+        self.assertEqual([c["num_vehicles"] for c in comparisons], [10, 100])
+        self.assertEqual([c["regression"] for c in comparisons],
+                         [False, True])
+        self.assertAlmostEqual(comparisons[1]["ratio"], 1.3)
+
+        # linear and quadratic scaling
+        self.assertAlmostEqual(scaling(results["results"])["get_state"], 1,
+                               delta=0.1)
+        quadratic = {"op": {str(n): latency(n ** 2) for n in [10, 100]}}
+        self.assertAlmostEqual(scaling(quadratic)["op"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.core.profiler import EpisodeProfiler, _StackSampler, \
+    write_collapsed, write_pstats
+from flow.envs.loop.loop_accel import AccelEnv, ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+
+def make_env(path, every_n_episodes=2, mode="sampling"):
+    """Create a ring road environment profiling one in every N episodes."""
+    vehicles = VehicleParams()
+    vehicles.add("human",
+                 acceleration_controller=(IDMController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=9)
+    vehicles.add("rl",
+                 acceleration_controller=(RLController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=1)
+    net_params = NetParams(additional_params=ADDITIONAL_NET_PARAMS)
+    scenario = LoopScenario("profiled_loop", vehicles, net_params,
+                            InitialConfig())
+    env_params = EnvParams(additional_params=ADDITIONAL_ENV_PARAMS,
+                           profile_path=path,
+                           profile_every_n_episodes=every_n_episodes,
+                           profile_mode=mode,
+                           profile_interval=0.001)
+    return AccelEnv(env_params, SumoParams(sim_step=0.1), scenario,
+                    simulator="ring")
+
+
+def run_episodes(env, num_episodes, num_steps=20):
+    """Run episodes of an environment, and terminate it."""
+    rl_actions = np.ones(env.action_space.shape)
+    for _ in range(num_episodes):
+        env.reset()
+        for _ in range(num_steps):
+            env.step(rl_actions)
+            # leave time for the sampler
+            time.sleep(0.002)
+    env.terminate()
+
+
+class TestEpisodeProfiler(unittest.TestCase):
+    """Tests the profiling of one in every N episodes of an environment."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_disabled(self):
+        env = make_env(None)
+        self.assertIsNone(env.profiler)
+        run_episodes(env, 1, num_steps=2)
+
+    def test_sampling(self):
+        env = make_env(self.path, every_n_episodes=2)
+        run_episodes(env, 3)
+
+        # the first and third episodes are profiled
+        prefixes = ["profiled_loop_pid{}_ep{}_veh10_steps20".format(
+            os.getpid(), episode) for episode in [1, 3]]
+        self.assertEqual(
+            sorted(os.listdir(self.path)),
+            sorted(prefix + ext for prefix in prefixes
+                   for ext in [".collapsed", ".pstats", ".json"]))
+
+        # the outputs are tagged with the scenario and the counters
+        with open(os.path.join(self.path, prefixes[1] + ".json")) as f:
+            tags = json.load(f)
+        self.assertEqual(tags["scenario"], "profiled_loop")
+        self.assertEqual(tags["episode"], 3)
+        self.assertEqual(tags["num_vehicles"], 10)
+        self.assertEqual(tags["time_counter"], 20)
+        self.assertEqual(tags["episode_steps"], 20)
+        self.assertEqual(tags["mode"], "sampling")
+        self.assertGreater(tags["num_samples"], 0)
+
+        # the samples include the loop running the episodes
+        with open(os.path.join(self.path, prefixes[1] + ".collapsed")) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(sum(int(line.rsplit(" ", 1)[1]) for line in lines),
+                         tags["num_samples"])
+        self.assertTrue(all("run_episodes (" in line for line in lines))
+
+        stats = pstats.Stats(os.path.join(self.path, prefixes[1] + ".pstats"))
+        self.assertTrue(any(name == "run_episodes"
+                            for _, _, name in stats.stats))
+
+    def test_cprofile(self):
+        env = make_env(self.path, every_n_episodes=1, mode="cprofile")
+        run_episodes(env, 1, num_steps=5)
+
+        prefix = "profiled_loop_pid{}_ep1_veh10_steps5".format(os.getpid())
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         [prefix + ".json", prefix + ".pstats"])
+        stats = pstats.Stats(os.path.join(self.path, prefix + ".pstats"))
+        self.assertTrue(any(name == "compute_reward"
+                            for _, _, name in stats.stats))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, EpisodeProfiler, self.path, mode="foo")
+        self.assertRaises(ValueError, EpisodeProfiler, self.path,
+                          every_n_episodes=0)
+        self.assertRaises(ValueError, EpisodeProfiler, self.path, interval=0)
+
+
+class TestStackSamples(unittest.TestCase):
+    """Tests the outputs built from stack samples."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        a, b, c = ("a.py", 1, "a"), ("b.py", 2, "b"), ("c.py", 3, "c")
+        self.samples = {(a, b): 3, (a, b, c): 1, (a,): 2}
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_sampler(self):
+        done = threading.Event()
+        thread = threading.Thread(target=done.wait)
+        thread.start()
+        sampler = _StackSampler(thread.ident, 0.001)
+        time.sleep(0.05)
+        sampler.stop()
+        done.set()
+        thread.join()
+
+        self.assertGreater(sum(sampler.samples.values()), 0)
+        for stack in sampler.samples:
+            self.assertEqual(stack[-1][2], "wait")
+
+    def test_collapsed(self):
+        path = os.path.join(self.path, "samples.collapsed")
+        write_collapsed(self.samples, path)
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines(), [
+                "a (a.py:1) 2",
+                "a (a.py:1);b (b.py:2) 3",
+                "a (a.py:1);b (b.py:2);c (c.py:3) 1",
+            ])
+
+    def test_pstats(self):
+        path = os.path.join(self.path, "samples.pstats")
+        write_pstats(self.samples, 0.5, path)
+        stats = pstats.Stats(path).stats
+
+        # number of samples, total time, cumulative time
+        a, b, c = ("a.py", 1, "a"), ("b.py", 2, "b"), ("c.py", 3, "c")
+        self.assertEqual(stats[a][1:4], (6, 1., 3.))
+        self.assertEqual(stats[b][1:4], (4, 1.5, 2.))
+        self.assertEqual(stats[c][1:4], (1, 0.5, 0.5))
+        self.assertEqual(stats[b][4], {a: (4, 4, 1.5, 2.)})
+        self.assertEqual(stats[a][4], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,9 @@
 from flow.renderer.pyglet_renderer import PygletRenderer as Renderer
+from flow.renderer.pyglet_renderer import truncate_colormap, \
+    vehicle_triangles, vehicle_circles, HUMAN_RGB_LUT
+from flow.renderer.rasterizer import lookup_colors
+import matplotlib.cm as cm
+import numpy as np
 import os
 import unittest
 
@@ -81,6 +86,42 @@ class TestPygletRenderer(unittest.TestCase):
         self.assertEqual(renderer.pxpm, pxpm)
         self.assertEqual(renderer.show_radius, show_radius)
 
+    def test_vehicle_triangles(self):
+        centers = np.array([[10., 20.], [-5., 3.]])
+        angles = np.array([30., 200.])
+        size, x_scale, y_scale = 9., 0.9, 0.8
+        vertices = vehicle_triangles(centers, angles, size, x_scale, y_scale)
+
+        # compare to the triangles previously added vehicle by vehicle
+        for (cx, cy), angle, triangle in zip(centers, angles, vertices):
+            ang = np.radians(angle)
+            pt1_ = [cx - size*x_scale*np.sin(ang),
+                    cy - size*y_scale*np.cos(ang)]
+            pt2 = [pt1_[0] + 0.25*size*x_scale*np.sin(np.pi/2-ang),
+                   pt1_[1] - 0.25*size*y_scale*np.cos(np.pi/2-ang)]
+            pt3 = [pt1_[0] - 0.25*size*x_scale*np.sin(np.pi/2-ang),
+                   pt1_[1] + 0.25*size*y_scale*np.cos(np.pi/2-ang)]
+            np.testing.assert_array_almost_equal(triangle,
+                                                 [[cx, cy], pt2, pt3])
+
+    def test_vehicle_circles(self):
+        centers = np.array([[10., 20.], [-5., 3.]])
+        segments = vehicle_circles(centers, 4, 8)
+        self.assertEqual(segments.shape, (2, 16, 2))
+        np.testing.assert_array_almost_equal(
+            np.linalg.norm(segments - centers[:, np.newaxis], axis=2), 4)
+        # consecutive segments are connected
+        np.testing.assert_array_almost_equal(segments[:, 1:-1:2],
+                                             segments[:, 2::2])
+
+    def test_colormap_lut(self):
+        dynamics = np.linspace(0, 1, 11)
+        cmap = truncate_colormap(cm.Greens, 0.2, 0.8)
+        expected = [(255*np.array(cmap(d)[:3])).astype(np.uint8)
+                    for d in dynamics]
+        np.testing.assert_allclose(
+            lookup_colors(HUMAN_RGB_LUT, dynamics), expected, atol=2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.kernel.recorder import TrajectoryReader
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.envs.loop.loop_accel import AccelEnv, ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+
+class TestTrajectoryRecorder(unittest.TestCase):
+    """Tests the trajectory recorder in flow/core/kernel/recorder.py"""
+
+    def setUp(self):
+        self.record_path = tempfile.mkdtemp()
+
+        vehicles = VehicleParams()
+        vehicles.add("human",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=5)
+        vehicles.add("rl",
+                     acceleration_controller=(RLController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=1)
+        scenario = LoopScenario(
+            "record_loop", vehicles,
+            NetParams(additional_params=ADDITIONAL_NET_PARAMS.copy()),
+            InitialConfig())
+        sim_params = SumoParams(sim_step=0.1, record_path=self.record_path,
+                                record_every_n_steps=2, record_chunk_size=7)
+        self.env = AccelEnv(
+            EnvParams(additional_params=ADDITIONAL_ENV_PARAMS),
+            sim_params, scenario, simulator="ring")
+
+    def tearDown(self):
+        self.env.terminate()
+        shutil.rmtree(self.record_path)
+
+    def test_record(self):
+        """Tests that the recorded rows match the state of the vehicles."""
+        k = self.env.k
+        speeds = []
+        for episode in range(2):
+            self.env.reset()
+            speeds.append([k.vehicle.get_speed("rl_0")])
+            for _ in range(10):
+                self.env.step(np.array([1]))
+                speeds[-1].append(k.vehicle.get_speed("rl_0"))
+        k.recorder.close()
+
+        self.assertEqual(os.path.dirname(k.recorder.path), self.record_path)
+        reader = TrajectoryReader(k.recorder.path)
+        self.assertCountEqual(reader.ids, self.env.initial_ids)
+        # 6 vehicles over 6 recorded steps of 2 episodes, in chunks of 7 rows
+        self.assertEqual(len(reader.chunk_paths), 11)
+
+        rows = reader.get_vehicle("rl_0")
+        np.testing.assert_array_equal(rows["episode"], [0] * 6 + [1] * 6)
+        np.testing.assert_array_almost_equal(
+            rows["time"], np.tile(np.arange(0, 1.1, 0.2), 2))
+        np.testing.assert_array_almost_equal(
+            rows["speed"], speeds[0][::2] + speeds[1][::2])
+
+        # the acceleration of the rl vehicle is that requested by the agent,
+        # and vehicles are not controlled upon reset
+        self.assertTrue(np.isnan(rows["accel"][0]))
+        np.testing.assert_array_almost_equal(rows["accel"][1:6], 1)
+
+        rows = reader.get_time_slice(0.5, 0.7, episode=1)
+        self.assertEqual(len(rows["id"]), 6)
+        np.testing.assert_array_almost_equal(rows["time"], 0.6)
+        for edge in rows["edge"]:
+            self.assertIn(reader.edges[edge], k.scenario.get_edge_list())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import cv2
+
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.envs.loop.loop_accel import AccelEnv, ADDITIONAL_ENV_PARAMS
+from flow.renderer.rasterizer import Rasterizer, HUMAN_LUT, lookup_colors
+from flow.renderer.replay import iter_trajectory_snapshots, render_video, \
+    _init_worker, _draw_frame
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+
+def ring_network(length=230, num_points=64):
+    """Return the polygon of a ring centered at the origin."""
+    radius = length / (2 * np.pi)
+    theta = np.linspace(0, 2 * np.pi, num_points)
+    return [np.stack([radius * np.cos(theta),
+                      radius * np.sin(theta)], axis=1).ravel().tolist()]
+
+
+class TestRasterizer(unittest.TestCase):
+    """Tests the rasterizer in flow/renderer/rasterizer.py"""
+
+    def test_draw(self):
+        rasterizer = Rasterizer(ring_network(), "drgb", pxpm=2)
+        frame = rasterizer.draw([[0, 36.6, 270]], [], [0.5], [])
+        self.assertEqual(frame.shape, (rasterizer.height, rasterizer.width,
+                                       3))
+
+        # the vehicle is drawn with the color of its speed, to the right of
+        # its position since it points to the west
+        px, py = rasterizer.to_pixels(0, 36.6)
+        color = lookup_colors(HUMAN_LUT, [0.5])[0]
+        np.testing.assert_array_equal(frame[int(py), int(px) + 4], color)
+        self.assertTrue((frame == color).all(axis=2).sum() > 0)
+
+        # the lanes are drawn once, and vehicles onto a copy of them
+        frame = rasterizer.draw([], [], [], [])
+        np.testing.assert_array_equal(frame, rasterizer.background)
+
+        gray = Rasterizer(ring_network(), "gray").draw([], [], [], [])
+        self.assertEqual(gray.ndim, 2)
+
+
+class TestReplay(unittest.TestCase):
+    """Tests the replay renderer in flow/renderer/replay.py"""
+
+    def setUp(self):
+        self.record_path = tempfile.mkdtemp()
+
+        vehicles = VehicleParams()
+        vehicles.add("human",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=5)
+        vehicles.add("rl",
+                     acceleration_controller=(RLController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=1)
+        scenario = LoopScenario(
+            "replay_loop", vehicles,
+            NetParams(additional_params=ADDITIONAL_NET_PARAMS.copy()),
+            InitialConfig())
+        self.env = AccelEnv(
+            EnvParams(additional_params=ADDITIONAL_ENV_PARAMS),
+            SumoParams(sim_step=0.1, record_path=self.record_path,
+                       record_chunk_size=10),
+            scenario, simulator="ring")
+
+    def tearDown(self):
+        self.env.terminate()
+        shutil.rmtree(self.record_path)
+
+    def test_replay(self):
+        """Tests replaying a recording of the kernel into a video."""
+        k = self.env.k
+        self.env.reset()
+        angles = []
+        for _ in range(20):
+            self.env.step(np.array([1]))
+            angles.append(k.vehicle.get_orientation("rl_0")[2])
+        k.recorder.close()
+
+        snapshots = list(iter_trajectory_snapshots(k.recorder.path))
+        self.assertEqual(len(snapshots), 21)
+        for snapshot in snapshots:
+            self.assertEqual(len(snapshot[0]), 5)
+            self.assertEqual(len(snapshot[1]), 1)
+        self.assertTrue(all(0 <= d <= 1 for s in snapshots for d in s[2]))
+
+        # angles are computed from the displacements of the vehicles
+        for snapshot, angle in zip(snapshots[1:-1], angles):
+            diff = (snapshot[1][0][2] - angle + 180) % 360 - 180
+            self.assertAlmostEqual(diff, 0, delta=1)
+
+        # frames drawn by the workers match those drawn in the process
+        network = ring_network()
+        _init_worker(network, "drgb", 50, False, 2)
+        rasterizer = Rasterizer(network, "drgb")
+        np.testing.assert_array_equal(_draw_frame(*snapshots[3]),
+                                      rasterizer.draw(*snapshots[3]))
+
+        output_path = os.path.join(self.record_path, "replay.mp4")
+        num_frames = render_video(network, iter(snapshots), output_path,
+                                  num_workers=2, encoder="opencv")
+        self.assertEqual(num_frames, 21)
+        video = cv2.VideoCapture(output_path)
+        self.assertEqual(int(video.get(cv2.CAP_PROP_FRAME_COUNT)), 21)
+        self.assertEqual(int(video.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                         rasterizer.width)
+        video.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
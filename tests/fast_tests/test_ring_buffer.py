@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from flow.renderer.ring_buffer import ArrayRingBuffer
+
+
+class TestArrayRingBuffer(unittest.TestCase):
+    """Tests the ring buffer in flow/renderer/ring_buffer.py"""
+
+    def test_append(self):
+        buffer = ArrayRingBuffer(3)
+        self.assertEqual(len(buffer), 0)
+        self.assertRaises(IndexError, buffer.__getitem__, 0)
+
+        for i in range(5):
+            buffer.append(np.full(2, i))
+        self.assertEqual(len(buffer), 3)
+        np.testing.assert_array_equal(np.stack(list(buffer)),
+                                      [[2, 2], [3, 3], [4, 4]])
+        np.testing.assert_array_equal(buffer[-1], [4, 4])
+        np.testing.assert_array_equal(buffer[0], [2, 2])
+
+        # arrays are copied into the slots, which are reused
+        value = np.zeros(2, dtype=int)
+        slot = buffer[0]
+        buffer.append(value)
+        value[:] = 7
+        self.assertIs(buffer[-1], slot)
+        np.testing.assert_array_equal(buffer[-1], [0, 0])
+
+        # slots are reallocated if the shape of the arrays changes
+        buffer.append(np.ones(4))
+        np.testing.assert_array_equal(buffer[-1], np.ones(4))
+
+    def test_fill(self):
+        buffer = ArrayRingBuffer(4)
+        buffer.append(np.ones(2))
+        buffer.fill(np.zeros((2, 2)))
+        self.assertEqual(len(buffer), 4)
+        for value in buffer:
+            np.testing.assert_array_equal(value, np.zeros((2, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
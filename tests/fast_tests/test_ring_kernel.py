@@ -0,0 +1,211 @@
+import unittest
+
+import numpy as np
+
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.kernel.simulation.ring import RingSimulator, KRAUSS, IDM
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.envs.loop.loop_accel import AccelEnv, ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+
+def car_following_params(model=KRAUSS, **kwargs):
+    params = {"length": 5, "accel": 1, "decel": 1.5, "tau": 1, "min_gap": 2.5,
+              "max_speed": 30, "sigma": 0, "model": model, "speed_mode": 31}
+    params.update(kwargs)
+    return params
+
+
+class TestRingSimulator(unittest.TestCase):
+    """Tests the vectorized simulator in flow/core/kernel/simulation/ring.py"""
+
+    def setUp(self):
+        self.sim = RingSimulator([100, 50], sim_step=0.1, seed=0, capacity=2)
+
+    def test_insertion(self):
+        """Tests that vehicles are inserted at the end of the next step."""
+        self.sim.add("a", 0, 10, 0, car_following_params())
+        self.assertEqual(self.sim.ids, [])
+
+        self.sim.step()
+        self.assertEqual(self.sim.ids, ["a"])
+        self.assertEqual(self.sim.departed_ids, ["a"])
+
+        self.sim.step()
+        self.assertEqual(self.sim.departed_ids, [])
+
+    def test_leaders(self):
+        """Tests that leaders wrap around rings and do not cross them."""
+        for veh_id, ring, pos in [("a", 0, 10), ("b", 0, 60), ("c", 0, 90),
+                                  ("d", 1, 20)]:
+            self.sim.add(veh_id, ring, pos, 0, car_following_params())
+        self.sim.step()
+
+        i = self.sim.index
+        self.assertEqual(self.sim.leader[i["a"]], i["b"])
+        self.assertEqual(self.sim.leader[i["c"]], i["a"])
+        self.assertEqual(self.sim.follower[i["a"]], i["c"])
+        self.assertEqual(self.sim.leader[i["d"]], -1)
+        # gaps are measured from the front bumper of the follower to the rear
+        # bumper of the leader
+        self.assertAlmostEqual(self.sim.gap[i["c"]], 15)
+        self.assertAlmostEqual(self.sim.gap[i["a"]], 45)
+
+        self.sim.remove("b")
+        i = self.sim.index
+        self.assertEqual(self.sim.ids, ["a", "d", "c"])
+        self.assertEqual(self.sim.leader[i["a"]], i["c"])
+        self.assertAlmostEqual(self.sim.gap[i["a"]], 75)
+
+    def test_partial_step(self):
+        """Tests that only the requested rings are advanced."""
+        self.sim.add("a", 0, 10, 5, car_following_params())
+        self.sim.add("b", 1, 10, 5, car_following_params())
+        self.sim.step()
+        self.sim.step(10, rings=[1])
+        self.assertAlmostEqual(self.sim.ring_pos[self.sim.index["a"]], 10)
+        self.assertGreater(self.sim.ring_pos[self.sim.index["b"]], 10)
+
+        # vehicles can be removed from several rings at once
+        self.sim.remove(["a", "b"])
+        self.assertEqual(self.sim.num_vehicles, 0)
+        self.assertEqual(self.sim.index, {})
+
+    def test_dynamics(self):
+        """Tests that vehicles accelerate, follow, and obey commands."""
+        for model in [KRAUSS, IDM]:
+            sim = RingSimulator([100], sim_step=0.1)
+            sim.add("a", 0, 0, 0, car_following_params(model))
+            sim.add("b", 0, 50, 0, car_following_params(model))
+            sim.step(300)
+
+            # vehicles never collide and converge to the same speed
+            self.assertEqual(sim.collided_ids, [])
+            self.assertTrue(np.all(sim.gap[:2] > 0))
+            self.assertAlmostEqual(sim.speed[0], sim.speed[1], places=3)
+
+        # commanded speeds are bounded by the maximum acceleration
+        speed = sim.speed[sim.index["a"]]
+        sim.set_speed("a", speed + 10)
+        sim.step()
+        self.assertAlmostEqual(sim.speed[sim.index["a"]], speed + 0.1)
+
+
+class TestRingKernel(unittest.TestCase):
+    """Tests that environments can run on the ring simulator kernel."""
+
+    def setUp(self):
+        vehicles = VehicleParams()
+        vehicles.add("human",
+                     acceleration_controller=(IDMController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=5)
+        vehicles.add("rl",
+                     acceleration_controller=(RLController, {}),
+                     routing_controller=(ContinuousRouter, {}),
+                     num_vehicles=1)
+        scenario = LoopScenario(
+            "loop", vehicles,
+            NetParams(additional_params=ADDITIONAL_NET_PARAMS.copy()),
+            InitialConfig())
+        self.env = AccelEnv(
+            EnvParams(additional_params=ADDITIONAL_ENV_PARAMS),
+            SumoParams(sim_step=0.1), scenario, simulator="ring")
+
+    def tearDown(self):
+        self.env.terminate()
+
+    def test_state(self):
+        """Tests that the kernel state is consistent with the simulator."""
+        self.env.reset()
+        k = self.env.k
+        self.assertEqual(sorted(k.vehicle.get_ids()),
+                         sorted(self.env.initial_ids))
+        self.assertEqual(k.vehicle.get_rl_ids(), ["rl_0"])
+
+        for _ in range(10):
+            self.env.step(np.array([1]))
+
+        for veh_id in k.vehicle.get_ids():
+            edge = k.vehicle.get_edge(veh_id)
+            pos = k.vehicle.get_position(veh_id)
+            self.assertIn(edge, k.scenario.get_edge_list())
+            self.assertTrue(0 <= pos <= k.scenario.edge_length(edge))
+            self.assertAlmostEqual(
+                k.vehicle.get_x_by_id(veh_id), k.scenario.get_x(edge, pos))
+
+        # the leader of each vehicle's follower is the vehicle itself
+        for veh_id in k.vehicle.get_ids():
+            follower = k.vehicle.get_follower(veh_id)
+            self.assertEqual(k.vehicle.get_leader(follower), veh_id)
+
+        # no vehicle collided or waits to be inserted
+        self.assertFalse(k.simulation.check_collision())
+        self.assertEqual(k.simulation.get_collision_ids(), [])
+        self.assertEqual(k.simulation.get_insertion_backlog(), 0)
+
+        # the rl vehicle accelerates as requested
+        speed = k.vehicle.get_speed("rl_0")
+        self.env.step(np.array([1]))
+        self.assertAlmostEqual(k.vehicle.get_speed("rl_0"), speed + 0.1)
+
+    def test_reset(self):
+        """Tests that resets place the initial vehicles back in the network."""
+        self.env.reset()
+        for _ in range(10):
+            self.env.step(np.array([1]))
+        self.env.reset()
+        self.assertEqual(sorted(self.env.k.vehicle.get_ids()),
+                         sorted(self.env.initial_ids))
+        self.assertEqual(self.env.k.vehicle.get_speed("rl_0"), 0)
+
+    def test_set_speed(self):
+        """Tests that test_set_speed overrides the speed of a vehicle."""
+        self.env.reset()
+        k = self.env.k
+        mean_speed = np.mean(k.metrics.speeds)
+        k.vehicle.test_set_speed("human_0", 5)
+        self.assertEqual(k.vehicle.get_speed("human_0"), 5)
+        self.assertAlmostEqual(np.mean(k.metrics.speeds), mean_speed + 5 / 6)
+
+    def test_shared_vehicle_params(self):
+        """Tests that environments sharing VehicleParams do not interfere."""
+        other = AccelEnv(
+            EnvParams(additional_params=ADDITIONAL_ENV_PARAMS),
+            SumoParams(sim_step=0.1), self.env.scenario, simulator="ring")
+        try:
+            params = self.env.k.vehicle.type_parameters["human"]
+            params["acceleration_controller"][1]["v0"] = 5
+            params["car_following_params"].controller_params["minGap"] = 10
+
+            for vehicles in [other.k.vehicle, self.env.scenario.vehicles]:
+                type_params = vehicles.type_parameters["human"]
+                self.assertEqual(type_params["acceleration_controller"][1], {})
+                self.assertNotEqual(type_params["car_following_params"]
+                                    .controller_params["minGap"], 10)
+        finally:
+            other.terminate()
+
+    def test_history(self):
+        """Tests the rolling histories of the vehicle kernel."""
+        self.env.reset()
+        k = self.env.k
+        history = k.vehicle.get_history("rl_0", 5)
+        self.assertIs(k.vehicle.get_history("rl_0", 5), history)
+
+        speeds = [k.vehicle.get_speed("rl_0")]
+        for _ in range(10):
+            self.env.step(np.array([1]))
+            speeds.append(k.vehicle.get_speed("rl_0"))
+        np.testing.assert_array_almost_equal(history.values(), speeds[-5:])
+        self.assertAlmostEqual(history.mean, np.mean(speeds[-5:]))
+
+        # histories are discarded upon reset
+        self.env.reset()
+        self.assertIsNot(k.vehicle.get_history("rl_0", 5), history)
+        self.assertEqual(len(k.vehicle.get_history("rl_0", 5)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+
+import numpy as np
+
+from flow.controllers import IDMController, RLController, ContinuousRouter, \
+    SimCarFollowingController, OVMController
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.envs.loop.wave_attenuation import ADDITIONAL_ENV_PARAMS
+from flow.envs.ring_vec_env import RingVecEnv
+from flow.scenarios.loop import ADDITIONAL_NET_PARAMS
+from flow.utils.registry import make_create_env
+
+
+def get_flow_params(num_human, ring_length, controller=IDMController):
+    vehicles = VehicleParams()
+    vehicles.add("human",
+                 acceleration_controller=(controller, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=num_human)
+    vehicles.add("rl",
+                 acceleration_controller=(RLController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=1)
+
+    additional_env_params = ADDITIONAL_ENV_PARAMS.copy()
+    additional_env_params["ring_length"] = ring_length
+
+    return dict(
+        exp_tag="batch_ring",
+        env_name="WaveAttenuationPOEnv",
+        scenario="LoopScenario",
+        simulator="ring",
+        sim=SumoParams(sim_step=0.1),
+        env=EnvParams(horizon=20, warmup_steps=10,
+                      additional_params=additional_env_params),
+        net=NetParams(additional_params=ADDITIONAL_NET_PARAMS.copy()),
+        veh=vehicles,
+        initial=InitialConfig(),
+    )
+
+
+class TestRingVecEnv(unittest.TestCase):
+    """Tests the batched ring environment in flow/envs/ring_vec_env.py"""
+
+    def test_reset_and_step(self):
+        """Tests the shapes of the outputs of reset and step."""
+        env = RingVecEnv(get_flow_params(5, [100, 150]), num_envs=4, seed=0)
+        obs = env.reset()
+        self.assertEqual(obs.shape, (4, 3))
+        self.assertTrue(np.all(100 <= env.sim.ring_lengths))
+        self.assertTrue(np.all(env.sim.ring_lengths <= 150))
+        self.assertEqual(env.sim.num_vehicles, 24)
+
+        obs, rewards, dones, infos = env.step(np.zeros((4, 1)))
+        self.assertEqual(obs.shape, (4, 3))
+        self.assertEqual(rewards.shape, (4,))
+        self.assertFalse(any(dones))
+        self.assertEqual(len(infos), 4)
+
+    def test_heterogeneous(self):
+        """Tests that sub-environments may have different vehicles."""
+        env = RingVecEnv([get_flow_params(5, [100, 100]),
+                          get_flow_params(10, [200, 200])], num_envs=2)
+        env.reset()
+        counts = np.bincount(env.sim.ring[:env.sim.num_vehicles])
+        np.testing.assert_array_equal(counts, [6, 11])
+        np.testing.assert_array_equal(env.sim.ring_lengths, [100, 200])
+
+    def test_auto_reset(self):
+        """Tests that sub-environments are reset once the horizon is met."""
+        env = RingVecEnv(get_flow_params(5, [100, 150]), num_envs=2, seed=0)
+        env.reset()
+        for _ in range(19):
+            _, _, dones, _ = env.step(np.ones((2, 1)))
+            self.assertFalse(any(dones))
+        obs, _, dones, infos = env.step(np.ones((2, 1)))
+        self.assertTrue(all(dones))
+        self.assertIn("terminal_observation", infos[0])
+        self.assertEqual(env.sim.num_vehicles, 12)
+
+    def test_seeding(self):
+        """Tests that sub-environments with the same seed are identical."""
+        obs = []
+        for _ in range(2):
+            env = RingVecEnv(get_flow_params(5, [100, 150]), num_envs=2,
+                             seed=1)
+            env.reset()
+            obs.append(env.step(np.ones((2, 1)))[0])
+        np.testing.assert_array_almost_equal(obs[0], obs[1])
+
+    def test_matches_env(self):
+        """Tests that sub-environments behave like WaveAttenuationPOEnv."""
+        flow_params = get_flow_params(5, [120, 120])
+        create_env, _ = make_create_env(flow_params)
+        env = create_env()
+        vec_env = RingVecEnv(flow_params, num_envs=1)
+        try:
+            np.testing.assert_array_almost_equal(
+                vec_env.reset()[0], env.reset())
+            for action in [0.5, -0.3, 1, 0]:
+                obs, reward, _, _ = env.step(np.array([action]))
+                vec_obs, vec_rewards, _, _ = vec_env.step([[action]])
+                np.testing.assert_array_almost_equal(vec_obs[0], obs)
+                self.assertAlmostEqual(vec_rewards[0], reward)
+        finally:
+            env.terminate()
+
+    def test_crash(self):
+        """Tests that only the sub-environments that crashed are stopped."""
+        flow_params = get_flow_params(5, [100, 150])
+        flow_params["env"].sims_per_step = 5
+        obs = []
+        for crash in [False, True]:
+            env = RingVecEnv(flow_params, num_envs=2, seed=0)
+            env.reset()
+            if crash:
+                # force a collision on the first ring in the next step
+                env.sim.gap[env._rl_index[0]] = -1
+            obs_i, rewards, dones, _ = env.step(np.zeros((2, 1)))
+            obs.append(obs_i)
+
+        np.testing.assert_array_equal(dones, [True, False])
+        self.assertEqual(rewards[0], 0)
+        # the second sub-environment is simulated for all of its steps
+        np.testing.assert_array_almost_equal(obs[0][1], obs[1][1])
+
+    def test_unsupported_controller(self):
+        """Tests that controllers without a built-in model are rejected."""
+        self.assertRaises(ValueError, RingVecEnv,
+                          get_flow_params(5, [100, 150], OVMController), 2)
+        # vehicles controlled by the simulator are supported
+        RingVecEnv(get_flow_params(5, [100, 150], SimCarFollowingController),
+                   2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+
+import numpy as np
+import traci.constants as tc
+
+from flow.benchmarks.perf.fake_api import record_trace
+from flow.benchmarks.perf.kernel_benchmark import make_env, replay_kernel
+
+
+class TestTraCISimulation(unittest.TestCase):
+    """Tests the state of the simulation cached by the TraCI kernel."""
+
+    def setUp(self):
+        self.env = make_env(10)
+        self.rl_actions = np.ones(self.env.action_space.shape)
+        self.trace = record_trace(self.env, 5, self.rl_actions)
+
+    def tearDown(self):
+        self.env.terminate()
+
+    def replay(self):
+        """Replace the kernel of the environment by a replaying kernel."""
+        return replay_kernel(self.env, self.trace)
+
+    def test_subscription(self):
+        k = self.replay()
+        variables = [tc.VAR_COLLIDING_VEHICLES_IDS,
+                     tc.VAR_LOADED_VEHICLES_NUMBER,
+                     tc.VAR_MIN_EXPECTED_VEHICLES]
+        for var in variables:
+            self.assertIn(var, self.trace["steps"][0][1])
+        self.assertEqual(k.kernel_api.calls["simulation.subscribe"], 1)
+
+    def test_check_collision(self):
+        # a vehicle starts to be teleported in the third step, and two
+        # vehicles collide in the fifth one
+        self.trace["steps"][3][1][
+            tc.VAR_TELEPORT_STARTING_VEHICLES_IDS] = ("human_0",)
+        self.trace["steps"][5][1][
+            tc.VAR_COLLIDING_VEHICLES_IDS] = ("human_1", "human_2")
+        k = self.replay()
+
+        collisions = []
+        for _ in range(5):
+            self.env.step(self.rl_actions)
+            collisions.append((k.simulation.check_collision(),
+                               k.simulation.get_collision_ids()))
+        self.assertEqual(collisions, [
+            (False, []), (False, []), (True, []), (False, []),
+            (True, ["human_1", "human_2"])])
+
+        # the collisions are read from the subscription
+        self.assertNotIn("simulation.getStartingTeleportNumber",
+                         k.kernel_api.calls)
+
+    def test_insertion_backlog(self):
+        k = self.replay()
+        self.assertEqual(k.simulation.get_insertion_backlog(), 0)
+
+        # two vehicles wait to be inserted
+        for step in self.trace["steps"]:
+            step[1][tc.VAR_MIN_EXPECTED_VEHICLES] = len(step[0]) + 2
+        self.env.step(self.rl_actions)
+        self.assertEqual(k.simulation.get_insertion_backlog(), 2)
+
+    def test_cached_time(self):
+        k = self.replay()
+        steps, times = [], []
+        k.kernel_api.simulationStep = lambda step=0.: steps.append(step)
+        k.kernel_api.simulation.getTime = lambda: times.append(1.) or 1.
+
+        # the time of the last update is used to skip steps
+        k.simulation.simulation_step(3)
+        self.assertAlmostEqual(steps[-1], 0.3)
+        self.assertEqual(times, [])
+
+        # the time is read from sumo if the simulation was stepped since
+        k.simulation.simulation_step(3)
+        self.assertAlmostEqual(steps[-1], 1.3)
+        self.assertEqual(times, [1.])
+
+    def test_vehicle_update(self):
+        # a vehicle exits the network in the second step
+        self.trace["steps"][2][1][tc.VAR_ARRIVED_VEHICLES_IDS] = ("human_0",)
+        for step in self.trace["steps"][2:]:
+            del step[0]["human_0"]
+        k = self.replay()
+        reads = []
+        results = k.kernel_api.simulation.getSubscriptionResults
+        k.kernel_api.simulation.getSubscriptionResults = \
+            lambda: reads.append(1) or results()
+
+        for _ in range(2):
+            self.env.step(self.rl_actions)
+        self.assertNotIn("human_0", k.vehicle.get_ids())
+        self.assertEqual(k.vehicle.get_num_arrived(), 1)
+
+        # the vehicle kernel reads the state cached by the simulation kernel
+        self.assertEqual(len(reads), 2)
+
+    def test_missing_variables(self):
+        # traces recorded before the variables were subscribed to
+        for step in self.trace["steps"]:
+            for var in [tc.VAR_COLLIDING_VEHICLES_IDS,
+                        tc.VAR_LOADED_VEHICLES_NUMBER,
+                        tc.VAR_MIN_EXPECTED_VEHICLES]:
+                del step[1][var]
+        k = self.replay()
+        self.env.step(self.rl_actions)
+        self.assertFalse(k.simulation.check_collision())
+        self.assertEqual(k.simulation.get_collision_ids(), [])
+        self.assertEqual(k.simulation.get_insertion_backlog(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
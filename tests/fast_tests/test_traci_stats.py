@@ -0,0 +1,176 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from flow.benchmarks.perf.fake_api import FakeKernelAPI, record_trace
+from flow.benchmarks.perf.kernel_benchmark import make_env
+from flow.core.kernel import Kernel
+from flow.core.kernel.scenario import RingScenario
+from flow.core.kernel.simulation import TraCISimulation
+from flow.core.kernel.traci_stats import TraCIStats
+from flow.core.kernel.traci_trace import TraCIRecorder
+from flow.core.params import SumoParams
+
+
+class FakeSocket(object):
+    """Socket answering every message with a 12-byte message."""
+
+    def send(self, data):
+        return len(data)
+
+    def recv(self, size):
+        return b"x" * min(size, 12)
+
+    def close(self):
+        pass
+
+
+class FakeVehicleDomain(object):
+    """Vehicle domain sending every command through the socket."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def getSpeed(self, veh_id):
+        self._connection.round_trip(8)
+        return 0.
+
+    def slowDown(self, veh_id, speed, duration):
+        self._connection.round_trip(16)
+
+    def getSubscriptionResults(self):
+        return {}
+
+
+class FakeConnection(object):
+    """Connection communicating with a fake socket, like traci."""
+
+    def __init__(self):
+        self._socket = FakeSocket()
+        self.vehicle = FakeVehicleDomain(self)
+
+    def round_trip(self, size):
+        self._socket.send(b"x" * size)
+        self._socket.recv(4)
+        self._socket.recv(100)
+
+    def simulationStep(self, step=0.):
+        self.round_trip(4)
+
+    def close(self):
+        self._socket.close()
+
+
+class TestTraCIStats(unittest.TestCase):
+    """Tests the accounting of the calls to a TraCI connection."""
+
+    def test_counts(self):
+        stats = TraCIStats(FakeConnection(), window=2)
+        self.assertTrue(stats.measures_bytes)
+        self.assertIsNone(stats.step_stats())
+
+        for step in range(3):
+            for veh_id in ["a", "b"]:
+                stats.vehicle.getSpeed(veh_id)
+            if step == 2:
+                stats.vehicle.slowDown("a", 0., 1.)
+            stats.vehicle.getSubscriptionResults()
+            stats.simulationStep()
+
+        # subscription results are not sent to sumo
+        self.assertEqual(stats.step_stats(), {
+            "calls": 5,
+            "round_trips": 4,
+            "bytes_sent": 8 * 2 + 16 + 4,
+            "bytes_received": 4 * 16,
+            "commands": {"vehicle.getSpeed": 2,
+                         "vehicle.slowDown": 1,
+                         "vehicle.getSubscriptionResults": 1,
+                         "simulationStep": 1},
+        })
+        self.assertEqual(stats.num_steps, 3)
+        self.assertEqual(stats.totals["vehicle.getSpeed"], 6)
+
+        # rolling statistics of the last two steps
+        summary = stats.summary()
+        self.assertEqual(summary["num_steps"], 2)
+        self.assertEqual(summary["calls"], 4.5)
+        self.assertEqual(summary["calls_max"], 5)
+        self.assertEqual(summary["round_trips"], 3.5)
+        self.assertEqual(summary["commands"]["vehicle.slowDown"], 0.5)
+        self.assertEqual(summary["domains"], {"vehicle": 3.5,
+                                              "connection": 1.})
+
+    def test_per_vehicle_calls(self):
+        stats = TraCIStats(FakeConnection(), per_vehicle_threshold=3)
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            for num_vehicles in [2, 4, 5]:
+                for i in range(num_vehicles):
+                    stats.vehicle.getSpeed("veh_{}".format(i))
+                    # commands other than getters are not reported
+                    stats.vehicle.slowDown("veh_{}".format(i), 0., 1.)
+                stats.simulationStep()
+
+        # the pattern is reported once per getter
+        self.assertEqual(len(w), 1)
+        self.assertIn("vehicle.getSpeed was called for 4 different objects",
+                      str(w[0].message))
+        self.assertEqual(stats.per_vehicle_commands, {"vehicle.getSpeed": 5})
+
+    def test_recorder(self):
+        # the bytes of a connection wrapped by another proxy are counted
+        path = tempfile.mkdtemp()
+        try:
+            stats = TraCIStats(TraCIRecorder(FakeConnection(),
+                                             os.path.join(path, "trace")))
+            stats.vehicle.getSpeed("a")
+            stats.simulationStep()
+            stats.close()
+        finally:
+            shutil.rmtree(path)
+        self.assertEqual(stats.step_stats()["round_trips"], 2)
+        self.assertEqual(stats.step_stats()["bytes_sent"], 12)
+
+    def test_kernel(self):
+        self.assertIsInstance(
+            TraCISimulation._count_calls(
+                FakeConnection(), SumoParams(traci_stats=True)),
+            TraCIStats)
+        self.assertIsInstance(
+            TraCISimulation._count_calls(FakeConnection(), SumoParams()),
+            FakeConnection)
+
+        # the statistics are available from the kernel of an environment
+        env = make_env(10)
+        rl_actions = np.ones(env.action_space.shape)
+        trace = record_trace(env, 5, rl_actions)
+        k = Kernel(simulator="traci", sim_params=env.sim_params)
+        k.scenario = RingScenario(k)
+        k.scenario.generate_network(env.scenario)
+        k.vehicle.initialize(env.scenario.vehicles)
+        k.simulation.sim_step = env.sim_step
+        self.assertIsNone(k.traci_stats)
+        k.pass_api(TraCIStats(FakeKernelAPI(trace)))
+        k.update(reset=True)
+        env.k.close()
+        env.k = k
+
+        for _ in range(5):
+            env.step(rl_actions)
+        env.terminate()
+
+        self.assertFalse(k.traci_stats.measures_bytes)
+        summary = k.traci_stats.summary()
+        self.assertEqual(summary["num_steps"], 5)
+        self.assertEqual(
+            summary["commands"]["vehicle.getSubscriptionResults"], 1)
+        self.assertEqual(summary["commands"]["simulationStep"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
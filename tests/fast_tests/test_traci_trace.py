@@ -0,0 +1,207 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import traci.constants as tc
+from traci.exceptions import TraCIException
+
+from flow.benchmarks.perf.fake_api import FakeKernelAPI, record_trace
+from flow.benchmarks.perf.kernel_benchmark import make_env
+from flow.core.kernel import Kernel
+from flow.core.kernel.scenario import RingScenario
+from flow.core.kernel.simulation import TraCISimulation
+from flow.core.kernel.traci_trace import TraCIRecorder, TraCIReplay, \
+    TraCITraceReader, TraceMismatchError
+from flow.core.params import SumoParams
+
+
+class FailingVehicleDomain(object):
+    """Vehicle domain whose commands raise an error."""
+
+    def getSpeed(self, veh_id):
+        raise TraCIException("Vehicle '{}' is not known".format(veh_id))
+
+
+class FailingAPI(object):
+    """Connection whose commands raise an error."""
+
+    vehicle = FailingVehicleDomain()
+
+    def close(self):
+        pass
+
+
+def run_env(make_api, num_steps=5):
+    """Step a ring environment whose kernel is driven by a TraCI connection.
+
+    Returns the observations and rewards of the environment.
+    """
+    env = make_env(10)
+    rl_actions = np.ones(env.action_space.shape)
+    api = make_api(env, rl_actions)
+
+    k = Kernel(simulator="traci", sim_params=env.sim_params)
+    k.scenario = RingScenario(k)
+    k.scenario.generate_network(env.scenario)
+    k.vehicle.initialize(env.scenario.vehicles)
+    k.simulation.sim_step = env.sim_step
+    k.pass_api(api)
+    k.update(reset=True)
+    env.k.close()
+    env.k = k
+
+    results = []
+    for _ in range(num_steps):
+        obs, reward, _, _ = env.step(rl_actions)
+        results.append((obs, reward))
+    env.terminate()
+    return results
+
+
+class TestTraCITrace(unittest.TestCase):
+    """Tests flow/core/kernel/traci_trace.py"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.trace_path = os.path.join(self.path, "run.trace")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_record_replay_env(self):
+        """Tests replaying the steps of an environment."""
+        def record(env, rl_actions):
+            trace = record_trace(env, 10, rl_actions)
+            return TraCIRecorder(FakeKernelAPI(trace), self.trace_path)
+
+        recorded = run_env(record)
+        reader = TraCITraceReader(self.trace_path)
+        replayed = run_env(lambda env, rl_actions: TraCIReplay(reader))
+        self.assertGreater(reader.num_calls, 100)
+
+        for (obs, reward), (expected_obs, expected_reward) in zip(
+                replayed, recorded):
+            np.testing.assert_array_equal(obs, expected_obs)
+            self.assertEqual(reward, expected_reward)
+
+        # the trace ended
+        self.assertRaises(StopIteration, next, reader)
+
+    def test_errors(self):
+        recorder = TraCIRecorder(FailingAPI(), self.trace_path)
+        self.assertRaises(TraCIException, recorder.vehicle.getSpeed, "veh_0")
+        recorder.close()
+        self.assertEqual(recorder.num_calls, 2)
+        self.assertEqual(recorder.num_bytes,
+                         os.path.getsize(self.trace_path))
+
+        # errors are raised again
+        replay = TraCIReplay(TraCITraceReader(self.trace_path))
+        self.assertRaises(TraCIException, replay.vehicle.getSpeed, "veh_0")
+        replay.close()
+        replay.close()
+        self.assertRaises(TraceMismatchError, replay.simulationStep)
+
+        # calls that do not match the trace
+        replay = TraCIReplay(TraCITraceReader(self.trace_path))
+        self.assertRaises(TraceMismatchError, replay.vehicle.getSpeed,
+                          "veh_1")
+        replay = TraCIReplay(TraCITraceReader(self.trace_path),
+                             check_args=False)
+        self.assertRaises(TraCIException, replay.vehicle.getSpeed, "veh_1")
+        self.assertRaises(TraceMismatchError, replay.simulationStep)
+
+        with open(self.trace_path, "wb") as f:
+            f.write(b"<xml>")
+        self.assertRaises(ValueError, TraCITraceReader, self.trace_path)
+
+    def test_restart(self):
+        """Tests replaying successive simulations through the kernel."""
+        trace = {"steps": [({"veh_0": {}}, {})] * 3, "types": {},
+                 "lengths": {}, "max_speed": 30}
+        for append in [False, True]:
+            recorder = TraCIRecorder(FakeKernelAPI(trace), self.trace_path,
+                                     append=append)
+            recorder.setOrder(0)
+            recorder.simulationStep()
+            self.assertEqual(recorder.vehicle.getIDList(), ["veh_0"])
+            recorder.vehicle.slowDown("veh_0", np.float64(3), 1)
+            recorder.close()
+
+        simulation = TraCISimulation(None)
+        sim_params = SumoParams(traci_replay_path=self.trace_path)
+        for _ in range(2):
+            replay = simulation.start_simulation(None, sim_params)
+            self.assertEqual(replay.vehicle.getIDList(), ["veh_0"])
+            replay.vehicle.slowDown("veh_0", 3.0, 1)
+            replay.close()
+        self.assertRaises(TraceMismatchError, simulation.start_simulation,
+                          None, sim_params)
+
+    def test_restart_env(self):
+        """Tests replaying an environment restarting sumo at every reset."""
+        env = make_env(10)
+        rl_actions = np.ones(env.action_space.shape)
+        trace = record_trace(env, 10, rl_actions)
+        env.terminate()
+
+        # the network of a new sumo instance is empty (before and after the
+        # first step), and the vehicles added by the reset depart in the next
+        # step
+        sim_obs = dict(trace["steps"][0][1])
+        sim_obs.update({tc.VAR_DEPARTED_VEHICLES_IDS: (),
+                        tc.VAR_LOADED_VEHICLES_NUMBER: 0,
+                        tc.VAR_MIN_EXPECTED_VEHICLES: 0})
+        trace["steps"][:0] = [({}, sim_obs)] * 2
+
+        def record(scenario, sim_params):
+            api = TraCIRecorder(FakeKernelAPI(trace), self.trace_path,
+                                append=os.path.exists(self.trace_path))
+            api.setOrder(0)
+            api.simulationStep()
+            return api
+
+        def run(sim_params, start_simulation=None):
+            # the initial positions of the vehicles are shuffled
+            random.seed(0)
+            np.random.seed(0)
+            env = make_env(10)
+            env.sim_params = sim_params
+            k = Kernel(simulator="traci", sim_params=sim_params)
+            k.scenario = RingScenario(k)
+            k.scenario.generate_network(env.scenario)
+            k.vehicle.initialize(env.scenario.vehicles)
+            if start_simulation is not None:
+                k.simulation.start_simulation = start_simulation
+            k.pass_api(k.simulation.start_simulation(k.scenario, sim_params))
+            k.update(reset=True)
+            env.k.close()
+            env.k = k
+            env.simulator = "traci"
+
+            results = []
+            for _ in range(2):
+                results.append((env.reset(), 0))
+                for _ in range(3):
+                    obs, reward, _, _ = env.step(rl_actions)
+                    results.append((obs, reward))
+            env.terminate()
+            return results
+
+        recorded = run(SumoParams(sim_step=0.1, restart_instance=True),
+                       start_simulation=record)
+        replayed = run(SumoParams(sim_step=0.1, restart_instance=True,
+                                  traci_replay_path=self.trace_path))
+
+        self.assertEqual(len(replayed), len(recorded))
+        for (obs, reward), (expected_obs, expected_reward) in zip(
+                replayed, recorded):
+            np.testing.assert_array_equal(obs, expected_obs)
+            self.assertEqual(reward, expected_reward)
+
+
+if __name__ == '__main__':
+    unittest.main()
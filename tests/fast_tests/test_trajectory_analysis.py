@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from flow.core.kernel.recorder import TRAJECTORY_COLUMNS
+from flow.visualize import trajectory_analysis as ta
+
+EDGES = [("a", 100.), ("b", 100.)]
+
+
+def constant_speed_chunks(num_vehicles=4, speed=10., headway=2.,
+                          sim_step=0.5, chunk_size=7):
+    """Return chunks of vehicles departing every headway seconds at the start
+    of edge "a", and traveling at a constant speed over edges "a" and "b".
+    """
+    rows = {name: [] for name in
+            ["time", "vehicle", "edge", "lane", "position", "speed"]}
+    for t in np.arange(0, 40, sim_step):
+        for i in range(num_vehicles):
+            x = speed * (t - i * headway)
+            if 0 <= x < 200:
+                rows["time"].append(t)
+                rows["vehicle"].append(i)
+                rows["edge"].append("a" if x < 100 else "b")
+                rows["lane"].append(i % 2)
+                rows["position"].append(x % 100)
+                rows["speed"].append(speed)
+    rows = {name: np.array(values) for name, values in rows.items()}
+    num_rows = len(rows["time"])
+    return [{name: values[i:i + chunk_size] for name, values in rows.items()}
+            for i in range(0, num_rows, chunk_size)]
+
+
+class TestTrajectoryAnalysis(unittest.TestCase):
+    """Tests the analyses in flow/visualize/trajectory_analysis.py"""
+
+    def test_time_space_diagram(self):
+        diagram = ta.time_space_diagram(constant_speed_chunks(), EDGES,
+                                        dt=5, dx=50)
+        np.testing.assert_array_almost_equal(diagram["space_edges"],
+                                             [0, 50, 100, 150, 200])
+        self.assertEqual(diagram["speed"].shape, (len(diagram["time_edges"])
+                                                  - 1, 4))
+        occupied = diagram["count"] > 0
+        np.testing.assert_array_almost_equal(diagram["speed"][occupied], 10)
+        self.assertTrue(np.all(np.isnan(diagram["speed"][~occupied])))
+        # every vehicle is sampled 40 times, i.e. every 0.5 s over 200 m
+        self.assertEqual(diagram["count"].sum(), 4 * 40)
+
+        # vehicles on the second lane
+        diagram = ta.time_space_diagram(constant_speed_chunks(), EDGES,
+                                        dt=5, dx=50, lane=1)
+        self.assertEqual(diagram["count"].sum(), 2 * 40)
+
+    def test_edie_cells(self):
+        cells = ta.edie_cells(constant_speed_chunks(num_vehicles=20), EDGES,
+                              dt=4, dx=100)
+        # in steady state, the flow is one vehicle every 2 seconds, and the
+        # density one vehicle every 20 meters
+        np.testing.assert_array_almost_equal(cells["flow"][5:9], 1800)
+        np.testing.assert_array_almost_equal(cells["density"][5:9], 50)
+        occupied = cells["density"] > 0
+        np.testing.assert_array_almost_equal(cells["speed"][occupied], 10)
+        np.testing.assert_array_almost_equal(
+            cells["flow"], cells["density"] * 3.6 * np.nan_to_num(
+                cells["speed"]))
+
+        # the result does not depend on the size of the chunks
+        other = ta.edie_cells(
+            constant_speed_chunks(num_vehicles=20, chunk_size=1), EDGES,
+            dt=4, dx=100)
+        for key in ["flow", "density", "speed"]:
+            np.testing.assert_array_almost_equal(other[key], cells[key])
+
+        # the sample period cannot be inferred from a single time
+        chunks = constant_speed_chunks(num_vehicles=20)[:1]
+        chunks[0] = {name: values[:1] for name, values in chunks[0].items()}
+        self.assertRaises(ValueError, ta.edie_cells, chunks, EDGES, dt=4,
+                          dx=100)
+
+    def test_virtual_detectors(self):
+        detectors = [("a", 50), ("b", 25), ("b", 25, 0)]
+        result = ta.virtual_detectors(constant_speed_chunks(), detectors,
+                                      interval=10)
+        np.testing.assert_array_equal(result["count"].sum(axis=1), [4, 4, 2])
+        # vehicle i crosses position 50 at 5 + 2i, and 125 at 12.5 + 2i
+        np.testing.assert_array_equal(result["count"][0], [3, 1])
+        np.testing.assert_array_equal(result["count"][1], [0, 4])
+        np.testing.assert_array_almost_equal(result["flow"][0], [1080, 360])
+        np.testing.assert_array_almost_equal(result["speed"][0, :2], 10)
+
+        # the result does not depend on the size of the chunks
+        other = ta.virtual_detectors(constant_speed_chunks(chunk_size=1),
+                                     detectors, interval=10)
+        np.testing.assert_array_equal(other["count"], result["count"])
+
+    def test_travel_times(self):
+        vehicles, times = ta.travel_times(constant_speed_chunks())
+        np.testing.assert_array_equal(vehicles, range(4))
+        np.testing.assert_array_almost_equal(times, 19.5)
+
+        vehicles, times = ta.travel_times(constant_speed_chunks(), ["b"])
+        np.testing.assert_array_almost_equal(times, 9.5)
+
+    def test_load_recording(self):
+        path = tempfile.mkdtemp()
+        try:
+            ta._write_synthetic_recording(path, num_rows=5000, chunk_size=400,
+                                          num_vehicles=100)
+            chunks = list(ta.load_chunks(path))
+            self.assertEqual(sum(len(c["time"]) for c in chunks), 5000)
+            self.assertEqual(set(chunks[-1]["edge"]), {"ring"})
+            with np.load(os.path.join(path, "chunk_00000.npz")) as chunk:
+                for name, dtype in TRAJECTORY_COLUMNS:
+                    self.assertEqual(chunk[name].dtype, dtype)
+
+            vehicles, times = ta.travel_times(chunks)
+            self.assertEqual(len(vehicles), 100)
+            np.testing.assert_array_almost_equal(times, 24.5)
+
+            results = ta.benchmark(num_rows=20000, chunk_size=5000)
+            self.assertGreater(results["edie_cells"], 0)
+        finally:
+            shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,14 +2,21 @@ import unittest
 import csv
 import os
 import json
+import shutil
+import tempfile
 import collections
+import resource
+
+import numpy as np
 
 from flow.core.params import VehicleParams
 from flow.core.params import TrafficLightParams
 from flow.controllers import IDMController, ContinuousRouter, RLController
 from flow.core.params import SumoParams, EnvParams, NetParams, InitialConfig, \
     InFlows, SumoCarFollowingParams
-from flow.core.util import emission_to_csv
+from flow.core import util
+from flow.core.util import emission_to_csv, emission_to_columnar, \
+    read_columnar_chunks
 from flow.utils.flow_warnings import deprecation_warning
 from flow.utils.registry import make_create_env
 from flow.utils.rllib import FlowParamsEncoder, get_flow_params
@@ -48,7 +55,7 @@ class TestEmissionToCSV(unittest.TestCase):
              'waiting', 'NOx', 'fuel', 'HC', 'x', 'route', 'relative_position',
              'noise', 'angle', 'PMx', 'speed', 'edge_id', 'lane_number']
 
-        self.assertCountEqual(headers, expected_headers)
+        self.assertEqual(headers, expected_headers)
 
         # check the number of rows of the generated csv file
         # Note that, rl vehicles are missing their final (reset) values, which
@@ -56,6 +63,73 @@ class TestEmissionToCSV(unittest.TestCase):
         self.assertEqual(len(dict1), 104)
 
 
+class TestEmissionToColumnar(unittest.TestCase):
+    """Tests the streaming conversion of emission files into columnar chunks.
+    """
+
+    def setUp(self):
+        current_path = os.path.realpath(__file__).rsplit("/", 1)[0]
+        self.emission_path = current_path + "/test_files/test-emission.xml"
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_chunks(self):
+        output_path = os.path.join(self.output_dir, "test-emission")
+        stats = emission_to_columnar(self.emission_path, output_path,
+                                     fmt="npz", chunk_size=10)
+        self.assertEqual(stats["rows"], 104)
+
+        chunks = list(read_columnar_chunks(output_path))
+        self.assertEqual([len(chunk["time"]) for chunk in chunks],
+                         [10] * 10 + [4])
+        self.assertEqual(chunks[0]["speed"].dtype, np.float64)
+        self.assertEqual(chunks[0]["lane_number"].dtype, np.int64)
+
+        # rows are ordered by time, as in the emission file
+        times = np.concatenate([chunk["time"] for chunk in chunks])
+        self.assertTrue(np.all(np.diff(times) >= 0))
+
+    def test_sort(self):
+        # the external sort spills a sorted run per chunk
+        output_path = os.path.join(self.output_dir, "test-emission.csv")
+        emission_to_columnar(self.emission_path, output_path, fmt="csv",
+                             sort=True, chunk_size=7)
+
+        chunks = list(read_columnar_chunks(output_path, ["id", "time"]))
+        ids = np.concatenate([chunk["id"] for chunk in chunks])
+        times = np.concatenate([chunk["time"] for chunk in chunks])
+        self.assertEqual(len(ids), 104)
+        np.testing.assert_array_equal(np.lexsort((times, ids)),
+                                      np.arange(104))
+
+    def test_merge_passes(self):
+        # there are more sorted runs than can be merged at once, and the
+        # number of open files is limited
+        fan_in = util._MERGE_FAN_IN
+        limits = resource.getrlimit(resource.RLIMIT_NOFILE)
+        util._MERGE_FAN_IN = 4
+        resource.setrlimit(resource.RLIMIT_NOFILE, (64, limits[1]))
+        try:
+            output_path = os.path.join(self.output_dir, "test-emission.csv")
+            emission_to_columnar(self.emission_path, output_path, fmt="csv",
+                                 sort=True, chunk_size=1)
+        finally:
+            util._MERGE_FAN_IN = fan_in
+            resource.setrlimit(resource.RLIMIT_NOFILE, limits)
+
+        expected_path = os.path.join(self.output_dir, "expected.csv")
+        emission_to_columnar(self.emission_path, expected_path, fmt="csv",
+                             sort=True)
+        with open(output_path) as f, open(expected_path) as expected:
+            self.assertEqual(f.read(), expected.read())
+
+    def test_invalid_format(self):
+        self.assertRaises(ValueError, emission_to_columnar,
+                          self.emission_path, fmt="xlsx")
+
+
 class TestWarnings(unittest.TestCase):
     """Tests warning functions located in flow.utils.warnings"""
 
@@ -0,0 +1,152 @@
+import unittest
+import os
+
+import numpy as np
+
+from flow.benchmarks.figureeight0 import flow_params
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.params import VehicleParams, NetParams, InitialConfig, \
+    EnvParams, SumoParams
+from flow.envs.loop.loop_accel import ADDITIONAL_ENV_PARAMS
+from flow.envs.vec_env import VecEnv
+from flow.scenarios.loop import ADDITIONAL_NET_PARAMS
+
+os.environ["TEST_FLAG"] = "True"
+
+
+class TestVecEnv(unittest.TestCase):
+    """Tests the vectorized Flow environment."""
+
+    def setUp(self):
+        self.num_envs = 2
+        self.env = VecEnv(flow_params, num_envs=self.num_envs, seed=0)
+
+    def tearDown(self):
+        self.env.close()
+        self.env = None
+
+    def test_spaces(self):
+        """Tests that the spaces match those of a single environment."""
+        self.assertEqual(self.env.observation_space.shape, (28,))
+        self.assertEqual(self.env.action_space.shape, (1,))
+
+    def test_reset_and_step(self):
+        """Tests the shapes of the outputs of reset and step."""
+        obs = self.env.reset()
+        self.assertEqual(obs.shape, (self.num_envs, 28))
+
+        actions = np.zeros((self.num_envs, 1))
+        self.env.step_async(actions)
+        obs, rewards, dones, infos = self.env.step_wait()
+        self.assertEqual(obs.shape, (self.num_envs, 28))
+        self.assertEqual(rewards.shape, (self.num_envs,))
+        self.assertEqual(dones.shape, (self.num_envs,))
+        self.assertEqual(len(infos), self.num_envs)
+        self.assertFalse(any(dones))
+
+    def test_step_async_twice(self):
+        """Tests that step_async cannot be called twice without waiting."""
+        self.env.reset()
+        actions = np.zeros((self.num_envs, 1))
+        self.env.step_async(actions)
+        self.assertRaises(RuntimeError, self.env.step_async, actions)
+        self.env.step_wait()
+
+
+def ring_flow_params(horizon=5, additional_env_params=None):
+    """Return the flow_params of a noisy AccelEnv on the ring simulator."""
+    vehicles = VehicleParams()
+    vehicles.add("human",
+                 acceleration_controller=(IDMController, {"noise": 0.5}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=5)
+    vehicles.add("rl",
+                 acceleration_controller=(RLController, {}),
+                 routing_controller=(ContinuousRouter, {}),
+                 num_vehicles=1)
+    return dict(
+        exp_tag="vec_env_ring",
+        env_name="AccelEnv",
+        scenario="LoopScenario",
+        simulator="ring",
+        sim=SumoParams(sim_step=0.1),
+        env=EnvParams(horizon=horizon,
+                      additional_params=additional_env_params or
+                      ADDITIONAL_ENV_PARAMS.copy()),
+        net=NetParams(additional_params=ADDITIONAL_NET_PARAMS.copy()),
+        veh=vehicles,
+        initial=InitialConfig(),
+    )
+
+
+class TestVecEnvRing(unittest.TestCase):
+    """Tests the rollout logic of VecEnv on the (simulator-free) ring kernel.
+    """
+
+    def rollout(self, seed, num_steps):
+        env = VecEnv(ring_flow_params(), num_envs=2, seed=seed)
+        try:
+            observations = [env.reset()]
+            for _ in range(num_steps):
+                obs, _, _, _ = env.step(np.ones((2, 1)))
+                observations.append(obs)
+        finally:
+            env.close()
+        return np.array(observations)
+
+    def test_seed_determinism(self):
+        """Tests that sub-environments are reproducible given their seeds."""
+        obs = self.rollout(seed=0, num_steps=4)
+        np.testing.assert_array_equal(obs, self.rollout(seed=0, num_steps=4))
+
+        # every sub-environment is seeded differently, so the noisy
+        # accelerations of the human drivers differ
+        self.assertFalse(np.allclose(obs[1:, 0], obs[1:, 1]))
+
+    def test_auto_reset(self):
+        """Tests that sub-environments are reset once the horizon is met."""
+        env = VecEnv(ring_flow_params(horizon=3), num_envs=2, seed=0)
+        try:
+            initial_obs = env.reset()
+            for _ in range(2):
+                obs, _, dones, infos = env.step(np.ones((2, 1)))
+                self.assertFalse(any(dones))
+                self.assertNotIn('terminal_observation', infos[0])
+
+            obs, _, dones, infos = env.step(np.ones((2, 1)))
+            self.assertTrue(all(dones))
+            for i in range(2):
+                # the terminal observation is that of the last step, and the
+                # returned observation is that of the next rollout
+                terminal_obs = infos[i]['terminal_observation']
+                self.assertEqual(terminal_obs.shape, obs[i].shape)
+                self.assertFalse(np.allclose(terminal_obs, obs[i]))
+            np.testing.assert_array_almost_equal(obs, initial_obs)
+        finally:
+            env.close()
+
+    def test_failed_start(self):
+        """Tests that VecEnv shuts down cleanly if a worker fails to start."""
+        # missing environment parameters raise in the worker processes
+        params = ring_flow_params(additional_env_params={"max_accel": 1})
+        with self.assertRaises(RuntimeError) as context:
+            VecEnv(params, num_envs=2)
+        # the error raised in the worker is chained
+        self.assertIsInstance(context.exception.__cause__, KeyError)
+
+    def test_step_error(self):
+        """Tests that errors raised by a sub-environment reach the caller."""
+        env = VecEnv(ring_flow_params(), num_envs=2, seed=0)
+        try:
+            env.reset()
+            # the action of the second sub-environment cannot be clipped
+            env.step_async([np.ones(1), {}])
+            with self.assertRaises(TypeError) as context:
+                env.step_wait()
+            self.assertIn("clip_actions", str(context.exception.__cause__))
+        finally:
+            env.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
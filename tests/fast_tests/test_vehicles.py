@@ -209,6 +209,46 @@ class TestVehiclesClass(unittest.TestCase):
         self.assertEqual(env.k.vehicle.num_rl_vehicles,
                          len(env.k.vehicle.get_rl_ids()))
 
+    def test_reinitialize(self):
+        """
+        Check that restarting the simulation re-initializes the vehicle kernel
+        from the VehicleParams object without modifying it, and that
+        controllers are constructed from the type parameters when requested.
+        """
+        vehicles = VehicleParams()
+        vehicles.add(
+            "test",
+            num_vehicles=5,
+            acceleration_controller=(IDMController, {}))
+        vehicles.add(
+            "test_rl",
+            num_vehicles=5,
+            acceleration_controller=(RLController, {}))
+
+        env, _ = ring_road_exp_setup(vehicles=vehicles)
+
+        # controllers are created once, and then reused
+        controller = env.k.vehicle.get_acc_controller("test_0")
+        self.assertIsInstance(controller, IDMController)
+        self.assertIs(env.k.vehicle.get_acc_controller("test_0"), controller)
+        self.assertIsNone(env.k.vehicle.get_routing_controller("test_0"))
+        self.assertIsNone(env.k.vehicle.get_acc_controller("test_100"))
+
+        # restart the simulation and check that the state of the vehicles is
+        # reconstructed from the (unmodified) VehicleParams object
+        env.sim_params.restart_instance = True
+        env.reset()
+        self.assertEqual(env.k.vehicle.num_vehicles, 10)
+        self.assertEqual(env.k.vehicle.num_rl_vehicles, 5)
+        self.assertEqual(len(env.k.vehicle.get_controlled_ids()), 5)
+        self.assertIsNot(env.k.vehicle.get_acc_controller("test_0"),
+                         controller)
+        self.assertEqual(vehicles.num_vehicles, 10)
+        self.assertListEqual(sorted(vehicles.type_parameters.keys()),
+                             ["test", "test_rl"])
+
+        env.terminate()
+
 
 class TestMultiLaneData(unittest.TestCase):
     """